@@ -0,0 +1,534 @@
+import argparse
+import contextlib
+import json
+import logging
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from utils.data_parser import iter_queries
+from utils.formatter import ResultWriter, write_results
+from utils.http_pool import HTTPPool
+from utils.lookup_cache import LookupCache
+from utils.metrics import LatencyHistogram, Metrics
+from utils.synthetic import (
+    DEFAULT_DUPLICATE_RATIO,
+    DEFAULT_MISS_RATIO,
+    generate_people,
+    generate_queries,
+    write_jsonl,
+)
+from extractors.federated_source import HedgedSource
+from extractors.identity_extractor import IdentityExtractor, LookupMiss, PersonRecord
+from extractors.record_store import (
+    InMemoryRecordStore,
+    RecordStore,
+    SnapshotRecordStore,
+    SQLiteRecordStore,
+    build_snapshot_index,
+    build_sqlite_store,
+)
+from extractors.remote_source import RemoteSource, serve_stub_source
+from extractors.relations_extractor import RelationsExtractor
+from main import run_threaded
+
+SRC_DIR = Path(__file__).resolve().parent
+REPORT_VERSION = 1
+STORES = ("memory", "sqlite", "snapshot")
+DEFAULT_QUERIES = 10_000
+DEFAULT_TOLERANCE = 0.15
+# Throughput figures compared between reports, per case.
+COMPARED_STAGES = (
+    "startup",
+    "lookup",
+    "lookup_many",
+    "enrich_relations",
+    "to_dict",
+    "write_results",
+    "result_writer",
+    "remote_lookup",
+    "remote_lookup_hedged",
+)
+# Queries sent through the stub HTTP source per case (each is a real request).
+REMOTE_QUERIES = 2000
+# Chunk size for the ``lookup_many`` stage.
+LOOKUP_BATCH = 256
+# Slow tail given to the stub sources in the ``remote_lookup_tail`` and
+# ``remote_lookup_hedged`` cases: this share of requests takes this long.
+TAIL_RATIO = 0.05
+TAIL_DELAY = 0.05
+
+def _peak_rss_mb() -> float:
+    # ru_maxrss is in KiB on Linux and bytes on macOS.
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1 << 20 if sys.platform == "darwin" else 1 << 10), 1)
+
+def _stats(histogram: LatencyHistogram, seconds: Optional[float] = None) -> Dict[str, Any]:
+    """
+    Per-call percentiles in microseconds, plus throughput when ``seconds``
+    of wall time are given (else the summed call time is reported).
+    """
+    stats: Dict[str, Any] = {"count": histogram.count}
+    if seconds is None:
+        stats["total_seconds"] = round(histogram.total / 1e9, 4)
+    else:
+        stats["seconds"] = round(seconds, 4)
+        stats["ops_per_sec"] = round(histogram.count / seconds, 1) if seconds > 0 else None
+    for q in (0.5, 0.95, 0.99):
+        stats[f"p{round(q * 100)}_us"] = round(histogram.quantile(q) / 1e3, 2)
+    stats["max_us"] = round(histogram.max / 1e3, 2)
+    return stats
+
+def _timed_each(fn: Callable[[Any], Any], items: Iterable[Any]) -> Tuple[List[Any], Dict[str, Any]]:
+    """Call ``fn`` on every item, timing each call; LookupErrors count as misses."""
+    histogram = LatencyHistogram()
+    results = []
+    misses = 0
+    clock = time.perf_counter_ns
+    start = time.perf_counter()
+    for item in items:
+        t = clock()
+        try:
+            results.append(fn(item))
+        except LookupError:
+            misses += 1
+        histogram.record(clock() - t)
+    stats = _stats(histogram, time.perf_counter() - start)
+    if misses:
+        stats["misses"] = misses
+    return results, stats
+
+def _batched_lookups(extractor: IdentityExtractor, rows: List[Tuple[str, str]]) -> Dict[str, Any]:
+    """``lookup_many`` over ``rows`` in chunks; each query is charged its chunk's mean time."""
+    histogram = LatencyHistogram()
+    misses = 0
+    clock = time.perf_counter_ns
+    start = time.perf_counter()
+    for offset in range(0, len(rows), LOOKUP_BATCH):
+        chunk = rows[offset : offset + LOOKUP_BATCH]
+        t = clock()
+        results = extractor.lookup_many(chunk)
+        share = (clock() - t) // len(chunk)
+        for result in results:
+            histogram.record(share)
+            if isinstance(result, LookupMiss):
+                misses += 1
+    stats = _stats(histogram, time.perf_counter() - start)
+    if misses:
+        stats["misses"] = misses
+    return stats
+
+def _remote_lookups(
+    store: RecordStore,
+    rows: List[Tuple[str, str]],
+    workers: int,
+    pooled: bool,
+    replicas: int = 1,
+    tail_ratio: float = 0.0,
+    tail_delay: float = 0.0,
+) -> Dict[str, Any]:
+    """
+    Look ``rows`` up from ``workers`` threads through local stub sources,
+    reusing keep-alive connections (``pooled``) or opening one per request.
+
+    With several ``replicas`` requests are hedged across them
+    (``HedgedSource``); ``tail_ratio`` and ``tail_delay`` give each stub a
+    slow tail.
+    """
+    servers = [
+        serve_stub_source(store, tail_ratio=tail_ratio, tail_delay=tail_delay)
+        for _ in range(replicas)
+    ]
+    pools = [
+        HTTPPool(max_per_host=workers, max_idle_per_host=None if pooled else 0) for _ in servers
+    ]
+    sources = [
+        RemoteSource("http://%s:%d" % server.server_address[:2], pool)
+        for server, pool in zip(servers, pools)
+    ]
+    source = sources[0] if replicas == 1 else HedgedSource(sources, name="hedged-benchmark")
+    extractor = IdentityExtractor(store=store, source=source)
+    histogram = LatencyHistogram()
+    clock = time.perf_counter_ns
+
+    def run(row: Tuple[str, str]) -> None:
+        t = clock()
+        try:
+            extractor.lookup(*row)
+        except LookupError:
+            pass
+        histogram.record(clock() - t)
+
+    start = time.perf_counter()
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for _ in executor.map(run, rows):
+                pass
+        seconds = time.perf_counter() - start
+    finally:
+        source.close()
+        for server in servers:
+            server.shutdown()
+            server.server_close()
+    stats = _stats(histogram, seconds)
+    stats["connections_opened"] = sum(pool.opened for pool in pools)
+    if isinstance(source, HedgedSource):
+        stats["hedged"] = source.hedges
+    return stats
+
+def run_case(
+    people: int,
+    queries: int,
+    store_kind: str,
+    work_dir: Path,
+    seed: int = 0,
+    duplicate_ratio: float = DEFAULT_DUPLICATE_RATIO,
+    miss_ratio: float = DEFAULT_MISS_RATIO,
+    workers: int = 4,
+) -> Dict[str, Any]:
+    """
+    Benchmark one dataset size in this process and return its report entry.
+
+    Each stage runs on its own over the same synthetic queries: record store
+    and ``IdentityExtractor`` construction, single-threaded ``lookup``,
+    ``lookup_many`` in chunks of ``LOOKUP_BATCH``, ``enrich_relations``, ``to_dict``, ``write_results`` and the streaming
+    ``ResultWriter``. ``remote_lookup`` sends up to ``REMOTE_QUERIES`` of the
+    lookups through ``RemoteSource`` to a stub HTTP source on localhost from
+    ``workers`` threads with pooled connections, and
+    ``remote_lookup_per_request`` repeats that with a new connection per
+    request. ``remote_lookup_tail`` gives the stub a slow tail
+    (``TAIL_RATIO`` of requests take ``TAIL_DELAY`` longer), and
+    ``remote_lookup_hedged`` hedges the same lookups across two such stubs.
+    ``end_to_end`` then runs the real ``run_threaded``
+    pipeline (parse, bounded thread pool, memory cache, output file) with
+    stage metrics enabled and no console output.
+    """
+    case: Dict[str, Any] = {
+        "people": people,
+        "queries": queries,
+        "store": store_kind,
+        "seed": seed,
+        "duplicate_ratio": duplicate_ratio,
+        "miss_ratio": miss_ratio,
+    }
+
+    start = time.perf_counter()
+    if store_kind == "sqlite":
+        db_path = work_dir / "people.sqlite3"
+        build_sqlite_store(generate_people(people, seed), db_path)
+        case["dataset_seconds"] = round(time.perf_counter() - start, 3)
+        start = time.perf_counter()
+        store = SQLiteRecordStore(db_path)
+    elif store_kind == "snapshot":
+        snapshot_path = work_dir / "people.stsnap"
+        build_snapshot_index(generate_people(people, seed), snapshot_path)
+        case["dataset_seconds"] = round(time.perf_counter() - start, 3)
+        start = time.perf_counter()
+        store = SnapshotRecordStore(snapshot_path)
+    else:
+        records = list(generate_people(people, seed))
+        case["dataset_seconds"] = round(time.perf_counter() - start, 3)
+        start = time.perf_counter()
+        store = InMemoryRecordStore(records)
+        del records
+    extractor = IdentityExtractor(store=store)
+    startup = time.perf_counter() - start
+    case["startup"] = {
+        "seconds": round(startup, 4),
+        "ops_per_sec": round(1 / startup, 3) if startup > 0 else None,
+    }
+    case["rss_after_startup_mb"] = _peak_rss_mb()
+
+    queries_path = work_dir / "queries.jsonl"
+    write_jsonl(generate_queries(people, queries, seed, duplicate_ratio, miss_ratio), queries_path)
+    rows = [(query.search_option, query.input_value) for query in iter_queries(queries_path)]
+
+    found, case["lookup"] = _timed_each(lambda row: extractor.lookup(*row), rows)
+    case["lookup_many"] = _batched_lookups(extractor, rows)
+    relations_extractor = RelationsExtractor()
+    enriched, case["enrich_relations"] = _timed_each(relations_extractor.enrich_relations, found)
+    dicts, case["to_dict"] = _timed_each(PersonRecord.to_dict, enriched)
+
+    start = time.perf_counter()
+    write_results(dicts, work_dir / "results.json")
+    seconds = time.perf_counter() - start
+    case["write_results"] = {
+        "count": len(dicts),
+        "seconds": round(seconds, 4),
+        "ops_per_sec": round(len(dicts) / seconds, 1) if seconds > 0 else None,
+        "bytes": (work_dir / "results.json").stat().st_size,
+    }
+    del dicts
+
+    with ResultWriter(work_dir / "results.stream.json") as writer:
+        _, case["result_writer"] = _timed_each(writer.write_record, enriched)
+    del found, enriched
+
+    remote_rows = rows[:REMOTE_QUERIES]
+    case["remote_lookup"] = _remote_lookups(store, remote_rows, workers, pooled=True)
+    case["remote_lookup_per_request"] = _remote_lookups(store, remote_rows, workers, pooled=False)
+    case["remote_lookup_tail"] = _remote_lookups(
+        store, remote_rows, workers, pooled=True, tail_ratio=TAIL_RATIO, tail_delay=TAIL_DELAY
+    )
+    case["remote_lookup_hedged"] = _remote_lookups(
+        store,
+        remote_rows,
+        workers,
+        pooled=True,
+        replicas=2,
+        tail_ratio=TAIL_RATIO,
+        tail_delay=TAIL_DELAY,
+    )
+
+    metrics = Metrics()
+    pipeline_extractor = IdentityExtractor(cache=LookupCache(), store=store, metrics=metrics)
+    settings = {"max_workers": workers}
+    start = time.perf_counter()
+    succeeded, failed = run_threaded(
+        metrics.timed_iter(iter_queries(queries_path)),
+        settings,
+        pipeline_extractor,
+        RelationsExtractor(),
+        work_dir / "results.pipeline.jsonl",
+        metrics=metrics,
+    )
+    seconds = time.perf_counter() - start
+    case["end_to_end"] = {
+        "workers": workers,
+        "succeeded": succeeded,
+        "failed": failed,
+        "seconds": round(seconds, 4),
+        "ops_per_sec": round(queries / seconds, 1) if seconds > 0 else None,
+        "stages": {
+            stage: _stats(histogram)
+            for stage, histogram in metrics.stages.items()
+            if histogram.count
+        },
+    }
+
+    store.close()
+    case["peak_rss_mb"] = _peak_rss_mb()
+    return case
+
+def _git_commit() -> Optional[str]:
+    try:
+        result = subprocess.run(
+            ["git", "rev-parse", "HEAD"], cwd=SRC_DIR, capture_output=True, text=True, timeout=10
+        )
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return result.stdout.strip() or None
+
+def _import_seconds() -> float:
+    """Wall time of a fresh interpreter importing the pipeline (``import main``)."""
+    start = time.perf_counter()
+    subprocess.run([sys.executable, "-c", "import main"], cwd=SRC_DIR, check=True)
+    return round(time.perf_counter() - start, 4)
+
+def _case_key(case: Dict[str, Any]) -> Tuple[Any, ...]:
+    return case["store"], case["people"], case["queries"]
+
+def compare_reports(
+    baseline: Dict[str, Any], current: Dict[str, Any], tolerance: float = DEFAULT_TOLERANCE
+) -> List[str]:
+    """
+    Describe every regression of ``current`` against ``baseline``.
+
+    Cases are matched by store and sizes. A stage regresses when its
+    ops/sec drops by more than ``tolerance`` (a fraction); peak RSS
+    regresses when it grows by more than that.
+    """
+    baseline_cases = {_case_key(case): case for case in baseline.get("cases", [])}
+    regressions = []
+    for case in current.get("cases", []):
+        old = baseline_cases.get(_case_key(case))
+        if old is None:
+            continue
+        label = "{} people={} queries={}".format(*_case_key(case))
+        for stage in COMPARED_STAGES + ("end_to_end",):
+            before = (old.get(stage) or {}).get("ops_per_sec")
+            after = (case.get(stage) or {}).get("ops_per_sec")
+            if before and after is not None and after < before * (1 - tolerance):
+                regressions.append(
+                    f"{label}: {stage} {after:g} ops/s vs {before:g} ({after / before - 1:+.1%})"
+                )
+        before_rss, after_rss = old.get("peak_rss_mb"), case.get("peak_rss_mb")
+        if before_rss and after_rss is not None and after_rss > before_rss * (1 + tolerance):
+            regressions.append(
+                f"{label}: peak RSS {after_rss:g} MB vs {before_rss:g} ({after_rss / before_rss - 1:+.1%})"
+            )
+    return regressions
+
+def _sizes(value: str) -> List[int]:
+    return [int(float(size)) for size in value.split(",") if size.strip()]
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Generate synthetic datasets and benchmark the lookup pipeline.",
+    )
+    parser.add_argument("--log-level", default="CRITICAL", help="pipeline log level (silenced by default)")
+    commands = parser.add_subparsers(dest="command", required=True, metavar="{generate,run,compare}")
+
+    def dataset_options(command: argparse.ArgumentParser) -> None:
+        command.add_argument("--queries", type=int, default=DEFAULT_QUERIES)
+        command.add_argument("--seed", type=int, default=0)
+        command.add_argument("--duplicate-ratio", type=float, default=DEFAULT_DUPLICATE_RATIO)
+        command.add_argument("--miss-ratio", type=float, default=DEFAULT_MISS_RATIO)
+
+    generate = commands.add_parser(
+        "generate", help="write people.jsonl (for build_index.py) and queries.jsonl"
+    )
+    generate.add_argument("out_dir", type=Path)
+    generate.add_argument("--people", type=int, default=10_000)
+    dataset_options(generate)
+
+    run = commands.add_parser("run", help="benchmark one or more dataset sizes and write a JSON report")
+    run.add_argument(
+        "--sizes",
+        type=_sizes,
+        default=[10_000],
+        help="comma separated people counts, e.g. 10000,100000,1e6 (each runs in a fresh process)",
+    )
+    run.add_argument(
+        "--store", choices=STORES, default="memory", help="use sqlite or snapshot for sizes past RAM"
+    )
+    run.add_argument("--workers", type=int, default=4)
+    run.add_argument("--report", type=Path, help="write the report here instead of stdout")
+    run.add_argument("--baseline", type=Path, help="earlier report; exit 1 on regressions")
+    run.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE)
+    run.add_argument("--work-dir", type=Path, help="keep generated files here (default: a temp dir)")
+    dataset_options(run)
+
+    # Internal: "run" measures each size in a fresh process through this command.
+    case = commands.add_parser("case")
+    case.add_argument("--people", type=int, required=True)
+    case.add_argument("--store", choices=STORES, default="memory")
+    case.add_argument("--workers", type=int, default=4)
+    case.add_argument("--work-dir", type=Path, required=True)
+    dataset_options(case)
+
+    compare = commands.add_parser("compare", help="compare two reports; exit 1 on regressions")
+    compare.add_argument("baseline", type=Path)
+    compare.add_argument("report", type=Path)
+    compare.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE)
+
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(
+        level=getattr(logging, args.log_level.upper(), logging.CRITICAL),
+        format="%(asctime)s [%(levelname)s] %(name)s - %(message)s",
+    )
+    logger = logging.getLogger("benchmark")
+
+    if args.command == "generate":
+        people = write_jsonl(generate_people(args.people, args.seed), args.out_dir / "people.jsonl")
+        queries = write_jsonl(
+            generate_queries(args.people, args.queries, args.seed, args.duplicate_ratio, args.miss_ratio),
+            args.out_dir / "queries.jsonl",
+        )
+        print(f"Wrote {people} people and {queries} queries to {args.out_dir}")
+        return 0
+
+    if args.command == "case":
+        args.work_dir.mkdir(parents=True, exist_ok=True)
+        result = run_case(
+            args.people,
+            args.queries,
+            args.store,
+            args.work_dir,
+            args.seed,
+            args.duplicate_ratio,
+            args.miss_ratio,
+            args.workers,
+        )
+        print(json.dumps(result))
+        return 0
+
+    if args.command == "compare":
+        try:
+            baseline = json.loads(args.baseline.read_text(encoding="utf-8"))
+            report = json.loads(args.report.read_text(encoding="utf-8"))
+        except (OSError, ValueError) as exc:
+            logger.error("Failed to read report: %s", exc)
+            return 1
+        regressions = compare_reports(baseline, report, args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        return 1 if regressions else 0
+
+    report: Dict[str, Any] = {
+        "version": REPORT_VERSION,
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "git_commit": _git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "import_seconds": _import_seconds(),
+        "cases": [],
+    }
+    with contextlib.ExitStack() as stack:
+        root = args.work_dir or Path(stack.enter_context(tempfile.TemporaryDirectory(prefix="skiptrace-bench-")))
+        for people in args.sizes:
+            command = [
+                sys.executable,
+                str(Path(__file__).resolve()),
+                "--log-level",
+                args.log_level,
+                "case",
+                "--people",
+                str(people),
+                "--queries",
+                str(args.queries),
+                "--store",
+                args.store,
+                "--workers",
+                str(args.workers),
+                "--work-dir",
+                str(root / f"{args.store}-{people}"),
+                "--seed",
+                str(args.seed),
+                "--duplicate-ratio",
+                str(args.duplicate_ratio),
+                "--miss-ratio",
+                str(args.miss_ratio),
+            ]
+            print(
+                f"Benchmarking {people} people / {args.queries} queries ({args.store} store)",
+                file=sys.stderr,
+            )
+            result = subprocess.run(command, cwd=SRC_DIR, stdout=subprocess.PIPE, text=True)
+            if result.returncode != 0:
+                logger.error("Benchmark case for %d people failed (exit %d)", people, result.returncode)
+                return 1
+            report["cases"].append(json.loads(result.stdout.strip().splitlines()[-1]))
+
+    regressions: List[str] = []
+    if args.baseline is not None:
+        try:
+            baseline = json.loads(args.baseline.read_text(encoding="utf-8"))
+        except (OSError, ValueError) as exc:
+            logger.error("Failed to read baseline report: %s", exc)
+            return 1
+        regressions = compare_reports(baseline, report, args.tolerance)
+        report["regressions"] = regressions
+
+    text = json.dumps(report, indent=4)
+    if args.report is not None:
+        args.report.parent.mkdir(parents=True, exist_ok=True)
+        args.report.write_text(text + "\n", encoding="utf-8")
+    else:
+        print(text)
+    for line in regressions:
+        print(f"REGRESSION {line}", file=sys.stderr)
+    return 1 if regressions else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
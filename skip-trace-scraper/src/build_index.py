@@ -0,0 +1,82 @@
+import argparse
+import logging
+import sys
+from pathlib import Path
+from typing import List, Optional
+
+from extractors.record_store import (
+    BUILD_BATCH_SIZE,
+    MARSHAL_INDEX_SUFFIX,
+    SNAPSHOT_BLOCK_RECORDS,
+    SNAPSHOT_COMPRESSIONS,
+    SNAPSHOT_SUFFIX,
+    build_marshal_index,
+    build_snapshot_index,
+    build_sqlite_store,
+    iter_bulk_records,
+)
+
+FORMATS = ("sqlite", "marshal", "snapshot")
+SUFFIX_FORMATS = {MARSHAL_INDEX_SUFFIX: "marshal", SNAPSHOT_SUFFIX: "snapshot"}
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Build an on-disk record index from a CSV or JSON Lines bulk file.",
+    )
+    parser.add_argument("source", type=Path, help="bulk .csv or .jsonl file of raw person records")
+    parser.add_argument("output", type=Path, help="index file to write (e.g. data/index/people.sqlite3)")
+    parser.add_argument(
+        "--format",
+        choices=FORMATS,
+        help="sqlite (queryable, incremental), marshal (fastest to open, for one-off lookups) "
+        "or snapshot (compact and memory-mapped, for sharing one dataset between processes); "
+        f"default: marshal for *{MARSHAL_INDEX_SUFFIX}, snapshot for *{SNAPSHOT_SUFFIX}, "
+        "otherwise sqlite",
+    )
+    parser.add_argument("--batch-size", type=int, default=BUILD_BATCH_SIZE)
+    parser.add_argument(
+        "--block-records",
+        type=int,
+        default=SNAPSHOT_BLOCK_RECORDS,
+        help="records per compressed block of a snapshot",
+    )
+    parser.add_argument(
+        "--compression",
+        choices=SNAPSHOT_COMPRESSIONS,
+        default="zlib",
+        help="block compression of a snapshot",
+    )
+    parser.add_argument("--log-level", default="INFO")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(
+        level=getattr(logging, args.log_level.upper(), logging.INFO),
+        format="%(asctime)s [%(levelname)s] %(name)s - %(message)s",
+    )
+    logger = logging.getLogger("build_index")
+
+    if not args.source.exists():
+        logger.error("Bulk file not found at: %s", args.source)
+        return 1
+
+    index_format = args.format or SUFFIX_FORMATS.get(args.output.suffix.lower(), "sqlite")
+    try:
+        if index_format == "marshal":
+            build_marshal_index(iter_bulk_records(args.source), args.output)
+        elif index_format == "snapshot":
+            build_snapshot_index(
+                iter_bulk_records(args.source),
+                args.output,
+                block_records=args.block_records,
+                compression=args.compression,
+            )
+        else:
+            build_sqlite_store(iter_bulk_records(args.source), args.output, args.batch_size)
+    except (OSError, ValueError) as exc:
+        logger.error("Failed to build record index: %s", exc)
+        return 1
+
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,57 @@
+import argparse
+import json
+import logging
+import sys
+from pathlib import Path
+from typing import List, Optional
+
+from extractors.relation_graph import ADDRESS_EDGES, PERSON_EDGES, RelationGraph
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Expand a trace from a saved relation graph without issuing new lookups.",
+    )
+    parser.add_argument("graph", type=Path, help="graph file written by a run (relation_graph_file)")
+    parser.add_argument(
+        "name",
+        help="person to expand from: a name (e.g. \"James Whitsitt\"), person link, phone or email;"
+        " a name shared by several people expands from all of them",
+    )
+    parser.add_argument("--hops", type=int, default=2)
+    parser.add_argument(
+        "--via-addresses",
+        action="store_true",
+        help="also connect people through shared current or previous addresses",
+    )
+    parser.add_argument("--log-level", default="WARNING")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(
+        level=getattr(logging, args.log_level.upper(), logging.WARNING),
+        format="%(asctime)s [%(levelname)s] %(name)s - %(message)s",
+    )
+    logger = logging.getLogger("expand_trace")
+
+    try:
+        graph = RelationGraph.load(args.graph)
+    except (OSError, ValueError) as exc:
+        logger.error("Failed to load relation graph: %s", exc)
+        return 1
+
+    edge_types = PERSON_EDGES + (ADDRESS_EDGES if args.via_addresses else ())
+    result = {
+        "name": args.name,
+        "hops": args.hops,
+        "connections": [
+            {"name": name, "age": age, "distance": distance}
+            for name, age, distance in graph.within_hops(args.name, args.hops, edge_types)
+        ],
+        "likely_household": [
+            {"name": name, "score": score} for name, score in graph.likely_household(args.name)
+        ],
+    }
+    print(json.dumps(result, indent=4, ensure_ascii=False))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
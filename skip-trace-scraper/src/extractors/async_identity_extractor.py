@@ -0,0 +1,304 @@
+import asyncio
+import logging
+import ssl
+import time
+from contextlib import suppress
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Tuple
+from urllib.parse import urlencode, urlsplit
+
+from utils.http_pool import DEFAULT_MAX_PER_HOST
+from utils.singleflight import AsyncSingleFlight
+
+from .identity_extractor import IdentityExtractor, PersonRecord
+from .remote_source import decode_source_response
+
+if TYPE_CHECKING:
+    from utils.lookup_cache import LookupCache
+
+logger = logging.getLogger(__name__)
+query_logger = logging.getLogger(f"queries.{__name__}")
+
+DEFAULT_TIMEOUT = 10.0
+DEFAULT_MAX_CONCURRENCY = 1000
+DEFAULT_MAX_RESPONSE_BYTES = 1 << 20
+# Errors a reused keep-alive connection raises when the server has already
+# closed it; the request is resent once on a fresh connection.
+_STALE_ERRORS = (ConnectionResetError, BrokenPipeError, asyncio.IncompleteReadError)
+
+Connection = Tuple[asyncio.StreamReader, asyncio.StreamWriter]
+
+class AsyncConnectionPool:
+    """
+    Idle keep-alive connections for ``http_get``, per host (scheme, name,
+    port): the asyncio counterpart of ``utils.http_pool.HTTPPool``'s idle
+    lists. At most ``max_idle_per_host`` connections are kept per host;
+    connections the server closed are dropped when next taken. Use from a
+    single event loop.
+    """
+
+    def __init__(self, max_idle_per_host: int = DEFAULT_MAX_PER_HOST) -> None:
+        self.max_idle_per_host = max(0, max_idle_per_host)
+        self._idle: Dict[Tuple[str, str, int], List[Connection]] = {}
+        self.opened = 0
+        self.reused = 0
+
+    def take(self, key: Tuple[str, str, int]) -> Optional[Connection]:
+        idle = self._idle.get(key)
+        while idle:
+            reader, writer = idle.pop()
+            if not reader.at_eof() and not writer.is_closing():
+                self.reused += 1
+                return reader, writer
+            writer.close()
+        return None
+
+    def give_back(self, key: Tuple[str, str, int], connection: Connection) -> None:
+        idle = self._idle.setdefault(key, [])
+        if len(idle) < self.max_idle_per_host:
+            idle.append(connection)
+        else:
+            connection[1].close()
+
+    async def close(self) -> None:
+        """Close every idle connection."""
+        idle, self._idle = self._idle, {}
+        for connections in idle.values():
+            for _, writer in connections:
+                writer.close()
+                with suppress(Exception):
+                    await writer.wait_closed()
+
+async def _read_body(reader: asyncio.StreamReader, headers: Dict[str, str], max_bytes: int) -> bytes:
+    if "chunked" in headers.get("transfer-encoding", "").lower():
+        chunks = []
+        total = 0
+        while True:
+            size_line = await reader.readline()
+            size = int(size_line.split(b";", 1)[0].strip() or b"0", 16)
+            if size == 0:
+                # Trailers, if any, end with an empty line.
+                while (await reader.readline()).strip():
+                    pass
+                return b"".join(chunks)
+            total += size
+            if total > max_bytes:
+                raise ValueError(f"Response body exceeds {max_bytes} bytes")
+            chunks.append(await reader.readexactly(size))
+            await reader.readexactly(2)
+
+    if "content-length" in headers:
+        length = int(headers["content-length"])
+        if length > max_bytes:
+            raise ValueError(f"Response body exceeds {max_bytes} bytes")
+        return await reader.readexactly(length)
+
+    body = await reader.read(max_bytes + 1)
+    if len(body) > max_bytes:
+        raise ValueError(f"Response body exceeds {max_bytes} bytes")
+    return body
+
+async def _exchange(
+    reader: asyncio.StreamReader,
+    writer: asyncio.StreamWriter,
+    request: bytes,
+    max_bytes: int,
+) -> Tuple[int, bytes, bool]:
+    """Send ``request``; return the status, the body and whether the connection can be reused."""
+    writer.write(request)
+    await writer.drain()
+
+    status_line = await reader.readline()
+    if not status_line:
+        raise ConnectionResetError("Connection closed before the response")
+    try:
+        version, status_text = status_line.split()[:2]
+        status = int(status_text)
+    except ValueError as exc:
+        raise ConnectionError(f"Malformed HTTP status line: {status_line!r}") from exc
+
+    headers: Dict[str, str] = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+
+    body = await _read_body(reader, headers, max_bytes)
+    reusable = (
+        version == b"HTTP/1.1"
+        and headers.get("connection", "").lower() != "close"
+        and ("content-length" in headers or "chunked" in headers.get("transfer-encoding", "").lower())
+    )
+    return status, body, reusable
+
+async def http_get(
+    url: str,
+    max_bytes: int = DEFAULT_MAX_RESPONSE_BYTES,
+    pool: Optional[AsyncConnectionPool] = None,
+) -> Tuple[int, bytes]:
+    """
+    Minimal asyncio HTTP/1.1 GET returning ``(status, body)``.
+
+    Only what the lookup protocol needs is implemented: plain or TLS
+    connections, Content-Length / chunked / read-to-close bodies, and a hard
+    cap on the response size. With a ``pool`` the connection is kept alive
+    and reused by later requests to the same host; a reused connection the
+    server has closed in the meantime is replaced once. Without one, every
+    request opens its own connection and closes it.
+    """
+    parts = urlsplit(url)
+    if parts.scheme not in ("http", "https") or not parts.hostname:
+        raise ValueError(f"Unsupported source URL: {url}")
+
+    secure = parts.scheme == "https"
+    port = parts.port or (443 if secure else 80)
+    key = (parts.scheme, parts.hostname, port)
+    target = parts.path or "/"
+    if parts.query:
+        target = f"{target}?{parts.query}"
+    request = (
+        f"GET {target} HTTP/1.1\r\n"
+        f"Host: {parts.netloc}\r\n"
+        "Accept: application/json\r\n"
+        f"Connection: {'keep-alive' if pool is not None else 'close'}\r\n"
+        "\r\n"
+    ).encode("ascii")
+
+    connection = pool.take(key) if pool is not None else None
+    reused = connection is not None
+    if connection is None:
+        connection = await asyncio.open_connection(
+            parts.hostname, port, ssl=ssl.create_default_context() if secure else None
+        )
+        if pool is not None:
+            pool.opened += 1
+
+    reusable = False
+    try:
+        try:
+            status, body, reusable = await _exchange(*connection, request, max_bytes)
+        except _STALE_ERRORS:
+            if not reused:
+                raise
+            connection[1].close()
+            connection = await asyncio.open_connection(
+                parts.hostname, port, ssl=ssl.create_default_context() if secure else None
+            )
+            pool.opened += 1
+            status, body, reusable = await _exchange(*connection, request, max_bytes)
+        return status, body
+    finally:
+        # Also reached on cancellation (timeouts): a half-read connection is never reused.
+        if pool is not None and reusable:
+            pool.give_back(key, connection)
+        else:
+            writer = connection[1]
+            writer.close()
+            with suppress(Exception):
+                await writer.wait_closed()
+
+class AsyncIdentityExtractor:
+    """
+    asyncio front-end for identity lookups.
+
+    With a ``source_url`` every lookup is an HTTP GET against
+    ``{source_url}/lookup?search_option=...&input_value=...``; the source
+    answers 200 with a raw record (same shape as the entries of
+    ``IdentityExtractor._build_static_dataset``) or 404 when nothing matches.
+    Without one, lookups are answered from the local ``IdentityExtractor``
+    on the loop's default executor, so they never block the event loop.
+    Requests reuse keep-alive connections (up to ``max_idle_per_host`` idle
+    per host; call ``aclose`` when done). Remote records are kept in the
+    optional ``LookupCache``, and duplicate lookups already in flight share
+    one request. Stage times go to the local
+    extractor's ``metrics``, if any.
+
+    A semaphore caps the number of concurrent upstream requests, and every
+    request is bounded by ``timeout`` seconds, so thousands of lookups can be
+    in flight in a single event loop without overwhelming the source.
+    """
+
+    def __init__(
+        self,
+        source_url: Optional[str] = None,
+        local: Optional[IdentityExtractor] = None,
+        timeout: float = DEFAULT_TIMEOUT,
+        max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+        max_response_bytes: int = DEFAULT_MAX_RESPONSE_BYTES,
+        cache: Optional["LookupCache"] = None,
+        max_idle_per_host: int = DEFAULT_MAX_PER_HOST,
+    ) -> None:
+        if max_concurrency < 1:
+            raise ValueError("max_concurrency must be at least 1")
+        self.source_url = source_url.rstrip("/") if source_url else None
+        self.timeout = timeout
+        self.max_concurrency = max_concurrency
+        self.max_response_bytes = max_response_bytes
+        self._local = local or IdentityExtractor(cache=cache)
+        self._cache = cache
+        self.inflight: AsyncSingleFlight[Optional[Dict[str, Any]]] = AsyncSingleFlight()
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self.pool = AsyncConnectionPool(max_idle_per_host)
+
+    async def _fetch(self, search_option: str, input_value: str) -> Optional[Dict[str, Any]]:
+        query = urlencode({"search_option": search_option, "input_value": input_value})
+        status, body = await http_get(
+            f"{self.source_url}/lookup?{query}", self.max_response_bytes, self.pool
+        )
+        return decode_source_response(status, body, input_value)
+
+    async def _fetch_and_cache(
+        self, cache_key: Tuple[str, str], search_option: str, input_value: str
+    ) -> Optional[Dict[str, Any]]:
+        async with self._semaphore:
+            try:
+                raw = await asyncio.wait_for(
+                    self._fetch(search_option, input_value), self.timeout
+                )
+            except asyncio.TimeoutError:
+                raise TimeoutError(
+                    f"Lookup for '{input_value}' timed out after {self.timeout}s"
+                ) from None
+
+        if raw is not None and self._cache is not None:
+            self._cache.put(cache_key, raw)
+        return raw
+
+    async def alookup(self, search_option: str, input_value: str) -> PersonRecord:
+        """Async counterpart of ``IdentityExtractor.lookup``."""
+        if self.source_url is None:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(None, self._local.lookup, search_option, input_value)
+
+        metrics = self._local.metrics
+        start = time.perf_counter_ns() if metrics is not None else 0
+        query_logger.info(
+            "Looking up identity for '%s' using search option '%s'",
+            input_value,
+            search_option,
+        )
+
+        cache_key = (
+            search_option.strip().lower(),
+            IdentityExtractor._normalize_key(input_value),
+        )
+        raw = self._cache.get(cache_key) if self._cache is not None else None
+        if raw is None:
+            raw = await self.inflight.do(
+                cache_key, lambda: self._fetch_and_cache(cache_key, search_option, input_value)
+            )
+
+        if metrics is not None:
+            resolved = time.perf_counter_ns()
+            metrics.observe("lookup", resolved - start)
+        if raw is None:
+            raise IdentityExtractor._not_found(search_option, input_value)
+        record = self._local._make_person_record(search_option, input_value, raw)
+        if metrics is not None:
+            metrics.observe("build", time.perf_counter_ns() - resolved)
+        return record
+
+    async def aclose(self) -> None:
+        """Close idle upstream connections."""
+        await self.pool.close()
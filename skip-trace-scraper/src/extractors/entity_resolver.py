@@ -0,0 +1,266 @@
+import logging
+import marshal
+import tempfile
+from array import array
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+from utils.matching import MAX_AGE_GAP, phone_key
+
+from .identity_extractor import PersonRecord, Relation
+from .record_store import address_keys, email_key, normalize_key
+
+logger = logging.getLogger(__name__)
+
+_NO_AGE = -1
+_MAX_AGE = 32767
+
+def _name_parts(record: PersonRecord) -> str:
+    return f"{normalize_key(record.first_name)}\0{normalize_key(record.last_name)}"
+
+def _same_person_name(a: str, b: str) -> bool:
+    """
+    Whether two ``_name_parts`` can name one person: the same last name and
+    first names that are equal or one a prefix of the other ("jim"/"j").
+    """
+    first_a, _, last_a = a.partition("\0")
+    first_b, _, last_b = b.partition("\0")
+    if last_a != last_b:
+        return False
+    return first_a.startswith(first_b) or first_b.startswith(first_a)
+
+def _age(record: PersonRecord) -> int:
+    age = (record.age or "").strip()
+    return min(int(age), _MAX_AGE) if age.isdigit() else _NO_AGE
+
+def _address_key(address: Dict[str, Any]) -> Any:
+    keys = address_keys(
+        address.get("streetAddress"),
+        address.get("addressLocality"),
+        address.get("addressRegion"),
+        address.get("postalCode"),
+    )
+    return keys[0] if keys else tuple(sorted((k, str(v)) for k, v in address.items()))
+
+def merge_person_records(records: List[PersonRecord]) -> PersonRecord:
+    """
+    Merge records of one person into a canonical record, earlier ones first.
+
+    Name, search option and input come from the first record; every other
+    scalar from the first record that has it. Emails, phones, previous
+    addresses, relatives and associates are combined, leaving out entries
+    an earlier record already gave. ``matched_queries`` lists each distinct
+    query of the records. The merged record only counts as a fuzzy match
+    (with the best ``match_score``) when every record was one.
+    """
+    first = records[0]
+    merged = PersonRecord(
+        search_option=first.search_option,
+        input_given=first.input_given,
+        first_name=first.first_name,
+        last_name=first.last_name,
+    )
+    for attr in (
+        "age",
+        "born",
+        "lives_in",
+        "street_address",
+        "address_locality",
+        "address_region",
+        "postal_code",
+        "county_name",
+        "person_link",
+    ):
+        values = [getattr(record, attr) for record in records]
+        setattr(merged, attr, next((value for value in values if value), values[0]))
+    scores = [record.match_score for record in records]
+    if None not in scores:
+        merged.match_score = max(scores)
+
+    seen_emails = set()
+    seen_phones = set()
+    seen_addresses = set()
+    seen_relatives = set()
+    seen_associates = set()
+    seen_queries = set()
+    for record in records:
+        for email in record.emails:
+            key = email_key(email)
+            if key not in seen_emails:
+                seen_emails.add(key)
+                merged.emails.append(email)
+        for phone in record.phones:
+            key = phone_key(phone.get("number")) or phone.get("number")
+            if key not in seen_phones:
+                seen_phones.add(key)
+                merged.phones.append(dict(phone))
+        for address in record.previous_addresses:
+            key = _address_key(address)
+            if key not in seen_addresses:
+                seen_addresses.add(key)
+                merged.previous_addresses.append(dict(address))
+        for relations, seen, target in (
+            (record.relatives, seen_relatives, merged.relatives),
+            (record.associates, seen_associates, merged.associates),
+        ):
+            for rel in relations:
+                key = normalize_key(rel.name)
+                if key not in seen:
+                    seen.add(key)
+                    target.append(Relation(rel.name, rel.age))
+        for query in record.matched_queries or [
+            {"Search Option": record.search_option, "Input Given": record.input_given}
+        ]:
+            key = (query["Search Option"], query["Input Given"])
+            if key not in seen_queries:
+                seen_queries.add(key)
+                merged.matched_queries.append(dict(query))
+    return merged
+
+class EntityResolver:
+    """
+    Cluster a run's results by person and merge each cluster into one record.
+
+    Records that share a blocking key are candidates for the same person:
+    any phone number (digits only), any email, the normalized name plus
+    5-digit ZIP code, or the person link. A candidate only joins a person
+    whose every record agrees with it, in age (within ``MAX_AGE_GAP``) and
+    name (``_same_person_name``), so neither a household's shared landline
+    nor a father and son of the same name at one address fold into one
+    person, and "J Smith" cannot bridge "Jim Smith" and "Jennifer Smith".
+    Each person keeps just what that check needs: the longest first name
+    (compatible names form a prefix chain) and the range of known ages.
+    Each key maps to the people that had it, and people are kept in a
+    union-find over record ids, so each record costs a few dict probes and
+    no comparisons beyond the people sharing its keys.
+
+    ``add`` takes each result with its input position; records are spilled
+    to a temporary file (``spill_dir`` or the system default) so only the
+    ids, cluster summaries and blocking keys stay in memory. ``resolve`` then yields
+    one canonical record per person (``merge_person_records``, members in
+    input order), ordered by each person's first query. Not thread-safe:
+    call it from the loop that collects results.
+    """
+
+    def __init__(self, spill_dir: Optional[Path] = None) -> None:
+        self._spill = tempfile.TemporaryFile(dir=spill_dir, prefix="entities-")
+        self._offsets = array("Q")
+        self._positions = array("q")
+        self._parent = array("I")
+        self._size = array("I")
+        # Per cluster root: longest name and range of known ages of its records.
+        self._names: List[str] = []
+        self._min_ages = array("h")
+        self._max_ages = array("h")
+        # Blocking key -> one record of each cluster that had the key.
+        self._blocks: Dict[str, List[int]] = {}
+        self.merged = 0
+
+    def __len__(self) -> int:
+        return len(self._parent)
+
+    def _find(self, node: int) -> int:
+        parent = self._parent
+        while parent[node] != node:
+            # Path halving.
+            parent[node] = parent[parent[node]]
+            node = parent[node]
+        return node
+
+    def _compatible(self, root_a: int, root_b: int) -> bool:
+        """Whether every record of one cluster agrees with every record of the other."""
+        if not _same_person_name(self._names[root_a], self._names[root_b]):
+            return False
+        low = min(self._min_ages[root_a], self._min_ages[root_b])
+        high = max(self._max_ages[root_a], self._max_ages[root_b])
+        return high == _NO_AGE or high - low <= MAX_AGE_GAP
+
+    def _union(self, root_a: int, root_b: int) -> int:
+        if self._size[root_a] < self._size[root_b]:
+            root_a, root_b = root_b, root_a
+        self._parent[root_b] = root_a
+        self._size[root_a] += self._size[root_b]
+        if len(self._names[root_b]) > len(self._names[root_a]):
+            self._names[root_a] = self._names[root_b]
+        self._min_ages[root_a] = min(self._min_ages[root_a], self._min_ages[root_b])
+        self._max_ages[root_a] = max(self._max_ages[root_a], self._max_ages[root_b])
+        self.merged += 1
+        return root_a
+
+    def add(self, position: int, record: PersonRecord) -> None:
+        """Add the result of the query at input ``position``."""
+        node = len(self._parent)
+        self._offsets.append(self._spill.tell())
+        self._spill.write(marshal.dumps(record.to_state()))
+        self._positions.append(position)
+        self._parent.append(node)
+        self._size.append(1)
+        name = _name_parts(record)
+        age = _age(record)
+        self._names.append(name)
+        # A record without an age leaves the range empty (min above max).
+        self._min_ages.append(age if age != _NO_AGE else _MAX_AGE)
+        self._max_ages.append(age)
+
+        phones = (phone_key(phone.get("number")) for phone in record.phones)
+        keys = [f"p:{key}" for key in phones if key]
+        keys += [f"e:{email_key(email)}" for email in record.emails if email.strip()]
+        zip5 = (record.postal_code or "").strip()[:5]
+        if zip5:
+            keys.append(f"n:{name}|{zip5}")
+        if record.person_link:
+            keys.append(f"l:{record.person_link}")
+
+        root = node
+        for key in dict.fromkeys(keys):
+            members = self._blocks.get(key)
+            if members is None:
+                self._blocks[key] = [node]
+                continue
+            joined = False
+            for member in members:
+                other = self._find(member)
+                if other == root:
+                    joined = True
+                elif self._compatible(root, other):
+                    root = self._union(root, other)
+                    joined = True
+            if not joined:
+                members.append(node)
+
+    def _load(self, node: int) -> PersonRecord:
+        self._spill.seek(self._offsets[node])
+        return PersonRecord.from_state(marshal.load(self._spill))
+
+    def resolve(self) -> Iterator[PersonRecord]:
+        """Yield one canonical record per person, in order of first query."""
+        self._spill.flush()
+        clusters: Dict[int, List[int]] = {}
+        for node in sorted(range(len(self._parent)), key=self._positions.__getitem__):
+            clusters.setdefault(self._find(node), []).append(node)
+        logger.info("Resolved %d result(s) into %d people", len(self._parent), len(clusters))
+        for members in clusters.values():
+            yield merge_person_records([self._load(node) for node in members])
+
+    def close(self) -> None:
+        self._spill.close()
+
+    def __enter__(self) -> "EntityResolver":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
+
+def resolver_from_settings(settings: Dict[str, Any], root_dir: Path) -> Optional[EntityResolver]:
+    """
+    An EntityResolver when the ``entity_resolution`` block is enabled, else
+    None. ``spill_dir`` is relative to ``root_dir``.
+    """
+    config = settings.get("entity_resolution") or {}
+    if not config.get("enabled", False):
+        return None
+    spill_dir = config.get("spill_dir")
+    path = root_dir / spill_dir if spill_dir else None
+    if path is not None:
+        path.mkdir(parents=True, exist_ok=True)
+    return EntityResolver(path)
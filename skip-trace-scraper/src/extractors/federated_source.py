@@ -0,0 +1,496 @@
+import logging
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, List, Mapping, Optional, Sequence, Set, Tuple, TypeVar
+
+from utils.http_pool import pool_from_settings
+from utils.matching import phone_key
+from utils.metrics import LatencyHistogram
+
+from .record_store import RecordStore, address_keys, email_key, normalize_key, query_address_keys
+from .remote_source import RemoteSource, remote_source_from_settings
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+DEFAULT_HEDGE_QUANTILE = 0.95
+DEFAULT_HEDGE_MIN_MS = 2.0
+DEFAULT_FEDERATION_TIMEOUT = 5.0
+# How long lower-ranked sources may still answer once the top-ranked one has.
+DEFAULT_GRACE_MS = 2.0
+DEFAULT_MAX_WORKERS = 64
+# Answers a HedgedSource must have seen before its latency quantile is
+# trusted; until then it does not hedge.
+HEDGE_WARMUP_SAMPLES = 20
+
+# Raw record fields merged as lists (union, in precedence order); every
+# other field takes the first non-empty value.
+LIST_FIELDS = ("phone_keys", "emails", "phones", "previous_addresses", "relatives", "associates")
+# Entry field identifying a list item, for de-duplication across sources.
+_ITEM_KEYS = {
+    "phones": "number",
+    "previous_addresses": "streetAddress",
+    "relatives": "Name",
+    "associates": "Name",
+}
+
+Query = Tuple[str, str]
+Raw = Optional[Dict[str, Any]]
+
+class StoreSource:
+    """
+    A ``RecordStore`` behind the source interface (``fetch``/``fetch_many``),
+    resolved exactly as a local ``IdentityExtractor`` would.
+
+    Lets the local index take part in a ``FederatedSource`` next to remote
+    providers. The store belongs to the caller and is not closed here.
+    """
+
+    batch = True
+
+    def __init__(self, store: RecordStore, fuzzy_threshold: Optional[float] = None) -> None:
+        from .identity_extractor import IdentityExtractor
+
+        self.store = store
+        self._resolver = IdentityExtractor(store=store, fuzzy_threshold=fuzzy_threshold)
+
+    def fetch(self, search_option: str, input_value: str) -> Raw:
+        return self._resolver.resolve(search_option, input_value)
+
+    def fetch_many(self, queries: Sequence[Query]) -> List[Raw]:
+        return self._resolver.resolve_many(queries)
+
+    def close(self) -> None:
+        pass
+
+class HedgedSource:
+    """
+    Replicas of one source; a slow request is repeated on the next replica.
+
+    Each call goes to the first replica. If it has not answered after the
+    ``hedge_quantile`` of recent answer latencies (never less than
+    ``hedge_min_ms``; no hedging before ``HEDGE_WARMUP_SAMPLES`` answers
+    have been seen), the same call is sent to the next replica,
+    and so on; the first answer wins. A replica that fails is replaced at
+    once. Losing calls still queued are cancelled; ones already in flight
+    are abandoned and their answers discarded. Only a few percent of calls
+    are duplicated, but the slow tail of any one replica is cut off.
+    ``fetch`` and ``fetch_many`` keep separate latency histograms.
+    """
+
+    def __init__(
+        self,
+        replicas: Sequence[Any],
+        hedge_quantile: float = DEFAULT_HEDGE_QUANTILE,
+        hedge_min_ms: float = DEFAULT_HEDGE_MIN_MS,
+        max_workers: int = DEFAULT_MAX_WORKERS,
+        name: str = "hedged",
+    ) -> None:
+        if not replicas:
+            raise ValueError("HedgedSource needs at least one replica")
+        self.replicas = list(replicas)
+        self.batch = all(getattr(replica, "batch", False) for replica in self.replicas)
+        self.hedge_quantile = hedge_quantile
+        self.hedge_min = max(0.0, hedge_min_ms) / 1000.0
+        self.name = name
+        self.latency = LatencyHistogram()
+        self.batch_latency = LatencyHistogram()
+        self.calls = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=name)
+
+    def hedge_delay(self, histogram: LatencyHistogram) -> Optional[float]:
+        """Seconds to wait on a replica before hedging; None while warming up."""
+        if histogram.count < HEDGE_WARMUP_SAMPLES:
+            return None
+        return max(self.hedge_min, histogram.quantile(self.hedge_quantile) / 1e9)
+
+    def fetch(self, search_option: str, input_value: str) -> Raw:
+        return self._hedged(lambda replica: replica.fetch(search_option, input_value), self.latency)
+
+    def fetch_many(self, queries: Sequence[Query]) -> List[Raw]:
+        if not queries:
+            return []
+        return self._hedged(lambda replica: replica.fetch_many(queries), self.batch_latency)
+
+    def _launch(
+        self, call: Callable[[Any], T], replica: Any, histogram: LatencyHistogram
+    ) -> "Future[T]":
+        start = time.perf_counter_ns()
+
+        def record(future: "Future[T]") -> None:
+            # Abandoned calls are recorded too: they are the tail we hedge against.
+            if not future.cancelled() and future.exception() is None:
+                histogram.record(time.perf_counter_ns() - start)
+
+        future = self._executor.submit(call, replica)
+        future.add_done_callback(record)
+        return future
+
+    def _hedged(self, call: Callable[[Any], T], histogram: LatencyHistogram) -> T:
+        delay = self.hedge_delay(histogram)
+        with self._lock:
+            self.calls += 1
+        pending: Dict["Future[T]", int] = {}
+        errors: List[BaseException] = []
+        launched = 0
+
+        while True:
+            if not pending:
+                # The first call, or every replica tried so far has failed.
+                if launched == len(self.replicas):
+                    raise errors[0]
+                pending[self._launch(call, self.replicas[launched], histogram)] = launched
+                launched += 1
+            timeout = delay if launched < len(self.replicas) else None
+            done, _ = wait(list(pending), timeout=timeout, return_when=FIRST_COMPLETED)
+            if not done:
+                assert timeout is not None
+                with self._lock:
+                    self.hedges += 1
+                logger.debug("%s: hedging to replica %d after %.1fms", self.name, launched, timeout * 1e3)
+                pending[self._launch(call, self.replicas[launched], histogram)] = launched
+                launched += 1
+                continue
+
+            for future in done:
+                index = pending.pop(future)
+                error = future.exception()
+                if error is not None:
+                    errors.append(error)
+                    continue
+                for loser in pending:
+                    loser.cancel()
+                if index:
+                    with self._lock:
+                        self.hedge_wins += 1
+                return future.result()
+
+    def close(self) -> None:
+        if self.calls:
+            logger.info(
+                "%s: %d call(s), %d hedged, %d won by a hedge",
+                self.name,
+                self.calls,
+                self.hedges,
+                self.hedge_wins,
+            )
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        for replica in self.replicas:
+            replica.close()
+
+def _item_key(field: str, item: Any) -> Any:
+    if isinstance(item, str):
+        return normalize_key(item)
+    if isinstance(item, dict):
+        key_field = _ITEM_KEYS.get(field)
+        if key_field is not None and item.get(key_field):
+            return normalize_key(str(item[key_field]))
+        return tuple(sorted((k, str(v)) for k, v in item.items()))
+    return item
+
+def _person_key(raw: Dict[str, Any]) -> Optional[str]:
+    if not raw.get("first_name") or not raw.get("last_name"):
+        return None
+    return normalize_key(f"{raw['first_name']}{raw['last_name']}")
+
+def _contact_keys(raw: Dict[str, Any]) -> Set[str]:
+    """
+    Phone numbers (digits), emails, address index keys (current, previous
+    and the free-form ``lives_in``) and the 5-digit ZIP code of a record.
+    """
+    numbers = list(raw.get("phone_keys") or ())
+    numbers += [phone.get("number") for phone in raw.get("phones") or () if isinstance(phone, dict)]
+    keys = {f"p:{key}" for key in map(phone_key, numbers) if key}
+    keys.update(f"e:{email_key(email)}" for email in raw.get("emails") or () if email and email.strip())
+    addresses = [
+        address_keys(
+            raw.get("street_address"),
+            raw.get("address_locality"),
+            raw.get("address_region"),
+            raw.get("postal_code"),
+        )
+    ]
+    addresses += [
+        address_keys(
+            addr.get("streetAddress"),
+            addr.get("addressLocality"),
+            addr.get("addressRegion"),
+            addr.get("postalCode"),
+        )
+        for addr in raw.get("previous_addresses") or ()
+        if isinstance(addr, dict)
+    ]
+    if raw.get("lives_in"):
+        addresses.append(query_address_keys(str(raw["lives_in"])))
+    keys.update(f"a:{key}" for address in addresses for key in address)
+    zip5 = str(raw.get("postal_code") or "").strip()[:5]
+    if zip5:
+        keys.add(f"z:{zip5}")
+    return keys
+
+def merge_records(
+    answers: Sequence[Tuple[str, Raw]],
+    precedence: Optional[Mapping[str, Sequence[str]]] = None,
+) -> Raw:
+    """
+    Merge the raw records several sources returned for one query.
+
+    ``answers`` are ``(source name, raw record or None)`` pairs in default
+    precedence order. ``precedence`` maps a field to the source names that
+    should win it, ahead of the default order. Scalar fields take the first
+    non-empty value; list fields (``LIST_FIELDS``) are the union of every
+    source's entries in precedence order, leaving out entries an earlier
+    source already gave (compared by normalized value: phones by number,
+    addresses by street, relations by name).
+
+    The first record that has a first and last name decides who the person
+    is. Another named record is only merged when it has the same name and
+    shares a phone number, email, address (current or previous) or ZIP code
+    with that record, since a name alone does not tell namesakes apart;
+    records without a name only add fields to it. Without any named record
+    the result is None.
+    """
+    present = [(name, raw) for name, raw in answers if raw]
+    anchor = next((raw for _, raw in present if _person_key(raw) is not None), None)
+    if anchor is None:
+        if present:
+            logger.debug("No source returned a named record; dropping %d partial answer(s)", len(present))
+        return None
+    person = _person_key(anchor)
+    contacts = _contact_keys(anchor)
+    members = []
+    for name, raw in present:
+        if raw is not anchor:
+            other = _person_key(raw)
+            if other is not None and (other != person or contacts.isdisjoint(_contact_keys(raw))):
+                logger.debug("Source '%s' returned a different person; not merged", name)
+                continue
+        members.append((name, raw))
+    if len(members) == 1:
+        return members[0][1]
+
+    precedence = precedence or {}
+    fields: Dict[str, None] = {}
+    for _, raw in members:
+        fields.update(dict.fromkeys(raw))
+
+    merged: Dict[str, Any] = {}
+    for field in fields:
+        preferred = precedence.get(field)
+        ordered = members
+        if preferred:
+            rank = {name: position for position, name in enumerate(preferred)}
+            ordered = sorted(members, key=lambda member: rank.get(member[0], len(rank)))
+
+        if field in LIST_FIELDS:
+            seen: set = set()
+            items = []
+            for _, raw in ordered:
+                entries = raw.get(field) or ()
+                # Only entries an earlier source already gave are dropped;
+                # each source's own list is kept as it is.
+                items.extend(item for item in entries if _item_key(field, item) not in seen)
+                seen.update(_item_key(field, item) for item in entries)
+            merged[field] = items
+        else:
+            values = [raw[field] for _, raw in ordered if field in raw]
+            merged[field] = next((value for value in values if value not in (None, "")), values[0])
+    return merged
+
+class FederatedSource:
+    """
+    Several named sources queried in parallel, their answers merged.
+
+    ``members`` are ``(name, source)`` pairs in precedence order; a source
+    is anything with ``fetch``, ``fetch_many`` and ``close``: a
+    ``RemoteSource``, a ``StoreSource`` over the local index, or a
+    ``HedgedSource`` over replicas of either. Every query goes to all
+    members at once and the answers are combined with ``merge_records``
+    (``precedence`` as there). The call returns once the top-ranked member
+    that has not failed has answered, plus ``grace`` seconds for the others
+    to catch up, or after ``timeout`` seconds at most. Members that have
+    not answered by then are left out of that result and their calls
+    cancelled or abandoned (counted as ``late`` after the grace period,
+    else as ``timeouts``); a member that raises is left out as well. Only
+    when no member answers at all does the call fail, with the first
+    member's error (TimeoutError if they all timed out).
+
+    Batches (``fetch_many``) go to each member as one ``fetch_many`` call,
+    so batch-capable members see one request per chunk.
+    """
+
+    batch = True
+
+    def __init__(
+        self,
+        members: Sequence[Tuple[str, Any]],
+        precedence: Optional[Mapping[str, Sequence[str]]] = None,
+        timeout: float = DEFAULT_FEDERATION_TIMEOUT,
+        max_workers: int = DEFAULT_MAX_WORKERS,
+        grace: float = DEFAULT_GRACE_MS / 1000.0,
+    ) -> None:
+        if not members:
+            raise ValueError("FederatedSource needs at least one member")
+        self.members = list(members)
+        self.precedence = dict(precedence or {})
+        self.timeout = timeout
+        self.grace = max(0.0, grace)
+        self.stats: Dict[str, Dict[str, int]] = {
+            name: {"answered": 0, "hits": 0, "errors": 0, "timeouts": 0, "late": 0}
+            for name, _ in self.members
+        }
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="federated")
+
+    def _leader_answered(self, futures: List[Tuple[str, "Future[T]"]]) -> bool:
+        """Whether the top-ranked member that has not failed has answered."""
+        for _, future in futures:
+            if not future.done():
+                return False
+            if future.exception() is None:
+                return True
+        return True
+
+    def _gather(self, call: Callable[[Any], T], what: str) -> List[Tuple[str, T]]:
+        futures = [(name, self._executor.submit(call, source)) for name, source in self.members]
+        deadline = time.monotonic() + self.timeout
+        cutoff = deadline
+        in_grace = False
+        pending = {future for _, future in futures}
+        while pending:
+            if not in_grace and self._leader_answered(futures):
+                in_grace = True
+                cutoff = min(deadline, time.monotonic() + self.grace)
+            remaining = cutoff - time.monotonic()
+            if remaining <= 0:
+                break
+            _, pending = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+
+        answers: List[Tuple[str, T]] = []
+        errors: List[BaseException] = []
+        with self._lock:
+            for name, future in futures:
+                counts = self.stats[name]
+                # Decided by the future itself: the loop may stop before
+                # ``wait`` has seen answers that are already in.
+                if not future.done():
+                    future.cancel()
+                    if in_grace:
+                        counts["late"] += 1
+                        continue
+                    counts["timeouts"] += 1
+                    errors.append(TimeoutError(f"Source '{name}' did not answer {what} in {self.timeout:g}s"))
+                    continue
+                error = future.exception()
+                if error is not None:
+                    counts["errors"] += 1
+                    errors.append(error)
+                    logger.debug("Source '%s' failed for %s: %s", name, what, error)
+                    continue
+                counts["answered"] += 1
+                answers.append((name, future.result()))
+        if not answers:
+            raise errors[0]
+        return answers
+
+    def fetch(self, search_option: str, input_value: str) -> Raw:
+        answers = self._gather(lambda source: source.fetch(search_option, input_value), f"'{input_value}'")
+        with self._lock:
+            for name, raw in answers:
+                if raw:
+                    self.stats[name]["hits"] += 1
+        return merge_records(answers, self.precedence)
+
+    def fetch_many(self, queries: Sequence[Query]) -> List[Raw]:
+        if not queries:
+            return []
+
+        def call(source: Any) -> List[Raw]:
+            raws = source.fetch_many(queries)
+            if len(raws) != len(queries):
+                raise ValueError(f"Source returned {len(raws)} record(s) for {len(queries)} queries")
+            return raws
+
+        answers = self._gather(call, f"a batch of {len(queries)}")
+        with self._lock:
+            for name, raws in answers:
+                self.stats[name]["hits"] += sum(1 for raw in raws if raw)
+        return [
+            merge_records([(name, raws[pos]) for name, raws in answers], self.precedence)
+            for pos in range(len(queries))
+        ]
+
+    def close(self) -> None:
+        for name, counts in self.stats.items():
+            if any(counts.values()):
+                logger.info(
+                    "Federated source '%s': %d answer(s), %d hit(s), %d error(s), %d timeout(s),"
+                    " %d late",
+                    name,
+                    counts["answered"],
+                    counts["hits"],
+                    counts["errors"],
+                    counts["timeouts"],
+                    counts["late"],
+                )
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        for _, source in self.members:
+            source.close()
+
+def source_from_settings(settings: Dict[str, Any], store: Optional[RecordStore] = None) -> Any:
+    """
+    The lookup source for ``IdentityExtractor``: a FederatedSource when the
+    ``federation`` block lists ``sources``, else ``remote_source_from_settings``.
+
+    Each entry of ``federation.sources`` is ``{"name": ..., "type": "store"}``
+    for the local record store (``store``, searched with
+    ``fuzzy_threshold``), or ``{"name": ..., "url": ...}`` for a remote
+    source; ``"urls"`` lists replicas that requests are hedged across, and
+    ``"batch"`` overrides ``source_batch``. Remote members are pooled per
+    ``http_pool``.
+    """
+    config = settings.get("federation") or {}
+    entries = config.get("sources") or []
+    if not entries:
+        return remote_source_from_settings(settings)
+
+    fuzzy_threshold = settings.get("fuzzy_threshold")
+    hedge_quantile = float(config.get("hedge_quantile", DEFAULT_HEDGE_QUANTILE))
+    hedge_min_ms = float(config.get("hedge_min_ms", DEFAULT_HEDGE_MIN_MS))
+    members: List[Tuple[str, Any]] = []
+    for position, entry in enumerate(entries):
+        name = str(entry.get("name") or f"source{position + 1}")
+        kind = entry.get("type", "remote")
+        if kind == "store":
+            if store is None:
+                raise ValueError(f"Federated source '{name}' needs a record store")
+            members.append(
+                (name, StoreSource(store, float(fuzzy_threshold) if fuzzy_threshold is not None else None))
+            )
+            continue
+        if kind != "remote":
+            raise ValueError(f"Unknown federated source type: {kind}")
+
+        urls = entry.get("urls") or ([entry["url"]] if entry.get("url") else [])
+        if not urls:
+            raise ValueError(f"Federated source '{name}' needs a url")
+        batch = bool(entry.get("batch", settings.get("source_batch", False)))
+        replicas = [RemoteSource(str(url), pool_from_settings(settings), batch=batch) for url in urls]
+        if len(replicas) == 1:
+            members.append((name, replicas[0]))
+        else:
+            members.append(
+                (name, HedgedSource(replicas, hedge_quantile, hedge_min_ms, name=f"hedged-{name}"))
+            )
+
+    return FederatedSource(
+        members,
+        precedence=config.get("field_precedence"),
+        timeout=float(config.get("timeout_seconds", DEFAULT_FEDERATION_TIMEOUT)),
+        grace=float(config.get("grace_ms", DEFAULT_GRACE_MS)) / 1000.0,
+    )
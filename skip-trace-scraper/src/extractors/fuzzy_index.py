@@ -0,0 +1,343 @@
+import logging
+import marshal
+import math
+import re
+from array import array
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from .record_store import normalize_key
+
+logger = logging.getLogger(__name__)
+
+# Minimum trigram similarity for a name token to be considered at all.
+TOKEN_THRESHOLD = 0.5
+# Similarity credited to tokens that only agree phonetically.
+PHONETIC_SCORE = 0.8
+LAST_NAME_WEIGHT = 0.6
+FIRST_NAME_WEIGHT = 0.4
+UNKNOWN_AGE = -1
+MAX_AGE = 32767
+# Bumped whenever the layout written by ``FuzzyNameIndex.to_bytes`` changes.
+SERIAL_VERSION = 1
+
+_NAME_TOKEN_RE = re.compile(r"[a-z]+")
+_SOUNDEX_CODES = {
+    **dict.fromkeys("bfpv", "1"),
+    **dict.fromkeys("cgjkqsxz", "2"),
+    **dict.fromkeys("dt", "3"),
+    "l": "4",
+    **dict.fromkeys("mn", "5"),
+    "r": "6",
+}
+
+def soundex(token: str) -> str:
+    """American Soundex code of a lowercase alphabetic token ("" if empty)."""
+    if not token:
+        return ""
+    code = [token[0].upper()]
+    previous = _SOUNDEX_CODES.get(token[0], "")
+    for char in token[1:]:
+        digit = _SOUNDEX_CODES.get(char, "")
+        if digit and digit != previous:
+            code.append(digit)
+            if len(code) == 4:
+                break
+        # "h" and "w" do not separate letters with the same code; vowels do.
+        if char not in "hw":
+            previous = digit
+    return "".join(code).ljust(4, "0")
+
+def trigrams(token: str) -> Set[str]:
+    padded = f"  {token} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+def dice(a: Set[str], b: Set[str]) -> float:
+    if not a or not b:
+        return 0.0
+    return 2 * len(a & b) / (len(a) + len(b))
+
+def split_name(name: str) -> Tuple[str, str]:
+    """
+    Return ``(first, last)`` tokens of a free-form name.
+
+    "Last, First M" is understood; middle names and initials are ignored.
+    A single token is treated as a last name.
+    """
+    if "," in name:
+        last_part, _, first_part = name.partition(",")
+        last_tokens = _NAME_TOKEN_RE.findall(last_part.lower())
+        first_tokens = _NAME_TOKEN_RE.findall(first_part.lower())
+        return (first_tokens[0] if first_tokens else "", last_tokens[-1] if last_tokens else "")
+
+    tokens = _NAME_TOKEN_RE.findall(name.lower())
+    if not tokens:
+        return "", ""
+    if len(tokens) == 1:
+        return "", tokens[0]
+    return tokens[0], tokens[-1]
+
+def _ids(data: bytes, typecode: str = "I") -> array:
+    values = array(typecode)
+    values.frombytes(data)
+    return values
+
+class _Vocabulary:
+    """Distinct name tokens with trigram postings and Soundex buckets."""
+
+    def __init__(self) -> None:
+        self.tokens: List[str] = []
+        self._ids: Dict[str, int] = {}
+        self._postings: Dict[str, array] = {}
+        self._by_code: Dict[str, array] = {}
+
+    def add(self, token: str) -> int:
+        token_id = self._ids.get(token)
+        if token_id is not None:
+            return token_id
+        token_id = self._ids[token] = len(self.tokens)
+        self.tokens.append(token)
+        for gram in trigrams(token):
+            self._postings.setdefault(gram, array("I")).append(token_id)
+        self._by_code.setdefault(soundex(token), array("I")).append(token_id)
+        return token_id
+
+    def state(self) -> Tuple[List[str], Dict[str, bytes], Dict[str, bytes]]:
+        return (
+            self.tokens,
+            {gram: ids.tobytes() for gram, ids in self._postings.items()},
+            {code: ids.tobytes() for code, ids in self._by_code.items()},
+        )
+
+    @classmethod
+    def from_state(cls, state: Tuple[List[str], Dict[str, bytes], Dict[str, bytes]]) -> "_Vocabulary":
+        vocabulary = cls()
+        tokens, postings, by_code = state
+        vocabulary.tokens = tokens
+        vocabulary._ids = {token: token_id for token_id, token in enumerate(tokens)}
+        vocabulary._postings = {gram: _ids(data) for gram, data in postings.items()}
+        vocabulary._by_code = {code: _ids(data) for code, data in by_code.items()}
+        return vocabulary
+
+    def similar(
+        self, token: str, threshold: float = TOKEN_THRESHOLD, phonetic_matches: bool = True
+    ) -> Dict[int, float]:
+        """
+        Map ids of tokens similar to ``token`` to a similarity in [0, 1].
+
+        Uses prefix filtering: a token with Dice similarity >= threshold must
+        share at least ``ceil(t*|Q| / (2-t))`` trigrams with the query, so
+        only the rarest ``|Q| - m + 1`` query trigrams need their postings
+        scanned. Phonetic (Soundex) matches are added on top unless
+        ``phonetic_matches`` is False.
+        """
+        query = trigrams(token)
+        needed = math.ceil(threshold * len(query) / (2 - threshold))
+        rarest = sorted(query, key=lambda gram: len(self._postings.get(gram, ())))
+        phonetic = set(self._by_code.get(soundex(token), ())) if phonetic_matches else set()
+        candidates = set(phonetic)
+        for gram in rarest[: len(query) - needed + 1]:
+            candidates.update(self._postings.get(gram, ()))
+
+        results: Dict[int, float] = {}
+        for token_id in candidates:
+            other = self.tokens[token_id]
+            score = 1.0 if other == token else dice(query, trigrams(other))
+            if score < PHONETIC_SCORE and token_id in phonetic:
+                score = PHONETIC_SCORE
+            if score >= threshold:
+                results[token_id] = score
+        return results
+
+@dataclass
+class FuzzyMatch:
+    score: float
+    name_key: str
+    region: Optional[str] = None
+    age: Optional[int] = None
+
+class FuzzyNameIndex:
+    """
+    Inverted index for approximate first/last name search.
+
+    Names are split into distinct first- and last-name vocabularies, each
+    indexed by trigrams and Soundex code, so the work per query depends on
+    the number of similar *distinct* names rather than on the number of
+    records. Records are grouped by (last, first) name; each group is scored
+    once and groups are walked best-first until enough records pass the
+    region/age filters, which live in compact per-record arrays.
+    """
+
+    def __init__(self) -> None:
+        self._first = _Vocabulary()
+        self._last = _Vocabulary()
+        self._regions = _Vocabulary()
+        self._name_keys: List[str] = []
+        self._region_ids = array("I")
+        self._ages = array("h")
+        self._groups: Dict[Tuple[int, int], array] = {}
+        self._firsts_by_last: Dict[int, array] = {}
+
+    def __len__(self) -> int:
+        return len(self._name_keys)
+
+    @classmethod
+    def build(cls, records: Iterable[Dict[str, Any]]) -> "FuzzyNameIndex":
+        index = cls()
+        for raw in records:
+            index.add(raw)
+        logger.debug(
+            "Built fuzzy name index: %d record(s), %d first / %d last names",
+            len(index),
+            len(index._first.tokens),
+            len(index._last.tokens),
+        )
+        return index
+
+    def to_bytes(self) -> bytes:
+        """
+        Serialize the index (marshal of plain lists, dicts and array bytes),
+        so record index builders can store it next to the records.
+        """
+        return marshal.dumps(
+            (
+                SERIAL_VERSION,
+                self._first.state(),
+                self._last.state(),
+                self._regions.state(),
+                self._name_keys,
+                self._region_ids.tobytes(),
+                self._ages.tobytes(),
+                {group: entries.tobytes() for group, entries in self._groups.items()},
+                {last_id: firsts.tobytes() for last_id, firsts in self._firsts_by_last.items()},
+            )
+        )
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "FuzzyNameIndex":
+        """Load a ``to_bytes`` index; raises ValueError for other data."""
+        try:
+            state = marshal.loads(data)
+            if state[0] != SERIAL_VERSION:
+                raise ValueError("version mismatch")
+            index = cls()
+            index._first = _Vocabulary.from_state(state[1])
+            index._last = _Vocabulary.from_state(state[2])
+            index._regions = _Vocabulary.from_state(state[3])
+            index._name_keys = state[4]
+            index._region_ids = _ids(state[5])
+            index._ages = _ids(state[6], "h")
+            index._groups = {group: _ids(entries) for group, entries in state[7].items()}
+            index._firsts_by_last = {last_id: _ids(firsts) for last_id, firsts in state[8].items()}
+        except (ValueError, EOFError, TypeError, IndexError) as exc:
+            raise ValueError(f"Unsupported fuzzy name index data ({exc})") from None
+        return index
+
+    def add(self, raw: Dict[str, Any]) -> None:
+        full_name = " ".join(
+            part for part in (raw.get("first_name"), raw.get("last_name")) if part
+        )
+        first, last = split_name(full_name)
+        if not last:
+            return
+
+        try:
+            age = int(raw.get("age") or UNKNOWN_AGE)
+        except (TypeError, ValueError):
+            age = UNKNOWN_AGE
+
+        entry_id = len(self._name_keys)
+        # Same key the record store indexes the record's name under.
+        self._name_keys.append(normalize_key(raw.get("name_key") or full_name))
+        self._region_ids.append(self._regions.add((raw.get("address_region") or "").strip().lower()))
+        self._ages.append(max(UNKNOWN_AGE, min(age, MAX_AGE)))
+
+        group = (self._last.add(last), self._first.add(first))
+        entries = self._groups.get(group)
+        if entries is None:
+            entries = self._groups[group] = array("I")
+            self._firsts_by_last.setdefault(group[0], array("I")).append(group[1])
+        entries.append(entry_id)
+
+    def _first_name_score(self, query: str, first_id: int, similar: Dict[int, float]) -> float:
+        if not query:
+            return 0.5
+        candidate = self._first.tokens[first_id]
+        if len(query) == 1 or len(candidate) == 1:
+            return 0.9 if candidate[:1] == query[0] else 0.0
+        return similar.get(first_id, 0.0)
+
+    def search(
+        self,
+        name: str,
+        limit: int = 10,
+        min_score: float = 0.0,
+        region: Optional[str] = None,
+        min_age: Optional[int] = None,
+        max_age: Optional[int] = None,
+        strict_first: bool = False,
+    ) -> List[FuzzyMatch]:
+        """
+        Rank records whose name resembles ``name``.
+
+        The score blends last-name and first-name similarity (trigram Dice,
+        with Soundex agreement counted as a near match and single initials
+        matched by prefix). ``region`` and the age bounds filter candidates;
+        records with unknown age never pass an age filter.
+
+        With ``strict_first`` only records whose first name is spelled like
+        the query's are returned: the query needs a full first name, and
+        initials, a missing first name or Soundex agreement alone do not
+        count. Use it when a match stands in for the searched person.
+        """
+        first, last = split_name(name)
+        if not last or limit < 1:
+            return []
+        if strict_first and len(first) < 2:
+            return []
+
+        region_id: Optional[int] = None
+        if region is not None:
+            region_id = self._regions._ids.get(region.strip().lower())
+            if region_id is None:
+                return []
+        check_age = min_age is not None or max_age is not None
+        low = 0 if min_age is None else min_age
+        high = MAX_AGE if max_age is None else max_age
+
+        first_matches = (
+            self._first.similar(first, phonetic_matches=not strict_first) if len(first) > 1 else {}
+        )
+        groups: List[Tuple[float, int, int]] = []
+        for last_id, last_score in self._last.similar(last).items():
+            for first_id in self._firsts_by_last.get(last_id, ()):
+                if strict_first:
+                    if first_id not in first_matches:
+                        continue
+                    first_score = first_matches[first_id]
+                else:
+                    first_score = self._first_name_score(first, first_id, first_matches)
+                score = LAST_NAME_WEIGHT * last_score + FIRST_NAME_WEIGHT * first_score
+                if score >= min_score:
+                    groups.append((score, last_id, first_id))
+        groups.sort(reverse=True)
+
+        matches: List[FuzzyMatch] = []
+        for score, last_id, first_id in groups:
+            for entry_id in self._groups[(last_id, first_id)]:
+                if region_id is not None and self._region_ids[entry_id] != region_id:
+                    continue
+                age = self._ages[entry_id]
+                if check_age and not low <= age <= high:
+                    continue
+                matches.append(
+                    FuzzyMatch(
+                        score=round(score, 4),
+                        name_key=self._name_keys[entry_id],
+                        region=self._regions.tokens[self._region_ids[entry_id]].upper() or None,
+                        age=age if age != UNKNOWN_AGE else None,
+                    )
+                )
+                if len(matches) >= limit:
+                    return matches
+        return matches
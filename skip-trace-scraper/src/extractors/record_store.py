@@ -0,0 +1,1048 @@
+import json
+import logging
+import marshal
+import mmap
+import os
+import re
+import struct
+import threading
+import zlib
+from array import array
+from bisect import bisect_left
+from collections import OrderedDict
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+# csv and sqlite3 are imported where used: most runs need neither, and a
+# single-query trace should not pay for them at startup.
+if TYPE_CHECKING:
+    import sqlite3
+
+    from .fuzzy_index import FuzzyNameIndex
+
+logger = logging.getLogger(__name__)
+
+KEY_KINDS = ("name", "phone", "email", "address")
+
+# Columns that hold lists/objects; in CSV files they are JSON encoded
+# (or, for the plain string lists, separated by ";").
+LIST_FIELDS = ("phone_keys", "emails", "phones", "previous_addresses", "relatives", "associates")
+SPLIT_FIELDS = ("phone_keys", "emails")
+
+SQLITE_FORMAT_VERSION = "1"
+BUILD_BATCH_SIZE = 10_000
+# Keys per ``IN (...)`` query in ``SQLiteRecordStore.get_many``; stays under
+# SQLite's default host-parameter limit of 999.
+SQLITE_PROBE_BATCH = 500
+
+MARSHAL_INDEX_MAGIC = b"STIDXM1\n"
+MARSHAL_INDEX_SUFFIX = ".stidx"
+MARSHAL_FORMAT_VERSION = 1
+_HEADER_LENGTH = struct.Struct("<Q")
+# Two adjacent entries of an array("Q") offset table.
+_OFFSET_PAIR = struct.Struct("QQ")
+_ALIGNMENT = 8
+
+SNAPSHOT_MAGIC = b"STSNAP1\n"
+SNAPSHOT_SUFFIX = ".stsnap"
+SNAPSHOT_FORMAT_VERSION = 1
+SNAPSHOT_COMPRESSIONS = ("zlib", "none")
+# Records per compressed block: bigger blocks compress better but cost
+# more to inflate for a single hit.
+SNAPSHOT_BLOCK_RECORDS = 16
+# Inflated blocks kept per open snapshot.
+SNAPSHOT_BLOCK_CACHE = 256
+# Most frequent interned strings kept decoded per open snapshot.
+SNAPSHOT_HOT_STRINGS = 4096
+# Encoded form of a non-string scalar that marshal would confuse with a string id.
+_SNAPSHOT_INT = -1
+
+_STREET_ABBREVIATIONS = {
+    "street": "st",
+    "avenue": "ave",
+    "road": "rd",
+    "drive": "dr",
+    "place": "pl",
+    "boulevard": "blvd",
+    "lane": "ln",
+    "court": "ct",
+    "circle": "cir",
+    "parkway": "pkwy",
+    "highway": "hwy",
+    "terrace": "ter",
+    "square": "sq",
+    "trail": "trl",
+    "north": "n",
+    "south": "s",
+    "east": "e",
+    "west": "w",
+    "apartment": "apt",
+    "suite": "ste",
+}
+_ADDRESS_TOKEN_RE = re.compile(r"[a-z0-9]+")
+_TRAILING_ZIP_RE = re.compile(r"(\d{5})(?:-\d{4})?\W*$")
+
+def normalize_key(value: str) -> str:
+    """Lowercase and drop all whitespace; used for name and phone keys."""
+    return "".join(value.lower().split())
+
+def email_key(value: str) -> str:
+    return value.strip().lower()
+
+def street_tokens(value: str) -> List[str]:
+    """Lowercased street tokens with punctuation dropped and suffixes abbreviated."""
+    return [
+        _STREET_ABBREVIATIONS.get(token, token)
+        for token in _ADDRESS_TOKEN_RE.findall(value.lower())
+    ]
+
+def address_keys(
+    street: Optional[str],
+    locality: Optional[str] = None,
+    region: Optional[str] = None,
+    postal_code: Optional[str] = None,
+) -> List[str]:
+    """
+    Canonical index keys for one address.
+
+    An address gets a ``street|zip5`` key and a ``street|city|state`` key when
+    the respective parts are known, so it can be found with either form.
+    """
+    if not street:
+        return []
+    canonical_street = " ".join(street_tokens(street))
+    if not canonical_street:
+        return []
+
+    keys = []
+    zip5 = (postal_code or "").strip()[:5]
+    if zip5.isdigit() and len(zip5) == 5:
+        keys.append(f"{canonical_street}|{zip5}")
+    if locality and region:
+        city = " ".join(_ADDRESS_TOKEN_RE.findall(locality.lower()))
+        keys.append(f"{canonical_street}|{city}|{region.strip().lower()}")
+    return keys
+
+def query_address_keys(value: str) -> List[str]:
+    """
+    Candidate index keys for a free-form address query.
+
+    Accepts inputs such as "1727 Summerlin Pl, Jeffersonville, IN 47130".
+    The split between street and city is unknown, so one ``street|zip5`` and
+    one ``street|city|state`` key is produced per possible split, longest
+    street first. Each candidate is an O(1) index probe.
+    """
+    text = value.lower()
+    zip5 = None
+    match = _TRAILING_ZIP_RE.search(text)
+    if match:
+        zip5 = match.group(1)
+        text = text[: match.start()]
+
+    tokens = _ADDRESS_TOKEN_RE.findall(text)
+    streets = [_STREET_ABBREVIATIONS.get(token, token) for token in tokens]
+
+    keys = []
+    for end in range(len(tokens), 0, -1):
+        street = " ".join(streets[:end])
+        if zip5:
+            keys.append(f"{street}|{zip5}")
+        # Needs at least one city token and a state token after the street.
+        if end <= len(tokens) - 2:
+            city = " ".join(tokens[end:-1])
+            keys.append(f"{street}|{city}|{tokens[-1]}")
+    return keys
+
+def _name_keys(raw: Dict[str, Any]) -> Iterator[str]:
+    name = raw.get("name_key") or " ".join(
+        part for part in (raw.get("first_name"), raw.get("last_name")) if part
+    )
+    if name:
+        yield normalize_key(name)
+
+def _phone_keys(raw: Dict[str, Any]) -> Iterator[str]:
+    phone_keys = raw.get("phone_keys") or [
+        phone.get("number") for phone in raw.get("phones", []) if phone.get("number")
+    ]
+    for phone in phone_keys:
+        yield normalize_key(phone)
+
+def _email_keys(raw: Dict[str, Any]) -> Iterator[str]:
+    for email in raw.get("emails", []):
+        if email:
+            yield email_key(email)
+
+def _address_keys(raw: Dict[str, Any]) -> Iterator[str]:
+    yield from address_keys(
+        raw.get("street_address"),
+        raw.get("address_locality"),
+        raw.get("address_region"),
+        raw.get("postal_code"),
+    )
+    for addr in raw.get("previous_addresses", []):
+        yield from address_keys(
+            addr.get("streetAddress"),
+            addr.get("addressLocality"),
+            addr.get("addressRegion"),
+            addr.get("postalCode"),
+        )
+
+# Per key kind, the normalized keys a raw record is indexed under.
+KEY_FUNCTIONS: Dict[str, Callable[[Dict[str, Any]], Iterator[str]]] = {
+    "name": _name_keys,
+    "phone": _phone_keys,
+    "email": _email_keys,
+    "address": _address_keys,
+}
+
+def record_keys(raw: Dict[str, Any]) -> Iterator[Tuple[str, str]]:
+    """
+    Yield every ``(kind, normalized key)`` a raw record is indexed under.
+
+    Records without explicit ``name_key`` / ``phone_keys`` fall back to
+    "first last" and the numbers in ``phones``. Addresses cover the current
+    address and every entry of ``previous_addresses``.
+    """
+    for kind in KEY_KINDS:
+        for key in KEY_FUNCTIONS[kind](raw):
+            yield kind, key
+
+class RecordStore:
+    """
+    Backend that maps normalized keys to raw person records.
+
+    Raw records use the shape of ``IdentityExtractor._build_static_dataset``.
+    Keys are normalized with the helpers in this module (``normalize_key``
+    for names and phones, ``email_key``, ``address_keys``). When several
+    records share a key, the one loaded last wins.
+    """
+
+    def get(self, kind: str, key: str) -> Optional[Dict[str, Any]]:
+        raise NotImplementedError
+
+    def get_many(self, kind: str, keys: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+        """
+        Probe many keys of one kind at once; returns only the keys that hit.
+
+        Backends override this when they can answer a batch more cheaply
+        than one ``get`` per key.
+        """
+        found = {}
+        for key in keys:
+            if key not in found:
+                raw = self.get(kind, key)
+                if raw is not None:
+                    found[key] = raw
+        return found
+
+    def iter_records(self) -> Iterator[Dict[str, Any]]:
+        raise NotImplementedError
+
+    def name_index(self) -> Optional["FuzzyNameIndex"]:
+        """
+        The fuzzy name index of the records, or None if the store has none.
+
+        Index files carry one written at build time, so loading it does not
+        decode any records; callers keep the result.
+        """
+        return None
+
+    def __len__(self) -> int:
+        raise NotImplementedError
+
+    def close(self) -> None:
+        pass
+
+class InMemoryRecordStore(RecordStore):
+    """
+    Dict-backed store for small datasets such as the built-in demo records.
+
+    The index of each key kind is built the first time that kind is
+    searched, so a run that only does phone lookups never indexes names.
+    """
+
+    def __init__(self, records: List[Dict[str, Any]]) -> None:
+        self._records = records
+        self._indexes: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        self._lock = threading.Lock()
+
+    def _index(self, kind: str) -> Optional[Dict[str, Dict[str, Any]]]:
+        index = self._indexes.get(kind)
+        if index is None and kind in KEY_FUNCTIONS:
+            with self._lock:
+                index = self._indexes.get(kind)
+                if index is None:
+                    keys_of = KEY_FUNCTIONS[kind]
+                    index = {}
+                    for rec in self._records:
+                        for key in keys_of(rec):
+                            index[key] = rec
+                    self._indexes[kind] = index
+                    logger.debug("Built %s index over %d record(s)", kind, len(self._records))
+        return index
+
+    def get(self, kind: str, key: str) -> Optional[Dict[str, Any]]:
+        index = self._index(kind)
+        return index.get(key) if index is not None else None
+
+    def get_many(self, kind: str, keys: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+        index = self._index(kind)
+        if index is None:
+            return {}
+        return {key: index[key] for key in keys if key in index}
+
+    def iter_records(self) -> Iterator[Dict[str, Any]]:
+        return iter(self._records)
+
+    def name_index(self) -> "FuzzyNameIndex":
+        from .fuzzy_index import FuzzyNameIndex
+
+        return FuzzyNameIndex.build(self._records)
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+class SQLiteRecordStore(RecordStore):
+    """
+    Read-only store backed by an index file from ``build_sqlite_store``.
+
+    Opening only touches the file header, so startup cost does not depend on
+    the dataset size, and records are decoded only when a key is hit. Each
+    thread gets its own read-only connection.
+    """
+
+    def __init__(self, path: Path) -> None:
+        if not path.exists():
+            raise FileNotFoundError(f"Record index not found at: {path}")
+        self.path = path
+        self._local = threading.local()
+        self._connections: List["sqlite3.Connection"] = []
+        self._connections_lock = threading.Lock()
+
+        version = self._conn().execute(
+            "SELECT value FROM meta WHERE name = 'format_version'"
+        ).fetchone()
+        if version is None or version[0] != SQLITE_FORMAT_VERSION:
+            raise ValueError(
+                f"Unsupported record index format in {path}; rebuild it with build_index.py"
+            )
+
+    def _conn(self) -> "sqlite3.Connection":
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            import sqlite3
+
+            conn = sqlite3.connect(
+                f"{self.path.resolve().as_uri()}?mode=ro", uri=True, check_same_thread=False
+            )
+            self._local.conn = conn
+            with self._connections_lock:
+                self._connections.append(conn)
+        return conn
+
+    def get(self, kind: str, key: str) -> Optional[Dict[str, Any]]:
+        row = self._conn().execute(
+            "SELECT r.data FROM record_keys k JOIN records r ON r.id = k.record_id"
+            " WHERE k.kind = ? AND k.key = ? ORDER BY k.record_id DESC LIMIT 1",
+            (kind, key),
+        ).fetchone()
+        return json.loads(row[0]) if row is not None else None
+
+    def get_many(self, kind: str, keys: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+        unique = list(dict.fromkeys(keys))
+        conn = self._conn()
+        # Rows come back in record order, so the last row per key wins;
+        # each winning record is decoded once however many keys hit it.
+        winners: Dict[str, int] = {}
+        data_by_id: Dict[int, str] = {}
+        for start in range(0, len(unique), SQLITE_PROBE_BATCH):
+            chunk = unique[start : start + SQLITE_PROBE_BATCH]
+            rows = conn.execute(
+                "SELECT k.key, r.id, r.data FROM record_keys k JOIN records r ON r.id = k.record_id"
+                f" WHERE k.kind = ? AND k.key IN ({', '.join('?' * len(chunk))})"
+                " ORDER BY k.record_id",
+                (kind, *chunk),
+            )
+            for key, record_id, data in rows:
+                winners[key] = record_id
+                data_by_id[record_id] = data
+        decoded = {record_id: json.loads(data_by_id[record_id]) for record_id in set(winners.values())}
+        return {key: decoded[record_id] for key, record_id in winners.items()}
+
+    def iter_records(self) -> Iterator[Dict[str, Any]]:
+        for (data,) in self._conn().execute("SELECT data FROM records ORDER BY id"):
+            yield json.loads(data)
+
+    def name_index(self) -> Optional["FuzzyNameIndex"]:
+        import sqlite3
+
+        from .fuzzy_index import FuzzyNameIndex
+
+        try:
+            row = self._conn().execute("SELECT data FROM name_index").fetchone()
+        except sqlite3.OperationalError:
+            # Built before name indexes were stored.
+            return None
+        return FuzzyNameIndex.from_bytes(row[0]) if row is not None else None
+
+    def __len__(self) -> int:
+        (count,) = self._conn().execute("SELECT COUNT(*) FROM records").fetchone()
+        return count
+
+    def close(self) -> None:
+        with self._connections_lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections.clear()
+        self._local = threading.local()
+
+def _parse_csv_row(row: Dict[str, str]) -> Dict[str, Any]:
+    raw: Dict[str, Any] = {}
+    for column, value in row.items():
+        if column is None or value is None or value == "":
+            continue
+        if column in LIST_FIELDS:
+            if value.lstrip().startswith("["):
+                raw[column] = json.loads(value)
+            elif column in SPLIT_FIELDS:
+                raw[column] = [part.strip() for part in value.split(";") if part.strip()]
+            else:
+                raise ValueError(f"Column '{column}' must hold a JSON list")
+        else:
+            raw[column] = value
+    return raw
+
+def iter_bulk_records(source: Path) -> Iterator[Dict[str, Any]]:
+    """Stream raw records from a ``.csv`` or JSON Lines bulk file."""
+    import csv
+
+    with source.open("r", encoding="utf-8", newline="") as f:
+        if source.suffix.lower() == ".csv":
+            for line_no, row in enumerate(csv.DictReader(f), start=2):
+                try:
+                    yield _parse_csv_row(row)
+                except ValueError as exc:
+                    raise ValueError(f"Invalid record on line {line_no} of {source}: {exc}") from exc
+        else:
+            for line_no, line in enumerate(f, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    raw = json.loads(line)
+                except json.JSONDecodeError as exc:
+                    raise ValueError(f"Invalid JSON on line {line_no} of {source}: {exc}") from exc
+                if not isinstance(raw, dict):
+                    raise ValueError(f"Line {line_no} of {source} is not a JSON object")
+                yield raw
+
+def build_sqlite_store(
+    records: Iterable[Dict[str, Any]], db_path: Path, batch_size: int = BUILD_BATCH_SIZE
+) -> int:
+    """
+    Build a SQLite record index covering name, phone, email and address keys,
+    plus the serialized fuzzy name index in the ``name_index`` table.
+
+    Records are streamed in batches into a temporary file next to
+    ``db_path`` that is renamed into place once complete, so readers never
+    see a half-built index. Returns the record count.
+    """
+    import sqlite3
+
+    from .fuzzy_index import FuzzyNameIndex
+
+    db_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = db_path.with_name(db_path.name + ".tmp")
+    if tmp_path.exists():
+        tmp_path.unlink()
+
+    conn = sqlite3.connect(str(tmp_path))
+    try:
+        conn.execute("PRAGMA journal_mode=OFF")
+        conn.execute("PRAGMA synchronous=OFF")
+        conn.execute("CREATE TABLE meta (name TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        conn.execute("CREATE TABLE records (id INTEGER PRIMARY KEY, data TEXT NOT NULL)")
+        # Clustered on the lookup key so the key text is stored only once.
+        conn.execute(
+            "CREATE TABLE record_keys (kind TEXT NOT NULL, key TEXT NOT NULL,"
+            " record_id INTEGER NOT NULL, PRIMARY KEY (kind, key, record_id)) WITHOUT ROWID"
+        )
+        conn.execute("CREATE TABLE name_index (data BLOB NOT NULL)")
+
+        count = 0
+        names = FuzzyNameIndex()
+        record_rows: List[Tuple[int, str]] = []
+        key_rows: List[Tuple[str, str, int]] = []
+
+        def flush() -> None:
+            conn.executemany("INSERT INTO records (id, data) VALUES (?, ?)", record_rows)
+            conn.executemany("INSERT INTO record_keys VALUES (?, ?, ?)", key_rows)
+            record_rows.clear()
+            key_rows.clear()
+
+        for raw in records:
+            count += 1
+            record_rows.append((count, json.dumps(raw, ensure_ascii=False, separators=(",", ":"))))
+            key_rows.extend((kind, key, count) for kind, key in set(record_keys(raw)))
+            names.add(raw)
+            if len(record_rows) >= batch_size:
+                flush()
+                logger.debug("Indexed %d record(s)", count)
+        flush()
+
+        conn.execute("INSERT INTO name_index VALUES (?)", (names.to_bytes(),))
+        conn.executemany(
+            "INSERT INTO meta VALUES (?, ?)",
+            [("format_version", SQLITE_FORMAT_VERSION), ("record_count", str(count))],
+        )
+        conn.commit()
+    finally:
+        conn.close()
+
+    os.replace(tmp_path, db_path)
+    logger.info("Built record index with %d record(s) at %s", count, db_path)
+    return count
+
+def _key_hash(key: str) -> int:
+    return zlib.crc32(key.encode("utf-8"))
+
+def _padded(data: bytes) -> bytes:
+    return data + b"\0" * (-len(data) % _ALIGNMENT)
+
+def _write_sectioned(
+    path: Path,
+    magic: bytes,
+    header: Dict[str, Any],
+    sections: List[Tuple[str, Union[bytes, Path]]],
+) -> None:
+    """
+    Write ``magic``, an 8-byte header length, the marshalled ``header``
+    (plus a ``sections`` table of ``(offset, length)`` pairs), then each
+    section 8-byte aligned. A section is given as bytes or as a file to copy
+    in. The file is written next to ``path`` and renamed into place.
+    """
+    # Offsets are relative to the (aligned) end of the header, so they do
+    # not depend on the header's own size.
+    table: Dict[str, Tuple[int, int]] = {}
+    position = 0
+    for name, data in sections:
+        length = len(data) if isinstance(data, bytes) else data.stat().st_size
+        table[name] = (position, length)
+        position += length + (-length % _ALIGNMENT)
+    encoded = marshal.dumps({**header, "sections": table})
+    prefix = magic + _HEADER_LENGTH.pack(len(encoded)) + encoded
+
+    tmp_path = path.with_name(path.name + ".tmp")
+    with tmp_path.open("wb") as out:
+        out.write(_padded(prefix))
+        for name, data in sections:
+            if isinstance(data, bytes):
+                out.write(_padded(data))
+                continue
+            with data.open("rb") as blob:
+                while True:
+                    chunk = blob.read(1 << 20)
+                    if not chunk:
+                        break
+                    out.write(chunk)
+            out.write(b"\0" * (-table[name][1] % _ALIGNMENT))
+    os.replace(tmp_path, path)
+
+def _key_tables(indexes: Dict[str, Dict[str, int]]) -> List[Tuple[str, Union[bytes, Path]]]:
+    """Per key kind, sorted key hashes and the matching record numbers."""
+    sections: List[Tuple[str, Union[bytes, Path]]] = []
+    for kind in KEY_KINDS:
+        entries = sorted((_key_hash(key), number) for key, number in indexes[kind].items())
+        sections.append((f"{kind}.hashes", array("I", [h for h, _ in entries]).tobytes()))
+        sections.append((f"{kind}.records", array("I", [n for _, n in entries]).tobytes()))
+    return sections
+
+def build_marshal_index(records: Iterable[Dict[str, Any]], path: Path) -> int:
+    """
+    Write a marshal record index: read-only, and opened without decoding it.
+
+    Layout: ``MARSHAL_INDEX_MAGIC``, an 8-byte header length, a marshalled
+    header of section ``(offset, length)`` pairs, then 8-byte aligned
+    sections: record offsets (``array('Q')``), every record marshalled back
+    to back, and per key kind a table of key hashes (``array('I')``, sorted)
+    with the matching record numbers (``array('I')``), and the serialized
+    fuzzy name index (``names``). A key that several records share points
+    at the last of them, as in the other stores. The file is written next
+    to ``path`` and renamed into place. Returns the record count.
+    """
+    from .fuzzy_index import FuzzyNameIndex
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    blob_path = path.with_name(path.name + ".records.tmp")
+
+    offsets = array("Q", [0])
+    indexes: Dict[str, Dict[str, int]] = {kind: {} for kind in KEY_KINDS}
+    names = FuzzyNameIndex()
+    try:
+        with blob_path.open("wb") as blob:
+            for number, raw in enumerate(records):
+                data = marshal.dumps(raw)
+                blob.write(data)
+                offsets.append(offsets[-1] + len(data))
+                for kind, key in record_keys(raw):
+                    indexes[kind][key] = number
+                names.add(raw)
+
+        sections: List[Tuple[str, Union[bytes, Path]]] = [
+            ("offsets", offsets.tobytes()),
+            ("records", blob_path),
+        ]
+        sections += _key_tables(indexes)
+        indexes.clear()
+        sections.append(("names", names.to_bytes()))
+        _write_sectioned(
+            path,
+            MARSHAL_INDEX_MAGIC,
+            {
+                "format_version": MARSHAL_FORMAT_VERSION,
+                "marshal_version": marshal.version,
+                "count": len(offsets) - 1,
+            },
+            sections,
+        )
+    finally:
+        if blob_path.exists():
+            blob_path.unlink()
+
+    count = len(offsets) - 1
+    logger.info("Built marshal record index with %d record(s) at %s", count, path)
+    return count
+
+def _count_strings(node: Any, counts: Dict[str, int]) -> None:
+    kind = type(node)
+    if kind is str:
+        counts[node] = counts.get(node, 0) + 1
+    elif kind is dict:
+        for value in node.values():
+            _count_strings(value, counts)
+    elif kind is list or kind is tuple:
+        for value in node:
+            _count_strings(value, counts)
+
+def _snapshot_encode(node: Any, strings: Dict[str, int], schemas: Dict[Tuple[str, ...], int]) -> Any:
+    kind = type(node)
+    if kind is str:
+        # Strings only one record uses stay inline.
+        return strings.get(node, node)
+    if kind is dict:
+        keys = tuple(node)
+        schema = schemas.get(keys)
+        if schema is None:
+            schema = schemas[keys] = len(schemas)
+        return (schema, *[_snapshot_encode(value, strings, schemas) for value in node.values()])
+    if kind is list or kind is tuple:
+        # JSON has no tuples; any that turn up come back as lists.
+        return [_snapshot_encode(value, strings, schemas) for value in node]
+    if kind is int:
+        return (_SNAPSHOT_INT, node)
+    # None, bools and floats stand for themselves.
+    return node
+
+def build_snapshot_index(
+    records: Iterable[Dict[str, Any]],
+    path: Path,
+    block_records: int = SNAPSHOT_BLOCK_RECORDS,
+    compression: str = "zlib",
+) -> int:
+    """
+    Write a compact snapshot of the records and key tables, read in place.
+
+    Strings that appear more than once are interned: stored once in a
+    string table (UTF-8 bytes plus an ``array('Q')`` of offsets), most
+    frequent first, and referenced by number. Every distinct dict shape is
+    stored once as a tuple of keys, so a record is encoded as nested tuples
+    of schema number and values. Records are marshalled one by one,
+    ``block_records`` to a block, and each block is compressed on its own
+    (``compression`` "zlib" or "none"); ``block_offsets`` locates the
+    blocks and ``record_offsets`` each record inside its inflated block.
+    The key tables and fuzzy name index are those of
+    ``build_marshal_index``, and the file uses
+    its sectioned layout under ``SNAPSHOT_MAGIC``. The records are spooled
+    to a temporary file while the strings are counted. Returns the record
+    count.
+    """
+    if compression not in SNAPSHOT_COMPRESSIONS:
+        raise ValueError(
+            f"Unknown snapshot compression '{compression}' "
+            f"(expected one of: {', '.join(SNAPSHOT_COMPRESSIONS)})"
+        )
+    if block_records < 1:
+        raise ValueError("block_records must be at least 1")
+    from .fuzzy_index import FuzzyNameIndex
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    spool_path = path.with_name(path.name + ".records.tmp")
+    blob_path = path.with_name(path.name + ".blocks.tmp")
+
+    counts: Dict[str, int] = {}
+    lengths = array("Q")
+    indexes: Dict[str, Dict[str, int]] = {kind: {} for kind in KEY_KINDS}
+    names = FuzzyNameIndex()
+    try:
+        with spool_path.open("wb") as spool:
+            for number, raw in enumerate(records):
+                data = marshal.dumps(raw)
+                spool.write(data)
+                lengths.append(len(data))
+                _count_strings(raw, counts)
+                for kind, key in record_keys(raw):
+                    indexes[kind][key] = number
+                names.add(raw)
+
+        shared = sorted(
+            (value for value, n in counts.items() if n > 1), key=counts.__getitem__, reverse=True
+        )
+        counts.clear()
+        strings = {value: number for number, value in enumerate(shared)}
+        string_offsets = array("Q", [0])
+        string_data = bytearray()
+        for value in shared:
+            string_data += value.encode("utf-8", "surrogatepass")
+            string_offsets.append(len(string_data))
+        del shared
+
+        schemas: Dict[Tuple[str, ...], int] = {}
+        block_offsets = array("Q", [0])
+        record_offsets = array("I")
+        with spool_path.open("rb") as spool, blob_path.open("wb") as blob:
+            block = bytearray()
+            for number, length in enumerate(lengths):
+                record_offsets.append(len(block))
+                block += marshal.dumps(
+                    _snapshot_encode(marshal.loads(spool.read(length)), strings, schemas)
+                )
+                if (number + 1) % block_records == 0 or number + 1 == len(lengths):
+                    data = zlib.compress(block) if compression == "zlib" else bytes(block)
+                    blob.write(data)
+                    block_offsets.append(block_offsets[-1] + len(data))
+                    block.clear()
+        count = len(lengths)
+        string_count = len(strings)
+        strings.clear()
+
+        sections: List[Tuple[str, Union[bytes, Path]]] = [
+            ("schemas", marshal.dumps(list(schemas))),
+            ("string_offsets", string_offsets.tobytes()),
+            ("strings", bytes(string_data)),
+            ("record_offsets", record_offsets.tobytes()),
+            ("block_offsets", block_offsets.tobytes()),
+            ("blocks", blob_path),
+        ]
+        del string_data
+        sections += _key_tables(indexes)
+        indexes.clear()
+        sections.append(("names", names.to_bytes()))
+        _write_sectioned(
+            path,
+            SNAPSHOT_MAGIC,
+            {
+                "format_version": SNAPSHOT_FORMAT_VERSION,
+                "marshal_version": marshal.version,
+                "count": count,
+                "block_records": block_records,
+                "compression": compression,
+            },
+            sections,
+        )
+    finally:
+        for tmp in (spool_path, blob_path):
+            if tmp.exists():
+                tmp.unlink()
+
+    logger.info(
+        "Built record snapshot with %d record(s), %d interned string(s) and %d block(s) (%s) at %s",
+        count,
+        string_count,
+        len(block_offsets) - 1,
+        compression,
+        path,
+    )
+    return count
+
+class _MappedRecordStore(RecordStore):
+    """
+    Read-only store over a file written by ``_write_sectioned``.
+
+    Opening maps the file and reads only its header; nothing is decoded up
+    front, and processes opening the same file share its pages. A lookup
+    binary-searches the key kind's hash table in place and decodes just the
+    candidate record (``_record``), checking its keys to rule out hash
+    collisions, so a one-off trace costs about the same against ten records
+    or ten million.
+    """
+
+    MAGIC = b""
+    FORMAT_VERSION = 0
+
+    def __init__(self, path: Path) -> None:
+        if not path.exists():
+            raise FileNotFoundError(f"Record index not found at: {path}")
+        self.path = path
+        self._file = path.open("rb")
+        try:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            self._file.close()
+            raise ValueError(f"Record index {path} is empty") from None
+        self._views: List[memoryview] = []
+        self._tables: Dict[str, Tuple[memoryview, memoryview]] = {}
+
+        magic_end = len(self.MAGIC)
+        header_start = magic_end + _HEADER_LENGTH.size
+        try:
+            if self._map[:magic_end] != self.MAGIC:
+                raise ValueError("bad magic")
+            (header_length,) = _HEADER_LENGTH.unpack(self._map[magic_end:header_start])
+            header = marshal.loads(self._map[header_start : header_start + header_length])
+            if (
+                header.get("format_version") != self.FORMAT_VERSION
+                or header.get("marshal_version") != marshal.version
+            ):
+                raise ValueError("version mismatch")
+        except (ValueError, EOFError, TypeError, struct.error):
+            self.close()
+            raise ValueError(
+                f"Unsupported record index format in {path}; rebuild it with build_index.py"
+            ) from None
+
+        header_end = header_start + header_length
+        self._base = header_end + (-header_end % _ALIGNMENT)
+        self._header: Dict[str, Any] = header
+        self._sections: Dict[str, Tuple[int, int]] = header["sections"]
+        self._count: int = header["count"]
+
+    def _section_start(self, name: str) -> int:
+        return self._base + self._sections[name][0]
+
+    def _view(self, name: str, fmt: str) -> memoryview:
+        offset, length = self._sections[name]
+        start = self._base + offset
+        view = memoryview(self._map)[start : start + length].cast(fmt)
+        self._views.append(view)
+        return view
+
+    def _record(self, number: int) -> Dict[str, Any]:
+        raise NotImplementedError
+
+    def _table(self, kind: str) -> Optional[Tuple[memoryview, memoryview]]:
+        table = self._tables.get(kind)
+        if table is None and f"{kind}.hashes" in self._sections and kind in KEY_FUNCTIONS:
+            # Racing threads may both build the views; either copy is fine.
+            table = self._tables[kind] = (
+                self._view(f"{kind}.hashes", "I"),
+                self._view(f"{kind}.records", "I"),
+            )
+        return table
+
+    def get(self, kind: str, key: str) -> Optional[Dict[str, Any]]:
+        table = self._table(kind)
+        if table is None:
+            return None
+        hashes, numbers = table
+        key_hash = _key_hash(key)
+        pos = bisect_left(hashes, key_hash)
+        while pos < len(hashes) and hashes[pos] == key_hash:
+            raw = self._record(numbers[pos])
+            if key in KEY_FUNCTIONS[kind](raw):
+                return raw
+            pos += 1
+        return None
+
+    def iter_records(self) -> Iterator[Dict[str, Any]]:
+        for number in range(self._count):
+            yield self._record(number)
+
+    def name_index(self) -> Optional["FuzzyNameIndex"]:
+        from .fuzzy_index import FuzzyNameIndex
+
+        if "names" not in self._sections:
+            # Built before name indexes were stored.
+            return None
+        offset, length = self._sections["names"]
+        return FuzzyNameIndex.from_bytes(self._map[self._base + offset : self._base + offset + length])
+
+    def __len__(self) -> int:
+        return self._count
+
+    def close(self) -> None:
+        self._tables.clear()
+        for view in self._views:
+            view.release()
+        self._views.clear()
+        if not self._map.closed:
+            self._map.close()
+        self._file.close()
+
+class MarshalRecordStore(_MappedRecordStore):
+    """
+    Store backed by a file from ``build_marshal_index``: each hit is one
+    ``marshal.loads`` of the record's bytes. The file is specific to the
+    Python marshal format version that wrote it.
+    """
+
+    MAGIC = MARSHAL_INDEX_MAGIC
+    FORMAT_VERSION = MARSHAL_FORMAT_VERSION
+
+    def __init__(self, path: Path) -> None:
+        super().__init__(path)
+        self._records_start = self._section_start("records")
+        self._offsets = self._view("offsets", "Q")
+
+    def _record(self, number: int) -> Dict[str, Any]:
+        offsets = self._offsets
+        return marshal.loads(
+            self._map[self._records_start + offsets[number] : self._records_start + offsets[number + 1]]
+        )
+
+class _StringCache(dict):
+    """Interned strings by number, decoded on first use; keeps numbers below ``limit``."""
+
+    def __init__(self, load: Callable[[int], str], limit: int) -> None:
+        super().__init__()
+        self._load = load
+        self._limit = limit
+
+    def __missing__(self, number: int) -> str:
+        value = self._load(number)
+        if number < self._limit:
+            self[number] = value
+        return value
+
+class SnapshotRecordStore(_MappedRecordStore):
+    """
+    Store backed by a file from ``build_snapshot_index``.
+
+    A hit inflates the record's block (the last ``SNAPSHOT_BLOCK_CACHE``
+    blocks stay inflated), unmarshals just that record and fills in its
+    interned strings from the mapped string table; the
+    ``SNAPSHOT_HOT_STRINGS`` most frequent ones are kept once decoded.
+    Only the dict shapes are loaded at open.
+    """
+
+    MAGIC = SNAPSHOT_MAGIC
+    FORMAT_VERSION = SNAPSHOT_FORMAT_VERSION
+
+    def __init__(self, path: Path) -> None:
+        super().__init__(path)
+        try:
+            self._block_records: int = self._header["block_records"]
+            self._compressed = self._header["compression"] == "zlib"
+            offset, length = self._sections["schemas"]
+            self._schemas: List[Tuple[str, ...]] = marshal.loads(
+                self._map[self._base + offset : self._base + offset + length]
+            )
+        except (KeyError, ValueError, EOFError, TypeError):
+            self.close()
+            raise ValueError(
+                f"Unsupported record index format in {path}; rebuild it with build_index.py"
+            ) from None
+        self._strings_start = self._section_start("strings")
+        self._string_offsets_start = self._section_start("string_offsets")
+        self._record_offsets = self._view("record_offsets", "I")
+        self._blocks_start = self._section_start("blocks")
+        self._block_offsets = self._view("block_offsets", "Q")
+        self._hot = _StringCache(self._string, SNAPSHOT_HOT_STRINGS)
+        self._inflated: "OrderedDict[int, bytes]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _block(self, number: int) -> bytes:
+        with self._lock:
+            block = self._inflated.get(number)
+            if block is not None:
+                self._inflated.move_to_end(number)
+                return block
+        start = self._blocks_start + self._block_offsets[number]
+        block = self._map[start : self._blocks_start + self._block_offsets[number + 1]]
+        if self._compressed:
+            block = zlib.decompress(block)
+        with self._lock:
+            self._inflated[number] = block
+            if len(self._inflated) > SNAPSHOT_BLOCK_CACHE:
+                self._inflated.popitem(last=False)
+        return block
+
+    def _string(self, number: int) -> str:
+        start, end = _OFFSET_PAIR.unpack_from(self._map, self._string_offsets_start + 8 * number)
+        base = self._strings_start
+        return self._map[base + start : base + end].decode("utf-8", "surrogatepass")
+
+    def _decode(self, node: Any) -> Any:
+        kind = type(node)
+        if kind is str:
+            return node
+        if kind is int:
+            return self._hot[node]
+        if kind is tuple:
+            schema = node[0]
+            if schema == _SNAPSHOT_INT:
+                return node[1]
+            decode = self._decode
+            return dict(zip(self._schemas[schema], [decode(value) for value in node[1:]]))
+        if kind is list:
+            decode = self._decode
+            return [decode(value) for value in node]
+        return node
+
+    def _record(self, number: int) -> Dict[str, Any]:
+        block_number, slot = divmod(number, self._block_records)
+        block = self._block(block_number)
+        start = self._record_offsets[number]
+        last = slot + 1 == self._block_records or number + 1 == self._count
+        end = len(block) if last else self._record_offsets[number + 1]
+        return self._decode(marshal.loads(block[start:end]))
+
+    def get_many(self, kind: str, keys: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+        # Probe in record order, so keys whose records share a block inflate it once.
+        table = self._table(kind)
+        if table is None:
+            return {}
+        hashes, numbers = table
+        candidates = []
+        for key in set(keys):
+            key_hash = _key_hash(key)
+            pos = bisect_left(hashes, key_hash)
+            if pos < len(hashes) and hashes[pos] == key_hash:
+                candidates.append((numbers[pos], key))
+        found = {}
+        for _, key in sorted(candidates):
+            raw = self.get(kind, key)
+            if raw is not None:
+                found[key] = raw
+        return found
+
+def open_record_store(path: Path) -> RecordStore:
+    """Open a prebuilt index, picking the backend from the file suffix."""
+    suffix = path.suffix.lower()
+    if suffix == MARSHAL_INDEX_SUFFIX:
+        return MarshalRecordStore(path)
+    if suffix == SNAPSHOT_SUFFIX:
+        return SnapshotRecordStore(path)
+    return SQLiteRecordStore(path)
+
+def store_from_settings(
+    settings: Dict[str, Any], root_dir: Path, default_records: List[Dict[str, Any]]
+) -> RecordStore:
+    """
+    Open the record store selected by the optional ``record_store`` setting.
+
+    ``{"type": "sqlite", "path": ...}``, ``{"type": "marshal", "path": ...}``
+    or ``{"type": "snapshot", "path": ...}`` opens a prebuilt index
+    (relative paths are resolved against ``root_dir``); no setting at all,
+    or ``"static"``, serves ``default_records`` from memory.
+    """
+    config = settings.get("record_store") or {}
+    store_type = config.get("type", "static")
+
+    if store_type == "sqlite":
+        return SQLiteRecordStore(root_dir / config["path"])
+    if store_type == "marshal":
+        return MarshalRecordStore(root_dir / config["path"])
+    if store_type == "snapshot":
+        return SnapshotRecordStore(root_dir / config["path"])
+    if store_type != "static":
+        raise ValueError(f"Unknown record store type: {store_type}")
+    return InMemoryRecordStore(default_records)
@@ -0,0 +1,468 @@
+import logging
+import marshal
+import os
+import threading
+from array import array
+from collections import deque
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from utils.matching import MAX_AGE_GAP, phone_key
+
+from .identity_extractor import PersonRecord
+from .record_store import address_keys, email_key, normalize_key
+
+logger = logging.getLogger(__name__)
+
+# Edge types
+RELATIVE = 1
+ASSOCIATE = 2
+RESIDES_AT = 3
+PREVIOUSLY_AT = 4
+
+EDGE_NAMES = {
+    RELATIVE: "relative",
+    ASSOCIATE: "associate",
+    RESIDES_AT: "resides_at",
+    PREVIOUSLY_AT: "previously_at",
+}
+PERSON_EDGES = (RELATIVE, ASSOCIATE)
+ADDRESS_EDGES = (RESIDES_AT, PREVIOUSLY_AT)
+
+# Node kinds. A referenced person is only known as someone's relative or
+# associate (a name and maybe an age) until a record of theirs is added.
+PERSON = 0
+ADDRESS = 1
+REFERENCED_PERSON = 2
+
+# Household scoring (see ``RelationGraph.likely_household``)
+CO_RESIDENT_SCORE = 1.0
+RELATIVE_SCORE = 0.5
+SURNAME_SCORE = 0.25
+HOUSEHOLD_THRESHOLD = 0.75
+
+GRAPH_FORMAT_VERSION = 2
+_NO_EDGE = -1
+_NO_AGE = -1
+_MAX_AGE = 32767
+# Age differences that still agree, closest first.
+_AGE_OFFSETS = sorted(range(-MAX_AGE_GAP, MAX_AGE_GAP + 1), key=abs)
+# Arrays of the saved format, by attribute name and typecode.
+_STATE_ARRAYS = (
+    ("_kinds", "B"),
+    ("_ages", "h"),
+    ("_head", "i"),
+    ("_next", "i"),
+    ("_target", "I"),
+    ("_edge_type", "B"),
+)
+
+def _label(text: str) -> str:
+    return " ".join(text.split())
+
+def _parse_age(age: Optional[str]) -> int:
+    text = (age or "").strip()
+    return min(int(text), _MAX_AGE) if text.isdigit() else _NO_AGE
+
+def _name_key(label: str) -> str:
+    return "n:" + normalize_key(label)
+
+def _identity_keys(record: PersonRecord) -> List[str]:
+    """Keys that tell this person apart from others of the same name."""
+    keys = [f"l:{record.person_link}"] if record.person_link else []
+    phones = (phone_key(phone.get("number")) for phone in record.phones)
+    keys += [f"p:{key}" for key in phones if key]
+    keys += [f"e:{email_key(email)}" for email in record.emails if email.strip()]
+    return keys
+
+class RelationGraph:
+    """
+    In-memory graph of people, their relations and their addresses.
+
+    Nodes are interned to compact integer ids. Edges are stored forward-star
+    style in a few flat arrays (``_head`` per node; ``_next``, ``_target``
+    and ``_edge_type`` per half-edge), so there are no per-node containers
+    and millions of edges cost roughly 20 bytes each.
+
+    A record's person is identified by its person link, phone numbers and
+    emails, together with the normalized "first last" name: two records are
+    the same person when they share one of those keys, the name and a
+    compatible age (within ``MAX_AGE_GAP``), so namesakes and people sharing
+    a household phone stay apart. Relatives and associates are only named
+    (with an age) in records; a reference joins a person of that name and a
+    compatible age (the closest age, then an unknown one; the earliest
+    such person if several), or becomes a ``REFERENCED_PERSON`` node that
+    the person's own record takes over later. People are also indexed by
+    name and age, so finding a namesake never scans every person of a
+    common name. Addresses are keyed by their
+    canonical keys from ``record_store.address_keys``, so the zip and
+    city/state forms of an address share one node.
+
+    Queries take a person link, phone number, email or name. A name shared
+    by several people expands from all of them.
+
+    Records are added incrementally with ``add_record`` (safe from several
+    threads); the graph can be saved and loaded between runs.
+    """
+
+    def __init__(self) -> None:
+        # Address keys -> node, and person keys ("n:" name, "l:" link,
+        # "p:" phone, "e:" email) -> every person node that had them, as
+        # insertion-ordered sets.
+        self._ids: Dict[str, int] = {}
+        self._people: Dict[str, Dict[int, None]] = {}
+        # (name key, age) -> person nodes, and the same for referenced
+        # people alone plus name key -> referenced people of any age.
+        # Derived from the above; rebuilt on load.
+        self._aged: Dict[Tuple[str, int], Dict[int, None]] = {}
+        self._unclaimed_aged: Dict[Tuple[str, int], Dict[int, None]] = {}
+        self._unclaimed: Dict[str, Dict[int, None]] = {}
+        self._labels: List[str] = []
+        self._kinds = array("B")
+        self._ages = array("h")
+        self._head = array("i")
+        self._next = array("i")
+        self._target = array("I")
+        self._edge_type = array("B")
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._labels)
+
+    @property
+    def edge_count(self) -> int:
+        return len(self._target) // 2
+
+    def _new_node(self, label: str, kind: int, age: int = _NO_AGE) -> int:
+        node_id = len(self._labels)
+        self._labels.append(label)
+        self._kinds.append(kind)
+        self._ages.append(age)
+        self._head.append(_NO_EDGE)
+        return node_id
+
+    def _age_agrees(self, node: int, age: int) -> bool:
+        known = self._ages[node]
+        return known == _NO_AGE or age == _NO_AGE or abs(known - age) <= MAX_AGE_GAP
+
+    def _register(self, node: int, keys: Iterable[str]) -> None:
+        for key in keys:
+            self._people.setdefault(key, {})[node] = None
+
+    def _index(self, node: int, name_key: str) -> None:
+        """Add a person node to the name and age buckets."""
+        bucket = (name_key, self._ages[node])
+        self._aged.setdefault(bucket, {})[node] = None
+        if self._kinds[node] == REFERENCED_PERSON:
+            self._unclaimed_aged.setdefault(bucket, {})[node] = None
+            self._unclaimed.setdefault(name_key, {})[node] = None
+
+    def _unindex(self, node: int, name_key: str) -> None:
+        bucket = (name_key, self._ages[node])
+        for index, key in (
+            (self._aged, bucket),
+            (self._unclaimed_aged, bucket),
+            (self._unclaimed, name_key),
+        ):
+            nodes = index.get(key)
+            if nodes is not None and node in nodes:
+                del nodes[node]
+                if not nodes:
+                    del index[key]
+
+    @staticmethod
+    def _closest(
+        aged: Dict[Tuple[str, int], Dict[int, None]],
+        by_name: Dict[str, Dict[int, None]],
+        name_key: str,
+        age: int,
+    ) -> Optional[int]:
+        """The first indexed person of a name whose age agrees with ``age``."""
+        if age == _NO_AGE:
+            nodes = by_name.get(name_key)
+            return next(iter(nodes)) if nodes else None
+        for candidate in [age + offset for offset in _AGE_OFFSETS if age + offset >= 0] + [_NO_AGE]:
+            nodes = aged.get((name_key, candidate))
+            if nodes:
+                return next(iter(nodes))
+        return None
+
+    def _subject(self, record: PersonRecord) -> Optional[int]:
+        """The node of the person a record describes, created if new."""
+        label = _label(f"{record.first_name} {record.last_name}")
+        if not label:
+            return None
+        name_key = _name_key(label)
+        age = _parse_age(record.age)
+        keys = _identity_keys(record)
+        namesakes = self._people.get(name_key, {})
+        node = next(
+            (
+                other
+                for key in keys
+                for other in self._people.get(key, ())
+                if other in namesakes and self._age_agrees(other, age)
+            ),
+            None,
+        )
+        if node is None:
+            node = self._closest(self._unclaimed_aged, self._unclaimed, name_key, age)
+        if node is None:
+            node = self._new_node(label, PERSON, age)
+        else:
+            self._unindex(node, name_key)
+        # The person's own record knows their age better than a reference.
+        if age != _NO_AGE and (self._ages[node] == _NO_AGE or self._kinds[node] == REFERENCED_PERSON):
+            self._ages[node] = age
+        self._kinds[node] = PERSON
+        self._register(node, [name_key, *keys])
+        self._index(node, name_key)
+        return node
+
+    def _referenced(self, name: str, age: Optional[str]) -> Optional[int]:
+        """The node of a relative or associate named in a record."""
+        label = _label(name)
+        if not label:
+            return None
+        name_key = _name_key(label)
+        parsed = _parse_age(age)
+        node = self._closest(self._aged, self._people, name_key, parsed)
+        if node is None:
+            node = self._new_node(label, REFERENCED_PERSON, parsed)
+            self._register(node, [name_key])
+            self._index(node, name_key)
+        return node
+
+    def _address(
+        self,
+        street: Optional[str],
+        locality: Optional[str],
+        region: Optional[str],
+        postal_code: Optional[str],
+    ) -> Optional[int]:
+        keys = ["a:" + key for key in address_keys(street, locality, region, postal_code)]
+        if not keys:
+            return None
+        node_id = next((self._ids[key] for key in keys if key in self._ids), None)
+        if node_id is None:
+            label = _label(", ".join(part for part in (street, locality, region, postal_code) if part))
+            node_id = self._new_node(label, ADDRESS)
+        for key in keys:
+            self._ids.setdefault(key, node_id)
+        return node_id
+
+    def _edges(self, node: int) -> Iterator[Tuple[int, int]]:
+        """Yield ``(neighbor, edge type)`` for every edge of ``node``, newest first."""
+        edge = self._head[node]
+        target = self._target
+        edge_type = self._edge_type
+        following = self._next
+        while edge != _NO_EDGE:
+            yield target[edge], edge_type[edge]
+            edge = following[edge]
+
+    def _link(self, a: int, b: int, edge_type: int) -> None:
+        # ``a`` is always the record's subject, whose edge list is short, so
+        # scanning it is cheaper than keeping an edge set.
+        if a == b:
+            return
+        for other, existing in self._edges(a):
+            if other == b and existing == edge_type:
+                return
+        for source, target in ((a, b), (b, a)):
+            self._next.append(self._head[source])
+            self._head[source] = len(self._target)
+            self._target.append(target)
+            self._edge_type.append(edge_type)
+
+    def add_record(self, record: PersonRecord) -> None:
+        """Add a (preferably enriched) record's person, relations and addresses."""
+        with self._lock:
+            subject = self._subject(record)
+            if subject is None:
+                return
+
+            for relations, edge_type in ((record.relatives, RELATIVE), (record.associates, ASSOCIATE)):
+                for rel in relations:
+                    other = self._referenced(rel.name, rel.age)
+                    if other is not None:
+                        self._link(subject, other, edge_type)
+
+            current = self._address(
+                record.street_address,
+                record.address_locality,
+                record.address_region,
+                record.postal_code,
+            )
+            if current is not None:
+                self._link(subject, current, RESIDES_AT)
+            for addr in record.previous_addresses:
+                previous = self._address(
+                    addr.get("streetAddress"),
+                    addr.get("addressLocality"),
+                    addr.get("addressRegion"),
+                    addr.get("postalCode"),
+                )
+                if previous is not None:
+                    self._link(subject, previous, PREVIOUSLY_AT)
+
+    def _lookup(self, person: str) -> List[int]:
+        """Person nodes for a person link, email, phone number or name."""
+        keys = [f"l:{person.strip()}", f"e:{email_key(person)}"]
+        phone = phone_key(person)
+        if phone:
+            keys.append(f"p:{phone}")
+        keys.append(_name_key(person))
+        for key in keys:
+            nodes = self._people.get(key)
+            if nodes:
+                return list(nodes)
+        return []
+
+    def neighbors(self, person: str, edge_types: Iterable[int] = PERSON_EDGES) -> List[Tuple[str, str]]:
+        """Direct ``(label, edge name)`` neighbors of a person, oldest edge first."""
+        wanted = set(edge_types)
+        found = []
+        for node in self._lookup(person):
+            edges = [
+                (self._labels[other], EDGE_NAMES[edge_type])
+                for other, edge_type in self._edges(node)
+                if edge_type in wanted
+            ]
+            edges.reverse()
+            found += edges
+        return found
+
+    def within_hops(
+        self,
+        person: str,
+        hops: int,
+        edge_types: Iterable[int] = PERSON_EDGES,
+    ) -> List[Tuple[str, Optional[int], int]]:
+        """
+        Breadth-first expansion from a person.
+
+        Returns ``(label, age, distance)`` for every person reachable within
+        ``hops`` edges of the given types (relatives and associates by
+        default), nearest first, then by name. Each person is listed once,
+        so namesakes show up as separate entries; ``age`` is None when
+        unknown. Add ``ADDRESS_EDGES`` to also walk through shared current
+        or previous addresses; address nodes themselves are not returned.
+        """
+        starts = self._lookup(person)
+        if not starts:
+            return []
+        wanted = set(edge_types)
+        distances = {start: 0 for start in starts}
+        queue = deque(starts)
+        while queue:
+            node = queue.popleft()
+            depth = distances[node]
+            if depth >= hops:
+                continue
+            for other, edge_type in self._edges(node):
+                if edge_type in wanted and other not in distances:
+                    distances[other] = depth + 1
+                    queue.append(other)
+
+        results = []
+        for node, depth in distances.items():
+            if depth and self._kinds[node] != ADDRESS:
+                age = self._ages[node]
+                results.append((self._labels[node], age if age != _NO_AGE else None, depth))
+        results.sort(key=lambda item: (item[2], item[0], -1 if item[1] is None else item[1]))
+        return results
+
+    def likely_household(self, person: str) -> List[Tuple[str, float]]:
+        """
+        People likely to live with the given person, best first.
+
+        Sharing the current address scores 1.0, being a relative 0.5, and a
+        shared surname adds 0.25; anyone reaching 0.75 (a co-resident, or a
+        relative with the same surname) is returned with their score.
+        """
+        ranked = []
+        for node in self._lookup(person):
+            scores: Dict[int, float] = {}
+            for other, edge_type in self._edges(node):
+                if edge_type == RELATIVE:
+                    scores[other] = scores.get(other, 0.0) + RELATIVE_SCORE
+                elif edge_type == RESIDES_AT:
+                    for resident, resident_edge in self._edges(other):
+                        if resident_edge == RESIDES_AT and resident != node:
+                            scores[resident] = scores.get(resident, 0.0) + CO_RESIDENT_SCORE
+
+            surname = self._labels[node].rsplit(" ", 1)[-1].lower()
+            for other, score in scores.items():
+                label = self._labels[other]
+                if label.rsplit(" ", 1)[-1].lower() == surname:
+                    score += SURNAME_SCORE
+                if score >= HOUSEHOLD_THRESHOLD:
+                    ranked.append((label, score))
+        ranked.sort(key=lambda item: (-item[1], item[0]))
+        return ranked
+
+    def save(self, path: Path) -> None:
+        """
+        Write the graph to ``path``, atomically replacing any previous file.
+
+        The file is one marshalled dict of string lists and array bytes, so
+        loading it never runs code from the file.
+        """
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(path.name + ".tmp")
+        with self._lock:
+            state: Dict[str, Any] = {
+                "version": GRAPH_FORMAT_VERSION,
+                "labels": self._labels,
+                "address_keys": list(self._ids),
+                "address_ids": array("I", self._ids.values()).tobytes(),
+                "person_keys": list(self._people),
+                "person_counts": array("I", map(len, self._people.values())).tobytes(),
+                "person_ids": array("I", [node for nodes in self._people.values() for node in nodes]).tobytes(),
+            }
+            for attr, _ in _STATE_ARRAYS:
+                state[attr] = getattr(self, attr).tobytes()
+            with tmp_path.open("wb") as f:
+                marshal.dump(state, f)
+        os.replace(tmp_path, path)
+        logger.debug("Saved relation graph (%d nodes, %d edges) to %s", len(self), self.edge_count, path)
+
+    @classmethod
+    def load(cls, path: Path) -> "RelationGraph":
+        """Read a graph written by ``save``; raises ValueError for anything else."""
+        try:
+            with path.open("rb") as f:
+                state = marshal.load(f)
+            if not isinstance(state, dict) or state.get("version") != GRAPH_FORMAT_VERSION:
+                raise ValueError("version mismatch")
+
+            graph = cls()
+            graph._labels = _strings(state["labels"])
+            graph._ids = dict(zip(_strings(state["address_keys"]), _array("I", state["address_ids"])))
+            person_ids = iter(_array("I", state["person_ids"]))
+            graph._people = {
+                key: dict.fromkeys([next(person_ids) for _ in range(count)])
+                for key, count in zip(_strings(state["person_keys"]), _array("I", state["person_counts"]))
+            }
+            for attr, typecode in _STATE_ARRAYS:
+                setattr(graph, attr, _array(typecode, state[attr]))
+        except (ValueError, EOFError, TypeError, KeyError, AttributeError, StopIteration):
+            raise ValueError(f"Unsupported relation graph format in {path}") from None
+        if not len(graph._kinds) == len(graph._ages) == len(graph._head) == len(graph._labels):
+            raise ValueError(f"Corrupt relation graph in {path}")
+        for node, kind in enumerate(graph._kinds):
+            if kind != ADDRESS:
+                graph._index(node, _name_key(graph._labels[node]))
+        logger.debug("Loaded relation graph (%d nodes, %d edges) from %s", len(graph), graph.edge_count, path)
+        return graph
+
+def _strings(values: Any) -> List[str]:
+    if not isinstance(values, list) or not all(type(value) is str for value in values):
+        raise ValueError("expected a list of strings")
+    return values
+
+def _array(typecode: str, data: bytes) -> array:
+    values = array(typecode)
+    values.frombytes(data)
+    return values
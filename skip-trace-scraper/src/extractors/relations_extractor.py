@@ -1,9 +1,40 @@
-thonimport logging
-from typing import List
+import logging
+from typing import Dict, Iterable, List, Optional
 
 from .identity_extractor import PersonRecord, Relation
 
 logger = logging.getLogger(__name__)
+query_logger = logging.getLogger(f"queries.{__name__}")
+
+RELATION_FIELDS = ("relatives", "associates")
+
+def _parse_age(age: Optional[str]) -> int:
+    try:
+        return int(age) if age is not None else -1
+    except ValueError:
+        return -1
+
+# Per-chunk memo tables used by enrich_many: each distinct raw value is
+# transformed once, and lookups go through dict.__missing__ only on a miss.
+class _NormalizedNames(dict):
+    def __missing__(self, name: str) -> str:
+        value = self[name] = " ".join(name.split())
+        return value
+
+class _Lowered(dict):
+    def __missing__(self, name: str) -> str:
+        value = self[name] = name.lower()
+        return value
+
+class _StrippedAges(dict):
+    def __missing__(self, age: Optional[str]) -> Optional[str]:
+        value = self[age] = age.strip() if age is not None else None
+        return value
+
+class _NegatedAges(dict):
+    def __missing__(self, age: Optional[str]) -> int:
+        value = self[age] = -_parse_age(age)
+        return value
 
 class RelationsExtractor:
     """
@@ -13,7 +44,8 @@ class RelationsExtractor:
       - Cross-check relatives/associates against additional data sources
       - Infer new connections
       - Resolve duplicates across multiple profiles
-    For this runnable demo we focus on data hygiene, ordering, and deduplication.
+    For this runnable demo we focus on data hygiene, ordering, and deduplication;
+    connections across records are tracked by ``relation_graph.RelationGraph``.
     """
 
     @staticmethod
@@ -34,11 +66,7 @@ class RelationsExtractor:
     def _sort_relations(relations: List[Relation]) -> List[Relation]:
         # Sort by numeric age (if available), then by name
         def sort_key(rel: Relation):
-            try:
-                age_val = int(rel.age) if rel.age is not None else -1
-            except ValueError:
-                age_val = -1
-            return (-age_val, rel.name.lower())
+            return (-_parse_age(rel.age), rel.name.lower())
 
         return sorted(relations, key=sort_key)
 
@@ -74,7 +102,7 @@ class RelationsExtractor:
             self._deduplicate_relations(record.associates)
         )
 
-        logger.info(
+        query_logger.info(
             "Relations enrichment complete for %s %s: %d relatives, %d associates",
             record.first_name,
             record.last_name,
@@ -82,4 +110,45 @@ class RelationsExtractor:
             len(record.associates),
         )
 
-        return record
\ No newline at end of file
+        return record
+
+    def enrich_many(self, records: Iterable[PersonRecord]) -> List[PersonRecord]:
+        """
+        Batch version of ``enrich_relations`` for a chunk of records.
+
+        Produces exactly the same relatives/associates as calling
+        ``enrich_relations`` on each record. Names and ages repeat a lot
+        within a batch, so every distinct raw value is normalized, lowercased
+        and parsed once per chunk, empty lists are skipped, and the chunk is
+        logged once instead of once per record.
+        """
+        records = list(records)
+        names = _NormalizedNames()
+        lowered = _Lowered()
+        ages = _StrippedAges()
+        neg_ages = _NegatedAges()
+
+        for record in records:
+            for field in RELATION_FIELDS:
+                relations = getattr(record, field)
+                if not relations:
+                    continue
+
+                # Plain string keys (length-prefixed to stay unambiguous)
+                # avoid allocating a tuple per relation.
+                first_seen: Dict[str, Relation] = {}
+                for rel in relations:
+                    rel.name = name = names[rel.name]
+                    rel.age = age = ages[rel.age]
+                    lower = lowered[name]
+                    first_seen.setdefault(f"{len(lower)}:{lower}{age or ''}", rel)
+
+                unique = list(first_seen.values())
+                if len(unique) > 1:
+                    # Two stable sorts == one sort by (-age, name).
+                    unique.sort(key=lambda rel: lowered[rel.name])
+                    unique.sort(key=lambda rel: neg_ages[rel.age])
+                setattr(record, field, unique)
+
+        logger.debug("Relations enrichment complete for %d record(s)", len(records))
+        return records
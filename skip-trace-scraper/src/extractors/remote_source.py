@@ -0,0 +1,223 @@
+import json
+import logging
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from urllib.parse import parse_qs, urlencode, urlsplit
+
+from utils.http_pool import HTTPPool, pool_from_settings
+
+from .record_store import RecordStore
+
+logger = logging.getLogger(__name__)
+
+def decode_source_response(status: int, body: bytes, input_value: str) -> Optional[Dict[str, Any]]:
+    """
+    Interpret a ``/lookup`` response: the raw record, or None for a 404.
+
+    Any other status raises ConnectionError; a body that is not a JSON
+    object raises ValueError.
+    """
+    if status == 404:
+        return None
+    if status != 200:
+        raise ConnectionError(f"Source returned HTTP {status} for '{input_value}'")
+
+    try:
+        raw = json.loads(body)
+    except ValueError as exc:
+        raise ValueError(f"Source returned invalid JSON for '{input_value}': {exc}") from exc
+    if not isinstance(raw, dict):
+        raise ValueError(f"Source returned a non-object record for '{input_value}'")
+    return raw
+
+class RemoteSource:
+    """
+    Blocking client for a lookup source at ``source_url``.
+
+    Speaks the same protocol as ``AsyncIdentityExtractor``: a GET against
+    ``{source_url}/lookup?search_option=...&input_value=...`` answered with
+    200 and a raw record, or 404 when nothing matches. Requests go through
+    an ``HTTPPool``, so lookups from many worker threads reuse keep-alive
+    connections and share its retry, per-host limit and circuit breaker
+    settings.
+
+    With ``batch``, ``fetch_many`` sends a whole chunk of queries as one
+    POST to ``{source_url}/lookup_many``: a JSON list of
+    ``{"search_option": ..., "input_value": ...}`` objects, answered with a
+    list of the same length holding a raw record or null per query.
+    Without it, ``fetch_many`` falls back to one GET per query.
+    """
+
+    def __init__(
+        self, source_url: str, pool: Optional[HTTPPool] = None, batch: bool = False
+    ) -> None:
+        self.source_url = source_url.rstrip("/")
+        self.pool = pool if pool is not None else HTTPPool()
+        self.batch = batch
+
+    def fetch(self, search_option: str, input_value: str) -> Optional[Dict[str, Any]]:
+        query = urlencode({"search_option": search_option, "input_value": input_value})
+        status, body = self.pool.get(f"{self.source_url}/lookup?{query}")
+        return decode_source_response(status, body, input_value)
+
+    def fetch_many(self, queries: Sequence[Tuple[str, str]]) -> List[Optional[Dict[str, Any]]]:
+        """Raw records (or None) for ``(search option, input value)`` pairs, in order."""
+        if not self.batch:
+            return [self.fetch(option, value) for option, value in queries]
+        if not queries:
+            return []
+
+        payload = json.dumps(
+            [{"search_option": option, "input_value": value} for option, value in queries],
+            ensure_ascii=False,
+        ).encode("utf-8")
+        status, body = self.pool.request(
+            "POST",
+            f"{self.source_url}/lookup_many",
+            body=payload,
+            headers={"Content-Type": "application/json"},
+        )
+        if status != 200:
+            raise ConnectionError(f"Source returned HTTP {status} for a batch of {len(queries)}")
+        try:
+            raws = json.loads(body)
+        except ValueError as exc:
+            raise ValueError(f"Source returned invalid JSON for a batch: {exc}") from exc
+        if not isinstance(raws, list) or len(raws) != len(queries):
+            raise ValueError(f"Source did not return a list of {len(queries)} record(s)")
+        if any(raw is not None and not isinstance(raw, dict) for raw in raws):
+            raise ValueError("Source returned a non-object record in a batch")
+        return raws
+
+    def close(self) -> None:
+        stats = self.pool.stats()
+        if stats["requests"]:
+            logger.info(
+                "Source %s: %d request(s), %d connection(s) opened, %d reused, %d retried, %d rejected",
+                self.source_url,
+                stats["requests"],
+                stats["connections_opened"],
+                stats["connections_reused"],
+                stats["retries"],
+                stats["rejected"],
+            )
+        self.pool.close()
+
+def remote_source_from_settings(settings: Dict[str, Any]) -> Optional[RemoteSource]:
+    """
+    A RemoteSource for ``source_url`` (pooled per ``http_pool``, batched
+    per ``source_batch``), or None without one.
+    """
+    source_url = settings.get("source_url")
+    if not source_url:
+        return None
+    return RemoteSource(
+        str(source_url),
+        pool_from_settings(settings),
+        batch=bool(settings.get("source_batch", False)),
+    )
+
+class _StubSourceHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    store: RecordStore
+    delay: float
+    tail_ratio: float
+    tail_delay: float
+    resolver: Any
+
+    def _simulate_latency(self) -> None:
+        delay = self.delay
+        if self.tail_ratio and random.random() < self.tail_ratio:
+            delay += self.tail_delay
+        if delay:
+            time.sleep(delay)
+
+    def do_GET(self) -> None:
+        url = urlsplit(self.path)
+        params = parse_qs(url.query)
+        option = (params.get("search_option") or [""])[0]
+        value = (params.get("input_value") or [""])[0]
+        if url.path != "/lookup" or not value:
+            status, body = 400, b'{"error": "expected /lookup?search_option=...&input_value=..."}'
+        else:
+            self._simulate_latency()
+            raw = self.resolver.resolve(option, value)
+            if raw is None:
+                status, body = 404, b'{"error": "not found"}'
+            else:
+                status, body = 200, json.dumps(raw, ensure_ascii=False).encode("utf-8")
+        self._reply(status, body)
+
+    def do_POST(self) -> None:
+        length = int(self.headers.get("Content-Length") or 0)
+        try:
+            queries = json.loads(self.rfile.read(length)) if length else None
+        except ValueError:
+            queries = None
+        if (
+            urlsplit(self.path).path != "/lookup_many"
+            or not isinstance(queries, list)
+            or not all(isinstance(query, dict) for query in queries)
+        ):
+            self._reply(400, b'{"error": "expected a JSON list of queries at /lookup_many"}')
+            return
+
+        self._simulate_latency()
+        raws = self.resolver.resolve_many(
+            [(str(query.get("search_option", "")), str(query.get("input_value", ""))) for query in queries]
+        )
+        self._reply(200, json.dumps(raws, ensure_ascii=False).encode("utf-8"))
+
+    def _reply(self, status: int, body: bytes) -> None:
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args: Any) -> None:
+        logger.debug("stub source: " + format, *args)
+
+class _StubSourceServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # The async engine opens hundreds of connections at once.
+    request_queue_size = 1024
+
+def serve_stub_source(
+    store: RecordStore,
+    host: str = "127.0.0.1",
+    port: int = 0,
+    delay: float = 0.0,
+    tail_ratio: float = 0.0,
+    tail_delay: float = 0.0,
+) -> ThreadingHTTPServer:
+    """
+    Serve ``store`` over the lookup protocol from a background thread.
+
+    A stand-in upstream for trying a ``source_url`` locally and for
+    benchmarking the fetch layer: searches resolve exactly as a local
+    ``IdentityExtractor`` would, after ``delay`` seconds of simulated
+    latency, plus ``tail_delay`` more on a random ``tail_ratio`` of
+    requests to imitate a slow tail. Port 0 picks a free port (see
+    ``server_address``); call ``shutdown`` and ``server_close`` when done.
+    """
+    from .identity_extractor import IdentityExtractor
+
+    handler = type(
+        "StubSourceHandler",
+        (_StubSourceHandler,),
+        {
+            "store": store,
+            "delay": delay,
+            "tail_ratio": tail_ratio,
+            "tail_delay": tail_delay,
+            "resolver": IdentityExtractor(store=store),
+        },
+    )
+    server = _StubSourceServer((host, port), handler)
+    threading.Thread(target=server.serve_forever, name="stub-source", daemon=True).start()
+    return server
@@ -0,0 +1,89 @@
+import argparse
+import json
+import logging
+import sys
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from extractors.identity_extractor import IdentityExtractor
+from extractors.record_store import RecordStore, open_record_store, store_from_settings
+from extractors.relations_extractor import RelationsExtractor
+from utils.serializer import RecordSerializer
+
+# Deliberately does not import main: a single trace should not pay for the
+# batch runners (asyncio, multiprocessing, metrics, checkpointing).
+ROOT_DIR = Path(__file__).resolve().parents[1]
+DEFAULT_SETTINGS_PATH = ROOT_DIR / "src" / "config" / "settings.json"
+
+def guess_search_option(value: str) -> str:
+    """Pick a search option for ``value``: email, phone (mostly digits) or name."""
+    if "@" in value:
+        return "Email Search"
+    digits = sum(ch.isdigit() for ch in value)
+    if digits >= 7 and digits * 2 >= len(value.replace(" ", "")):
+        return "Phone Search"
+    return "Name Search"
+
+def _load_settings(settings_path: Path) -> Dict[str, Any]:
+    if not settings_path.exists():
+        return {}
+    with settings_path.open("r", encoding="utf-8") as f:
+        return json.load(f)
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Trace a single query and print the result, without starting a batch run.",
+    )
+    parser.add_argument("value", help="name, phone, email or address to look up")
+    parser.add_argument(
+        "--option",
+        help="search option, e.g. \"Address Search\" (default: guessed from the value)",
+    )
+    parser.add_argument(
+        "--index",
+        type=Path,
+        help="prebuilt record index to query (.stidx for marshal, .stsnap for a snapshot, "
+        "otherwise SQLite); defaults to the record_store in settings.json",
+    )
+    parser.add_argument(
+        "--fuzzy",
+        type=float,
+        help="fuzzy name match threshold (default: fuzzy_threshold in settings.json)",
+    )
+    parser.add_argument("--settings", type=Path, default=DEFAULT_SETTINGS_PATH)
+    parser.add_argument("--log-level", default="ERROR")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(
+        level=getattr(logging, args.log_level.upper(), logging.ERROR),
+        format="%(asctime)s [%(levelname)s] %(name)s - %(message)s",
+    )
+    logger = logging.getLogger("lookup")
+
+    try:
+        settings = _load_settings(args.settings)
+        store: RecordStore
+        if args.index is not None:
+            store = open_record_store(args.index)
+        else:
+            store = store_from_settings(settings, ROOT_DIR, IdentityExtractor._build_static_dataset())
+    except (OSError, ValueError) as exc:
+        logger.error("Failed to open record store: %s", exc)
+        return 1
+
+    threshold = args.fuzzy if args.fuzzy is not None else settings.get("fuzzy_threshold")
+    option = args.option or guess_search_option(args.value)
+    try:
+        extractor = IdentityExtractor(store=store, fuzzy_threshold=threshold)
+        record = RelationsExtractor().enrich_relations(extractor.lookup(option, args.value))
+    except LookupError:
+        # The extractor has already logged the miss.
+        return 1
+    finally:
+        store.close()
+
+    print(RecordSerializer(indent=4).dumps(record))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,17 +1,46 @@
-thonimport json
+import argparse
+import asyncio
+import contextlib
+import itertools
+import json
 import logging
+import multiprocessing
+import queue
 import sys
-from concurrent.futures import ThreadPoolExecutor, as_completed
+import time
 from pathlib import Path
-from typing import Any, Dict, List
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
 
-from utils.data_parser import load_queries, SearchQuery
-from utils.formatter import write_results, pretty_print_result
-from extractors.identity_extractor import IdentityExtractor
+from utils.checkpoint import CheckpointJournal, checkpoint_from_settings
+from utils.data_parser import iter_queries, SearchQuery
+from utils.console import OUTPUT_MODES, ConsoleOutput, console_from_settings, should_render
+from utils.formatter import result_writer_for
+from utils.http_pool import DEFAULT_MAX_PER_HOST
+from utils.log_pipeline import QUERY_LOGGER, TEXT_FORMAT, configure_logging
+from utils.lookup_cache import LookupCache, cache_from_settings
+from utils.metrics import Metrics, metrics_from_settings
+from utils.scheduler import SearchRateLimiter, run_async_bounded, scheduler_from_settings
+from utils.serializer import RecordSerializer
+from utils.sharding import ReorderBuffer, shard_for
+from extractors.async_identity_extractor import (
+    DEFAULT_MAX_CONCURRENCY,
+    DEFAULT_TIMEOUT,
+    AsyncIdentityExtractor,
+)
+from extractors.entity_resolver import EntityResolver, resolver_from_settings
+from extractors.federated_source import source_from_settings
+from extractors.identity_extractor import IdentityExtractor, LookupMiss, PersonRecord
+from extractors.record_store import normalize_key, store_from_settings
+from extractors.relation_graph import RelationGraph
 from extractors.relations_extractor import RelationsExtractor
 
 ROOT_DIR = Path(__file__).resolve().parents[1]
 DEFAULT_SETTINGS_PATH = ROOT_DIR / "src" / "config" / "settings.json"
+ENGINES = ("threads", "async")
+DEFAULT_SHARD_BATCH_SIZE = 64
+
+# (index, encoded record, printed record, record state, error, is miss)
+ShardResult = Tuple[int, Any, Optional[str], Optional[List[Any]], Optional[str], bool]
 
 def load_settings(settings_path: Path) -> Dict[str, Any]:
     if not settings_path.exists():
@@ -30,107 +59,905 @@ def load_settings(settings_path: Path) -> Dict[str, Any]:
 
     return data
 
-def configure_logging(level_name: str) -> None:
-    level = getattr(logging, level_name.upper(), logging.INFO)
-    logging.basicConfig(
-        level=level,
-        format="%(asctime)s [%(levelname)s] %(name)s - %(message)s",
-    )
-    logging.debug("Logging configured at %s level", level_name)
-
 def process_query(
     query: SearchQuery,
     identity_extractor: IdentityExtractor,
     relations_extractor: RelationsExtractor,
-) -> Dict[str, Any]:
-    logger = logging.getLogger("process_query")
+    relation_graph: Optional[RelationGraph] = None,
+    metrics: Optional[Metrics] = None,
+) -> PersonRecord:
+    logger = logging.getLogger(f"{QUERY_LOGGER}.process_query")
     logger.debug("Processing query: %s", query)
 
     person_record = identity_extractor.lookup(query.search_option, query.input_value)
-    enriched_record = relations_extractor.enrich_relations(person_record)
-    result_dict = enriched_record.to_dict()
+    if metrics is None:
+        enriched_record = relations_extractor.enrich_relations(person_record)
+    else:
+        with metrics.timer("enrich"):
+            enriched_record = relations_extractor.enrich_relations(person_record)
+    if relation_graph is not None:
+        relation_graph.add_record(enriched_record)
 
     logger.info(
         "Processed query '%s' (%s) successfully",
         query.input_value,
         query.search_option,
     )
-    return result_dict
+    return enriched_record
+
+async def process_query_async(
+    query: SearchQuery,
+    identity_extractor: AsyncIdentityExtractor,
+    relations_extractor: RelationsExtractor,
+    relation_graph: Optional[RelationGraph] = None,
+    metrics: Optional[Metrics] = None,
+) -> PersonRecord:
+    logger = logging.getLogger(f"{QUERY_LOGGER}.process_query")
+    logger.debug("Processing query: %s", query)
+
+    person_record = await identity_extractor.alookup(query.search_option, query.input_value)
+    if metrics is None:
+        enriched_record = relations_extractor.enrich_relations(person_record)
+    else:
+        with metrics.timer("enrich"):
+            enriched_record = relations_extractor.enrich_relations(person_record)
+    if relation_graph is not None:
+        relation_graph.add_record(enriched_record)
+
+    logger.info(
+        "Processed query '%s' (%s) successfully",
+        query.input_value,
+        query.search_option,
+    )
+    return enriched_record
+
+def _report_failure(query: SearchQuery, exc: BaseException) -> None:
+    logging.getLogger("main").error(
+        "Failed to process query '%s' (%s): %s",
+        query.input_value,
+        query.search_option,
+        exc,
+    )
+
+def _pending(
+    queries: Iterable[SearchQuery],
+    journal: Optional[CheckpointJournal],
+    metrics: Optional[Metrics] = None,
+) -> Iterator[Tuple[int, SearchQuery]]:
+    """Number the queries by input position, skipping checkpointed ones."""
+    for idx, query in enumerate(queries):
+        if journal is None or not journal.is_done(idx):
+            yield idx, query
+        elif metrics is not None:
+            metrics.skipped += 1
+
+def _write_record(writer: Any, record: PersonRecord, metrics: Optional[Metrics]) -> None:
+    if metrics is None:
+        writer.write_record(record)
+        return
+    with metrics.timer("serialize"):
+        item = writer.encode(record)
+    with metrics.timer("write"):
+        writer.write_encoded(item)
+
+def _emit(
+    writer: Any,
+    resolver: Optional[EntityResolver],
+    idx: int,
+    record: PersonRecord,
+    metrics: Optional[Metrics],
+) -> None:
+    """Write a result, or hold it for entity resolution at the end of the run."""
+    if resolver is None:
+        _write_record(writer, record, metrics)
+    else:
+        resolver.add(idx, record)
+
+def _result_writer(
+    output_path: Path, settings: Dict[str, Any], resolver: Optional[EntityResolver]
+) -> Any:
+    return result_writer_for(
+        output_path,
+        matched_queries=resolver is not None,
+        match_scores=settings.get("fuzzy_threshold") is not None,
+    )
+
+def _finish_output(writer: Any, resolver: Optional[EntityResolver]) -> int:
+    """Write the resolved people, if resolving; returns the results produced."""
+    if resolver is None:
+        return writer.count
+    for record in resolver.resolve():
+        writer.write_record(record)
+    return len(resolver)
+
+def _replay_checkpoint(
+    journal: CheckpointJournal,
+    writer: Any,
+    relation_graph: Optional[RelationGraph] = None,
+    resolver: Optional[EntityResolver] = None,
+) -> int:
+    """Write checkpointed results to the fresh output; returns the replayed misses."""
+    misses = 0
+    replayed = 0
+    for idx, state, _ in journal.replay():
+        if state is None:
+            misses += 1
+            continue
+        record = PersonRecord.from_state(state)
+        _emit(writer, resolver, idx, record, None)
+        replayed += 1
+        if relation_graph is not None:
+            relation_graph.add_record(record)
+
+    if journal.resumed:
+        logging.getLogger("main").info(
+            "Replayed %d checkpointed result(s) and %d miss(es)", replayed, misses
+        )
+    return misses
+
+def _journal_outcome(
+    journal: Optional[CheckpointJournal],
+    idx: int,
+    record: Optional[PersonRecord] = None,
+    exc: Optional[BaseException] = None,
+) -> None:
+    if journal is None:
+        return
+    if record is not None:
+        journal.record_success(idx, record.to_state())
+    elif isinstance(exc, LookupError):
+        # Misses are final; other errors are left out so a resume retries them.
+        journal.record_miss(idx, str(exc))
+
+def _async_source_url(settings: Dict[str, Any]) -> Optional[str]:
+    """
+    The URL the async engine queries itself, or None to run lookups through
+    the local extractor, which is where a ``federation`` source lives.
+    """
+    if (settings.get("federation") or {}).get("sources"):
+        return None
+    return settings.get("source_url")
+
+def run_threaded(
+    queries: Iterable[SearchQuery],
+    settings: Dict[str, Any],
+    identity_extractor: IdentityExtractor,
+    relations_extractor: RelationsExtractor,
+    output_path: Path,
+    relation_graph: Optional[RelationGraph] = None,
+    journal: Optional[CheckpointJournal] = None,
+    metrics: Optional[Metrics] = None,
+    console: Optional[ConsoleOutput] = None,
+    resolver: Optional[EntityResolver] = None,
+) -> Tuple[int, int]:
+    """
+    Process queries on a bounded thread pool; returns (succeeded, failed).
+
+    With a ``journal``, checkpointed results are replayed first, only the
+    remaining queries run, and each outcome is journaled as it completes.
+    With ``metrics``, stage times and outcomes of the new queries are recorded.
+    New results are handed to ``console`` (if any) for display. With a
+    ``resolver``, results are collected instead of written as they come, and
+    the output gets one merged record per person once all queries are done.
+    """
+    logger = logging.getLogger("main")
+    scheduler = scheduler_from_settings(settings)
+    failed = 0
+
+    logger.info(
+        "Processing queries using up to %d workers (%d in flight)",
+        scheduler.max_workers,
+        scheduler.max_in_flight,
+    )
 
-def main() -> int:
+    def run_query(item: Tuple[int, SearchQuery]) -> PersonRecord:
+        return process_query(
+            item[1], identity_extractor, relations_extractor, relation_graph, metrics
+        )
+
+    with _result_writer(output_path, settings, resolver) as writer:
+        if journal is not None:
+            failed += _replay_checkpoint(journal, writer, relation_graph, resolver)
+
+        completed = scheduler.run(
+            run_query,
+            _pending(queries, journal, metrics),
+            limit_key=lambda item: item[1].search_option,
+        )
+        for (idx, query), future in completed:
+            try:
+                record = future.result()
+                _emit(writer, resolver, idx, record, metrics)
+                _journal_outcome(journal, idx, record)
+                if console is not None:
+                    console.show(idx, record)
+            except Exception as exc:
+                _report_failure(query, exc)
+                _journal_outcome(journal, idx, exc=exc)
+                failed += 1
+                if metrics is not None:
+                    metrics.record_outcome(False)
+            else:
+                if metrics is not None:
+                    metrics.record_outcome(True)
+        succeeded = _finish_output(writer, resolver)
+
+    if scheduler.feed_error is not None:
+        logger.error("Input was only partially processed: %s", scheduler.feed_error)
+        failed += 1
+        if journal is not None:
+            journal.close()
+    elif journal is not None:
+        journal.complete()
+
+    if identity_extractor.inflight.coalesced:
+        logger.info(
+            "Coalesced %d duplicate in-flight lookup(s)",
+            identity_extractor.inflight.coalesced,
+        )
+
+    return succeeded, failed
+
+def _max_idle_per_host(settings: Dict[str, Any]) -> int:
+    """Idle keep-alive connections per host, as for ``utils.http_pool.pool_from_settings``."""
+    config = settings.get("http_pool") or {}
+    return int(config.get("max_idle_per_host", config.get("max_per_host", DEFAULT_MAX_PER_HOST)))
+
+async def run_async(
+    queries: Iterable[SearchQuery],
+    settings: Dict[str, Any],
+    local_extractor: IdentityExtractor,
+    relations_extractor: RelationsExtractor,
+    output_path: Path,
+    cache: Optional[LookupCache] = None,
+    relation_graph: Optional[RelationGraph] = None,
+    journal: Optional[CheckpointJournal] = None,
+    metrics: Optional[Metrics] = None,
+    console: Optional[ConsoleOutput] = None,
+    resolver: Optional[EntityResolver] = None,
+) -> Tuple[int, int]:
+    """
+    Process queries on the asyncio engine; returns (succeeded, failed).
+
+    ``async_concurrency`` caps concurrent upstream requests, at most twice that
+    many lookups are in flight, and ``request_timeout`` bounds each request.
+    ``journal``, ``metrics``, ``console`` and ``resolver`` are used as in
+    ``run_threaded``.
+    """
+    logger = logging.getLogger("main")
+    concurrency = int(settings.get("async_concurrency", DEFAULT_MAX_CONCURRENCY))
+    identity_extractor = AsyncIdentityExtractor(
+        source_url=_async_source_url(settings),
+        local=local_extractor,
+        cache=cache,
+        timeout=float(settings.get("request_timeout", DEFAULT_TIMEOUT)),
+        max_concurrency=concurrency,
+        max_idle_per_host=_max_idle_per_host(settings),
+    )
+    rate_limiter = SearchRateLimiter(settings.get("search_rate_limits"))
+    failed = 0
+
+    logger.info("Processing queries on the asyncio engine (concurrency %d)", concurrency)
+
+    async def run_query(item: Tuple[int, SearchQuery]) -> PersonRecord:
+        return await process_query_async(
+            item[1], identity_extractor, relations_extractor, relation_graph, metrics
+        )
+
+    partial = False
+    with _result_writer(output_path, settings, resolver) as writer:
+        if journal is not None:
+            failed += _replay_checkpoint(journal, writer, relation_graph, resolver)
+
+        completed = run_async_bounded(
+            run_query,
+            _pending(queries, journal, metrics),
+            max_in_flight=concurrency * 2,
+            rate_limiter=rate_limiter or None,
+            limit_key=lambda item: item[1].search_option,
+        )
+        try:
+            async for (idx, query), task in completed:
+                try:
+                    record = task.result()
+                    _emit(writer, resolver, idx, record, metrics)
+                    _journal_outcome(journal, idx, record)
+                    if console is not None:
+                        console.show(idx, record)
+                except Exception as exc:
+                    _report_failure(query, exc)
+                    _journal_outcome(journal, idx, exc=exc)
+                    failed += 1
+                    if metrics is not None:
+                        metrics.record_outcome(False)
+                else:
+                    if metrics is not None:
+                        metrics.record_outcome(True)
+        except Exception as exc:
+            logger.error("Input was only partially processed: %s", exc)
+            failed += 1
+            partial = True
+        succeeded = _finish_output(writer, resolver)
+
+    if journal is not None:
+        if partial:
+            journal.close()
+        else:
+            journal.complete()
+
+    await identity_extractor.aclose()
+    # Remote lookups coalesce in the async extractor, local ones in the executor.
+    coalesced = identity_extractor.inflight.coalesced + local_extractor.inflight.coalesced
+    if coalesced:
+        logger.info("Coalesced %d duplicate in-flight lookup(s)", coalesced)
+
+    return succeeded, failed
+
+def _shard_outcome(
+    idx: int,
+    record: Optional[PersonRecord],
+    exc: Optional[BaseException],
+    encoder: Any,
+    pretty: RecordSerializer,
+    with_state: bool,
+    render: bool,
+    metrics: Optional[Metrics] = None,
+) -> ShardResult:
+    if record is None:
+        return idx, None, None, None, f"{exc}", isinstance(exc, LookupError)
+    state = record.to_state() if with_state else None
+    if metrics is None:
+        encoded = encoder.encode(record)
+    else:
+        with metrics.timer("serialize"):
+            encoded = encoder.encode(record)
+    formatted = pretty.dumps(record) if render else None
+    return idx, encoded, formatted, state, None, False
+
+def _shard_worker(
+    shard: int,
+    settings: Dict[str, Any],
+    output_path: Path,
+    with_state: bool,
+    with_metrics: bool,
+    console_mode: str,
+    sample_every: int,
+    inbox: Any,
+    outbox: Any,
+) -> None:
+    """
+    Worker process of ``run_sharded``: runs its own lookup pipeline.
+
+    Receives batches of ``(index, search option, input value)`` until a
+    ``None`` sentinel and answers each batch with a list of ``ShardResult``
+    tuples; records are already encoded for the output writer (and
+    formatted, if the console mode shows them), so the parent only has to
+    append them. Each answer also carries
+    the batch's stage timings (``Metrics.drain_stages``) when
+    ``with_metrics`` is set, else None.
+    """
+    configure_logging(settings.get("log_level", "INFO"), settings.get("logging"))
+    logger = logging.getLogger("main")
+
+    # Commit every cache write: the cache file is shared with the other shards.
+    cache = cache_from_settings(settings, ROOT_DIR, commit_every=1)
+    store = store_from_settings(settings, ROOT_DIR, IdentityExtractor._build_static_dataset())
+    source = source_from_settings(settings, store)
+    metrics = Metrics() if with_metrics else None
+    fuzzy_threshold = settings.get("fuzzy_threshold")
+    identity_extractor = IdentityExtractor(
+        cache=cache,
+        store=store,
+        fuzzy_threshold=float(fuzzy_threshold) if fuzzy_threshold is not None else None,
+        metrics=metrics,
+        source=source,
+    )
+    relations_extractor = RelationsExtractor()
+    encoder = result_writer_for(output_path)
+    pretty = RecordSerializer(indent=4)
+
+    def answer(results: List[ShardResult]) -> None:
+        outbox.put((results, metrics.drain_stages() if metrics is not None else None))
+
+    def run_batch_sync(batch: List[Tuple[int, str, str]]) -> List[ShardResult]:
+        # The whole batch goes through the bulk lookup and enrichment paths.
+        found = identity_extractor.lookup_many([(option, value) for _, option, value in batch])
+        hits = [entry for entry in found if isinstance(entry, PersonRecord)]
+        if metrics is None or not hits:
+            enriched = iter(relations_extractor.enrich_many(hits))
+        else:
+            start = time.perf_counter_ns()
+            enriched = iter(relations_extractor.enrich_many(hits))
+            share = (time.perf_counter_ns() - start) // len(hits)
+            for _ in hits:
+                metrics.observe("enrich", share)
+
+        results = []
+        for (idx, _, _), entry in zip(batch, found):
+            if isinstance(entry, LookupMiss):
+                exc = entry.to_exception()
+                results.append(_shard_outcome(idx, None, exc, encoder, pretty, with_state, False))
+            else:
+                render = should_render(console_mode, sample_every, idx)
+                results.append(
+                    _shard_outcome(
+                        idx, next(enriched), None, encoder, pretty, with_state, render, metrics
+                    )
+                )
+        return results
+
+    remote_coalesced = 0
+
+    async def run_async_loop() -> None:
+        nonlocal remote_coalesced
+        async_extractor = AsyncIdentityExtractor(
+            source_url=_async_source_url(settings),
+            local=identity_extractor,
+            cache=cache,
+            timeout=float(settings.get("request_timeout", DEFAULT_TIMEOUT)),
+            max_concurrency=int(settings.get("async_concurrency", DEFAULT_MAX_CONCURRENCY)),
+            max_idle_per_host=_max_idle_per_host(settings),
+        )
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await loop.run_in_executor(None, inbox.get)
+            if batch is None:
+                await async_extractor.aclose()
+                remote_coalesced = async_extractor.inflight.coalesced
+                return
+            queries = [SearchQuery(option, value) for _, option, value in batch]
+            records = await asyncio.gather(
+                *(
+                    process_query_async(query, async_extractor, relations_extractor, metrics=metrics)
+                    for query in queries
+                ),
+                return_exceptions=True,
+            )
+            answer(
+                [
+                    _shard_outcome(idx, None, record, encoder, pretty, with_state, False)
+                    if isinstance(record, BaseException)
+                    else _shard_outcome(
+                        idx,
+                        record,
+                        None,
+                        encoder,
+                        pretty,
+                        with_state,
+                        should_render(console_mode, sample_every, idx),
+                        metrics,
+                    )
+                    for (idx, _, _), record in zip(batch, records)
+                ]
+            )
+
+    try:
+        if str(settings.get("engine", "threads")).lower() == "async":
+            asyncio.run(run_async_loop())
+        else:
+            for batch in iter(inbox.get, None):
+                answer(run_batch_sync(batch))
+    finally:
+        store.close()
+        if source is not None:
+            source.close()
+        if cache is not None:
+            cache.close()
+            logger.info(
+                "Shard %d lookup cache: %d hit(s), %d miss(es)",
+                shard,
+                cache.stats.hits,
+                cache.stats.misses,
+            )
+        coalesced = identity_extractor.inflight.coalesced + remote_coalesced
+        if coalesced:
+            logger.info("Shard %d coalesced %d duplicate in-flight lookup(s)", shard, coalesced)
+
+def run_sharded(
+    queries: Iterable[SearchQuery],
+    settings: Dict[str, Any],
+    output_path: Path,
+    processes: int,
+    relation_graph: Optional[RelationGraph] = None,
+    journal: Optional[CheckpointJournal] = None,
+    metrics: Optional[Metrics] = None,
+    console: Optional[ConsoleOutput] = None,
+    resolver: Optional[EntityResolver] = None,
+) -> Tuple[int, int]:
+    """
+    Process queries on ``processes`` worker processes; returns (succeeded, failed).
+
+    Each query goes to the shard picked by hashing its normalized cache key,
+    so repeated keys always meet the same worker's in-memory cache and
+    single-flight. Queries travel in batches of ``shard_batch_size``; at most
+    ``processes * shard_batch_size * 4`` are outstanding. Workers send back
+    records already encoded for the writer, and a reorder buffer writes them
+    in input order, so the output is deterministic. ``journal``, ``metrics``,
+    ``console`` and ``resolver`` are used as in ``run_threaded``; workers ship their
+    stage timings back with each batch and only format the results the
+    console will show.
+    """
+    logger = logging.getLogger("main")
+    batch_size = max(1, int(settings.get("shard_batch_size", DEFAULT_SHARD_BATCH_SIZE)))
+    max_outstanding = processes * batch_size * 4
+    with_state = journal is not None or relation_graph is not None or resolver is not None
+    context = multiprocessing.get_context("spawn")
+    inboxes = [context.Queue(maxsize=4) for _ in range(processes)]
+    outbox = context.Queue()
+    workers = [
+        context.Process(
+            target=_shard_worker,
+            args=(
+                shard,
+                settings,
+                output_path,
+                with_state,
+                metrics is not None,
+                console.mode if console is not None else "quiet",
+                console.sample_every if console is not None else 1,
+                inboxes[shard],
+                outbox,
+            ),
+            name=f"shard-{shard}",
+            daemon=True,
+        )
+        for shard in range(processes)
+    ]
+    batches: List[List[Tuple[int, str, str]]] = [[] for _ in range(processes)]
+    waiting: Dict[int, SearchQuery] = {}
+    reorder: ReorderBuffer[ShardResult] = ReorderBuffer()
+    failed = 0
+
+    logger.info("Processing queries on %d worker processes", processes)
+    if metrics is not None:
+        metrics.gauge("reorder_buffer", lambda: len(reorder))
+
+    def check_workers() -> None:
+        dead = [worker.name for worker in workers if not worker.is_alive()]
+        if dead:
+            raise RuntimeError(f"Worker process(es) exited unexpectedly: {', '.join(dead)}")
+
+    def put(shard: int, batch: Optional[List[Tuple[int, str, str]]]) -> None:
+        # A dead worker never drains its inbox: don't block on it forever.
+        while True:
+            try:
+                inboxes[shard].put(batch, timeout=1.0)
+                return
+            except queue.Full:
+                check_workers()
+
+    def send(shard: int) -> None:
+        if batches[shard]:
+            put(shard, batches[shard])
+            batches[shard] = []
+
+    def collect(writer: Any) -> None:
+        nonlocal failed
+        while True:
+            try:
+                results, stages = outbox.get(timeout=1.0)
+                break
+            except queue.Empty:
+                check_workers()
+
+        if stages and metrics is not None:
+            metrics.merge_stages(stages)
+        for result in results:
+            reorder.put(result[0], result)
+        for idx, encoded, formatted, state, error, miss in reorder.pop_ready():
+            query = waiting.pop(idx)
+            if error is not None:
+                exc: Exception = LookupError(error) if miss else RuntimeError(error)
+                _report_failure(query, exc)
+                _journal_outcome(journal, idx, exc=exc)
+                failed += 1
+                if metrics is not None:
+                    metrics.record_outcome(False)
+                continue
+            if resolver is not None:
+                resolver.add(idx, PersonRecord.from_state(state))
+            elif metrics is None:
+                writer.write_encoded(encoded)
+            else:
+                with metrics.timer("write"):
+                    writer.write_encoded(encoded)
+            if metrics is not None:
+                metrics.record_outcome(True)
+            if state is not None:
+                if journal is not None:
+                    journal.record_success(idx, state)
+                if relation_graph is not None:
+                    relation_graph.add_record(PersonRecord.from_state(state))
+            if formatted is not None and console is not None:
+                console.show_text(idx, formatted)
+
+    for worker in workers:
+        worker.start()
+
+    feed_error: Optional[BaseException] = None
+    try:
+        with _result_writer(output_path, settings, resolver) as writer:
+            if journal is not None:
+                failed += _replay_checkpoint(journal, writer, relation_graph, resolver)
+
+            try:
+                for idx, query in enumerate(queries):
+                    if journal is not None and journal.is_done(idx):
+                        reorder.skip(idx)
+                        if metrics is not None:
+                            metrics.skipped += 1
+                        continue
+                    key = f"{query.search_option.strip().lower()}\0{normalize_key(query.input_value)}"
+                    shard = shard_for(key, processes)
+                    batches[shard].append((idx, query.search_option, query.input_value))
+                    waiting[idx] = query
+                    if len(batches[shard]) >= batch_size:
+                        send(shard)
+                    while len(waiting) >= max_outstanding:
+                        # Partial batches may hold the next result in order.
+                        for pending_shard in range(processes):
+                            send(pending_shard)
+                        collect(writer)
+            except Exception as exc:
+                feed_error = exc
+
+            for shard in range(processes):
+                send(shard)
+                put(shard, None)
+            while waiting:
+                collect(writer)
+            succeeded = _finish_output(writer, resolver)
+    finally:
+        for worker in workers:
+            worker.join(timeout=5.0)
+            if worker.is_alive():
+                worker.terminate()
+
+    if feed_error is not None:
+        logger.error("Input was only partially processed: %s", feed_error)
+        failed += 1
+        if journal is not None:
+            journal.close()
+    elif journal is not None:
+        journal.complete()
+
+    return succeeded, failed
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Run the skip trace batch from settings.json.")
+    parser.add_argument(
+        "--processes",
+        type=int,
+        default=None,
+        help="shard queries across N worker processes (default: settings 'processes', or 1)",
+    )
+    parser.add_argument(
+        "--output-mode",
+        choices=OUTPUT_MODES,
+        default=None,
+        help="console output: every result (full), every Nth (sampled), a final summary line, "
+        "or nothing (default: settings 'console.mode', or full)",
+    )
+    args = parser.parse_args(argv)
     logger = logging.getLogger("main")
 
     try:
         settings = load_settings(DEFAULT_SETTINGS_PATH)
     except Exception as exc:
-        logging.basicConfig(
-            level=logging.INFO,
-            format="%(asctime)s [%(levelname)s] %(name)s - %(message)s",
-        )
+        logging.basicConfig(level=logging.INFO, format=TEXT_FORMAT)
         logging.error("Failed to load settings: %s", exc)
         return 1
 
-    configure_logging(settings.get("log_level", "INFO"))
+    try:
+        configure_logging(settings.get("log_level", "INFO"), settings.get("logging"))
+    except Exception as exc:
+        logging.basicConfig(level=logging.INFO, format=TEXT_FORMAT)
+        logging.error("Invalid logging settings: %s", exc)
+        return 1
 
     input_path = ROOT_DIR / settings["input_file"]
     output_path = ROOT_DIR / settings["output_file"]
-    max_workers = int(settings.get("max_workers", 4))
+    engine = str(settings.get("engine", "threads")).lower()
+    if engine not in ENGINES:
+        logger.error("Unknown engine '%s' (expected one of: %s)", engine, ", ".join(ENGINES))
+        return 1
 
     logger.info("Skip Trace Scraper starting up")
     logger.debug("Root directory: %s", ROOT_DIR)
     logger.debug("Input path: %s", input_path)
     logger.debug("Output path: %s", output_path)
-    logger.debug("Max workers: %d", max_workers)
+    logger.debug("Max workers: %d", int(settings["max_workers"]))
+
+    processes = args.processes if args.processes is not None else int(settings.get("processes", 1))
+    if processes < 1:
+        logger.error("--processes must be at least 1")
+        return 1
+
+    try:
+        console = console_from_settings(settings, args.output_mode)
+    except ValueError as exc:
+        logger.error("Invalid console settings: %s", exc)
+        return 1
 
     try:
-        queries = load_queries(input_path)
+        reporter = metrics_from_settings(settings, ROOT_DIR)
     except Exception as exc:
-        logger.error("Failed to load input queries: %s", exc)
+        logger.error("Failed to set up metrics: %s", exc)
         return 1
+    metrics = reporter.metrics if reporter is not None else None
 
-    if not queries:
-        logger.warning("No queries found in input file. Exiting.")
-        write_results([], output_path)
-        return 0
+    # Everything opened from here on is closed on the way out, whichever
+    # ``return`` is taken.
+    with contextlib.ExitStack() as resources:
+        try:
+            query_stream = iter_queries(input_path)
+            resources.callback(query_stream.close)
+            queries = query_stream
+            if metrics is not None:
+                queries = metrics.timed_iter(queries)
+            first_query = next(queries, None)
+        except Exception as exc:
+            logger.error("Failed to load input queries: %s", exc)
+            return 1
 
-    identity_extractor = IdentityExtractor()
-    relations_extractor = RelationsExtractor()
+        if first_query is None:
+            logger.warning("No queries found in input file. Exiting.")
+            with result_writer_for(output_path):
+                pass
+            return 0
+
+        # With worker processes every worker opens its own cache and store.
+        cache: Optional[LookupCache] = None
+        if processes == 1:
+            try:
+                cache = cache_from_settings(settings, ROOT_DIR)
+            except Exception as exc:
+                logger.error("Failed to open lookup cache: %s", exc)
+                return 1
+            if cache is not None:
+                resources.callback(cache.close)
 
-    results: List[Dict[str, Any]] = []
-    errors: List[str] = []
+            try:
+                store = store_from_settings(
+                    settings, ROOT_DIR, IdentityExtractor._build_static_dataset()
+                )
+            except Exception as exc:
+                logger.error("Failed to open record store: %s", exc)
+                return 1
+            resources.callback(store.close)
+
+            try:
+                source = source_from_settings(settings, store)
+            except Exception as exc:
+                logger.error("Failed to set up lookup source: %s", exc)
+                return 1
+            if source is not None:
+                resources.callback(source.close)
+
+            fuzzy_threshold = settings.get("fuzzy_threshold")
+            identity_extractor = IdentityExtractor(
+                cache=cache,
+                store=store,
+                fuzzy_threshold=float(fuzzy_threshold) if fuzzy_threshold is not None else None,
+                metrics=metrics,
+                source=source,
+            )
+            relations_extractor = RelationsExtractor()
+
+        relation_graph: Optional[RelationGraph] = None
+        graph_file = settings.get("relation_graph_file")
+        graph_path = ROOT_DIR / graph_file if graph_file else None
+        if graph_path is not None:
+            try:
+                relation_graph = (
+                    RelationGraph.load(graph_path) if graph_path.exists() else RelationGraph()
+                )
+            except Exception as exc:
+                logger.error("Failed to load relation graph: %s", exc)
+                return 1
 
-    logger.info("Processing %d queries using up to %d workers", len(queries), max_workers)
+        # Closed as soon as the run ends, before the summary below; this
+        # keeps whatever finished if the run is interrupted.
+        with contextlib.ExitStack() as run_resources:
+            try:
+                journal = checkpoint_from_settings(settings, ROOT_DIR, input_path)
+                if journal is not None:
+                    run_resources.callback(journal.close)
+                    journal.open()
+            except Exception as exc:
+                logger.error("Failed to open checkpoint journal: %s", exc)
+                return 1
 
-    with ThreadPoolExecutor(max_workers=max_workers) as executor:
-        future_to_query = {
-            executor.submit(
-                process_query,
-                query,
-                identity_extractor,
-                relations_extractor,
-            ): query
-            for query in queries
-        }
+            if reporter is not None:
+                try:
+                    reporter.start()
+                except OSError as exc:
+                    logger.error("Failed to start metrics endpoint: %s", exc)
+                    return 1
+                run_resources.callback(reporter.stop)
+                if console.renders:
+                    reporter.metrics.gauge("console_queue", lambda: console.pending)
 
-        for future in as_completed(future_to_query):
-            query = future_to_query[future]
             try:
-                result = future.result()
-                results.append(result)
-                pretty_print_result(result)
+                resolver = resolver_from_settings(settings, ROOT_DIR)
             except Exception as exc:
-                msg = f"Failed to process query '{query.input_value}' ({query.search_option}): {exc}"
-                logger.error(msg)
-                errors.append(msg)
+                logger.error("Failed to set up entity resolution: %s", exc)
+                return 1
+            if resolver is not None:
+                run_resources.callback(resolver.close)
+
+            console.start()
+            run_resources.callback(console.close)
 
-    write_results(results, output_path)
+            if processes > 1:
+                success_count, failed = run_sharded(
+                    itertools.chain([first_query], queries),
+                    settings,
+                    output_path,
+                    processes,
+                    relation_graph,
+                    journal,
+                    metrics,
+                    console,
+                    resolver,
+                )
+            elif engine == "async":
+                success_count, failed = asyncio.run(
+                    run_async(
+                        itertools.chain([first_query], queries),
+                        settings,
+                        identity_extractor,
+                        relations_extractor,
+                        output_path,
+                        cache,
+                        relation_graph,
+                        journal,
+                        metrics,
+                        console,
+                        resolver,
+                    )
+                )
+            else:
+                success_count, failed = run_threaded(
+                    itertools.chain([first_query], queries),
+                    settings,
+                    identity_extractor,
+                    relations_extractor,
+                    output_path,
+                    relation_graph,
+                    journal,
+                    metrics,
+                    console,
+                    resolver,
+                )
+
+        logger.info("Processing complete: %d success, %d failed", success_count, failed)
+        console.summary(success_count, failed)
+
+        if relation_graph is not None and graph_path is not None:
+            try:
+                relation_graph.save(graph_path)
+                logger.info(
+                    "Relation graph: %d node(s), %d edge(s) saved to %s",
+                    len(relation_graph),
+                    relation_graph.edge_count,
+                    graph_path,
+                )
+            except Exception as exc:
+                logger.error("Failed to save relation graph: %s", exc)
 
-    logger.info("Processing complete: %d success, %d failed", len(results), len(errors))
+        if cache is not None:
+            logger.info(
+                "Lookup cache: %d hit(s), %d miss(es) (%.1f%% hit rate)",
+                cache.stats.hits,
+                cache.stats.misses,
+                cache.stats.hit_rate * 100,
+            )
 
-    if errors:
+    if failed:
         logger.warning("Some queries failed to process. See logs for details.")
 
     return 0
 
 if __name__ == "__main__":
-    sys.exit(main())
\ No newline at end of file
+    sys.exit(main())
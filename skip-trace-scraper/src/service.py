@@ -0,0 +1,434 @@
+import argparse
+import json
+import logging
+import os
+import signal
+import socketserver
+import stat
+import sys
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
+from urllib.parse import parse_qs, urlsplit
+
+from extractors.federated_source import source_from_settings
+from extractors.identity_extractor import IdentityExtractor, LookupMiss, PersonRecord
+from extractors.record_store import RecordStore, store_from_settings
+from extractors.relations_extractor import RelationsExtractor
+from lookup import guess_search_option
+from main import DEFAULT_SETTINGS_PATH, ROOT_DIR, load_settings
+from utils.log_pipeline import TEXT_FORMAT, configure_logging
+from utils.lookup_cache import LookupCache, cache_from_settings
+from utils.metrics import Metrics, MetricsReporter, metrics_from_settings
+from utils.microbatch import DEFAULT_MAX_BATCH, MicroBatcher
+from utils.serializer import RecordSerializer
+
+logger = logging.getLogger("service")
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+DEFAULT_MAX_WAIT_MS = 2.0
+DEFAULT_TIMEOUT_SECONDS = 30.0
+# Largest request body accepted, and most queries in one POSTed list.
+MAX_BODY_BYTES = 1 << 20
+MAX_QUERIES_PER_REQUEST = 1000
+
+class LookupService:
+    """
+    Serve lookups from extractors, indexes and caches that stay warm.
+
+    Each request's identity lookup runs on the calling (HTTP handler)
+    thread, so concurrent requests share the cache and coalesce duplicate
+    in-flight lookups. Found records are then handed to a ``MicroBatcher``
+    that enriches relations with ``enrich_many`` and serializes whole
+    batches at a time.
+    """
+
+    def __init__(
+        self,
+        identity_extractor: IdentityExtractor,
+        relations_extractor: RelationsExtractor,
+        store: Optional[RecordStore] = None,
+        metrics: Optional[Metrics] = None,
+        max_batch: int = DEFAULT_MAX_BATCH,
+        max_wait_ms: float = DEFAULT_MAX_WAIT_MS,
+        timeout: float = DEFAULT_TIMEOUT_SECONDS,
+    ) -> None:
+        self.identity_extractor = identity_extractor
+        self.relations_extractor = relations_extractor
+        self.store = store
+        self.metrics = metrics
+        self.timeout = timeout
+        self.served = 0
+        self.misses = 0
+        self.started_at = time.monotonic()
+        self._serializer = RecordSerializer()
+        self._counts_lock = threading.Lock()
+        self.batcher: MicroBatcher[PersonRecord, bytes] = MicroBatcher(
+            self._finish_batch, max_batch=max_batch, max_wait=max_wait_ms / 1000.0, name="service-batch"
+        )
+        if metrics is not None:
+            metrics.gauge("batch_queue", lambda: self.batcher.pending)
+
+    def _finish_batch(self, records: List[PersonRecord]) -> List[bytes]:
+        metrics = self.metrics
+        if metrics is None:
+            enriched = self.relations_extractor.enrich_many(records)
+            return [self._serializer.encode(record) for record in enriched]
+
+        with metrics.timer("enrich"):
+            enriched = self.relations_extractor.enrich_many(records)
+        encoded = []
+        for record in enriched:
+            with metrics.timer("serialize"):
+                encoded.append(self._serializer.encode(record))
+        return encoded
+
+    def _resolve(self, search_option: Optional[str], input_value: str) -> "Future[bytes]":
+        option = search_option or guess_search_option(input_value)
+        try:
+            record = self.identity_extractor.lookup(option, input_value)
+        except LookupError:
+            self._count_miss()
+            raise
+        return self.batcher.submit(record)
+
+    def _count_miss(self) -> None:
+        with self._counts_lock:
+            self.misses += 1
+        if self.metrics is not None:
+            self.metrics.record_outcome(False)
+
+    def _result(self, future: "Future[bytes]", input_value: str) -> bytes:
+        try:
+            body = future.result(timeout=self.timeout)
+        except FutureTimeoutError:
+            raise TimeoutError(f"Lookup for '{input_value}' timed out after {self.timeout:g}s") from None
+        with self._counts_lock:
+            self.served += 1
+        if self.metrics is not None:
+            self.metrics.record_outcome(True)
+        return body
+
+    def lookup(self, search_option: Optional[str], input_value: str) -> bytes:
+        """
+        Return the JSON-encoded enriched record for one query.
+
+        ``search_option`` may be None to guess it from the value. Raises
+        LookupError on a miss and TimeoutError if enrichment does not finish
+        within ``timeout`` seconds.
+        """
+        return self._result(self._resolve(search_option, input_value), input_value)
+
+    def lookup_many(
+        self, queries: Sequence[Tuple[Optional[str], str]]
+    ) -> List[Union[bytes, Exception]]:
+        """
+        ``lookup`` for several queries, returning each body or its error.
+
+        The identities are resolved with one ``lookup_many`` call and all
+        found records are submitted before any is waited on, so they are
+        enriched and serialized together.
+        """
+        found = self.identity_extractor.lookup_many(
+            [(option or guess_search_option(value), value) for option, value in queries]
+        )
+        pending: List[Tuple[str, Union["Future[bytes]", Exception]]] = []
+        for (_, value), entry in zip(queries, found):
+            if isinstance(entry, LookupMiss):
+                exc = entry.to_exception()
+                if isinstance(exc, LookupError):
+                    self._count_miss()
+                pending.append((value, exc))
+                continue
+            try:
+                pending.append((value, self.batcher.submit(entry)))
+            except Exception as exc:
+                pending.append((value, exc))
+
+        results: List[Union[bytes, Exception]] = []
+        for value, entry in pending:
+            if isinstance(entry, Exception):
+                results.append(entry)
+                continue
+            try:
+                results.append(self._result(entry, value))
+            except Exception as exc:
+                results.append(exc)
+        return results
+
+    def health(self) -> Dict[str, Any]:
+        batcher = self.batcher
+        return {
+            "status": "ok",
+            "uptime_seconds": round(time.monotonic() - self.started_at, 3),
+            "records": len(self.store) if self.store is not None else None,
+            "served": self.served,
+            "misses": self.misses,
+            "coalesced": self.identity_extractor.inflight.coalesced,
+            "batches": batcher.batches,
+            "mean_batch_size": round(batcher.items / batcher.batches, 2) if batcher.batches else 0.0,
+            "batch_queue": batcher.pending,
+        }
+
+    def close(self) -> None:
+        self.batcher.close()
+
+def _query_from_json(item: Any) -> Tuple[Optional[str], str]:
+    """``(search option, input value)`` from one JSON query object."""
+    if not isinstance(item, dict):
+        raise ValueError("each query must be a JSON object")
+    option = item.get("search_option", item.get("Search Option"))
+    value = item.get("input_value", item.get("Input Value"))
+    if not isinstance(value, str) or not value.strip():
+        raise ValueError("'input_value' must be a non-empty string")
+    if option is not None and (not isinstance(option, str) or not option.strip()):
+        raise ValueError("'search_option' must be a non-empty string")
+    return option, value.strip()
+
+class _ServiceHandler(BaseHTTPRequestHandler):
+    service: LookupService
+    protocol_version = "HTTP/1.1"
+
+    def _send(self, status: int, body: Union[bytes, Dict[str, Any]]) -> None:
+        if isinstance(body, dict):
+            body = json.dumps(body, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _error(self, exc: Exception, input_value: str) -> Tuple[int, bytes]:
+        if isinstance(exc, LookupError):
+            status, message = 404, str(exc)
+        elif isinstance(exc, TimeoutError):
+            status, message = 503, str(exc)
+        else:
+            logger.error("Lookup for '%s' failed: %s", input_value, exc, exc_info=exc)
+            status, message = 500, f"lookup failed: {exc}"
+        body = json.dumps({"status": status, "error": message}, ensure_ascii=False)
+        return status, body.encode("utf-8")
+
+    def _answer(self, option: Optional[str], value: str) -> Tuple[int, bytes]:
+        try:
+            return 200, self.service.lookup(option, value)
+        except Exception as exc:
+            return self._error(exc, value)
+
+    def _answer_many(self, queries: Sequence[Tuple[Optional[str], str]]) -> bytes:
+        parts = []
+        for (_, value), result in zip(queries, self.service.lookup_many(queries)):
+            parts.append(result if isinstance(result, bytes) else self._error(result, value)[1])
+        return b"[" + b",".join(parts) + b"]"
+
+    def do_GET(self) -> None:
+        url = urlsplit(self.path)
+        if url.path == "/health":
+            self._send(200, self.service.health())
+            return
+        if url.path == "/metrics" and self.service.metrics is not None:
+            body = self.service.metrics.prometheus().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            return
+        if url.path != "/lookup":
+            self._send(404, {"status": 404, "error": f"unknown path {url.path}"})
+            return
+
+        params = parse_qs(url.query)
+        value = (params.get("value") or params.get("input_value") or [""])[0].strip()
+        option = (params.get("option") or params.get("search_option") or [None])[0]
+        if not value:
+            self._send(400, {"status": 400, "error": "missing 'value' query parameter"})
+            return
+        self._send(*self._answer(option, value))
+
+    def do_POST(self) -> None:
+        if urlsplit(self.path).path != "/lookup":
+            self._send(404, {"status": 404, "error": f"unknown path {self.path}"})
+            return
+        try:
+            length = int(self.headers.get("Content-Length", ""))
+        except ValueError:
+            self._send(411, {"status": 411, "error": "Content-Length required"})
+            return
+        if length > MAX_BODY_BYTES:
+            self._send(413, {"status": 413, "error": f"request body over {MAX_BODY_BYTES} bytes"})
+            return
+
+        try:
+            payload = json.loads(self.rfile.read(length))
+            if isinstance(payload, list):
+                if len(payload) > MAX_QUERIES_PER_REQUEST:
+                    raise ValueError(f"at most {MAX_QUERIES_PER_REQUEST} queries per request")
+                queries = [_query_from_json(item) for item in payload]
+            else:
+                query = _query_from_json(payload)
+        except ValueError as exc:
+            self._send(400, {"status": 400, "error": f"invalid request: {exc}"})
+            return
+
+        if isinstance(payload, list):
+            self._send(200, self._answer_many(queries))
+        else:
+            self._send(*self._answer(*query))
+
+    def log_message(self, format: str, *args: Any) -> None:
+        logger.debug("%s " + format, self.client_address or "unix", *args)
+
+class _UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+def _is_socket(path: Path) -> bool:
+    try:
+        return stat.S_ISSOCK(path.lstat().st_mode)
+    except FileNotFoundError:
+        return False
+
+def make_server(
+    service: LookupService,
+    host: str = DEFAULT_HOST,
+    port: int = DEFAULT_PORT,
+    unix_socket: Optional[Path] = None,
+) -> socketserver.BaseServer:
+    """
+    Bind an HTTP server for ``service`` on ``host:port`` or a Unix socket.
+
+    A stale socket left at ``unix_socket`` is replaced; any other file there
+    raises FileExistsError.
+    """
+    # Headers and body go out as separate writes; without TCP_NODELAY
+    # keep-alive clients stall on delayed ACKs (~40ms per request).
+    handler = type(
+        "ServiceHandler",
+        (_ServiceHandler,),
+        {"service": service, "disable_nagle_algorithm": unix_socket is None},
+    )
+    if unix_socket is not None:
+        if _is_socket(unix_socket):
+            unix_socket.unlink()
+        elif os.path.lexists(unix_socket):
+            raise FileExistsError(f"{unix_socket} exists and is not a socket")
+        return _UnixHTTPServer(str(unix_socket), handler)
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Serve lookups over a local HTTP/JSON API with warm indexes and caches.",
+    )
+    parser.add_argument("--host", help=f"address to bind (default: settings 'service.host', or {DEFAULT_HOST})")
+    parser.add_argument("--port", type=int, help=f"port to bind; 0 picks a free one (default: {DEFAULT_PORT})")
+    parser.add_argument("--unix-socket", type=Path, help="serve on this Unix socket instead of TCP")
+    parser.add_argument("--settings", type=Path, default=DEFAULT_SETTINGS_PATH)
+    args = parser.parse_args(argv)
+
+    try:
+        settings = load_settings(args.settings)
+    except Exception as exc:
+        logging.basicConfig(level=logging.INFO, format=TEXT_FORMAT)
+        logging.error("Failed to load settings: %s", exc)
+        return 1
+
+    try:
+        configure_logging(settings.get("log_level", "INFO"), settings.get("logging"))
+    except Exception as exc:
+        logging.basicConfig(level=logging.INFO, format=TEXT_FORMAT)
+        logging.error("Invalid logging settings: %s", exc)
+        return 1
+    config = settings.get("service") or {}
+
+    try:
+        reporter: Optional[MetricsReporter] = metrics_from_settings(settings, ROOT_DIR)
+    except Exception as exc:
+        logger.error("Failed to set up metrics: %s", exc)
+        return 1
+    metrics = reporter.metrics if reporter is not None else None
+
+    try:
+        cache: Optional[LookupCache] = cache_from_settings(settings, ROOT_DIR)
+    except Exception as exc:
+        logger.error("Failed to open lookup cache: %s", exc)
+        return 1
+
+    try:
+        store = store_from_settings(settings, ROOT_DIR, IdentityExtractor._build_static_dataset())
+    except Exception as exc:
+        logger.error("Failed to open record store: %s", exc)
+        return 1
+
+    try:
+        source = source_from_settings(settings, store)
+    except Exception as exc:
+        logger.error("Failed to set up lookup source: %s", exc)
+        return 1
+
+    fuzzy_threshold = settings.get("fuzzy_threshold")
+    service = LookupService(
+        IdentityExtractor(
+            cache=cache,
+            store=store,
+            fuzzy_threshold=float(fuzzy_threshold) if fuzzy_threshold is not None else None,
+            metrics=metrics,
+            source=source,
+        ),
+        RelationsExtractor(),
+        store=store,
+        metrics=metrics,
+        max_batch=int(config.get("max_batch", DEFAULT_MAX_BATCH)),
+        max_wait_ms=float(config.get("max_wait_ms", DEFAULT_MAX_WAIT_MS)),
+        timeout=float(config.get("timeout_seconds", DEFAULT_TIMEOUT_SECONDS)),
+    )
+
+    unix_socket = args.unix_socket or (Path(config["unix_socket"]) if config.get("unix_socket") else None)
+    try:
+        server = make_server(
+            service,
+            host=args.host or str(config.get("host", DEFAULT_HOST)),
+            port=args.port if args.port is not None else int(config.get("port", DEFAULT_PORT)),
+            unix_socket=unix_socket,
+        )
+        if reporter is not None:
+            reporter.start()
+    except OSError as exc:
+        logger.error("Failed to start service: %s", exc)
+        service.close()
+        return 1
+
+    if unix_socket is not None:
+        logger.info("Serving lookups on unix:%s", unix_socket)
+    else:
+        host, port = server.server_address[:2]
+        logger.info("Serving lookups at http://%s:%d/lookup", host, port)
+
+    # SIGTERM stops the service like Ctrl-C does.
+    signal.signal(signal.SIGTERM, lambda *_: threading.Thread(target=server.shutdown).start())
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        logger.info("Shutting down")
+        server.server_close()
+        service.close()
+        if reporter is not None:
+            reporter.stop()
+        if cache is not None:
+            cache.close()
+        if source is not None:
+            source.close()
+        store.close()
+        if unix_socket is not None and _is_socket(unix_socket):
+            os.unlink(unix_socket)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,207 @@
+import json
+import logging
+import os
+import time
+from pathlib import Path
+from typing import IO, Any, Dict, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+CHECKPOINT_VERSION = 1
+DEFAULT_FLUSH_EVERY = 100
+DEFAULT_FLUSH_SECONDS = 2.0
+
+def input_fingerprint(input_path: Path) -> Dict[str, Any]:
+    """Identify an input file well enough to tell whether it changed."""
+    stat = input_path.stat()
+    return {
+        "path": str(input_path.resolve()),
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+    }
+
+class CheckpointJournal:
+    """
+    Append-only journal of finished queries, used to resume a killed run.
+
+    The first line is a header holding the input fingerprint; each further
+    line records one finished query by its position in the input:
+    ``{"i": 12, "ok": <PersonRecord.to_state()>}`` for a result, or
+    ``{"i": 13, "miss": "<message>"}`` for a lookup that found nothing.
+    Other failures (timeouts, source errors) are not journaled, so they are
+    retried on resume.
+
+    Entries are buffered and written, flushed and fsync'ed in batches of
+    ``flush_every`` or every ``flush_seconds``, so a crash loses at most one
+    batch (those queries simply run again). A torn last line is ignored and
+    cut off before appending. If the input changed since the journal was
+    written, it is discarded and the run starts over.
+
+    Usage: ``open()``, write ``replay()`` to the output, skip queries where
+    ``is_done(idx)``, ``record_*`` new results, then ``complete()`` when the
+    whole input was processed (removes the journal) or ``close()``.
+    Not thread-safe; call it from the thread that collects results.
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        fingerprint: Dict[str, Any],
+        flush_every: int = DEFAULT_FLUSH_EVERY,
+        flush_seconds: float = DEFAULT_FLUSH_SECONDS,
+    ) -> None:
+        self.path = path
+        self.fingerprint = fingerprint
+        self.flush_every = max(1, flush_every)
+        self.flush_seconds = flush_seconds
+        self.resumed = 0
+        self._done = bytearray()
+        self._file: Optional[IO[bytes]] = None
+        self._buffer: List[bytes] = []
+        self._last_flush = time.monotonic()
+
+    def _scan(self) -> Optional[int]:
+        """
+        Load completed indexes from an existing journal.
+
+        Returns the byte offset just past the last intact line, or None when
+        there is no usable journal (missing, other input, unreadable header).
+        """
+        if not self.path.exists():
+            return None
+
+        with self.path.open("rb") as f:
+            try:
+                header = json.loads(f.readline())
+            except ValueError:
+                header = None
+            if not isinstance(header, dict) or header.get("version") != CHECKPOINT_VERSION:
+                logger.warning("Ignoring unreadable checkpoint %s", self.path)
+                return None
+            if header.get("input") != self.fingerprint:
+                logger.warning("Input changed since checkpoint %s was written; starting over", self.path)
+                return None
+
+            end = f.tell()
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                    idx = int(entry["i"])
+                except (ValueError, KeyError, TypeError):
+                    # A torn write from the interrupted run; drop it and anything after.
+                    logger.warning("Truncating damaged checkpoint entry at byte %d", end)
+                    break
+                if not line.endswith(b"\n"):
+                    break
+                self._mark(idx)
+                self.resumed += 1
+                end += len(line)
+        return end
+
+    def _mark(self, idx: int) -> None:
+        if idx >= len(self._done):
+            self._done.extend(bytes(max(idx + 1 - len(self._done), len(self._done))))
+        self._done[idx] = 1
+
+    def open(self) -> "CheckpointJournal":
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        end = self._scan()
+        if end is None:
+            self._done = bytearray()
+            self.resumed = 0
+            self._file = self.path.open("wb")
+            header = {"version": CHECKPOINT_VERSION, "input": self.fingerprint}
+            self._file.write(json.dumps(header).encode("utf-8") + b"\n")
+            self._sync()
+        else:
+            self._file = self.path.open("r+b")
+            self._file.truncate(end)
+            self._file.seek(end)
+            if self.resumed:
+                logger.info("Resuming from checkpoint %s (%d finished queries)", self.path, self.resumed)
+        self._last_flush = time.monotonic()
+        return self
+
+    def replay(self) -> Iterator[Tuple[int, Optional[List[Any]], Optional[str]]]:
+        """
+        Yield ``(index, record state, miss message)`` for journaled queries.
+
+        Exactly one of state and message is set. Call before recording new
+        entries; only the intact part of the journal is read.
+        """
+        if not self.resumed:
+            return
+        with self.path.open("rb") as f:
+            f.readline()
+            for _ in range(self.resumed):
+                entry = json.loads(f.readline())
+                yield entry["i"], entry.get("ok"), entry.get("miss")
+
+    def is_done(self, idx: int) -> bool:
+        return idx < len(self._done) and self._done[idx] == 1
+
+    def _append(self, entry: Dict[str, Any]) -> None:
+        if self._file is None:
+            raise RuntimeError("CheckpointJournal is not open")
+        self._buffer.append(json.dumps(entry, ensure_ascii=False).encode("utf-8") + b"\n")
+        if (
+            len(self._buffer) >= self.flush_every
+            or time.monotonic() - self._last_flush >= self.flush_seconds
+        ):
+            self.flush()
+
+    def record_success(self, idx: int, state: List[Any]) -> None:
+        self._append({"i": idx, "ok": state})
+
+    def record_miss(self, idx: int, message: str) -> None:
+        self._append({"i": idx, "miss": message})
+
+    def _sync(self) -> None:
+        assert self._file is not None
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def flush(self) -> None:
+        if self._file is None:
+            return
+        if self._buffer:
+            self._file.write(b"".join(self._buffer))
+            self._buffer.clear()
+            self._sync()
+        self._last_flush = time.monotonic()
+
+    def close(self) -> None:
+        """Flush pending entries and keep the journal for a later resume."""
+        if self._file is None:
+            return
+        self.flush()
+        self._file.close()
+        self._file = None
+
+    def complete(self) -> None:
+        """The whole input was processed: the journal is no longer needed."""
+        self.close()
+        try:
+            self.path.unlink()
+        except FileNotFoundError:
+            pass
+        logger.debug("Removed checkpoint %s", self.path)
+
+def checkpoint_from_settings(
+    settings: Dict[str, Any], root_dir: Path, input_path: Path
+) -> Optional[CheckpointJournal]:
+    """
+    Build a CheckpointJournal from the optional ``checkpoint`` block in settings.json.
+
+    Returns None when checkpointing is disabled (no block, or ``"enabled": false``).
+    """
+    config = settings.get("checkpoint")
+    if not config or not config.get("enabled", True):
+        return None
+
+    return CheckpointJournal(
+        root_dir / config.get("path", "data/cache/checkpoint.jsonl"),
+        input_fingerprint(input_path),
+        flush_every=int(config.get("flush_every", DEFAULT_FLUSH_EVERY)),
+        flush_seconds=float(config.get("flush_seconds", DEFAULT_FLUSH_SECONDS)),
+    )
@@ -0,0 +1,458 @@
+import csv
+import json
+import logging
+import struct
+import sys
+import zlib
+from array import array
+from operator import attrgetter
+from pathlib import Path
+from types import TracebackType
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    BinaryIO,
+    Dict,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    TextIO,
+    Tuple,
+    Type,
+)
+
+from .serializer import SCALAR_FIELDS
+
+if TYPE_CHECKING:
+    from extractors.identity_extractor import PersonRecord
+
+logger = logging.getLogger(__name__)
+
+CSV_SUFFIXES = {".csv"}
+COLUMNAR_SUFFIXES = {".stcol"}
+
+DEFAULT_MAX_EMAILS = 5
+DEFAULT_MAX_PHONES = 5
+DEFAULT_ROW_GROUP_SIZE = 65536
+CSV_FLUSH_ROWS = 1024
+
+# Column types
+STRING = "string"
+JSON = "json"
+
+COLUMNAR_MAGIC = b"STC1"
+COLUMNAR_VERSION = 1
+_FOOTER = struct.Struct("<Q4s")
+# Dictionary-encode a chunk when it has at most this share of distinct values.
+DICTIONARY_RATIO = 0.5
+
+_compact = json.JSONEncoder(ensure_ascii=False).encode
+_get_leading = attrgetter(
+    "search_option",
+    "input_given",
+    "first_name",
+    "last_name",
+    *(attr for attr, _ in SCALAR_FIELDS),
+)
+
+def _text(value: Any) -> Optional[str]:
+    if value is None or type(value) is str:
+        return value
+    return str(value)
+
+def _relations(relations: Sequence[Any]) -> Optional[str]:
+    if not relations:
+        return None
+    return _compact([{"Name": rel.name, "Age": rel.age} for rel in relations])
+
+class FlatSchema:
+    """
+    Stable flat column layout for ``PersonRecord`` results.
+
+    Columns follow the ``to_dict`` keys in order, with a fixed number of
+    ``Email-N`` / ``Phone-N`` slots so every row has the same shape. Emails
+    and phones beyond those slots go to the ``Additional Emails`` /
+    ``Additional Phones`` JSON columns; previous addresses, relatives and
+    associates are JSON columns too. Missing values are ``None``. With
+    ``match_scores`` trailing ``Match Type`` / ``Match Score`` columns mark
+    fuzzy name matches, and with ``matched_queries`` a trailing ``Matched
+    Queries`` JSON column holds the queries of entity-resolved records.
+    """
+
+    def __init__(
+        self,
+        max_emails: int = DEFAULT_MAX_EMAILS,
+        max_phones: int = DEFAULT_MAX_PHONES,
+        matched_queries: bool = False,
+        match_scores: bool = False,
+    ) -> None:
+        self.max_emails = max_emails
+        self.max_phones = max_phones
+        self.matched_queries = matched_queries
+        self.match_scores = match_scores
+        columns: List[Tuple[str, str]] = [
+            ("Search Option", STRING),
+            ("Input Given", STRING),
+            ("First Name", STRING),
+            ("Last Name", STRING),
+        ]
+        columns += [(name, STRING) for _, name in SCALAR_FIELDS]
+        columns += [(f"Email-{idx}", STRING) for idx in range(1, max_emails + 1)]
+        columns.append(("Additional Emails", JSON))
+        for idx in range(1, max_phones + 1):
+            columns += [
+                (f"Phone-{idx}", STRING),
+                (f"Phone-{idx} Type", STRING),
+                (f"Phone-{idx} Provider", STRING),
+            ]
+        columns += [
+            ("Additional Phones", JSON),
+            ("Previous Addresses", JSON),
+            ("Relatives", JSON),
+            ("Associates", JSON),
+            ("Person Link", STRING),
+        ]
+        if match_scores:
+            columns += [("Match Type", STRING), ("Match Score", STRING)]
+        if matched_queries:
+            columns.append(("Matched Queries", JSON))
+        self.columns = columns
+        self.names = [name for name, _ in columns]
+
+    def row(self, record: "PersonRecord") -> List[Optional[str]]:
+        """Flatten a record into one value per column."""
+        row: List[Optional[str]] = [_text(value) for value in _get_leading(record)]
+
+        max_emails = self.max_emails
+        emails = record.emails
+        row += [_text(email) for email in emails[:max_emails]]
+        if len(emails) < max_emails:
+            row += [None] * (max_emails - len(emails))
+        row.append(_compact(emails[max_emails:]) if len(emails) > max_emails else None)
+
+        max_phones = self.max_phones
+        phones = record.phones
+        for phone in phones[:max_phones]:
+            row.append(_text(phone.get("number") or None))
+            row.append(_text(phone.get("type") or None))
+            row.append(_text(phone.get("provider") or None))
+        if len(phones) < max_phones:
+            row += [None] * (3 * (max_phones - len(phones)))
+        row.append(_compact(phones[max_phones:]) if len(phones) > max_phones else None)
+
+        row.append(_compact(record.previous_addresses) if record.previous_addresses else None)
+        row.append(_relations(record.relatives))
+        row.append(_relations(record.associates))
+        row.append(_text(record.person_link or None))
+        if self.match_scores:
+            fuzzy = record.match_score is not None
+            row.append("fuzzy" if fuzzy else None)
+            row.append(_text(record.match_score) if fuzzy else None)
+        if self.matched_queries:
+            row.append(_compact(record.matched_queries) if record.matched_queries else None)
+        return row
+
+class _FlatWriter:
+    """Shared open/close and context-manager plumbing of the flat writers."""
+
+    def __init__(self, output_path: Path, schema: Optional[FlatSchema] = None) -> None:
+        self.output_path = output_path
+        self.schema = schema or FlatSchema()
+        self.count = 0
+
+    def open(self) -> "_FlatWriter":
+        raise NotImplementedError
+
+    def encode(self, record: "PersonRecord") -> List[Optional[str]]:
+        """Flatten a record for ``write_encoded``; needs no open file."""
+        return self.schema.row(record)
+
+    def write_encoded(self, row: List[Optional[str]]) -> None:
+        raise NotImplementedError
+
+    def write_record(self, record: "PersonRecord") -> None:
+        self.write_encoded(self.schema.row(record))
+
+    def close(self) -> None:
+        raise NotImplementedError
+
+    def __enter__(self) -> "_FlatWriter":
+        return self.open()
+
+    def __exit__(
+        self,
+        exc_type: Optional[Type[BaseException]],
+        exc: Optional[BaseException],
+        tb: Optional[TracebackType],
+    ) -> None:
+        self.close()
+
+class CsvResultWriter(_FlatWriter):
+    """
+    Stream results to a CSV file with a header row of ``FlatSchema`` columns.
+
+    Rows are flushed to disk every ``CSV_FLUSH_ROWS`` records and on close.
+    """
+
+    def __init__(self, output_path: Path, schema: Optional[FlatSchema] = None) -> None:
+        super().__init__(output_path, schema)
+        self._file: Optional[TextIO] = None
+        self._writer: Any = None
+
+    def open(self) -> "CsvResultWriter":
+        self.output_path.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            self._file = self.output_path.open("w", encoding="utf-8", newline="")
+        except OSError as exc:
+            logger.error("Failed to open %s for writing: %s", self.output_path, exc)
+            raise
+        self._writer = csv.writer(self._file)
+        self._writer.writerow(self.schema.names)
+        logger.debug("Streaming results to %s (CSV)", self.output_path)
+        return self
+
+    def write_encoded(self, row: List[Optional[str]]) -> None:
+        if self._file is None:
+            raise RuntimeError("CsvResultWriter is not open")
+        self._writer.writerow(row)
+        self.count += 1
+        if self.count % CSV_FLUSH_ROWS == 0:
+            self._file.flush()
+
+    def close(self) -> None:
+        if self._file is None:
+            return
+        self._file.close()
+        self._file = None
+        self._writer = None
+        logger.debug("Wrote %d result(s) to %s", self.count, self.output_path)
+
+def _little_endian(values: array) -> bytes:
+    if sys.byteorder == "big":
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values.tobytes()
+
+def _from_little_endian(typecode: str, data: bytes) -> array:
+    values = array(typecode)
+    values.frombytes(data)
+    if sys.byteorder == "big":
+        values.byteswap()
+    return values
+
+def _encode_strings(values: Sequence[Optional[str]]) -> bytes:
+    """Lengths in characters (-1 for null) followed by the UTF-8 text."""
+    lengths = array("i", [-1 if value is None else len(value) for value in values])
+    text = "".join(value for value in values if value is not None)
+    return _little_endian(lengths) + text.encode("utf-8")
+
+def _decode_strings(data: bytes, count: int) -> List[Optional[str]]:
+    split = 4 * count
+    lengths = _from_little_endian("i", data[:split])
+    text = data[split:].decode("utf-8")
+    values: List[Optional[str]] = []
+    pos = 0
+    for length in lengths:
+        if length < 0:
+            values.append(None)
+        else:
+            values.append(text[pos:pos + length])
+            pos += length
+    return values
+
+def _encode_chunk(values: List[Optional[str]]) -> Tuple[str, int, bytes]:
+    """Encode one column chunk; returns ``(encoding, dictionary size, bytes)``."""
+    distinct: Dict[str, int] = {}
+    for value in values:
+        if value is not None and value not in distinct:
+            distinct[value] = len(distinct)
+            if len(distinct) > DICTIONARY_RATIO * len(values):
+                return "plain", 0, _encode_strings(values)
+
+    indices = array("i", [-1 if value is None else distinct[value] for value in values])
+    return "dictionary", len(distinct), _encode_strings(list(distinct)) + _little_endian(indices)
+
+def _decode_chunk(encoding: str, dictionary_size: int, data: bytes, count: int) -> List[Optional[str]]:
+    if encoding == "plain":
+        return _decode_strings(data, count)
+    if encoding != "dictionary":
+        raise ValueError(f"Unknown column encoding: {encoding}")
+    indices = _from_little_endian("i", data[len(data) - 4 * count:])
+    dictionary = _decode_strings(data[: len(data) - 4 * count], dictionary_size)
+    return [None if idx < 0 else dictionary[idx] for idx in indices]
+
+class ColumnarResultWriter(_FlatWriter):
+    """
+    Stream results into a chunked, typed column file (``.stcol``).
+
+    Rows are buffered per column and written as a row group every
+    ``row_group_size`` records. Each column chunk is plain or dictionary
+    encoded (whichever fits; low-cardinality columns like regions and phone
+    types collapse to small integer arrays) and zlib-compressed. A JSON
+    footer manifest records the schema and the offset of every chunk, so
+    ``ColumnarReader`` can load just the columns it needs.
+
+    Layout: ``STC1`` | row groups | manifest | u64 manifest length | ``STC1``.
+    The file is only readable once closed.
+    """
+
+    def __init__(
+        self,
+        output_path: Path,
+        schema: Optional[FlatSchema] = None,
+        row_group_size: int = DEFAULT_ROW_GROUP_SIZE,
+        compression_level: int = 6,
+    ) -> None:
+        super().__init__(output_path, schema)
+        if row_group_size < 1:
+            raise ValueError("row_group_size must be at least 1")
+        self.row_group_size = row_group_size
+        self.compression_level = compression_level
+        self._file: Optional[BinaryIO] = None
+        self._columns: List[List[Optional[str]]] = []
+        self._row_groups: List[Dict[str, Any]] = []
+
+    def open(self) -> "ColumnarResultWriter":
+        self.output_path.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            self._file = self.output_path.open("wb")
+        except OSError as exc:
+            logger.error("Failed to open %s for writing: %s", self.output_path, exc)
+            raise
+        self._file.write(COLUMNAR_MAGIC)
+        self._columns = [[] for _ in self.schema.columns]
+        self._row_groups = []
+        logger.debug("Streaming results to %s (columnar)", self.output_path)
+        return self
+
+    def write_encoded(self, row: List[Optional[str]]) -> None:
+        if self._file is None:
+            raise RuntimeError("ColumnarResultWriter is not open")
+        for column, value in zip(self._columns, row):
+            column.append(value)
+        self.count += 1
+        if len(self._columns[0]) >= self.row_group_size:
+            self._flush_row_group()
+
+    def _flush_row_group(self) -> None:
+        assert self._file is not None
+        rows = len(self._columns[0])
+        if not rows:
+            return
+        chunks = []
+        for idx, values in enumerate(self._columns):
+            encoding, dictionary_size, data = _encode_chunk(values)
+            compressed = zlib.compress(data, self.compression_level)
+            chunks.append(
+                {
+                    "offset": self._file.tell(),
+                    "length": len(compressed),
+                    "encoding": encoding,
+                    "dictionary_size": dictionary_size,
+                }
+            )
+            self._file.write(compressed)
+            self._columns[idx] = []
+        self._row_groups.append({"rows": rows, "columns": chunks})
+        self._file.flush()
+
+    def close(self) -> None:
+        if self._file is None:
+            return
+        self._flush_row_group()
+        manifest = json.dumps(
+            {
+                "version": COLUMNAR_VERSION,
+                "schema": [{"name": name, "type": type_} for name, type_ in self.schema.columns],
+                "num_rows": self.count,
+                "row_groups": self._row_groups,
+            },
+            ensure_ascii=False,
+        ).encode("utf-8")
+        self._file.write(manifest)
+        self._file.write(_FOOTER.pack(len(manifest), COLUMNAR_MAGIC))
+        self._file.close()
+        self._file = None
+        logger.debug(
+            "Wrote %d result(s) in %d row group(s) to %s",
+            self.count,
+            len(self._row_groups),
+            self.output_path,
+        )
+
+class ColumnarReader:
+    """Read ``.stcol`` files written by ``ColumnarResultWriter``."""
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self._file = path.open("rb")
+        try:
+            if self._file.read(len(COLUMNAR_MAGIC)) != COLUMNAR_MAGIC:
+                raise ValueError(f"{path} is not a columnar result file")
+            if self._file.seek(0, 2) < len(COLUMNAR_MAGIC) + _FOOTER.size:
+                raise ValueError(f"{path} is truncated (no footer)")
+            self._file.seek(-_FOOTER.size, 2)
+            length, magic = _FOOTER.unpack(self._file.read(_FOOTER.size))
+            if magic != COLUMNAR_MAGIC:
+                raise ValueError(f"{path} is truncated (no footer)")
+            self._file.seek(-_FOOTER.size - length, 2)
+            manifest = json.loads(self._file.read(length))
+        except Exception:
+            self._file.close()
+            raise
+        if manifest.get("version") != COLUMNAR_VERSION:
+            self._file.close()
+            raise ValueError(f"Unsupported columnar format version in {path}")
+
+        self.schema: List[Tuple[str, str]] = [(col["name"], col["type"]) for col in manifest["schema"]]
+        self.names = [name for name, _ in self.schema]
+        self.num_rows: int = manifest["num_rows"]
+        self.row_groups: List[Dict[str, Any]] = manifest["row_groups"]
+
+    def _read_chunk(self, row_group: Dict[str, Any], column: int) -> List[Any]:
+        chunk = row_group["columns"][column]
+        self._file.seek(chunk["offset"])
+        data = zlib.decompress(self._file.read(chunk["length"]))
+        values = _decode_chunk(chunk["encoding"], chunk["dictionary_size"], data, row_group["rows"])
+        if self.schema[column][1] == JSON:
+            return [None if value is None else json.loads(value) for value in values]
+        return values
+
+    def iter_row_groups(self, columns: Optional[Sequence[str]] = None) -> Iterator[Dict[str, List[Any]]]:
+        """Yield ``{column: values}`` per row group, decoding only ``columns``."""
+        wanted = list(columns) if columns is not None else self.names
+        positions = [self.names.index(name) for name in wanted]
+        for row_group in self.row_groups:
+            yield {
+                name: self._read_chunk(row_group, position)
+                for name, position in zip(wanted, positions)
+            }
+
+    def read_columns(self, columns: Optional[Sequence[str]] = None) -> Dict[str, List[Any]]:
+        """Whole columns as lists."""
+        result: Dict[str, List[Any]] = {}
+        for group in self.iter_row_groups(columns):
+            for name, values in group.items():
+                result.setdefault(name, []).extend(values)
+        return result
+
+    def iter_rows(self) -> Iterator[Dict[str, Any]]:
+        """Yield each row as a dict of its non-null columns."""
+        for group in self.iter_row_groups():
+            for row in zip(*group.values()):
+                yield {name: value for name, value in zip(self.names, row) if value is not None}
+
+    def close(self) -> None:
+        self._file.close()
+
+    def __enter__(self) -> "ColumnarReader":
+        return self
+
+    def __exit__(
+        self,
+        exc_type: Optional[Type[BaseException]],
+        exc: Optional[BaseException],
+        tb: Optional[TracebackType],
+    ) -> None:
+        self.close()
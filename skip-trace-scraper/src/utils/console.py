@@ -0,0 +1,190 @@
+import json
+import logging
+import queue
+import sys
+import threading
+import time
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Union
+
+from .formatter import format_result_text
+from .serializer import RecordSerializer
+
+if TYPE_CHECKING:
+    from extractors.identity_extractor import PersonRecord
+
+logger = logging.getLogger(__name__)
+
+OUTPUT_MODES = ("quiet", "summary", "sampled", "full")
+DEFAULT_OUTPUT_MODE = "full"
+DEFAULT_SAMPLE_EVERY = 100
+DEFAULT_QUEUE_SIZE = 256
+# Results rendered per stdout write.
+WRITE_BATCH = 64
+
+_STOP = object()
+
+def should_render(mode: str, sample_every: int, idx: int) -> bool:
+    """Whether the result at input position ``idx`` is printed in ``mode``."""
+    if mode == "full":
+        return True
+    if mode == "sampled":
+        return idx % sample_every == 0
+    return False
+
+class ConsoleOutput:
+    """
+    Print results to stdout without slowing down result collection.
+
+    Modes:
+      - ``full``: every result, as ``pretty_print_result`` prints it.
+      - ``sampled``: every ``sample_every``-th query by input position.
+      - ``summary``: no results, only a closing summary line.
+      - ``quiet``: nothing at all.
+
+    Results are handed over with ``show`` (a record) or ``show_text``
+    (already formatted) and rendered by a background thread from a queue of
+    ``queue_size`` entries, so JSON formatting and terminal I/O happen off
+    the collecting thread. In ``full`` mode a full queue blocks the caller,
+    so nothing is lost; in ``sampled`` mode the sample is dropped instead.
+    Use it as a context manager, then call ``summary`` with the final counts.
+    """
+
+    def __init__(
+        self,
+        mode: str = DEFAULT_OUTPUT_MODE,
+        sample_every: int = DEFAULT_SAMPLE_EVERY,
+        queue_size: int = DEFAULT_QUEUE_SIZE,
+    ) -> None:
+        if mode not in OUTPUT_MODES:
+            raise ValueError(f"Unknown output mode '{mode}' (expected one of: {', '.join(OUTPUT_MODES)})")
+        self.mode = mode
+        self.sample_every = max(1, sample_every)
+        self.dropped = 0
+        self._queue: "queue.Queue[Any]" = queue.Queue(maxsize=max(1, queue_size))
+        self._thread: Optional[threading.Thread] = None
+        self._pretty = RecordSerializer(indent=4)
+        self._started_at = time.monotonic()
+
+    @property
+    def renders(self) -> bool:
+        """Whether any result is ever printed in this mode."""
+        return self.mode in ("full", "sampled")
+
+    @property
+    def pending(self) -> int:
+        return self._queue.qsize()
+
+    def wants(self, idx: int) -> bool:
+        return should_render(self.mode, self.sample_every, idx)
+
+    def start(self) -> "ConsoleOutput":
+        self._started_at = time.monotonic()
+        if self.renders and self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="console", daemon=True)
+            self._thread.start()
+        return self
+
+    def _put(self, item: Any) -> None:
+        if self._thread is None:
+            raise RuntimeError("ConsoleOutput is not started")
+        if self.mode == "full":
+            self._queue.put(item)
+            return
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            self.dropped += 1
+
+    def show(self, idx: int, record: Union["PersonRecord", Dict[str, Any]]) -> None:
+        if self.wants(idx):
+            self._put(record)
+
+    def show_text(self, idx: int, formatted: str) -> None:
+        if self.wants(idx):
+            self._put(formatted)
+
+    def _render(self, item: Any) -> str:
+        if isinstance(item, str):
+            return format_result_text(item)
+        try:
+            if isinstance(item, dict):
+                return format_result_text(
+                    json.dumps(item, indent=4, ensure_ascii=False, default=str)
+                )
+            return format_result_text(self._pretty.dumps(item))
+        except (TypeError, ValueError) as exc:
+            logger.error("Failed to format result for the console: %s", exc)
+            return ""
+
+    def _run(self) -> None:
+        broken = False
+        while True:
+            batch: List[Any] = [self._queue.get()]
+            while len(batch) < WRITE_BATCH:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            stop = False
+            parts = []
+            for item in batch:
+                if item is _STOP:
+                    stop = True
+                    break
+                if not broken:
+                    parts.append(self._render(item))
+
+            if parts and not broken:
+                try:
+                    sys.stdout.write("".join(parts))
+                    sys.stdout.flush()
+                except OSError as exc:
+                    # e.g. stdout piped into `head`; keep draining so callers never block.
+                    logger.warning("Console output disabled: %s", exc)
+                    broken = True
+            if stop:
+                return
+
+    def close(self) -> None:
+        """Print whatever is still queued and stop the render thread."""
+        if self._thread is not None:
+            self._queue.put(_STOP)
+            self._thread.join()
+            self._thread = None
+
+    def summary(self, succeeded: int, failed: int) -> None:
+        """Print the closing summary line (every mode but ``quiet``)."""
+        if self.mode == "quiet":
+            return
+        elapsed = time.monotonic() - self._started_at
+        total = succeeded + failed
+        line = (
+            f"Processed {total} quer{'y' if total == 1 else 'ies'} in {elapsed:.1f}s "
+            f"({total / elapsed if elapsed > 0 else 0.0:.1f}/s): {succeeded} succeeded, {failed} failed"
+        )
+        if self.dropped:
+            line += f" ({self.dropped} sampled result(s) not shown)"
+        try:
+            print(line)
+        except OSError:
+            pass
+
+    def __enter__(self) -> "ConsoleOutput":
+        return self.start()
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
+
+def console_from_settings(settings: Dict[str, Any], mode: Optional[str] = None) -> ConsoleOutput:
+    """
+    Build a ConsoleOutput from the optional ``console`` block in settings.json.
+
+    ``mode`` (e.g. from the command line) overrides the configured mode.
+    """
+    config = settings.get("console") or {}
+    return ConsoleOutput(
+        mode=(mode or str(config.get("mode", DEFAULT_OUTPUT_MODE))).lower(),
+        sample_every=int(config.get("sample_every", DEFAULT_SAMPLE_EVERY)),
+        queue_size=int(config.get("queue_size", DEFAULT_QUEUE_SIZE)),
+    )
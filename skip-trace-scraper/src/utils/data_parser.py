@@ -1,11 +1,19 @@
-thonimport json
+import json
 import logging
 from dataclasses import dataclass
 from pathlib import Path
-from typing import List
+from typing import Any, Iterator, List, Optional, TextIO
 
 logger = logging.getLogger(__name__)
 
+JSON_LINES_SUFFIXES = {".jsonl", ".ndjson"}
+DEFAULT_CHUNK_SIZE = 1 << 16
+# Characters a number token can go on with ("12." continues as "12.5").
+_NUMBER_CHARS = frozenset("0123456789+-.eE")
+# How far before the end of a truncated element the decoder can report its
+# error: the start of the longest literal, "-Infinity".
+_LONGEST_LITERAL = len("-Infinity")
+
 @dataclass(frozen=True)
 class SearchQuery:
     """Represents a single search query for the skip trace scraper."""
@@ -24,6 +32,160 @@ def _normalize_input_value(value: str) -> str:
         raise ValueError("Input value cannot be empty")
     return normalized
 
+def _parse_entry(idx: int, item: Any) -> Optional[SearchQuery]:
+    """Turn one raw input entry into a SearchQuery, or None if it is unusable."""
+    if not isinstance(item, dict):
+        logger.warning("Skipping non-dict entry at index %d", idx)
+        return None
+
+    search_option = item.get("search_option") or item.get("Search Option")
+    input_value = item.get("input_value") or item.get("Input Given") or item.get("input")
+
+    if search_option is None or input_value is None:
+        logger.warning(
+            "Skipping entry at index %d due to missing fields: %s",
+            idx,
+            item,
+        )
+        return None
+
+    try:
+        return SearchQuery(
+            search_option=_normalize_search_option(search_option),
+            input_value=_normalize_input_value(input_value),
+        )
+    except ValueError as exc:
+        logger.warning(
+            "Skipping invalid entry at index %d: %s (error: %s)",
+            idx,
+            item,
+            exc,
+        )
+        return None
+
+def _iter_json_lines(f: TextIO) -> Iterator[Any]:
+    for line_no, line in enumerate(f, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line)
+        except json.JSONDecodeError as exc:
+            raise ValueError(f"Invalid JSON on line {line_no} of input file: {exc}") from exc
+
+def _is_number(item: Any) -> bool:
+    return isinstance(item, (int, float)) and not isinstance(item, bool)
+
+def _truncated(exc: json.JSONDecodeError, buf: str) -> bool:
+    """Whether ``exc`` may only mean that ``buf`` ends in the middle of an element."""
+    return exc.msg.startswith("Unterminated string") or len(buf) - exc.pos < _LONGEST_LITERAL
+
+def _iter_json_array(f: TextIO, chunk_size: int) -> Iterator[Any]:
+    """
+    Incrementally decode the elements of a top-level JSON array.
+
+    Only one chunk plus the element currently being decoded is held in memory,
+    so arbitrarily large arrays can be consumed with flat memory usage.
+    Malformed input fails at the first bad token instead of being read on.
+    """
+    decoder = json.JSONDecoder()
+    buf = ""
+    pos = 0
+    eof = False
+
+    def fill() -> bool:
+        nonlocal buf, pos, eof
+        chunk = f.read(chunk_size)
+        if not chunk:
+            eof = True
+            return False
+        buf = buf[pos:] + chunk
+        pos = 0
+        return True
+
+    def skip_ws() -> None:
+        nonlocal pos
+        while True:
+            while pos < len(buf) and buf[pos].isspace():
+                pos += 1
+            if pos < len(buf) or not fill():
+                return
+
+    skip_ws()
+    if pos >= len(buf) or buf[pos] != "[":
+        raise ValueError("Input JSON must be a list of query objects")
+    pos += 1
+
+    expect_value = True
+    seen_value = False
+    while True:
+        skip_ws()
+        if pos >= len(buf):
+            raise ValueError("Invalid JSON in input file: unterminated array")
+
+        char = buf[pos]
+        if char == "]":
+            if expect_value and seen_value:
+                raise ValueError(f"Invalid JSON in input file: trailing ',' before offset {pos}")
+            return
+        if char == ",":
+            if expect_value:
+                raise ValueError(f"Invalid JSON in input file: unexpected ',' at offset {pos}")
+            expect_value = True
+            pos += 1
+            continue
+        if not expect_value:
+            raise ValueError(f"Invalid JSON in input file: expected ',' or ']' at offset {pos}")
+
+        while True:
+            try:
+                item, end = decoder.raw_decode(buf, pos)
+            except json.JSONDecodeError as exc:
+                # Read on only if the element may be split across chunks.
+                if not eof and _truncated(exc, buf) and fill():
+                    continue
+                raise ValueError(f"Invalid JSON in input file: {exc}") from exc
+            # A scalar ending at the buffer edge, or a number followed only by
+            # what may be the rest of it ("12." then "5"), might continue in
+            # the next chunk.
+            if (
+                not eof
+                and (end == len(buf) or _is_number(item) and _NUMBER_CHARS.issuperset(buf[end:]))
+                and fill()
+            ):
+                continue
+            break
+
+        pos = end
+        expect_value = False
+        seen_value = True
+        yield item
+
+def iter_queries(path: Path, chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[SearchQuery]:
+    """
+    Lazily yield search queries from a JSON array or JSON Lines file.
+
+    Files ending in ``.jsonl`` / ``.ndjson`` are read line by line; any other
+    file is expected to hold a JSON array (see ``load_queries``), which is
+    decoded incrementally instead of being loaded with ``json.load``.
+    Invalid entries are skipped with a warning, just like ``load_queries``.
+    """
+    if not path.exists():
+        raise FileNotFoundError(f"Input file not found at: {path}")
+
+    logger.debug("Streaming queries from: %s", path)
+
+    with path.open("r", encoding="utf-8") as f:
+        if path.suffix.lower() in JSON_LINES_SUFFIXES:
+            items = _iter_json_lines(f)
+        else:
+            items = _iter_json_array(f, chunk_size)
+
+        for idx, item in enumerate(items):
+            query = _parse_entry(idx, item)
+            if query is not None:
+                yield query
+
 def load_queries(path: Path) -> List[SearchQuery]:
     """
     Load search queries from a JSON file.
@@ -36,54 +198,11 @@ def load_queries(path: Path) -> List[SearchQuery]:
             },
             ...
         ]
-    """
-    if not path.exists():
-        raise FileNotFoundError(f"Input file not found at: {path}")
-
-    logger.debug("Loading queries from: %s", path)
-
-    try:
-        with path.open("r", encoding="utf-8") as f:
-            raw = json.load(f)
-    except json.JSONDecodeError as exc:
-        raise ValueError(f"Invalid JSON in input file: {exc}") from exc
-
-    if not isinstance(raw, list):
-        raise ValueError("Input JSON must be a list of query objects")
 
-    queries: List[SearchQuery] = []
-
-    for idx, item in enumerate(raw):
-        if not isinstance(item, dict):
-            logger.warning("Skipping non-dict entry at index %d", idx)
-            continue
-
-        search_option = item.get("search_option") or item.get("Search Option")
-        input_value = item.get("input_value") or item.get("Input Given") or item.get("input")
-
-        if search_option is None or input_value is None:
-            logger.warning(
-                "Skipping entry at index %d due to missing fields: %s",
-                idx,
-                item,
-            )
-            continue
-
-        try:
-            query = SearchQuery(
-                search_option=_normalize_search_option(search_option),
-                input_value=_normalize_input_value(input_value),
-            )
-        except ValueError as exc:
-            logger.warning(
-                "Skipping invalid entry at index %d: %s (error: %s)",
-                idx,
-                item,
-                exc,
-            )
-            continue
-
-        queries.append(query)
+    JSON Lines files (one query object per line) are accepted as well. Use
+    ``iter_queries`` to consume large inputs without materializing the list.
+    """
+    queries = list(iter_queries(path))
 
     logger.info("Loaded %d valid queries from %s", len(queries), path)
-    return queries
\ No newline at end of file
+    return queries
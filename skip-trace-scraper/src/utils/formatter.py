@@ -1,7 +1,21 @@
-thonimport json
+import json
 import logging
 from pathlib import Path
-from typing import Any, Dict, List
+from types import TracebackType
+from typing import TYPE_CHECKING, Any, BinaryIO, Dict, List, Optional, Type, Union
+
+from .columnar import (
+    COLUMNAR_SUFFIXES,
+    CSV_SUFFIXES,
+    ColumnarResultWriter,
+    CsvResultWriter,
+    FlatSchema,
+)
+from .data_parser import JSON_LINES_SUFFIXES
+from .serializer import RecordSerializer
+
+if TYPE_CHECKING:
+    from extractors.identity_extractor import PersonRecord
 
 logger = logging.getLogger(__name__)
 
@@ -22,21 +36,154 @@ def write_results(results: List[Dict[str, Any]], output_path: Path) -> None:
         logger.error("Failed to write results to %s: %s", output_path, exc)
         raise
 
-def pretty_print_result(result: Dict[str, Any]) -> None:
+class ResultWriter:
+    """
+    Incrementally write results to disk as they are produced.
+
+    Two layouts are supported, picked from the output file suffix unless
+    ``json_lines`` is given explicitly:
+
+      - JSON Lines (``.jsonl`` / ``.ndjson``): one compact object per line.
+      - JSON array (anything else): byte-for-byte the same document that
+        ``write_results`` produces, written one element at a time.
+
+    ``write_record`` serializes a ``PersonRecord`` directly with
+    ``RecordSerializer``; ``write`` takes an already built result dict.
+    ``encode`` / ``write_encoded`` split ``write_record`` in two so records
+    can be serialized elsewhere (e.g. in worker processes).
+
+    Every record is flushed once written, so a crash only loses results that
+    had not been handed to the writer yet. Use it as a context manager; the
+    JSON array is only closed (``]``) when the writer is closed.
     """
-    Print a single result in a human-friendly JSON format to stdout.
+
+    def __init__(self, output_path: Path, json_lines: Optional[bool] = None) -> None:
+        if json_lines is None:
+            json_lines = output_path.suffix.lower() in JSON_LINES_SUFFIXES
+
+        self.output_path = output_path
+        self.json_lines = json_lines
+        self.count = 0
+        self._file: Optional[BinaryIO] = None
+        # Array elements sit one level deep in the document.
+        self._serializer = RecordSerializer(None if json_lines else 4, 0 if json_lines else 1)
+
+    def open(self) -> "ResultWriter":
+        self.output_path.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            self._file = self.output_path.open("wb")
+        except OSError as exc:
+            logger.error("Failed to open %s for writing: %s", self.output_path, exc)
+            raise
+        logger.debug(
+            "Streaming results to %s (%s)",
+            self.output_path,
+            "JSON Lines" if self.json_lines else "JSON array",
+        )
+        return self
+
+    def _write_item(self, item: str) -> None:
+        if self._file is None:
+            raise RuntimeError("ResultWriter is not open")
+
+        if self.json_lines:
+            self._file.write(f"{item}\n".encode("utf-8"))
+        else:
+            separator = "[\n    " if self.count == 0 else ",\n    "
+            self._file.write(f"{separator}{item}".encode("utf-8"))
+
+        self.count += 1
+        self._file.flush()
+
+    def write(self, result: Dict[str, Any]) -> None:
+        if self.json_lines:
+            self._write_item(json.dumps(result, ensure_ascii=False))
+        else:
+            # Re-indent the element so the document matches json.dump(indent=4).
+            # JSON strings never contain raw newlines, so this is safe.
+            item = json.dumps(result, indent=4, ensure_ascii=False)
+            self._write_item(item.replace("\n", "\n    "))
+
+    def encode(self, record: "PersonRecord") -> str:
+        """Serialize a record for ``write_encoded``; needs no open file."""
+        return self._serializer.dumps(record)
+
+    def write_encoded(self, item: str) -> None:
+        self._write_item(item)
+
+    def write_record(self, record: "PersonRecord") -> None:
+        """Write a record; same bytes as ``write(record.to_dict())``."""
+        self._write_item(self._serializer.dumps(record))
+
+    def close(self) -> None:
+        if self._file is None:
+            return
+        if not self.json_lines:
+            self._file.write(b"[]" if self.count == 0 else b"\n]")
+        self._file.close()
+        self._file = None
+        logger.debug("Wrote %d result(s) to %s", self.count, self.output_path)
+
+    def __enter__(self) -> "ResultWriter":
+        return self.open()
+
+    def __exit__(
+        self,
+        exc_type: Optional[Type[BaseException]],
+        exc: Optional[BaseException],
+        tb: Optional[TracebackType],
+    ) -> None:
+        self.close()
+
+def result_writer_for(
+    output_path: Path, matched_queries: bool = False, match_scores: bool = False
+) -> Union[ResultWriter, CsvResultWriter, ColumnarResultWriter]:
+    """
+    Pick a streaming writer from the output file suffix.
+
+    ``.csv`` gives a flat CSV export and ``.stcol`` the chunked columnar
+    format (see ``utils.columnar``); anything else is JSON / JSON Lines.
+    All of them accept ``write_record`` (or ``encode`` + ``write_encoded``)
+    and are used as context managers. ``matched_queries`` adds the
+    ``Matched Queries`` column and ``match_scores`` the ``Match Type`` /
+    ``Match Score`` columns to the flat formats (JSON output includes them
+    whenever a record has any).
+    """
+    suffix = output_path.suffix.lower()
+    schema = FlatSchema(matched_queries=matched_queries, match_scores=match_scores)
+    if suffix in CSV_SUFFIXES:
+        return CsvResultWriter(output_path, schema)
+    if suffix in COLUMNAR_SUFFIXES:
+        return ColumnarResultWriter(output_path, schema)
+    return ResultWriter(output_path)
+
+_PRETTY = RecordSerializer(indent=4)
+
+def pretty_print_result(result: Union[Dict[str, Any], "PersonRecord"]) -> None:
+    """
+    Print a single result (dict or ``PersonRecord``) as indented JSON to stdout.
 
     This is useful when running the script interactively.
     """
     try:
-        formatted = json.dumps(result, indent=4, ensure_ascii=False)
+        if isinstance(result, dict):
+            formatted = json.dumps(result, indent=4, ensure_ascii=False)
+        else:
+            formatted = _PRETTY.dumps(result)
     except TypeError:
         # As a fallback, convert non-serializable objects to string
         def default(obj: Any) -> str:
             return str(obj)
 
-        formatted = json.dumps(result, indent=4, ensure_ascii=False, default=default)
+        data = result if isinstance(result, dict) else result.to_dict()
+        formatted = json.dumps(data, indent=4, ensure_ascii=False, default=default)
+
+    print_result_text(formatted)
+
+def format_result_text(formatted: str) -> str:
+    """The console banner around an already formatted result, as printed."""
+    return f"\n=== Skip Trace Result ===\n{formatted}\n=========================\n\n"
 
-    print("\n=== Skip Trace Result ===")
-    print(formatted)
-    print("=========================\n")
\ No newline at end of file
+def print_result_text(formatted: str) -> None:
+    """Print an already formatted result with the console banner."""
+    print(format_result_text(formatted), end="")
@@ -0,0 +1,368 @@
+import http.client
+import logging
+import random
+import ssl
+import threading
+import time
+from typing import Any, Callable, Dict, List, Mapping, Optional, Tuple
+from urllib.parse import urlsplit
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TIMEOUT = 10.0
+DEFAULT_MAX_PER_HOST = 8
+DEFAULT_MAX_RETRIES = 2
+DEFAULT_BACKOFF_BASE = 0.1
+DEFAULT_BACKOFF_MAX = 2.0
+DEFAULT_FAILURE_THRESHOLD = 5
+DEFAULT_RESET_SECONDS = 30.0
+DEFAULT_MAX_RESPONSE_BYTES = 1 << 20
+
+# Responses worth another attempt; everything else is returned as is.
+RETRY_STATUSES = frozenset({429, 502, 503, 504})
+# Errors a reused keep-alive connection raises when the server has
+# already closed it; the request is resent once on a fresh connection.
+_STALE_ERRORS = (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError)
+
+class CircuitOpenError(ConnectionError):
+    """Raised instead of calling a host whose circuit breaker is open."""
+
+class PoolSaturatedError(RuntimeError):
+    """
+    Raised when no connection to a host frees up within the timeout.
+
+    The host has not been called, so this is neither retried nor counted
+    by its circuit breaker (and is deliberately not an OSError).
+    """
+
+class CircuitBreaker:
+    """
+    Stop calling a host after ``failure_threshold`` consecutive failures.
+
+    While open, ``allow`` refuses calls. Once ``reset_seconds`` have passed
+    it lets a single trial call through (half-open) and re-arms the timer;
+    a success closes the circuit, a failure keeps it open.
+    """
+
+    def __init__(
+        self,
+        failure_threshold: int = DEFAULT_FAILURE_THRESHOLD,
+        reset_seconds: float = DEFAULT_RESET_SECONDS,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_seconds = reset_seconds
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._opened_at is None:
+                return "closed"
+            if self._clock() - self._opened_at >= self.reset_seconds:
+                return "half_open"
+            return "open"
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            now = self._clock()
+            if now - self._opened_at >= self.reset_seconds:
+                self._opened_at = now
+                return True
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            if self._failures >= self.failure_threshold:
+                if self._opened_at is None:
+                    logger.warning("Circuit opened after %d consecutive failure(s)", self._failures)
+                self._opened_at = self._clock()
+
+class _Host:
+    __slots__ = ("key", "scheme", "hostname", "port", "idle", "slots", "breaker")
+
+    def __init__(self, scheme: str, hostname: str, port: int, max_per_host: int, breaker: CircuitBreaker) -> None:
+        self.key = f"{scheme}://{hostname}:{port}"
+        self.scheme = scheme
+        self.hostname = hostname
+        self.port = port
+        self.idle: List[http.client.HTTPConnection] = []
+        self.slots = threading.BoundedSemaphore(max_per_host)
+        self.breaker = breaker
+
+class HTTPPool:
+    """
+    Thread-safe HTTP/1.1 client that keeps connections alive between requests.
+
+    Per host (scheme, name, port) it holds up to ``max_idle_per_host`` idle
+    keep-alive connections for reuse and lets at most ``max_per_host``
+    requests run at once; callers beyond that wait up to ``timeout`` for a
+    slot. Connection errors, timeouts and 429/502/503/504 responses are
+    retried up to ``max_retries`` times with full-jitter exponential backoff
+    (``backoff_base * 2**attempt``, capped at ``backoff_max`` and raised to a
+    numeric ``Retry-After``). Every host has a ``CircuitBreaker`` fed with the
+    final outcome of each request, so a dead upstream fails fast with
+    ``CircuitOpenError`` instead of tying up workers. A request that finds
+    no free slot raises ``PoolSaturatedError`` straight away: the host was
+    never called, so it is not retried and does not reach the breaker.
+    Bodies larger than ``max_response_bytes`` raise ValueError.
+    """
+
+    def __init__(
+        self,
+        timeout: float = DEFAULT_TIMEOUT,
+        max_per_host: int = DEFAULT_MAX_PER_HOST,
+        max_idle_per_host: Optional[int] = None,
+        max_retries: int = DEFAULT_MAX_RETRIES,
+        backoff_base: float = DEFAULT_BACKOFF_BASE,
+        backoff_max: float = DEFAULT_BACKOFF_MAX,
+        failure_threshold: int = DEFAULT_FAILURE_THRESHOLD,
+        reset_seconds: float = DEFAULT_RESET_SECONDS,
+        max_response_bytes: int = DEFAULT_MAX_RESPONSE_BYTES,
+        ssl_context: Optional[ssl.SSLContext] = None,
+    ) -> None:
+        if max_per_host < 1:
+            raise ValueError("max_per_host must be at least 1")
+        self.timeout = timeout
+        self.max_per_host = max_per_host
+        self.max_idle_per_host = max_per_host if max_idle_per_host is None else max(0, max_idle_per_host)
+        self.max_retries = max(0, max_retries)
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.max_response_bytes = max_response_bytes
+        self._ssl_context = ssl_context
+        self._hosts: Dict[Tuple[str, str, int], _Host] = {}
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.opened = 0
+        self.reused = 0
+        self.retries = 0
+        self.rejected = 0
+        self.saturated = 0
+
+    def _host(self, scheme: str, hostname: str, port: int) -> _Host:
+        key = (scheme, hostname, port)
+        host = self._hosts.get(key)
+        if host is None:
+            with self._lock:
+                host = self._hosts.get(key)
+                if host is None:
+                    host = self._hosts[key] = _Host(
+                        scheme,
+                        hostname,
+                        port,
+                        self.max_per_host,
+                        CircuitBreaker(self.failure_threshold, self.reset_seconds),
+                    )
+        return host
+
+    def _connect(self, host: _Host) -> http.client.HTTPConnection:
+        self.opened += 1
+        if host.scheme == "https":
+            if self._ssl_context is None:
+                self._ssl_context = ssl.create_default_context()
+            return http.client.HTTPSConnection(
+                host.hostname, host.port, timeout=self.timeout, context=self._ssl_context
+            )
+        return http.client.HTTPConnection(host.hostname, host.port, timeout=self.timeout)
+
+    def _read(self, conn: http.client.HTTPConnection, response: http.client.HTTPResponse) -> bytes:
+        length = response.getheader("Content-Length")
+        if length is not None and length.isdigit() and int(length) > self.max_response_bytes:
+            conn.close()
+            raise ValueError(f"Response body exceeds {self.max_response_bytes} bytes")
+        data = response.read(self.max_response_bytes + 1)
+        if len(data) > self.max_response_bytes:
+            conn.close()
+            raise ValueError(f"Response body exceeds {self.max_response_bytes} bytes")
+        return data
+
+    def _exchange(
+        self,
+        conn: http.client.HTTPConnection,
+        method: str,
+        target: str,
+        body: Optional[bytes],
+        headers: Dict[str, str],
+    ) -> Tuple[http.client.HTTPResponse, bytes]:
+        conn.request(method, target, body=body, headers=headers)
+        response = conn.getresponse()
+        return response, self._read(conn, response)
+
+    def _send(
+        self,
+        host: _Host,
+        method: str,
+        target: str,
+        body: Optional[bytes],
+        headers: Dict[str, str],
+    ) -> Tuple[int, Optional[str], bytes]:
+        if not host.slots.acquire(timeout=self.timeout):
+            self.saturated += 1
+            raise PoolSaturatedError(f"No free connection to {host.key} within {self.timeout:g}s")
+        try:
+            try:
+                conn = host.idle.pop()
+                reused = True
+                self.reused += 1
+            except IndexError:
+                conn = self._connect(host)
+                reused = False
+
+            try:
+                try:
+                    response, data = self._exchange(conn, method, target, body, headers)
+                except _STALE_ERRORS:
+                    if not reused:
+                        raise
+                    conn.close()
+                    conn = self._connect(host)
+                    response, data = self._exchange(conn, method, target, body, headers)
+            except BaseException:
+                conn.close()
+                raise
+
+            if response.will_close or len(host.idle) >= self.max_idle_per_host:
+                conn.close()
+            else:
+                host.idle.append(conn)
+            return response.status, response.getheader("Retry-After"), data
+        finally:
+            host.slots.release()
+
+    def _backoff(self, attempt: int, retry_after: Optional[str]) -> float:
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+        if retry_after is not None and retry_after.strip().isdigit():
+            delay = max(delay, float(retry_after))
+        return min(delay, self.backoff_max)
+
+    def request(
+        self,
+        method: str,
+        url: str,
+        body: Optional[bytes] = None,
+        headers: Optional[Mapping[str, str]] = None,
+    ) -> Tuple[int, bytes]:
+        """Send one request (retrying as configured) and return ``(status, body)``."""
+        parts = urlsplit(url)
+        if parts.scheme not in ("http", "https") or not parts.hostname:
+            raise ValueError(f"Unsupported URL: {url}")
+        host = self._host(parts.scheme, parts.hostname, parts.port or (443 if parts.scheme == "https" else 80))
+        target = parts.path or "/"
+        if parts.query:
+            target = f"{target}?{parts.query}"
+        request_headers = {"Accept": "application/json"}
+        if headers:
+            request_headers.update(headers)
+
+        if not host.breaker.allow():
+            self.rejected += 1
+            raise CircuitOpenError(f"Circuit open for {host.key}; skipping request")
+
+        self.requests += 1
+        attempt = 0
+        while True:
+            error: Optional[BaseException] = None
+            status, retry_after, data = 0, None, b""
+            try:
+                status, retry_after, data = self._send(host, method, target, body, request_headers)
+            except ValueError:
+                # Oversized response: the host is up, the answer is unusable.
+                host.breaker.record_success()
+                raise
+            except (OSError, http.client.HTTPException) as exc:
+                error = exc
+
+            if error is None and status not in RETRY_STATUSES:
+                if status >= 500:
+                    host.breaker.record_failure()
+                else:
+                    host.breaker.record_success()
+                return status, data
+
+            if attempt >= self.max_retries:
+                host.breaker.record_failure()
+                if error is not None:
+                    raise error
+                return status, data
+
+            delay = self._backoff(attempt, retry_after)
+            attempt += 1
+            self.retries += 1
+            logger.debug(
+                "Retrying %s %s in %.3fs (attempt %d/%d): %s",
+                method,
+                url,
+                delay,
+                attempt,
+                self.max_retries,
+                error if error is not None else f"HTTP {status}",
+            )
+            time.sleep(delay)
+
+    def get(self, url: str, headers: Optional[Mapping[str, str]] = None) -> Tuple[int, bytes]:
+        return self.request("GET", url, headers=headers)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "requests": self.requests,
+            "connections_opened": self.opened,
+            "connections_reused": self.reused,
+            "retries": self.retries,
+            "rejected": self.rejected,
+            "saturated": self.saturated,
+            "open_circuits": sum(
+                1 for host in list(self._hosts.values()) if host.breaker.state != "closed"
+            ),
+        }
+
+    def close(self) -> None:
+        """Close idle connections; connections in use close when returned."""
+        with self._lock:
+            hosts = list(self._hosts.values())
+        for host in hosts:
+            while host.idle:
+                try:
+                    host.idle.pop().close()
+                except IndexError:
+                    break
+        self.max_idle_per_host = 0
+
+    def __enter__(self) -> "HTTPPool":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
+
+def pool_from_settings(settings: Dict[str, Any]) -> HTTPPool:
+    """
+    Build an HTTPPool from the optional ``http_pool`` block in settings.json.
+
+    Requests time out after the top-level ``request_timeout``.
+    """
+    config = settings.get("http_pool") or {}
+    max_idle = config.get("max_idle_per_host")
+    return HTTPPool(
+        timeout=float(settings.get("request_timeout", DEFAULT_TIMEOUT)),
+        max_per_host=int(config.get("max_per_host", DEFAULT_MAX_PER_HOST)),
+        max_idle_per_host=int(max_idle) if max_idle is not None else None,
+        max_retries=int(config.get("max_retries", DEFAULT_MAX_RETRIES)),
+        backoff_base=float(config.get("backoff_base", DEFAULT_BACKOFF_BASE)),
+        backoff_max=float(config.get("backoff_max", DEFAULT_BACKOFF_MAX)),
+        failure_threshold=int(config.get("failure_threshold", DEFAULT_FAILURE_THRESHOLD)),
+        reset_seconds=float(config.get("reset_seconds", DEFAULT_RESET_SECONDS)),
+        max_response_bytes=int(config.get("max_response_bytes", DEFAULT_MAX_RESPONSE_BYTES)),
+    )
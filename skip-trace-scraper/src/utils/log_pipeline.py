@@ -0,0 +1,255 @@
+import atexit
+import json
+import logging
+import logging.handlers
+import queue
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+TEXT_FORMAT = "%(asctime)s [%(levelname)s] %(name)s - %(message)s"
+LOG_FORMATS = ("text", "json")
+
+# Parent of the loggers that log once per query ("queries.<module>"). They
+# are off unless ``per_query`` is set, which costs a single level check per
+# call: no LogRecord is created.
+QUERY_LOGGER = "queries"
+_QUERY_LOGS_OFF = logging.CRITICAL + 1
+
+DEFAULT_RATE_LIMIT_BURST = 10
+DEFAULT_RATE_LIMIT_SECONDS = 60.0
+
+# Attributes every LogRecord has; anything else was passed as ``extra``.
+_RECORD_ATTRS = frozenset(
+    vars(logging.LogRecord("", logging.INFO, "", 0, "", None, None))
+) | {"message", "asctime", "taskName"}
+
+class JsonFormatter(logging.Formatter):
+    """
+    One JSON object per line: time (UTC, ISO 8601), level, logger, message,
+    the exception if any, and every ``extra`` attribute of the record
+    (``sample_every`` and ``suppressed`` from the filters below included).
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry: Dict[str, Any] = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(
+                timespec="milliseconds"
+            ),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRS:
+                entry[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        if record.stack_info:
+            entry["stack"] = record.stack_info
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+class SamplingFilter(logging.Filter):
+    """
+    Keep one in ``every[prefix]`` records of each event.
+
+    An event is a logger plus a message template, so "Looking up identity
+    for '%s'..." is sampled on its own counter whatever the input. The rate
+    of a logger comes from the longest matching prefix of its name (e.g.
+    ``{"queries": 100}``); loggers without one are not sampled. Kept records
+    carry ``sample_every``.
+    """
+
+    def __init__(self, every: Dict[str, int]) -> None:
+        super().__init__()
+        self._every = {prefix: int(n) for prefix, n in every.items() if int(n) > 1}
+        self._rates: Dict[str, int] = {}
+        self._counts: Dict[Tuple[str, str], int] = {}
+        self._lock = threading.Lock()
+
+    def _rate(self, name: str) -> int:
+        rate = self._rates.get(name)
+        if rate is None:
+            matches = [
+                prefix
+                for prefix in self._every
+                if name == prefix or name.startswith(prefix + ".")
+            ]
+            rate = self._every[max(matches, key=len)] if matches else 1
+            self._rates[name] = rate
+        return rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        rate = self._rate(record.name)
+        if rate == 1:
+            return True
+        key = (record.name, str(record.msg))
+        with self._lock:
+            count = self._counts.get(key, 0)
+            self._counts[key] = count + 1
+        if count % rate:
+            return False
+        record.sample_every = rate
+        return True
+
+class RateLimitFilter(logging.Filter):
+    """
+    Pass at most ``burst`` records of each event per ``interval`` seconds.
+
+    Events are keyed like ``SamplingFilter``'s plus the level, so a flood
+    of identical misses ("Failed to process query '%s'...") is cut to a
+    handful per interval. The first record let through after a suppressed
+    stretch says how many were dropped (and carries ``suppressed``);
+    ``pending`` lists what is still unreported.
+    """
+
+    def __init__(
+        self,
+        burst: int = DEFAULT_RATE_LIMIT_BURST,
+        interval: float = DEFAULT_RATE_LIMIT_SECONDS,
+    ) -> None:
+        super().__init__()
+        self.burst = burst
+        self.interval = interval
+        # key -> [window start, passed in window, suppressed since last report]
+        self._windows: Dict[Tuple[str, int, str], List[Any]] = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        key = (record.name, record.levelno, str(record.msg))
+        now = time.monotonic()
+        with self._lock:
+            window = self._windows.get(key)
+            if window is None:
+                self._windows[key] = [now, 1, 0]
+                return True
+            if now - window[0] >= self.interval:
+                window[0] = now
+                window[1] = 0
+            if window[1] >= self.burst:
+                window[2] += 1
+                return False
+            window[1] += 1
+            suppressed = window[2]
+            window[2] = 0
+        if suppressed:
+            record.msg = f"{record.msg} ({suppressed} similar message(s) suppressed)"
+            record.suppressed = suppressed
+        return True
+
+    def pending(self) -> List[Tuple[str, int, str, int]]:
+        """``(logger, level, message template, suppressed)`` not reported yet."""
+        with self._lock:
+            return [
+                (name, level, msg, window[2])
+                for (name, level, msg), window in self._windows.items()
+                if window[2]
+            ]
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler that hands the listener the merged message and traceback
+    text but leaves formatting to the listener's handler.
+    """
+
+    _tracebacks = logging.Formatter()
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # The root handler is the only one, so the record is ours to change.
+        # Merge the arguments now: they may change before the listener runs.
+        record.msg = record.message = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = self._tracebacks.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+_listener: Optional[logging.handlers.QueueListener] = None
+_rate_limit: Optional[RateLimitFilter] = None
+_atexit_registered = False
+
+def configure_logging(level_name: str, config: Optional[Dict[str, Any]] = None) -> None:
+    """
+    Set up the root logger from ``log_level`` and the optional ``logging`` block.
+
+    ``format`` is "text" (the default) or "json" (``JsonFormatter``). With
+    ``queue`` (the default) callers only put records on a queue, and a
+    listener thread formats and writes them to stderr; otherwise records
+    are written inline. ``per_query`` turns on the ``queries.*`` loggers,
+    which log every lookup, enrichment and miss. ``sample_every`` maps
+    logger name prefixes to sampling rates (``SamplingFilter``), and
+    ``rate_limit`` (``burst`` records per ``interval_seconds`` and event;
+    off unless set) caps repeated messages (``RateLimitFilter``).
+
+    Replaces any handlers already on the root logger; call
+    ``shutdown_logging`` (run at exit too) to flush the queue.
+    """
+    global _listener, _rate_limit, _atexit_registered
+    config = config or {}
+    log_format = str(config.get("format", "text")).lower()
+    if log_format not in LOG_FORMATS:
+        raise ValueError(
+            f"Unknown log format '{log_format}' (expected one of: {', '.join(LOG_FORMATS)})"
+        )
+
+    shutdown_logging()
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+        handler.close()
+    root.setLevel(getattr(logging, level_name.upper(), logging.INFO))
+    logging.getLogger(QUERY_LOGGER).setLevel(
+        logging.NOTSET if config.get("per_query", False) else _QUERY_LOGS_OFF
+    )
+
+    output = logging.StreamHandler(sys.stderr)
+    output.setFormatter(JsonFormatter() if log_format == "json" else logging.Formatter(TEXT_FORMAT))
+
+    rate_limit = config.get("rate_limit")
+    _rate_limit = (
+        RateLimitFilter(
+            int(rate_limit.get("burst", DEFAULT_RATE_LIMIT_BURST)),
+            float(rate_limit.get("interval_seconds", DEFAULT_RATE_LIMIT_SECONDS)),
+        )
+        if rate_limit is not None
+        else None
+    )
+    filters: List[logging.Filter] = []
+    if config.get("sample_every"):
+        filters.append(SamplingFilter(config["sample_every"]))
+    if _rate_limit is not None:
+        filters.append(_rate_limit)
+
+    handler: logging.Handler = output
+    if config.get("queue", True):
+        records: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+        handler = _QueueHandler(records)
+        _listener = logging.handlers.QueueListener(records, output)
+        _listener.start()
+        if not _atexit_registered:
+            atexit.register(shutdown_logging)
+            _atexit_registered = True
+    # Filters go on the handler callers run, so dropped records never reach the queue.
+    for log_filter in filters:
+        handler.addFilter(log_filter)
+    root.addHandler(handler)
+    logger.debug("Logging configured at %s level (%s output)", level_name, log_format)
+
+def shutdown_logging() -> None:
+    """Report messages the rate limit is still holding back and drain the queue."""
+    global _listener, _rate_limit
+    rate_limit, _rate_limit = _rate_limit, None
+    if rate_limit is not None:
+        for name, level, msg, suppressed in rate_limit.pending():
+            logging.getLogger(name).log(
+                level, "%d more message(s) like this were suppressed: %s", suppressed, msg
+            )
+    listener, _listener = _listener, None
+    if listener is not None:
+        listener.stop()
@@ -0,0 +1,265 @@
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+CacheKey = Tuple[str, str]
+
+DEFAULT_TTL_SECONDS = 7 * 24 * 3600
+DEFAULT_MEMORY_ENTRIES = 10_000
+DEFAULT_DISK_ENTRIES = 1_000_000
+# Disk writes are committed and the disk tier trimmed every this many puts.
+COMMIT_EVERY = 100
+EVICT_EVERY = 1_000
+# Disk hits refresh their rows' access time in batches of this many.
+TOUCH_EVERY = 1_000
+# Settings that decide what a query resolves to; see ``dataset_fingerprint``.
+DATASET_SETTINGS = ("record_store", "source_url", "federation", "fuzzy_threshold")
+
+@dataclass
+class CacheStats:
+    hits: int = 0
+    misses: int = 0
+    memory_hits: int = 0
+    disk_hits: int = 0
+    expired: int = 0
+    evictions: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+class LookupCache:
+    """
+    Two-tier cache of raw lookup records keyed by normalized query.
+
+    Keys are ``(normalized_option, normalized_input)`` tuples. The first tier
+    is an in-process LRU of ``memory_entries`` records; the optional second
+    tier is a SQLite file that survives across runs and is trimmed to
+    ``disk_entries`` least recently used rows. Every entry carries its own
+    expiry time, and expired entries are treated as misses. Keys do not
+    name the dataset, so one file must only cache one dataset
+    (``cache_from_settings`` names the file after ``dataset_fingerprint``).
+
+    A disk hit does not write: access times are refreshed in batches of
+    ``TOUCH_EVERY`` (and before trimming), so recency is slightly stale.
+    Disk writes are committed every ``commit_every`` writes. When several
+    processes share one file, use 1 so no process holds the write lock
+    across lookups.
+
+    The cache is safe to share between threads.
+    """
+
+    def __init__(
+        self,
+        path: Optional[Path] = None,
+        memory_entries: int = DEFAULT_MEMORY_ENTRIES,
+        disk_entries: int = DEFAULT_DISK_ENTRIES,
+        ttl_seconds: float = DEFAULT_TTL_SECONDS,
+        commit_every: int = COMMIT_EVERY,
+    ) -> None:
+        self.path = path
+        self.memory_entries = memory_entries
+        self.disk_entries = disk_entries
+        self.ttl_seconds = ttl_seconds
+        self.commit_every = max(1, commit_every)
+        self.stats = CacheStats()
+
+        self._memory: "OrderedDict[CacheKey, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        self._pending_writes = 0
+        self._puts_since_evict = 0
+        self._touched: Dict[CacheKey, float] = {}
+
+        if path is not None:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            self._db = sqlite3.connect(str(path), check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS lookup_cache ("
+                " option TEXT NOT NULL,"
+                " input TEXT NOT NULL,"
+                " value TEXT NOT NULL,"
+                " expires_at REAL NOT NULL,"
+                " accessed_at REAL NOT NULL,"
+                " PRIMARY KEY (option, input))"
+            )
+            self._db.execute(
+                "CREATE INDEX IF NOT EXISTS lookup_cache_accessed ON lookup_cache (accessed_at)"
+            )
+            self._db.commit()
+            logger.debug("Opened persistent lookup cache at %s", path)
+
+    def _remember(self, key: CacheKey, expires_at: float, value: Dict[str, Any]) -> None:
+        self._memory[key] = (expires_at, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+            self.stats.evictions += 1
+
+    def get(self, key: CacheKey) -> Optional[Dict[str, Any]]:
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self._memory.move_to_end(key)
+                    self.stats.hits += 1
+                    self.stats.memory_hits += 1
+                    return entry[1]
+                del self._memory[key]
+                self.stats.expired += 1
+
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT value, expires_at FROM lookup_cache WHERE option = ? AND input = ?",
+                    key,
+                ).fetchone()
+                if row is not None:
+                    if row[1] > now:
+                        self._touched[key] = now
+                        if len(self._touched) >= TOUCH_EVERY:
+                            self._flush_touches()
+                        value = json.loads(row[0])
+                        self._remember(key, row[1], value)
+                        self.stats.hits += 1
+                        self.stats.disk_hits += 1
+                        return value
+                    self._db.execute(
+                        "DELETE FROM lookup_cache WHERE option = ? AND input = ?", key
+                    )
+                    self._note_write()
+                    self.stats.expired += 1
+
+            self.stats.misses += 1
+            return None
+
+    def put(self, key: CacheKey, value: Dict[str, Any], ttl_seconds: Optional[float] = None) -> None:
+        now = time.time()
+        expires_at = now + (self.ttl_seconds if ttl_seconds is None else ttl_seconds)
+        with self._lock:
+            self._remember(key, expires_at, value)
+            if self._db is None:
+                return
+            self._db.execute(
+                "INSERT OR REPLACE INTO lookup_cache (option, input, value, expires_at, accessed_at)"
+                " VALUES (?, ?, ?, ?, ?)",
+                (*key, json.dumps(value, ensure_ascii=False), expires_at, now),
+            )
+            self._note_write()
+            self._puts_since_evict += 1
+            if self._puts_since_evict >= EVICT_EVERY:
+                self._evict_disk(now)
+
+    def _note_write(self) -> None:
+        self._pending_writes += 1
+        if self._pending_writes >= self.commit_every:
+            self._db.commit()
+            self._pending_writes = 0
+
+    def _flush_touches(self) -> None:
+        self._db.executemany(
+            "UPDATE lookup_cache SET accessed_at = ? WHERE option = ? AND input = ?",
+            [(accessed_at, *key) for key, accessed_at in self._touched.items()],
+        )
+        self._touched.clear()
+        self._note_write()
+
+    def _evict_disk(self, now: float) -> None:
+        self._puts_since_evict = 0
+        if self._touched:
+            self._flush_touches()
+        cursor = self._db.execute("DELETE FROM lookup_cache WHERE expires_at <= ?", (now,))
+        self.stats.expired += cursor.rowcount
+        (count,) = self._db.execute("SELECT COUNT(*) FROM lookup_cache").fetchone()
+        excess = count - self.disk_entries
+        if excess > 0:
+            self._db.execute(
+                "DELETE FROM lookup_cache WHERE rowid IN ("
+                " SELECT rowid FROM lookup_cache ORDER BY accessed_at LIMIT ?)",
+                (excess,),
+            )
+            self.stats.evictions += excess
+        self._db.commit()
+        self._pending_writes = 0
+
+    def close(self) -> None:
+        with self._lock:
+            if self._db is None:
+                return
+            self._evict_disk(time.time())
+            self._db.close()
+            self._db = None
+        logger.debug(
+            "Lookup cache closed: %d hit(s), %d miss(es), %d eviction(s)",
+            self.stats.hits,
+            self.stats.misses,
+            self.stats.evictions,
+        )
+
+def dataset_fingerprint(settings: Dict[str, Any], root_dir: Path) -> str:
+    """
+    Short hash of what lookups resolve against: the ``DATASET_SETTINGS``
+    plus the size and modification time of every file they name with a
+    ``path``, so switching or rebuilding a record index changes it.
+    """
+    config = {name: settings.get(name) for name in DATASET_SETTINGS}
+    files = []
+
+    def collect(node: Any) -> None:
+        if isinstance(node, dict):
+            for name, value in node.items():
+                if name == "path" and isinstance(value, str):
+                    try:
+                        stat = (root_dir / value).stat()
+                    except OSError:
+                        continue
+                    files.append([value, stat.st_size, stat.st_mtime_ns])
+                else:
+                    collect(value)
+        elif isinstance(node, list):
+            for value in node:
+                collect(value)
+
+    collect(config)
+    encoded = json.dumps([config, files], sort_keys=True, default=str).encode("utf-8")
+    return hashlib.sha1(encoded).hexdigest()[:12]
+
+def cache_from_settings(
+    settings: Dict[str, Any], root_dir: Path, commit_every: int = COMMIT_EVERY
+) -> Optional[LookupCache]:
+    """
+    Build a LookupCache from the optional ``cache`` block in settings.json.
+
+    Returns None when caching is disabled (no block, or ``"enabled": false``).
+    A relative ``path`` is resolved against ``root_dir``, and the dataset's
+    fingerprint is added to the file name ("lookups.sqlite3" becomes
+    "lookups-<fingerprint>.sqlite3"), so results cached for one record store
+    or source are never served for another. Without a path only the
+    in-process tier is used.
+    """
+    config = settings.get("cache")
+    if not config or not config.get("enabled", True):
+        return None
+
+    path = root_dir / config["path"] if config.get("path") else None
+    if path is not None:
+        path = path.with_name(f"{path.stem}-{dataset_fingerprint(settings, root_dir)}{path.suffix}")
+    return LookupCache(
+        path=path,
+        memory_entries=int(config.get("memory_entries", DEFAULT_MEMORY_ENTRIES)),
+        disk_entries=int(config.get("disk_entries", DEFAULT_DISK_ENTRIES)),
+        ttl_seconds=float(config.get("ttl_seconds", DEFAULT_TTL_SECONDS)),
+        commit_every=commit_every,
+    )
@@ -0,0 +1,13 @@
+from typing import Optional
+
+# Shortest digit string treated as a phone number for blocking.
+MIN_PHONE_DIGITS = 7
+# Largest age difference (years) still taken as the same person.
+MAX_AGE_GAP = 1
+
+def phone_key(number: Optional[str]) -> Optional[str]:
+    """Digits of a phone number, without a leading US country code; None if too short."""
+    digits = "".join(ch for ch in number or "" if ch.isdigit())
+    if len(digits) == 11 and digits.startswith("1"):
+        digits = digits[1:]
+    return digits if len(digits) >= MIN_PHONE_DIGITS else None
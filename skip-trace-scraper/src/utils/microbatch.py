@@ -0,0 +1,121 @@
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, Generic, List, Optional, Sequence, Tuple, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+DEFAULT_MAX_BATCH = 32
+DEFAULT_MAX_WAIT_SECONDS = 0.002
+
+_STOP = object()
+
+class MicroBatcher(Generic[T, R]):
+    """
+    Group items submitted from many threads into batches for one handler.
+
+    ``submit`` returns a Future at once. A background thread waits for the
+    first item, then keeps collecting until it has ``max_batch`` items or
+    ``max_wait`` seconds have passed, and calls ``handler`` with the batch.
+    The handler returns one entry per item, in order; an entry that is an
+    exception instance fails only that item's Future. If the handler itself
+    raises, every item in the batch fails with that error.
+
+    Under light load a request waits at most ``max_wait`` for company; under
+    heavy load batches fill up and per-item overhead is paid once per batch.
+    """
+
+    def __init__(
+        self,
+        handler: Callable[[List[T]], Sequence[Any]],
+        max_batch: int = DEFAULT_MAX_BATCH,
+        max_wait: float = DEFAULT_MAX_WAIT_SECONDS,
+        name: str = "microbatch",
+    ) -> None:
+        self.handler = handler
+        self.max_batch = max(1, max_batch)
+        self.max_wait = max(0.0, max_wait)
+        self.batches = 0
+        self.items = 0
+        self._queue: "queue.Queue[Any]" = queue.Queue()
+        self._closed = False
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    @property
+    def pending(self) -> int:
+        return self._queue.qsize()
+
+    def submit(self, item: T) -> "Future[R]":
+        future: "Future[R]" = Future()
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("MicroBatcher is closed")
+            self._queue.put((item, future))
+        return future
+
+    def _collect(self) -> Tuple[List[Tuple[T, "Future[R]"]], bool]:
+        first = self._queue.get()
+        if first is _STOP:
+            return [], True
+        batch = [first]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            try:
+                entry = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if entry is _STOP:
+                return batch, True
+            batch.append(entry)
+        return batch, False
+
+    def _run(self) -> None:
+        stop = False
+        while not stop:
+            batch, stop = self._collect()
+            if batch:
+                self._dispatch(batch)
+
+    def _dispatch(self, batch: List[Tuple[T, "Future[R]"]]) -> None:
+        self.batches += 1
+        self.items += len(batch)
+        try:
+            results = self.handler([item for item, _ in batch])
+            if len(results) != len(batch):
+                raise RuntimeError(
+                    f"Batch handler returned {len(results)} result(s) for {len(batch)} item(s)"
+                )
+        except Exception as exc:
+            logger.exception("Batch of %d item(s) failed", len(batch))
+            for _, future in batch:
+                future.set_exception(exc)
+            return
+
+        for (_, future), result in zip(batch, results):
+            if isinstance(result, BaseException):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+    def close(self, timeout: Optional[float] = None) -> None:
+        """Finish the items already submitted, then stop the batching thread."""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._queue.put(_STOP)
+        self._thread.join(timeout)
+
+    def __enter__(self) -> "MicroBatcher[T, R]":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
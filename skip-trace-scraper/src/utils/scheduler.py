@@ -0,0 +1,236 @@
+import asyncio
+import logging
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Iterable, Iterator, Optional, Tuple, TypeVar, Union
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+DEFAULT_RATE_LIMIT_KEY = "*"
+
+class TokenBucket:
+    """
+    Thread-safe token bucket.
+
+    ``rate`` tokens are added per second up to ``burst``; ``acquire`` blocks
+    the calling thread until a token is available.
+    """
+
+    def __init__(self, rate: float, burst: Optional[float] = None) -> None:
+        if rate <= 0:
+            raise ValueError("Rate limit must be a positive number of requests per second")
+        self.rate = float(rate)
+        self.burst = float(burst) if burst is not None else max(1.0, self.rate)
+        if self.burst < 1:
+            raise ValueError("Rate limit burst must allow at least one request")
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _take(self) -> float:
+        """Take a token if one is available, else return how long to wait."""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0.0
+            return (1 - self._tokens) / self.rate
+
+    def acquire(self) -> None:
+        # Sleep outside the lock so other callers are not held up.
+        while True:
+            delay = self._take()
+            if not delay:
+                return
+            time.sleep(delay)
+
+    async def aacquire(self) -> None:
+        while True:
+            delay = self._take()
+            if not delay:
+                return
+            await asyncio.sleep(delay)
+
+class SearchRateLimiter:
+    """
+    Per-search-option rate limits built from the ``search_rate_limits`` setting.
+
+    Keys are search options such as ``"Phone Search"`` (matched
+    case-insensitively); values are either a number of lookups per second or
+    ``{"rate": ..., "burst": ...}``. The ``"*"`` key, if present, is one
+    shared bucket for every search option without its own entry. Options
+    with no applicable limit are never throttled.
+    """
+
+    def __init__(self, limits: Optional[Dict[str, Union[float, Dict[str, float]]]] = None) -> None:
+        self._buckets: Dict[str, TokenBucket] = {}
+        for option, spec in (limits or {}).items():
+            if isinstance(spec, dict):
+                bucket = TokenBucket(spec["rate"], spec.get("burst"))
+            else:
+                bucket = TokenBucket(spec)
+            self._buckets[option.strip().lower()] = bucket
+        self._default = self._buckets.pop(DEFAULT_RATE_LIMIT_KEY, None)
+
+    def __bool__(self) -> bool:
+        return bool(self._buckets) or self._default is not None
+
+    def acquire(self, option: str) -> None:
+        bucket = self._buckets.get(option.strip().lower(), self._default)
+        if bucket is not None:
+            bucket.acquire()
+
+    async def aacquire(self, option: str) -> None:
+        bucket = self._buckets.get(option.strip().lower(), self._default)
+        if bucket is not None:
+            await bucket.aacquire()
+
+class BoundedScheduler:
+    """
+    Run a function over an iterator of items with bounded in-flight work.
+
+    Unlike submitting every item to a ThreadPoolExecutor up front, at most
+    ``max_workers * max_in_flight_per_worker`` futures exist at any time; the
+    next item is only pulled from the iterator when a slot frees up. Memory
+    therefore stays capped regardless of input size, and slow consumers
+    naturally apply backpressure to the reader.
+    """
+
+    def __init__(
+        self,
+        max_workers: int,
+        max_in_flight_per_worker: int = 2,
+        rate_limiter: Optional[SearchRateLimiter] = None,
+    ) -> None:
+        if max_workers < 1:
+            raise ValueError("max_workers must be at least 1")
+        if max_in_flight_per_worker < 1:
+            raise ValueError("max_in_flight_per_worker must be at least 1")
+        self.max_workers = max_workers
+        self.max_in_flight = max_workers * max_in_flight_per_worker
+        self.rate_limiter = rate_limiter
+        self.feed_error: Optional[BaseException] = None
+
+    def _call(self, fn: Callable[[T], R], item: T, limit_key: Optional[Callable[[T], str]]) -> R:
+        if self.rate_limiter and limit_key is not None:
+            self.rate_limiter.acquire(limit_key(item))
+        return fn(item)
+
+    def run(
+        self,
+        fn: Callable[[T], R],
+        items: Iterable[T],
+        limit_key: Optional[Callable[[T], str]] = None,
+    ) -> Iterator[Tuple[T, "Future[R]"]]:
+        """
+        Yield ``(item, future)`` pairs in completion order.
+
+        ``limit_key`` maps an item to its rate-limit key (its search option). If reading from
+        ``items`` fails, feeding stops, in-flight work is still drained and
+        yielded, and the error is kept on ``feed_error`` for the caller.
+        """
+        self.feed_error = None
+        iterator = iter(items)
+        exhausted = False
+        pending: Dict["Future[R]", T] = {}
+
+        executor = ThreadPoolExecutor(max_workers=self.max_workers)
+        try:
+            while True:
+                while not exhausted and len(pending) < self.max_in_flight:
+                    try:
+                        item = next(iterator)
+                    except StopIteration:
+                        exhausted = True
+                        break
+                    except Exception as exc:
+                        logger.error("Stopped reading work items: %s", exc)
+                        self.feed_error = exc
+                        exhausted = True
+                        break
+                    pending[executor.submit(self._call, fn, item, limit_key)] = item
+
+                if not pending:
+                    return
+
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield pending.pop(future), future
+        finally:
+            # Only reached early if the consumer stops iterating.
+            executor.shutdown(wait=True, cancel_futures=True)
+
+async def run_async_bounded(
+    fn: Callable[[T], Awaitable[R]],
+    items: Iterable[T],
+    max_in_flight: int,
+    rate_limiter: Optional[SearchRateLimiter] = None,
+    limit_key: Optional[Callable[[T], str]] = None,
+) -> AsyncIterator[Tuple[T, "asyncio.Task[R]"]]:
+    """
+    asyncio counterpart of ``BoundedScheduler.run``.
+
+    At most ``max_in_flight`` tasks exist at once; finished tasks are yielded
+    as ``(item, task)`` pairs in completion order. Errors raised by ``items``
+    propagate only after the in-flight tasks have been drained.
+    """
+    if max_in_flight < 1:
+        raise ValueError("max_in_flight must be at least 1")
+
+    async def call(item: T) -> R:
+        if rate_limiter and limit_key is not None:
+            await rate_limiter.aacquire(limit_key(item))
+        return await fn(item)
+
+    iterator = iter(items)
+    exhausted = False
+    feed_error: Optional[BaseException] = None
+    pending: Dict["asyncio.Task[R]", T] = {}
+
+    try:
+        while True:
+            while not exhausted and len(pending) < max_in_flight:
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    exhausted = True
+                    break
+                except Exception as exc:
+                    logger.error("Stopped reading work items: %s", exc)
+                    feed_error = exc
+                    exhausted = True
+                    break
+                pending[asyncio.create_task(call(item))] = item
+
+            if not pending:
+                break
+
+            done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                yield pending.pop(task), task
+    finally:
+        for task in pending:
+            task.cancel()
+
+    if feed_error is not None:
+        raise feed_error
+
+def scheduler_from_settings(settings: Dict[str, Any]) -> BoundedScheduler:
+    """Build a BoundedScheduler from the optional scheduler keys in settings.json."""
+    max_workers = int(settings.get("max_workers", 4))
+    max_concurrency = settings.get("max_concurrency")
+    if max_concurrency is not None:
+        max_workers = min(max_workers, int(max_concurrency))
+
+    rate_limiter = SearchRateLimiter(settings.get("search_rate_limits"))
+    return BoundedScheduler(
+        max_workers=max_workers,
+        max_in_flight_per_worker=int(settings.get("max_in_flight_per_worker", 2)),
+        rate_limiter=rate_limiter or None,
+    )
@@ -0,0 +1,220 @@
+import json
+from json.encoder import encode_basestring
+from operator import attrgetter
+from typing import TYPE_CHECKING, Any, List, Optional, Tuple
+
+if TYPE_CHECKING:
+    from extractors.identity_extractor import PersonRecord
+
+# (attribute, output key) of the optional scalar fields, in output order.
+SCALAR_FIELDS = (
+    ("age", "Age"),
+    ("born", "Born"),
+    ("lives_in", "Lives in"),
+    ("street_address", "Street Address"),
+    ("address_locality", "Address Locality"),
+    ("address_region", "Address Region"),
+    ("postal_code", "Postal Code"),
+    ("county_name", "County Name"),
+)
+
+# Email-N / Phone-N keys prepared up front; more are added on demand.
+PRECOMPILED_INDEXES = 10
+
+_get_scalars = attrgetter(*(attr for attr, _ in SCALAR_FIELDS))
+# Without indentation json's C encoder is the fastest way to nested values.
+_compact = json.JSONEncoder(ensure_ascii=False).encode
+
+def _encode(value: Any, indent: Optional[int], level: int) -> str:
+    """``json.dumps(value, indent=indent, ensure_ascii=False)`` nested ``level`` deep."""
+    if type(value) is str:
+        return encode_basestring(value)
+    if indent is None:
+        return _compact(value)
+    if isinstance(value, dict):
+        if not value:
+            return "{}"
+        if not all(type(key) is str for key in value):
+            # Leave non-string key coercion to json itself.
+            return _reindent(json.dumps(value, indent=indent, ensure_ascii=False), indent, level)
+        items = [
+            f"{encode_basestring(key)}: {_encode(item, indent, level + 1)}"
+            for key, item in value.items()
+        ]
+        return _join(items, "{", "}", indent, level)
+    if isinstance(value, (list, tuple)):
+        if not value:
+            return "[]"
+        return _join([_encode(item, indent, level + 1) for item in value], "[", "]", indent, level)
+    return _compact(value)
+
+def _join(items: List[str], open_: str, close: str, indent: int, level: int) -> str:
+    inner = "\n" + " " * (indent * (level + 1))
+    return f"{open_}{inner}{(',' + inner).join(items)}\n{' ' * (indent * level)}{close}"
+
+def _reindent(text: str, indent: int, level: int) -> str:
+    if level == 0:
+        return text
+    # JSON strings never contain raw newlines.
+    return text.replace("\n", "\n" + " " * (indent * level))
+
+class RecordSerializer:
+    """
+    Serialize a ``PersonRecord`` straight to JSON without building ``to_dict``.
+
+    The output is exactly ``json.dumps(record.to_dict(), indent=indent,
+    ensure_ascii=False)``. Quoted keys and separators are precompiled per
+    instance; ``level`` is the nesting depth of the record in the enclosing
+    document (1 for an element of a top-level array), so the text can be
+    spliced into a larger indented document as is.
+    """
+
+    def __init__(self, indent: Optional[int] = None, level: int = 0) -> None:
+        self.indent = indent
+        self.level = level
+        if indent is None:
+            first, sep, self._close = "", ", ", "}"
+        else:
+            pad = "\n" + " " * (indent * (level + 1))
+            first, sep, self._close = pad, "," + pad, "\n" + " " * (indent * level) + "}"
+        self._sep = sep
+
+        def key(name: str) -> str:
+            return f"{sep}{encode_basestring(name)}: "
+
+        self._head = f"{{{first}{encode_basestring('Search Option')}: "
+        self._input_key = key("Input Given")
+        self._first_name_key = key("First Name")
+        self._last_name_key = key("Last Name")
+        self._scalar_keys = tuple(key(name) for _, name in SCALAR_FIELDS)
+        self._previous_key = key("Previous Addresses")
+        self._relatives_key = key("Relatives")
+        self._associates_key = key("Associates")
+        self._link_key = key("Person Link")
+        self._fuzzy_keys = f'{key("Match Type")}"fuzzy"{key("Match Score")}'
+        self._matched_key = key("Matched Queries")
+        self._indexed: Tuple[List[str], List[Tuple[str, str, str]]] = ([], [])
+        self._indexed_keys(PRECOMPILED_INDEXES)
+
+        # Relation lists: [{"Name": ..., "Age": ...}, ...] one level deeper.
+        if indent is None:
+            self._rel_first, self._rel_sep, self._rel_close = "[", ", ", "]"
+            name_prefix, age_prefix, obj_close = '{"Name": ', ', "Age": ', "}"
+        else:
+            list_pad = "\n" + " " * (indent * (level + 2))
+            obj_pad = "\n" + " " * (indent * (level + 3))
+            self._rel_first = "[" + list_pad
+            self._rel_sep = "," + list_pad
+            self._rel_close = "\n" + " " * (indent * (level + 1)) + "]"
+            name_prefix = "{" + obj_pad + '"Name": '
+            age_prefix = "," + obj_pad + '"Age": '
+            obj_close = list_pad + "}"
+        self._rel_name = name_prefix
+        self._rel_age = age_prefix
+        self._rel_obj_close = obj_close
+
+    def _value(self, value: Any) -> str:
+        if type(value) is str:
+            return encode_basestring(value)
+        return _encode(value, self.indent, self.level + 1)
+
+    def _indexed_keys(self, count: int) -> Tuple[List[str], List[Tuple[str, str, str]]]:
+        """Key fragments for ``Email-N`` / ``Phone-N ...`` up to ``count``."""
+        email_keys = list(self._indexed[0])
+        phone_keys = list(self._indexed[1])
+        for idx in range(len(email_keys) + 1, count + 1):
+            email_keys.append(f"{self._sep}\"Email-{idx}\": ")
+            phone_keys.append(
+                (
+                    f"{self._sep}\"Phone-{idx}\": ",
+                    f"{self._sep}\"Phone-{idx} Type\": ",
+                    f"{self._sep}\"Phone-{idx} Provider\": ",
+                )
+            )
+        # Swapped in whole so concurrent callers never see a half-built table.
+        self._indexed = (email_keys, phone_keys)
+        return self._indexed
+
+    def _relations(self, relations: List[Any]) -> str:
+        indent = self.indent
+        level = self.level + 3
+        parts = []
+        for rel in relations:
+            parts.append(
+                f"{self._rel_name}{_encode(rel.name, indent, level)}{self._rel_age}"
+                f"{_encode(rel.age, indent, level)}{self._rel_obj_close}"
+            )
+        return self._rel_first + self._rel_sep.join(parts) + self._rel_close
+
+    def dumps(self, record: "PersonRecord") -> str:
+        value = self._value
+        parts = [
+            self._head,
+            value(record.search_option),
+            self._input_key,
+            value(record.input_given),
+            self._first_name_key,
+            value(record.first_name),
+            self._last_name_key,
+            value(record.last_name),
+        ]
+
+        for key, scalar in zip(self._scalar_keys, _get_scalars(record)):
+            if scalar is not None:
+                parts.append(key)
+                parts.append(value(scalar))
+
+        emails = record.emails
+        phones = record.phones
+        email_keys, phone_keys = self._indexed
+        count = max(len(emails), len(phones))
+        if count > len(email_keys):
+            email_keys, phone_keys = self._indexed_keys(count)
+
+        for key, email in zip(email_keys, emails):
+            parts.append(key)
+            parts.append(value(email))
+
+        for (number_key, type_key, provider_key), phone in zip(phone_keys, phones):
+            number = phone.get("number")
+            if number:
+                parts.append(number_key)
+                parts.append(value(number))
+            type_ = phone.get("type")
+            if type_:
+                parts.append(type_key)
+                parts.append(value(type_))
+            provider = phone.get("provider")
+            if provider:
+                parts.append(provider_key)
+                parts.append(value(provider))
+
+        if record.previous_addresses:
+            parts.append(self._previous_key)
+            parts.append(_encode(record.previous_addresses, self.indent, self.level + 1))
+        if record.relatives:
+            parts.append(self._relatives_key)
+            parts.append(self._relations(record.relatives))
+        if record.associates:
+            parts.append(self._associates_key)
+            parts.append(self._relations(record.associates))
+        if record.person_link:
+            parts.append(self._link_key)
+            parts.append(value(record.person_link))
+        if record.match_score is not None:
+            parts.append(self._fuzzy_keys)
+            parts.append(_encode(record.match_score, self.indent, self.level + 1))
+        if record.matched_queries:
+            parts.append(self._matched_key)
+            parts.append(_encode(record.matched_queries, self.indent, self.level + 1))
+
+        parts.append(self._close)
+        return "".join(parts)
+
+    def encode(self, record: "PersonRecord") -> bytes:
+        """UTF-8 encoded ``dumps``."""
+        return self.dumps(record).encode("utf-8")
+
+    def encode_line(self, record: "PersonRecord") -> bytes:
+        """One JSON Lines row (the record followed by a newline)."""
+        return (self.dumps(record) + "\n").encode("utf-8")
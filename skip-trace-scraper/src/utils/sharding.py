@@ -0,0 +1,40 @@
+import zlib
+from typing import Dict, Generic, Iterator, TypeVar
+
+T = TypeVar("T")
+
+_SKIPPED = object()
+
+def shard_for(key: str, shards: int) -> int:
+    """Stable shard number of an already normalized key (same in every process)."""
+    return zlib.crc32(key.encode("utf-8")) % shards
+
+class ReorderBuffer(Generic[T]):
+    """
+    Release items in sequence order no matter the order they complete in.
+
+    Items are ``put`` under their sequence number; ``skip`` marks a number
+    that will never produce an item. ``pop_ready`` yields every item whose
+    predecessors have all been released.
+    """
+
+    def __init__(self, start: int = 0) -> None:
+        self.next_seq = start
+        self._items: Dict[int, object] = {}
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def put(self, seq: int, item: T) -> None:
+        self._items[seq] = item
+
+    def skip(self, seq: int) -> None:
+        self._items[seq] = _SKIPPED
+
+    def pop_ready(self) -> Iterator[T]:
+        items = self._items
+        while self.next_seq in items:
+            item = items.pop(self.next_seq)
+            self.next_seq += 1
+            if item is not _SKIPPED:
+                yield item  # type: ignore[misc]
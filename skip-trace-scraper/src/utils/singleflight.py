@@ -0,0 +1,99 @@
+import threading
+from typing import TYPE_CHECKING, Awaitable, Callable, Dict, Generic, Hashable, Optional, TypeVar
+
+# asyncio is imported inside AsyncSingleFlight.do: the threaded extractor
+# imports this module too and should not pay for asyncio at startup.
+if TYPE_CHECKING:
+    import asyncio
+
+T = TypeVar("T")
+
+class _Call(Generic[T]):
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self) -> None:
+        self.done = threading.Event()
+        self.result: Optional[T] = None
+        self.error: Optional[BaseException] = None
+
+class SingleFlight(Generic[T]):
+    """
+    Coalesce concurrent calls that share a key into one execution.
+
+    The first caller for a key runs ``fn``; callers arriving while it is still
+    running block and receive the same result (or exception). Once the call
+    finishes the key is forgotten, so later calls run ``fn`` again; caching
+    results is left to the caller.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, _Call[T]] = {}
+        self.executed = 0
+        self.coalesced = 0
+
+    def do(self, key: Hashable, fn: Callable[[], T]) -> T:
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                self.coalesced += 1
+                leader = False
+            else:
+                call = self._calls[key] = _Call()
+                self.executed += 1
+                leader = True
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result  # type: ignore[return-value]
+
+        try:
+            call.result = fn()
+        except BaseException as exc:
+            call.error = exc
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result
+
+class AsyncSingleFlight(Generic[T]):
+    """asyncio counterpart of ``SingleFlight`` for use within one event loop."""
+
+    def __init__(self) -> None:
+        self._calls: Dict[Hashable, "asyncio.Future[T]"] = {}
+        self.executed = 0
+        self.coalesced = 0
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> T:
+        import asyncio
+
+        future = self._calls.get(key)
+        if future is not None:
+            self.coalesced += 1
+            # Shield so one cancelled waiter does not cancel the shared call.
+            return await asyncio.shield(future)
+
+        future = asyncio.get_running_loop().create_future()
+        self._calls[key] = future
+        self.executed += 1
+        try:
+            result = await fn()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as exc:
+            if not future.cancelled():
+                future.set_exception(exc)
+                # Mark retrieved so a fetch nobody else waited on does not
+                # log "exception was never retrieved".
+                future.exception()
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            del self._calls[key]
@@ -0,0 +1,276 @@
+import json
+import logging
+import random
+from collections import deque
+from pathlib import Path
+from typing import Any, Deque, Dict, Iterable, Iterator, Tuple
+
+logger = logging.getLogger(__name__)
+
+HOUSEHOLD_SIZE = 3
+DEFAULT_DUPLICATE_RATIO = 0.3
+DEFAULT_MISS_RATIO = 0.05
+# How far back a repeated query may reach, and how strongly it favours recent ones.
+DUPLICATE_WINDOW = 4096
+DUPLICATE_SKEW = 3
+
+FIRST_NAMES = (
+    "James", "Mary", "Robert", "Patricia", "John", "Jennifer", "Michael", "Linda",
+    "David", "Elizabeth", "William", "Barbara", "Richard", "Susan", "Joseph", "Jessica",
+    "Thomas", "Sarah", "Charles", "Karen", "Christopher", "Lisa", "Daniel", "Nancy",
+    "Matthew", "Betty", "Anthony", "Margaret", "Mark", "Sandra", "Donald", "Ashley",
+    "Steven", "Kimberly", "Paul", "Emily", "Andrew", "Donna", "Joshua", "Michelle",
+    "Kenneth", "Carol", "Kevin", "Amanda", "Brian", "Dorothy", "George", "Melissa",
+    "Timothy", "Deborah", "Ronald", "Stephanie", "Edward", "Rebecca", "Jason", "Sharon",
+    "Jeffrey", "Laura", "Ryan", "Cynthia", "Jacob", "Kathleen", "Gary", "Amy",
+    "Nicholas", "Angela", "Eric", "Shirley", "Jonathan", "Anna", "Stephen", "Brenda",
+    "Larry", "Pamela", "Justin", "Emma", "Scott", "Nicole", "Brandon", "Helen",
+    "Luis", "Maria", "Jose", "Rosa", "Carlos", "Ana", "Miguel", "Lucia",
+)
+LAST_NAMES = (
+    "Smith", "Johnson", "Williams", "Brown", "Jones", "Garcia", "Miller", "Davis",
+    "Rodriguez", "Martinez", "Hernandez", "Lopez", "Gonzalez", "Wilson", "Anderson",
+    "Thomas", "Taylor", "Moore", "Jackson", "Martin", "Lee", "Perez", "Thompson",
+    "White", "Harris", "Sanchez", "Clark", "Ramirez", "Lewis", "Robinson", "Walker",
+    "Young", "Allen", "King", "Wright", "Scott", "Torres", "Nguyen", "Hill", "Flores",
+    "Green", "Adams", "Nelson", "Baker", "Hall", "Rivera", "Campbell", "Mitchell",
+    "Carter", "Roberts", "Gomez", "Phillips", "Evans", "Turner", "Diaz", "Parker",
+    "Cruz", "Edwards", "Collins", "Reyes", "Stewart", "Morris", "Morales", "Murphy",
+    "Cook", "Rogers", "Gutierrez", "Ortiz", "Morgan", "Cooper", "Peterson", "Bailey",
+    "Reed", "Kelly", "Howard", "Ramos", "Kim", "Cox", "Ward", "Richardson", "Watson",
+    "Brooks", "Chavez", "Wood", "James", "Bennett", "Gray", "Mendoza", "Ruiz", "Hughes",
+    "Price", "Alvarez", "Castillo", "Sanders", "Patel", "Myers", "Long", "Ross", "Foster",
+    "Whitsitt", "Sonnenberg",
+)
+STREET_NAMES = (
+    "Oak", "Maple", "Cedar", "Pine", "Elm", "Washington", "Lake", "Hill", "Park",
+    "Summerlin", "Meadowcove", "Sunset", "Ocean", "Ridge", "River", "Highland",
+    "Church", "Mill", "Spring", "Forest", "Lincoln", "Jackson", "Franklin", "Willow",
+)
+STREET_SUFFIXES = ("St", "Ave", "Rd", "Dr", "Pl", "Blvd", "Ln", "Ct", "Cir", "Way")
+# (city, state, zip prefix, county)
+CITIES = (
+    ("Jeffersonville", "IN", "471", "Clark County"),
+    ("Indianapolis", "IN", "462", "Marion County"),
+    ("Garland", "TX", "750", "Dallas County"),
+    ("Dallas", "TX", "752", "Dallas County"),
+    ("Houston", "TX", "770", "Harris County"),
+    ("Miami", "FL", "331", "Miami-Dade County"),
+    ("Orlando", "FL", "328", "Orange County"),
+    ("Los Angeles", "CA", "900", "Los Angeles County"),
+    ("San Diego", "CA", "921", "San Diego County"),
+    ("Phoenix", "AZ", "850", "Maricopa County"),
+    ("Chicago", "IL", "606", "Cook County"),
+    ("Columbus", "OH", "432", "Franklin County"),
+    ("Atlanta", "GA", "303", "Fulton County"),
+    ("Seattle", "WA", "981", "King County"),
+    ("Denver", "CO", "802", "Denver County"),
+    ("Nashville", "TN", "372", "Davidson County"),
+)
+EMAIL_DOMAINS = ("gmail.com", "yahoo.com", "hotmail.com", "outlook.com", "example.com")
+PHONE_TYPES = (
+    ("Wireless", "Verizon Wireless"),
+    ("Wireless", "T-Mobile USA"),
+    ("Wireless", "New Cingular Wireless PCS LLC - IL"),
+    ("Landline", "AT&T"),
+    ("Landline", "Frontier Communications"),
+    ("VoIP", "Bandwidth.com"),
+)
+MONTHS = (
+    "January", "February", "March", "April", "May", "June", "July", "August",
+    "September", "October", "November", "December",
+)
+SEARCH_KINDS = ("Name Search", "Phone Search", "Email Search", "Address Search")
+# Relative frequency of each search kind in generated queries.
+SEARCH_WEIGHTS = (50, 30, 12, 8)
+
+_MASK64 = (1 << 64) - 1
+
+def _mix(seed: int, idx: int, salt: int) -> int:
+    """splitmix64 of the inputs: a cheap, well-spread 64-bit hash."""
+    z = ((seed << 40) ^ (idx << 4) ^ salt) * 0x9E3779B97F4A7C15 & _MASK64
+    z = (z ^ (z >> 30)) * 0xBF58476D1CE4E5B9 & _MASK64
+    z = (z ^ (z >> 27)) * 0x94D049BB133111EB & _MASK64
+    return z ^ (z >> 31)
+
+def _rng(seed: int, idx: int, salt: int) -> random.Random:
+    return random.Random(_mix(seed, idx, salt))
+
+def _phone(serial: int) -> str:
+    """A distinct, well-formed US number for every serial below 8 * 10**9."""
+    area = 200 + (serial // 10_000_000) % 800
+    # 7919 is coprime with 10**7, so this permutes the line numbers.
+    line = (serial * 7919) % 10_000_000
+    return f"({area}) {line // 10_000:03d}-{line % 10_000:04d}"
+
+def _identity(seed: int, idx: int) -> Tuple[str, str, str, int]:
+    """(first name, middle initial, last name, age) of person ``idx``."""
+    last = LAST_NAMES[_mix(seed, idx // HOUSEHOLD_SIZE, 1) % len(LAST_NAMES)]
+    h = _mix(seed, idx, 2)
+    return (
+        FIRST_NAMES[h % len(FIRST_NAMES)],
+        chr(65 + (h >> 16) % 26),
+        last,
+        18 + (h >> 24) % 78,
+    )
+
+def _address(seed: int, household: int, salt: int) -> Dict[str, str]:
+    h = _mix(seed, household, salt)
+    city, state, zip_prefix, county = CITIES[h % len(CITIES)]
+    street = STREET_NAMES[(h >> 8) % len(STREET_NAMES)]
+    suffix = STREET_SUFFIXES[(h >> 16) % len(STREET_SUFFIXES)]
+    return {
+        "streetAddress": f"{1 + (h >> 24) % 9999} {street} {suffix}",
+        "addressLocality": city,
+        "addressRegion": state,
+        "postalCode": f"{zip_prefix}{(h >> 40) % 100:02d}",
+        "county": county,
+    }
+
+def _relation(seed: int, idx: int) -> Dict[str, str]:
+    first, middle, last, age = _identity(seed, idx)
+    return {"Name": f"{first} {middle} {last}", "Age": str(age)}
+
+def synthetic_person(idx: int, count: int, seed: int = 0) -> Dict[str, Any]:
+    """
+    Raw record of person ``idx`` out of ``count``, in the shape of
+    ``IdentityExtractor._build_static_dataset`` entries.
+
+    Deterministic per ``(idx, count, seed)``, so any person can be rebuilt
+    without keeping the population in memory. People live in households of
+    ``HOUSEHOLD_SIZE`` sharing a last name and address, list each other as
+    relatives, and sometimes list the same relative twice with different
+    spacing or case, like scraped data does.
+    """
+    first, middle, last, age = _identity(seed, idx)
+    rng = _rng(seed, idx, 3)
+    household = idx // HOUSEHOLD_SIZE
+    home = _address(seed, household, 4)
+
+    phones = []
+    for n in range(rng.choice((1, 1, 1, 2, 2, 3))):
+        kind, provider = rng.choice(PHONE_TYPES)
+        phones.append({"number": _phone(idx * 3 + n), "type": kind, "provider": provider})
+
+    local = f"{first}.{last}{idx}".lower()
+    emails = [
+        f"{local}@{domain}"
+        for domain in rng.sample(EMAIL_DOMAINS, rng.choice((0, 1, 1, 1, 2, 3)))
+    ]
+
+    previous = []
+    for n in range(rng.choice((0, 1, 1, 2, 3))):
+        address = _address(seed, household, 5 + n)
+        address["timespan"] = f"Recorded {rng.choice(MONTHS)} {rng.randint(1980, 2020)}"
+        previous.append(address)
+
+    members = range(household * HOUSEHOLD_SIZE, min(count, (household + 1) * HOUSEHOLD_SIZE))
+    relatives = [_relation(seed, other) for other in members if other != idx]
+    relatives.extend(_relation(seed, rng.randrange(count)) for _ in range(rng.randint(0, 3)))
+    if relatives and rng.random() < 0.2:
+        duplicate = dict(rng.choice(relatives))
+        duplicate["Name"] = "  " + duplicate["Name"].upper()
+        relatives.append(duplicate)
+    associates = [_relation(seed, rng.randrange(count)) for _ in range(rng.randint(0, 4))]
+
+    born_year = 2025 - age
+    return {
+        "name_key": f"{first} {middle} {last}",
+        "phone_keys": [phone["number"] for phone in phones],
+        "first_name": first,
+        "last_name": last,
+        "age": str(age),
+        "born": f"{rng.choice(MONTHS)} {born_year}",
+        "lives_in": (
+            f"{home['streetAddress']} {home['addressLocality']} "
+            f"{home['addressRegion']} {home['postalCode']}"
+        ),
+        "street_address": home["streetAddress"],
+        "address_locality": home["addressLocality"],
+        "address_region": home["addressRegion"],
+        "postal_code": home["postalCode"],
+        "county_name": home["county"],
+        "emails": emails,
+        "phones": phones,
+        "previous_addresses": previous,
+        "relatives": relatives,
+        "associates": associates,
+        "person_link": f"https://example.com/person/{first}-{last}-{idx}".lower(),
+    }
+
+def generate_people(count: int, seed: int = 0) -> Iterator[Dict[str, Any]]:
+    """Stream ``count`` synthetic raw records (see ``synthetic_person``)."""
+    for idx in range(count):
+        yield synthetic_person(idx, count, seed)
+
+def _query_for(person: Dict[str, Any], kind: str, rng: random.Random) -> str:
+    if kind == "Phone Search" and person["phones"]:
+        number = rng.choice(person["phones"])["number"]
+        return number if rng.random() < 0.8 else number.replace(" ", "")
+    if kind == "Email Search" and person["emails"]:
+        email = rng.choice(person["emails"])
+        return email if rng.random() < 0.8 else email.upper()
+    if kind == "Address Search":
+        street = person["street_address"]
+        if rng.random() < 0.5:
+            return f"{street}, {person['address_locality']}, {person['address_region']} {person['postal_code']}"
+        return f"{street} {person['postal_code']}"
+    name = person["name_key"]
+    variant = rng.random()
+    if variant < 0.1:
+        return name.lower()
+    if variant < 0.2:
+        return "  " + name.replace(" ", "  ")
+    return name
+
+def _miss_for(kind: str, rng: random.Random) -> str:
+    if kind == "Phone Search":
+        return f"(999) {rng.randrange(1000):03d}-{rng.randrange(10000):04d}"
+    if kind == "Email Search":
+        return f"nobody{rng.randrange(10**9)}@nowhere.invalid"
+    if kind == "Address Search":
+        return f"{rng.randint(1, 9999)} Nowhere Ln, Atlantis, ZZ 00000"
+    return f"Nobody {rng.randrange(10**9)} Here"
+
+def generate_queries(
+    people: int,
+    count: int,
+    seed: int = 0,
+    duplicate_ratio: float = DEFAULT_DUPLICATE_RATIO,
+    miss_ratio: float = DEFAULT_MISS_RATIO,
+) -> Iterator[Dict[str, str]]:
+    """
+    Stream ``count`` query rows (``search_option`` / ``input_value``) against
+    a population of ``people`` built by ``generate_people`` with the same seed.
+
+    About ``duplicate_ratio`` of the rows repeat one of the last
+    ``DUPLICATE_WINDOW`` rows, skewed towards recent ones like a batch with
+    hot keys; about ``miss_ratio`` match nobody. Search kinds follow
+    ``SEARCH_WEIGHTS`` and inputs vary in case and spacing.
+    """
+    rng = _rng(seed, 0, 6)
+    recent: Deque[Dict[str, str]] = deque(maxlen=DUPLICATE_WINDOW)
+    for _ in range(count):
+        if recent and rng.random() < duplicate_ratio:
+            row = recent[-1 - int(len(recent) * rng.random() ** DUPLICATE_SKEW)]
+        else:
+            kind = rng.choices(SEARCH_KINDS, SEARCH_WEIGHTS)[0]
+            if people == 0 or rng.random() < miss_ratio:
+                value = _miss_for(kind, rng)
+            else:
+                value = _query_for(synthetic_person(rng.randrange(people), people, seed), kind, rng)
+            row = {"search_option": kind, "input_value": value}
+            recent.append(row)
+        yield row
+
+def write_jsonl(rows: Iterable[Dict[str, Any]], path: Path) -> int:
+    """Write rows as JSON Lines; returns the number written."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    written = 0
+    with path.open("w", encoding="utf-8") as f:
+        for row in rows:
+            f.write(json.dumps(row, ensure_ascii=False))
+            f.write("\n")
+            written += 1
+    logger.debug("Wrote %d row(s) to %s", written, path)
+    return written
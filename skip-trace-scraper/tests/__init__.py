@@ -0,0 +1,8 @@
+import sys
+from pathlib import Path
+
+# The code under test imports its packages from src/ ("from utils ..."),
+# as it does when run with ``cd src && python main.py``.
+SRC_DIR = Path(__file__).resolve().parent.parent / "src"
+if str(SRC_DIR) not in sys.path:
+    sys.path.insert(0, str(SRC_DIR))
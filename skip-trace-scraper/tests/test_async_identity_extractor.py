@@ -0,0 +1,164 @@
+import asyncio
+import tempfile
+import unittest
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from extractors.async_identity_extractor import AsyncIdentityExtractor
+from extractors.federated_source import source_from_settings
+from extractors.identity_extractor import IdentityExtractor
+from extractors.record_store import InMemoryRecordStore
+from extractors.relations_extractor import RelationsExtractor
+from extractors.remote_source import serve_stub_source
+from main import run_async, run_threaded
+from utils.data_parser import SearchQuery
+from utils.lookup_cache import LookupCache
+from utils.synthetic import generate_people, generate_queries
+
+PEOPLE = 200
+QUERIES = 400
+# Nothing listens here: lookups that reach it fail.
+DEAD_URL = "http://127.0.0.1:9"
+
+def _queries() -> List[Tuple[str, str]]:
+    rows = generate_queries(PEOPLE, QUERIES, seed=5, miss_ratio=0.1)
+    return [(row["search_option"], row["input_value"]) for row in rows]
+
+def _single(extractor: IdentityExtractor, option: str, value: str) -> Any:
+    try:
+        return extractor.lookup(option, value).to_dict()
+    except LookupError as exc:
+        return ("miss", str(exc))
+
+class AsyncLookupTests(unittest.TestCase):
+    """``alookup`` against the stub source answers like a local ``lookup``."""
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.store = InMemoryRecordStore(list(generate_people(PEOPLE, seed=5)))
+        cls.queries = _queries()
+
+    def serve(self, **options: float) -> str:
+        server = serve_stub_source(self.store, **options)
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        return f"http://127.0.0.1:{server.server_address[1]}"
+
+    def test_remote_lookups_match_local(self) -> None:
+        local = IdentityExtractor(store=self.store)
+        expected = [_single(local, option, value) for option, value in self.queries]
+
+        async def run() -> List[Any]:
+            extractor = AsyncIdentityExtractor(self.serve(), local=IdentityExtractor(), max_concurrency=8)
+            results = await asyncio.gather(
+                *(extractor.alookup(option, value) for option, value in self.queries),
+                return_exceptions=True,
+            )
+            await extractor.aclose()
+            self.assertLessEqual(extractor.pool.opened, 8)
+            self.assertGreater(extractor.pool.reused, 0)
+            return [
+                ("miss", str(r)) if isinstance(r, LookupError) else r.to_dict() for r in results
+            ]
+
+        self.assertEqual(asyncio.run(run()), expected)
+
+    def test_remote_hits_are_served_from_the_cache(self) -> None:
+        server = serve_stub_source(self.store)
+        self.addCleanup(server.server_close)
+        local = IdentityExtractor(store=self.store)
+        hits = [q for q in self.queries if isinstance(_single(local, *q), dict)][:50]
+
+        async def run() -> List[Any]:
+            extractor = AsyncIdentityExtractor(
+                f"http://127.0.0.1:{server.server_address[1]}",
+                local=IdentityExtractor(),
+                cache=LookupCache(),
+            )
+            first = [(await extractor.alookup(*query)).to_dict() for query in hits]
+            # The source is gone: only the cache can answer now.
+            server.shutdown()
+            await extractor.aclose()
+            second = [(await extractor.alookup(*query)).to_dict() for query in hits]
+            self.assertEqual(second, first)
+            return first
+
+        self.assertEqual(asyncio.run(run()), [_single(local, *query) for query in hits])
+
+    def test_duplicate_lookups_share_one_request(self) -> None:
+        local = IdentityExtractor(store=self.store)
+        option, value = next(
+            q for q in self.queries if q[0] == "Phone Search" and isinstance(_single(local, *q), dict)
+        )
+
+        async def run() -> AsyncIdentityExtractor:
+            extractor = AsyncIdentityExtractor(self.serve(delay=0.05), local=IdentityExtractor())
+            await asyncio.gather(*(extractor.alookup(option, f" {value} ") for _ in range(10)))
+            await extractor.aclose()
+            return extractor
+
+        extractor = asyncio.run(run())
+        self.assertEqual(extractor.inflight.coalesced, 9)
+        self.assertEqual(extractor.pool.opened, 1)
+
+    def test_slow_source_times_out(self) -> None:
+        async def run() -> None:
+            extractor = AsyncIdentityExtractor(
+                self.serve(delay=0.5), local=IdentityExtractor(), timeout=0.05
+            )
+            try:
+                await extractor.alookup(*self.queries[0])
+            finally:
+                await extractor.aclose()
+
+        with self.assertRaises(TimeoutError):
+            asyncio.run(run())
+
+class AsyncEngineTests(unittest.TestCase):
+    """``run_async`` writes the same results as ``run_threaded``."""
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.store = InMemoryRecordStore(list(generate_people(PEOPLE, seed=5)))
+        cls.queries = [SearchQuery(option, value) for option, value in _queries()]
+
+    def setUp(self) -> None:
+        work_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(work_dir.cleanup)
+        self.work_dir = Path(work_dir.name)
+
+    def run_engine(
+        self, name: str, settings: Dict[str, Any], source: Optional[Any] = None
+    ) -> Tuple[Tuple[int, int], List[str]]:
+        output_path = self.work_dir / f"{name}.jsonl"
+        extractor = IdentityExtractor(store=self.store, source=source)
+        if name.startswith("async"):
+            counts = asyncio.run(
+                run_async(iter(self.queries), settings, extractor, RelationsExtractor(), output_path)
+            )
+        else:
+            counts = run_threaded(iter(self.queries), settings, extractor, RelationsExtractor(), output_path)
+        return counts, sorted(output_path.read_text(encoding="utf-8").splitlines())
+
+    def test_stub_source(self) -> None:
+        server = serve_stub_source(self.store)
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        settings = {"source_url": f"http://127.0.0.1:{server.server_address[1]}", "async_concurrency": 16}
+        expected = self.run_engine("threads", {})
+        self.assertEqual(self.run_engine("async", settings), expected)
+        succeeded, failed = expected[0]
+        self.assertEqual(succeeded + failed, len(self.queries))
+        self.assertTrue(succeeded and failed)
+
+    def test_federation_replaces_source_url(self) -> None:
+        settings = {
+            "source_url": DEAD_URL,
+            "federation": {"sources": [{"name": "local", "type": "store"}]},
+        }
+        source = source_from_settings(settings, self.store)
+        self.addCleanup(source.close)
+        self.assertEqual(self.run_engine("async", settings, source), self.run_engine("threads", {}))
+
+if __name__ == "__main__":
+    unittest.main()
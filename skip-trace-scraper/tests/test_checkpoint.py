@@ -0,0 +1,189 @@
+import json
+import tempfile
+import unittest
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Tuple
+
+from extractors.identity_extractor import IdentityExtractor
+from extractors.record_store import InMemoryRecordStore, build_marshal_index
+from extractors.relations_extractor import RelationsExtractor
+from main import run_sharded, run_threaded
+from utils.checkpoint import CheckpointJournal, checkpoint_from_settings, input_fingerprint
+from utils.data_parser import SearchQuery
+from utils.metrics import Metrics
+from utils.synthetic import generate_people, generate_queries
+
+PEOPLE = 120
+QUERIES = 300
+# Where the interrupted run's input "fails".
+INTERRUPT_AT = 170
+FINGERPRINT = {"path": "/data/inputs.json", "size": 1234, "mtime_ns": 1}
+
+def _state(n: int) -> List[Any]:
+    return ["Name Search", f"query {n}", "Ann", "Lee"]
+
+class CheckpointJournalTests(unittest.TestCase):
+    def setUp(self) -> None:
+        work_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(work_dir.cleanup)
+        self.path = Path(work_dir.name) / "cache" / "checkpoint.jsonl"
+
+    def journal(self, fingerprint: Dict[str, Any] = FINGERPRINT, **options: Any) -> CheckpointJournal:
+        journal = CheckpointJournal(self.path, fingerprint, **options).open()
+        self.addCleanup(journal.close)
+        return journal
+
+    def test_resumes_where_a_killed_run_stopped(self) -> None:
+        journal = CheckpointJournal(self.path, FINGERPRINT, flush_every=2, flush_seconds=3600).open()
+        for n in (0, 1, 4):
+            journal.record_success(n, _state(n))
+        journal.record_miss(7, "No matching record")
+        journal.record_success(9, _state(9))
+        # Killed here: only full batches reached the disk.
+        journal._file.close()
+        self.assertEqual(len(self.path.read_bytes().splitlines()), 1 + 4)
+
+        resumed = self.journal()
+        self.assertEqual(resumed.resumed, 4)
+        self.assertEqual([idx for idx in range(12) if resumed.is_done(idx)], [0, 1, 4, 7])
+        self.assertEqual(
+            list(resumed.replay()),
+            [(0, _state(0), None), (1, _state(1), None), (4, _state(4), None), (7, None, "No matching record")],
+        )
+
+    def test_torn_last_line_is_ignored(self) -> None:
+        journal = self.journal(flush_every=1)
+        journal.record_success(0, _state(0))
+        journal.record_success(1, _state(1))
+        journal.close()
+        intact = self.path.stat().st_size
+        for torn in (b'{"i": 2, "ok": ["Name Se', b'{"i": 2, "miss": "x"}', b"\x00\x00\x00"):
+            with self.subTest(torn=torn):
+                with self.path.open("ab") as f:
+                    f.write(torn)
+                resumed = self.journal(flush_every=1)
+                self.assertEqual(resumed.resumed, 2)
+                self.assertFalse(resumed.is_done(2))
+                self.assertEqual(self.path.stat().st_size, intact)
+                # New entries follow the intact ones.
+                resumed.record_miss(2, "No matching record")
+                resumed.close()
+                last = json.loads(self.path.read_bytes().splitlines()[-1])
+                self.assertEqual(last, {"i": 2, "miss": "No matching record"})
+                with self.path.open("r+b") as f:
+                    f.truncate(intact)
+
+    def test_changed_input_discards_the_journal(self) -> None:
+        journal = self.journal()
+        journal.record_success(0, _state(0))
+        journal.close()
+
+        for fingerprint in ({**FINGERPRINT, "size": 1235}, {**FINGERPRINT, "mtime_ns": 2}):
+            with self.subTest(fingerprint=fingerprint):
+                fresh = self.journal(fingerprint)
+                self.assertEqual((fresh.resumed, fresh.is_done(0), list(fresh.replay())), (0, False, []))
+                fresh.close()
+                header = json.loads(self.path.read_bytes().splitlines()[0])
+                self.assertEqual(header["input"], fingerprint)
+
+    def test_unreadable_header_starts_over(self) -> None:
+        self.path.parent.mkdir(parents=True)
+        for content in (b"", b"not json\n", b'{"version": 99}\n{"i": 0, "miss": "x"}\n'):
+            with self.subTest(content=content):
+                self.path.write_bytes(content)
+                journal = self.journal()
+                self.assertEqual(journal.resumed, 0)
+                journal.close()
+
+    def test_complete_removes_the_journal(self) -> None:
+        journal = self.journal()
+        journal.record_success(0, _state(0))
+        journal.complete()
+        self.assertFalse(self.path.exists())
+        with self.assertRaises(RuntimeError):
+            journal.record_success(1, _state(1))
+
+    def test_checkpoint_from_settings(self) -> None:
+        root = self.path.parent.parent
+        input_path = root / "inputs.json"
+        input_path.write_text("[]", encoding="utf-8")
+        self.assertIsNone(checkpoint_from_settings({}, root, input_path))
+        self.assertIsNone(checkpoint_from_settings({"checkpoint": {"enabled": False}}, root, input_path))
+        journal = checkpoint_from_settings({"checkpoint": {"path": "cp.jsonl", "flush_every": 5}}, root, input_path)
+        self.assertEqual((journal.path, journal.flush_every), (root / "cp.jsonl", 5))
+        self.assertEqual(journal.fingerprint, input_fingerprint(input_path))
+
+class ResumeTests(unittest.TestCase):
+    """A run resumed from the checkpoint of an interrupted one writes what an uninterrupted run writes."""
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.people = list(generate_people(PEOPLE, seed=3))
+        rows = generate_queries(PEOPLE, QUERIES, seed=3, miss_ratio=0.15)
+        cls.queries = [SearchQuery(row["search_option"], row["input_value"]) for row in rows]
+
+    def setUp(self) -> None:
+        work_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(work_dir.cleanup)
+        self.work_dir = Path(work_dir.name)
+        self.journal_path = self.work_dir / "checkpoint.jsonl"
+
+    def interrupted(self) -> Iterator[SearchQuery]:
+        yield from self.queries[:INTERRUPT_AT]
+        raise OSError("input file went away")
+
+    def journal(self) -> CheckpointJournal:
+        journal = CheckpointJournal(self.journal_path, FINGERPRINT, flush_every=16).open()
+        self.addCleanup(journal.close)
+        return journal
+
+    def run_threaded(self, name: str, queries: Iterator[SearchQuery], **kwargs: Any) -> Tuple[int, int]:
+        extractor = IdentityExtractor(store=InMemoryRecordStore(self.people))
+        settings = {"max_workers": 4}
+        return run_threaded(queries, settings, extractor, RelationsExtractor(), self.work_dir / name, **kwargs)
+
+    def run_sharded(self, name: str, queries: Iterator[SearchQuery], **kwargs: Any) -> Tuple[int, int]:
+        store_path = self.work_dir / "people.stmi"
+        if not store_path.exists():
+            build_marshal_index(self.people, store_path)
+        settings = {
+            "record_store": {"type": "marshal", "path": str(store_path)},
+            "shard_batch_size": 8,
+            "log_level": "CRITICAL",
+        }
+        return run_sharded(queries, settings, self.work_dir / name, 2, **kwargs)
+
+    def check_resume(self, run: Any) -> Tuple[List[str], List[str]]:
+        expected_counts = run("full.jsonl", iter(self.queries))
+
+        succeeded, failed = run("partial.jsonl", self.interrupted(), journal=self.journal())
+        self.assertEqual(succeeded + failed, INTERRUPT_AT + 1)  # +1: the input error
+        self.assertTrue(self.journal_path.exists())
+
+        journal = self.journal()
+        self.assertEqual(journal.resumed, INTERRUPT_AT)
+        metrics = Metrics()
+        counts = run("resumed.jsonl", iter(self.queries), journal=journal, metrics=metrics)
+        self.assertEqual(counts, expected_counts)
+        # Only the queries after the interruption ran again.
+        self.assertEqual(metrics.skipped, INTERRUPT_AT)
+        self.assertEqual(metrics.succeeded + metrics.failed, QUERIES - INTERRUPT_AT)
+        self.assertFalse(self.journal_path.exists())
+
+        def lines(name: str) -> List[str]:
+            return (self.work_dir / name).read_text(encoding="utf-8").splitlines()
+
+        return lines("resumed.jsonl"), lines("full.jsonl")
+
+    def test_threaded(self) -> None:
+        resumed, full = self.check_resume(self.run_threaded)
+        # Threads write results as they finish: compare as sets of lines.
+        self.assertEqual(sorted(resumed), sorted(full))
+
+    def test_sharded(self) -> None:
+        resumed, full = self.check_resume(self.run_sharded)
+        # Shards write in input order: replayed results come first, in order.
+        self.assertEqual(resumed, full)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,197 @@
+import csv
+import json
+import tempfile
+import unittest
+from pathlib import Path
+from typing import Any, List, Optional
+
+from extractors.identity_extractor import IdentityExtractor, PersonRecord, Relation
+from extractors.record_store import InMemoryRecordStore
+from utils.columnar import (
+    JSON,
+    ColumnarReader,
+    ColumnarResultWriter,
+    CsvResultWriter,
+    FlatSchema,
+    _decode_chunk,
+    _encode_chunk,
+)
+from utils.synthetic import generate_people
+
+def _records() -> List[PersonRecord]:
+    people = list(generate_people(40, seed=5))
+    extractor = IdentityExtractor(store=InMemoryRecordStore(people))
+    records = [extractor.lookup("Name Search", p["name_key"]) for p in people]
+    records.append(
+        PersonRecord(
+            search_option="Name Search",
+            input_given='  "Zoë"\tname\n',
+            first_name="Zoë",
+            last_name="O'Brien-Łukasz \U0001F600",
+            county_name="",
+            emails=[f"user{n}@example.com" for n in range(7)],
+            phones=[{"number": "(555) 010-0000", "type": None, "provider": "Acme, Co"}] * 6,
+            previous_addresses=[{"streetAddress": "1 Main St", "addressLocality": "Málaga"}],
+            relatives=[Relation("Ann \"Nan\" Smith"), Relation("Bob", "70")],
+            match_score=0.875,
+            matched_queries=[{"Search Option": "Name Search", "Input Given": "Zoë"}],
+        )
+    )
+    records.append(PersonRecord("Phone Search", "555-010-9999", "", ""))
+    return records
+
+def _expected(schema: FlatSchema, records: List[PersonRecord]) -> List[List[Any]]:
+    """Rows as ``ColumnarReader`` returns them: JSON columns decoded."""
+    rows = []
+    for record in records:
+        row = schema.row(record)
+        rows.append(
+            [
+                json.loads(value) if value is not None and type_ == JSON else value
+                for value, (_, type_) in zip(row, schema.columns)
+            ]
+        )
+    return rows
+
+class ChunkEncodingTests(unittest.TestCase):
+    def test_round_trip(self) -> None:
+        cases = {
+            "plain": ["a", "b", None, "c", "Zoë \U0001F600"],
+            "dictionary": ["TX", "TX", None, "CA", "TX", "", "", "CA"],
+            "all null": [None] * 4,
+            "empty strings": ["", "", ""],
+            "single": ["only"],
+        }
+        for name, values in cases.items():
+            with self.subTest(name=name):
+                encoding, dictionary_size, data = _encode_chunk(values)
+                self.assertEqual(_decode_chunk(encoding, dictionary_size, data, len(values)), values)
+
+    def test_picks_dictionary_for_repeated_values(self) -> None:
+        self.assertEqual(_encode_chunk(["TX", "TX", "CA", "TX"])[:2], ("dictionary", 2))
+        self.assertEqual(_encode_chunk(["TX", "CA", "NY", "TX"])[:2], ("plain", 0))
+        self.assertEqual(_encode_chunk([None, None])[:2], ("dictionary", 0))
+
+    def test_unknown_encoding(self) -> None:
+        with self.assertRaises(ValueError):
+            _decode_chunk("delta", 0, b"", 0)
+
+class CsvResultWriterTests(unittest.TestCase):
+    def test_round_trip(self) -> None:
+        records = _records()
+        schema = FlatSchema(matched_queries=True, match_scores=True)
+        with tempfile.TemporaryDirectory() as work_dir:
+            path = Path(work_dir) / "out" / "results.csv"
+            with CsvResultWriter(path, schema) as writer:
+                for record in records:
+                    writer.write_record(record)
+            with path.open(encoding="utf-8", newline="") as handle:
+                header, *rows = list(csv.reader(handle))
+
+        self.assertEqual(header, schema.names)
+        # CSV has no null: missing values come back as empty strings.
+        self.assertEqual(rows, [["" if v is None else v for v in schema.row(r)] for r in records])
+        self.assertEqual(writer.count, len(records))
+
+    def test_write_before_open(self) -> None:
+        writer = CsvResultWriter(Path(tempfile.gettempdir()) / "never.csv")
+        with self.assertRaises(RuntimeError):
+            writer.write_record(PersonRecord("Name Search", "q", "A", "B"))
+
+class ColumnarTests(unittest.TestCase):
+    def setUp(self) -> None:
+        work_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(work_dir.cleanup)
+        self.path = Path(work_dir.name) / "results.stcol"
+        self.records = _records()
+        self.schema = FlatSchema(matched_queries=True, match_scores=True)
+
+    def write(self, row_group_size: int, records: Optional[List[PersonRecord]] = None) -> None:
+        with ColumnarResultWriter(self.path, self.schema, row_group_size=row_group_size) as writer:
+            for record in self.records if records is None else records:
+                writer.write_record(record)
+
+    def test_round_trip(self) -> None:
+        expected = _expected(self.schema, self.records)
+        for row_group_size in (1, 7, len(self.records), 65536):
+            with self.subTest(row_group_size=row_group_size):
+                self.write(row_group_size)
+                with ColumnarReader(self.path) as reader:
+                    self.assertEqual(reader.schema, self.schema.columns)
+                    self.assertEqual(reader.num_rows, len(self.records))
+                    self.assertEqual(len(reader.row_groups), -(-len(self.records) // row_group_size))
+                    columns = reader.read_columns()
+                    rows = list(reader.iter_rows())
+                self.assertEqual([list(row) for row in zip(*columns.values())], expected)
+                self.assertEqual(
+                    rows,
+                    [
+                        {name: value for name, value in zip(self.schema.names, row) if value is not None}
+                        for row in expected
+                    ],
+                )
+
+    def test_uses_both_chunk_encodings(self) -> None:
+        self.write(65536)
+        with ColumnarReader(self.path) as reader:
+            (row_group,) = reader.row_groups
+            encodings = dict(zip(reader.names, (chunk["encoding"] for chunk in row_group["columns"])))
+        self.assertEqual(encodings["Search Option"], "dictionary")
+        self.assertEqual(encodings["Input Given"], "plain")
+        # Mostly null columns collapse to a tiny dictionary too.
+        self.assertEqual(encodings["Email-5"], "dictionary")
+
+    def test_nulls_and_empty_strings_stay_apart(self) -> None:
+        self.write(65536)
+        with ColumnarReader(self.path) as reader:
+            counties = reader.read_columns(["County Name"])["County Name"]
+            scores = reader.read_columns(["Match Score"])["Match Score"]
+        self.assertEqual(counties[-2], "")
+        self.assertIsNone(counties[-1])
+        self.assertEqual(scores[-2:], ["0.875", None])
+
+    def test_reads_only_the_requested_columns(self) -> None:
+        self.write(7)
+        with ColumnarReader(self.path) as reader:
+            groups = list(reader.iter_row_groups(["Relatives", "First Name"]))
+        self.assertTrue(all(list(group) == ["Relatives", "First Name"] for group in groups))
+        self.assertEqual(
+            groups[-1]["Relatives"][-2], [{"Name": 'Ann "Nan" Smith', "Age": None}, {"Name": "Bob", "Age": "70"}]
+        )
+        self.assertEqual(groups[-1]["First Name"][-2:], ["Zoë", ""])
+
+    def test_empty_file(self) -> None:
+        self.write(4, records=[])
+        with ColumnarReader(self.path) as reader:
+            self.assertEqual((reader.num_rows, reader.row_groups), (0, []))
+            self.assertEqual(list(reader.iter_rows()), [])
+
+    def test_rejects_truncated_files(self) -> None:
+        self.write(7)
+        data = self.path.read_bytes()
+        unclosed = ColumnarResultWriter(self.path.with_name("unclosed.stcol"), self.schema, row_group_size=7)
+        unclosed.open()
+        for record in self.records:
+            unclosed.write_record(record)
+        # Row groups are on disk, the footer is not written until close().
+        cases = {
+            "missing footer": unclosed.output_path.read_bytes(),
+            "cut footer": data[:-1],
+            "cut manifest": data[:-20],
+            "magic only": data[:4],
+            "empty": b"",
+            "not columnar": b"Search Option,Input Given\n" * 4,
+        }
+        unclosed.close()
+        for name, content in cases.items():
+            with self.subTest(name=name):
+                self.path.write_bytes(content)
+                with self.assertRaises(ValueError):
+                    ColumnarReader(self.path)
+
+    def test_row_group_size_must_be_positive(self) -> None:
+        with self.assertRaises(ValueError):
+            ColumnarResultWriter(self.path, row_group_size=0)
+
+if __name__ == "__main__":
+    unittest.main()
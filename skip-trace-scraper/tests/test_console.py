@@ -0,0 +1,130 @@
+import contextlib
+import io
+import threading
+import unittest
+from typing import List, Tuple
+
+from extractors.identity_extractor import PersonRecord
+from utils.console import ConsoleOutput, console_from_settings, should_render
+from utils.formatter import format_result_text, pretty_print_result
+
+RESULTS = 250
+
+def _record(idx: int) -> PersonRecord:
+    return PersonRecord("Name Search", f"Person {idx}", "Person", str(idx), age=str(20 + idx % 50))
+
+def _printed(records: List[PersonRecord]) -> str:
+    """What ``pretty_print_result`` prints for ``records``, one after another."""
+    out = io.StringIO()
+    with contextlib.redirect_stdout(out):
+        for record in records:
+            pretty_print_result(record)
+    return out.getvalue()
+
+def _split_summary(output: str) -> Tuple[str, str]:
+    """The printed results and the closing summary line."""
+    body, summary, _ = output.rsplit("\n", 2)
+    return body + "\n", summary
+
+class BlockingStdout(io.StringIO):
+    """Holds every write until ``release`` is set."""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.release = threading.Event()
+
+    def write(self, text: str) -> int:
+        self.release.wait(5)
+        return super().write(text)
+
+class BrokenStdout(io.StringIO):
+    def write(self, text: str) -> int:
+        raise BrokenPipeError("stdout closed")
+
+class ConsoleOutputTests(unittest.TestCase):
+    def run_console(self, console: ConsoleOutput) -> str:
+        out = io.StringIO()
+        with contextlib.redirect_stdout(out):
+            with console:
+                for idx in range(RESULTS):
+                    # Workers hand over preformatted text, the threads engine records.
+                    if idx % 2:
+                        console.show_text(idx, f"text {idx}")
+                    else:
+                        console.show(idx, _record(idx))
+            console.summary(RESULTS - 3, 3)
+        return out.getvalue()
+
+    def expected(self, indexes: List[int]) -> str:
+        return "".join(
+            format_result_text(f"text {idx}") if idx % 2 else _printed([_record(idx)]) for idx in indexes
+        )
+
+    def test_full_prints_every_result_in_order(self) -> None:
+        output = self.run_console(ConsoleOutput("full", queue_size=4))
+        body, summary = _split_summary(output)
+        self.assertEqual(body, self.expected(list(range(RESULTS))))
+        self.assertRegex(summary, r"^Processed 250 queries in [0-9.]+s \([0-9.]+/s\): 247 succeeded, 3 failed$")
+
+    def test_sampled_honors_sample_every(self) -> None:
+        for sample_every in (1, 7, 100, 1000):
+            with self.subTest(sample_every=sample_every):
+                output = self.run_console(ConsoleOutput("sampled", sample_every=sample_every))
+                body, summary = _split_summary(output)
+                self.assertEqual(body, self.expected(list(range(0, RESULTS, sample_every))))
+                self.assertTrue(summary.endswith("247 succeeded, 3 failed"))
+
+    def test_summary_prints_only_the_summary(self) -> None:
+        console = ConsoleOutput("summary")
+        output = self.run_console(console)
+        self.assertRegex(output, r"^Processed 250 queries in .*: 247 succeeded, 3 failed\n$")
+        self.assertFalse(console.renders)
+        self.assertIsNone(console._thread)
+
+    def test_quiet_prints_nothing(self) -> None:
+        self.assertEqual(self.run_console(ConsoleOutput("quiet")), "")
+
+    def test_sampled_drops_samples_instead_of_blocking(self) -> None:
+        stdout = BlockingStdout()
+        console = ConsoleOutput("sampled", sample_every=1, queue_size=2)
+        with contextlib.redirect_stdout(stdout):
+            console.start()
+            for idx in range(20):
+                console.show_text(idx, f"text {idx}")
+            stdout.release.set()
+            console.close()
+            console.summary(20, 0)
+        self.assertGreater(console.dropped, 0)
+        shown = stdout.getvalue().count("=== Skip Trace Result ===")
+        self.assertEqual(shown + console.dropped, 20)
+        self.assertIn(f"({console.dropped} sampled result(s) not shown)", stdout.getvalue())
+
+    def test_broken_stdout_keeps_draining(self) -> None:
+        console = ConsoleOutput("full", queue_size=1)
+        with contextlib.redirect_stdout(BrokenStdout()):
+            with console:
+                for idx in range(50):
+                    console.show_text(idx, "text")
+        self.assertEqual(console.pending, 0)
+
+    def test_show_before_start(self) -> None:
+        with self.assertRaises(RuntimeError):
+            ConsoleOutput("full").show(0, _record(0))
+
+    def test_should_render(self) -> None:
+        self.assertEqual([idx for idx in range(10) if should_render("sampled", 4, idx)], [0, 4, 8])
+        self.assertTrue(all(should_render("full", 4, idx) for idx in range(10)))
+        for mode in ("summary", "quiet"):
+            self.assertFalse(any(should_render(mode, 1, idx) for idx in range(10)))
+
+    def test_console_from_settings(self) -> None:
+        settings = {"console": {"mode": "Sampled", "sample_every": 0, "queue_size": 8}}
+        console = console_from_settings(settings)
+        self.assertEqual((console.mode, console.sample_every), ("sampled", 1))
+        self.assertEqual(console_from_settings(settings, "quiet").mode, "quiet")
+        self.assertEqual(console_from_settings({}).mode, "full")
+        with self.assertRaises(ValueError):
+            console_from_settings({"console": {"mode": "verbose"}})
+
+if __name__ == "__main__":
+    unittest.main()
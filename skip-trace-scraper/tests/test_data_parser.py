@@ -0,0 +1,50 @@
+import io
+import json
+import unittest
+
+from utils.data_parser import _iter_json_array
+
+class CountingReader(io.StringIO):
+    def __init__(self, text: str) -> None:
+        super().__init__(text)
+        self.reads = 0
+
+    def read(self, size: int = -1) -> str:
+        self.reads += 1
+        return super().read(size)
+
+class JsonArrayStreamTests(unittest.TestCase):
+    def test_every_chunk_size_decodes_the_same(self) -> None:
+        items = [
+            12.5, -3e+10, 1E5, 0, -0.25, True, False, None, "s" * 20,
+            {"search_option": "Name Search", "input_value": 'Zoë "Q" \\u00e9'},
+            [1, [2, {"a": "é"}]],
+        ]
+        text = json.dumps(items, indent=1)
+        for chunk_size in range(1, len(text) + 2):
+            with self.subTest(chunk_size=chunk_size):
+                self.assertEqual(list(_iter_json_array(io.StringIO(text), chunk_size)), items)
+
+    def test_number_split_after_its_dot_or_exponent(self) -> None:
+        for text in ("[12.5]", "[1e+5, 2]", "[-7.25E-3]"):
+            for chunk_size in range(1, len(text)):
+                with self.subTest(text=text, chunk_size=chunk_size):
+                    self.assertEqual(list(_iter_json_array(io.StringIO(text), chunk_size)), json.loads(text))
+
+    def test_malformed_input_fails_without_reading_on(self) -> None:
+        tail = ", 1" * 10_000 + "]"
+        for text in ("[1, 2, x" + tail, '[{"a": 1 "b": 2}' + tail, "[1 2" + tail, "[tru, " + tail):
+            with self.subTest(text=text[:20]):
+                reader = CountingReader(text)
+                with self.assertRaises(ValueError):
+                    list(_iter_json_array(reader, 16))
+                self.assertLessEqual(reader.reads, 2)
+
+    def test_structural_errors(self) -> None:
+        for text in ("[1,]", "[,1]", "[1", "[", "{}", "", "[12.]", "[1.5e]"):
+            with self.subTest(text=text):
+                with self.assertRaises(ValueError):
+                    list(_iter_json_array(io.StringIO(text), 2))
+
+if __name__ == "__main__":
+    unittest.main()
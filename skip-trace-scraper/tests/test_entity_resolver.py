@@ -0,0 +1,164 @@
+import tempfile
+import unittest
+from typing import List, Optional
+
+from extractors.entity_resolver import EntityResolver, merge_person_records
+from extractors.identity_extractor import PersonRecord
+
+def person(
+    first: str,
+    last: str,
+    age: Optional[str] = None,
+    phone: Optional[str] = None,
+    email: Optional[str] = None,
+    zip_code: Optional[str] = None,
+    link: Optional[str] = None,
+    score: Optional[float] = None,
+    query: Optional[str] = None,
+) -> PersonRecord:
+    return PersonRecord(
+        search_option="Name Search",
+        input_given=query or f"{first} {last}",
+        first_name=first,
+        last_name=last,
+        age=age,
+        postal_code=zip_code,
+        emails=[email] if email else [],
+        phones=[{"number": phone, "type": "Landline", "provider": None}] if phone else [],
+        person_link=link,
+        match_score=score,
+    )
+
+def resolve(records: List[PersonRecord]) -> List[List[str]]:
+    """The inputs of each resolved person, in resolution order."""
+    with EntityResolver() as resolver:
+        for position, record in enumerate(records):
+            resolver.add(position, record)
+        return [
+            [query["Input Given"] for query in merged.matched_queries]
+            for merged in resolver.resolve()
+        ]
+
+class EntityResolverTests(unittest.TestCase):
+    def test_shared_phone_or_email_merges_one_person(self) -> None:
+        people = resolve(
+            [
+                person("Jim", "Smith", "40", phone="(555) 123-4567", query="q1"),
+                person("James", "Park", "33", email="jp@example.com", query="q2"),
+                person("Jim", "Smith", "41", phone="+1 555 123 4567", query="q3"),
+                person("James", "Park", None, email="JP@Example.com", query="q4"),
+            ]
+        )
+        self.assertEqual(people, [["q1", "q3"], ["q2", "q4"]])
+
+    def test_household_landline_keeps_different_people_apart(self) -> None:
+        people = resolve(
+            [
+                person("Mary", "Smith", "60", phone="555-000-1111", query="mother"),
+                person("John", "Smith", "62", phone="555-000-1111", query="father"),
+                person("Mary", "Jones", "60", phone="555-000-1111", query="neighbour"),
+            ]
+        )
+        self.assertEqual(len(people), 3)
+
+    def test_father_and_son_of_one_name_and_address(self) -> None:
+        people = resolve(
+            [
+                person("Robert", "Lee", "70", phone="555-222-3333", zip_code="47130", query="father"),
+                person("Robert", "Lee", "40", phone="555-222-3333", zip_code="47130", query="son"),
+                person("Robert", "Lee", "41", phone="555-222-3333", zip_code="47130-1234", query="son again"),
+                person("Robert", "Lee", "71", zip_code="47130", query="father again"),
+            ]
+        )
+        self.assertEqual(people, [["father", "father again"], ["son", "son again"]])
+
+    def test_later_key_holders_are_considered(self) -> None:
+        # The shared key's first holder (the father) is incompatible; the
+        # record must still join the son, who holds the key too.
+        people = resolve(
+            [
+                person("Robert", "Lee", "70", phone="555-222-3333", query="father"),
+                person("Robert", "Lee", "40", phone="555-222-3333", email="rl@example.com", query="son"),
+                person("Robert", "Lee", "40", email="rl@example.com", query="son by email"),
+                person("Robert", "Lee", "39", phone="555-222-3333", query="son by phone"),
+            ]
+        )
+        self.assertEqual(people, [["father"], ["son", "son by email", "son by phone"]])
+
+    def test_initial_does_not_bridge_different_first_names(self) -> None:
+        people = resolve(
+            [
+                person("Jim", "Smith", phone="555-444-5555", query="jim"),
+                person("J", "Smith", phone="555-444-5555", email="js@example.com", query="j"),
+                person("Jennifer", "Smith", email="js@example.com", query="jennifer"),
+            ]
+        )
+        self.assertEqual(people, [["jim", "j"], ["jennifer"]])
+
+    def test_initial_joins_the_first_compatible_person_only(self) -> None:
+        people = resolve(
+            [
+                person("Jim", "Smith", phone="555-444-5555", query="jim"),
+                person("Jennifer", "Smith", email="js@example.com", query="jennifer"),
+                person("J", "Smith", phone="555-444-5555", email="js@example.com", query="j"),
+            ]
+        )
+        self.assertEqual(len(people), 2)
+        self.assertEqual(sorted(len(queries) for queries in people), [1, 2])
+
+    def test_person_link_is_verified_too(self) -> None:
+        link = "https://example.com/person/1"
+        people = resolve(
+            [
+                person("Ann", "Baker", "50", link=link, query="ann"),
+                person("Ann", "Baker", "51", link=link, query="ann again"),
+                person("Tom", "Baker", "50", link=link, query="tom"),
+                person("Ann", "Baker", "20", link=link, query="young ann"),
+            ]
+        )
+        self.assertEqual(people, [["ann", "ann again"], ["tom"], ["young ann"]])
+
+    def test_records_without_age_join_any_age(self) -> None:
+        people = resolve(
+            [
+                person("Kim", "Ng", None, email="kim@example.com", query="a"),
+                person("Kim", "Ng", "30", email="kim@example.com", query="b"),
+                person("Kim", "Ng", "31", email="kim@example.com", query="c"),
+                # More than MAX_AGE_GAP from the youngest record so far.
+                person("Kim", "Ng", "32", email="kim@example.com", query="d"),
+            ]
+        )
+        self.assertEqual(people, [["a", "b", "c"], ["d"]])
+
+    def test_spills_to_the_given_directory(self) -> None:
+        with tempfile.TemporaryDirectory() as spill_dir:
+            with EntityResolver(spill_dir) as resolver:
+                for position in range(100):
+                    resolver.add(position, person("Lee", f"Name{position % 10}", phone=f"555-000-{position % 10:04d}"))
+                self.assertEqual(len(resolver), 100)
+                self.assertEqual(len(list(resolver.resolve())), 10)
+                self.assertEqual(resolver.merged, 90)
+
+class MergeTests(unittest.TestCase):
+    def test_merge_keeps_first_values_and_combines_lists(self) -> None:
+        merged = merge_person_records(
+            [
+                person("Jim", "Smith", None, phone="(555) 123-4567", query="q1"),
+                person("James", "Smith", "40", phone="555.123.4567", email="jim@example.com", query="q2"),
+                person("Jim", "Smith", "41", email="JIM@example.com", query="q1"),
+            ]
+        )
+        self.assertEqual((merged.first_name, merged.age, merged.input_given), ("Jim", "40", "q1"))
+        self.assertEqual(len(merged.phones), 1)
+        self.assertEqual(merged.emails, ["jim@example.com"])
+        self.assertEqual([q["Input Given"] for q in merged.matched_queries], ["q1", "q2"])
+
+    def test_merged_record_is_fuzzy_only_if_every_record_was(self) -> None:
+        exact = person("Jim", "Smith")
+        fuzzy = person("Jim", "Smyth", score=0.82)
+        fuzzier = person("Jim", "Smithe", score=0.9)
+        self.assertIsNone(merge_person_records([exact, fuzzy]).match_score)
+        self.assertEqual(merge_person_records([fuzzy, fuzzier]).match_score, 0.9)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,290 @@
+import threading
+import time
+import unittest
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from extractors.federated_source import (
+    HEDGE_WARMUP_SAMPLES,
+    FederatedSource,
+    HedgedSource,
+    StoreSource,
+    merge_records,
+    source_from_settings,
+)
+from extractors.identity_extractor import IdentityExtractor
+from extractors.record_store import InMemoryRecordStore
+from utils.synthetic import generate_people, generate_queries
+
+ANN = {
+    "first_name": "Ann",
+    "last_name": "Lee",
+    "age": "40",
+    "street_address": "1 Elm Street",
+    "address_locality": "Dallas",
+    "address_region": "TX",
+    "postal_code": "75201",
+    "phones": [{"number": "(555) 010-0001", "type": "Landline"}],
+    "emails": ["ann@example.com"],
+    "relatives": [{"Name": "Bob Lee", "Age": "42"}],
+}
+
+class FakeSource:
+    """Answers every query with ``raw`` after ``delay`` seconds, or raises ``error``."""
+
+    batch = True
+
+    def __init__(
+        self, raw: Optional[Dict[str, Any]] = None, delay: float = 0.0, error: Optional[Exception] = None
+    ) -> None:
+        self.raw = raw
+        self.delay = delay
+        self.error = error
+        self.calls = 0
+        self.release = threading.Event()
+
+    def fetch(self, search_option: str, input_value: str) -> Optional[Dict[str, Any]]:
+        self.calls += 1
+        if self.delay:
+            self.release.wait(self.delay)
+        if self.error is not None:
+            raise self.error
+        return self.raw
+
+    def fetch_many(self, queries: Sequence[Tuple[str, str]]) -> List[Optional[Dict[str, Any]]]:
+        return [self.fetch(option, value) for option, value in queries]
+
+    def close(self) -> None:
+        self.release.set()
+
+class ImmediateExecutor:
+    """Runs every call at once, so all answers are in before ``_gather`` first looks."""
+
+    def submit(self, fn: Callable[..., Any], *args: Any) -> "Future[Any]":
+        future: "Future[Any]" = Future()
+        try:
+            future.set_result(fn(*args))
+        except Exception as exc:
+            future.set_exception(exc)
+        return future
+
+    def shutdown(self, wait: bool = True, cancel_futures: bool = False) -> None:
+        pass
+
+class MergeRecordsTests(unittest.TestCase):
+    def test_scalars_take_the_first_value_in_precedence_order(self) -> None:
+        other = {
+            "first_name": "Ann",
+            "last_name": "Lee",
+            "age": "41",
+            "born": "1985",
+            "county_name": "",
+            "emails": ["ann@example.com"],
+        }
+        merged = merge_records([("local", dict(ANN, county_name=None)), ("provider", other)])
+        # Conflicting values: the top-ranked source wins; gaps are filled in order.
+        self.assertEqual((merged["age"], merged["born"]), ("40", "1985"))
+        self.assertIsNone(merged["county_name"])
+
+        reranked = merge_records(
+            [("local", ANN), ("provider", other)], precedence={"age": ["provider"], "born": ["local"]}
+        )
+        self.assertEqual((reranked["age"], reranked["born"]), ("41", "1985"))
+
+    def test_lists_are_combined_without_repeats(self) -> None:
+        other = {
+            "first_name": "ann",
+            "last_name": "LEE",
+            "phones": [{"number": "(555)010-0001", "type": "Mobile"}, {"number": "(555) 010-0002"}],
+            "emails": ["ANN@example.com ", "ann.lee@example.com"],
+            "relatives": [{"Name": "bob lee", "Age": None}, {"Name": "Cy Lee", "Age": "70"}],
+        }
+        merged = merge_records([("local", ANN), ("provider", other)])
+        self.assertEqual(
+            [phone["number"] for phone in merged["phones"]], ["(555) 010-0001", "(555) 010-0002"]
+        )
+        self.assertEqual(merged["emails"], ["ann@example.com", "ann.lee@example.com"])
+        self.assertEqual([rel["Name"] for rel in merged["relatives"]], ["Bob Lee", "Cy Lee"])
+
+        reranked = merge_records([("local", ANN), ("provider", other)], precedence={"phones": ["provider"]})
+        self.assertEqual(reranked["phones"][0], {"number": "(555)010-0001", "type": "Mobile"})
+
+    def test_namesakes_are_not_merged(self) -> None:
+        namesake = {
+            "first_name": "Ann",
+            "last_name": "Lee",
+            "age": "70",
+            "postal_code": "10001",
+            "phones": [{"number": "(555) 999-0000"}],
+        }
+        stranger = dict(ANN, first_name="Eve")
+        for other in (namesake, stranger, {"first_name": "Ann", "last_name": "Lee", "age": "22"}):
+            with self.subTest(other=other):
+                self.assertIs(merge_records([("local", ANN), ("provider", other)]), ANN)
+
+    def test_same_name_and_address_is_merged(self) -> None:
+        partials = {
+            "current address": {
+                "street_address": "1 Elm St",
+                "address_locality": "Dallas",
+                "address_region": "TX",
+            },
+            "lives in": {"lives_in": "1 Elm St Dallas TX"},
+            "previous address": {
+                "previous_addresses": [{"streetAddress": "1 elm street", "postalCode": "75201-1234"}]
+            },
+        }
+        for name, fields in partials.items():
+            with self.subTest(name=name):
+                partial = {"first_name": "Ann", "last_name": "Lee", "born": "1985", **fields}
+                merged = merge_records([("local", ANN), ("provider", partial)])
+                self.assertEqual((merged["age"], merged["born"]), ("40", "1985"))
+
+    def test_nameless_answers_only_add_fields(self) -> None:
+        merged = merge_records([("provider", {"born": "1985"}), ("local", ANN), ("other", None)])
+        self.assertEqual((merged["first_name"], merged["born"]), ("Ann", "1985"))
+        self.assertIsNone(merge_records([("provider", {"born": "1985"}), ("local", None)]))
+        self.assertIsNone(merge_records([]))
+
+class HedgedSourceTests(unittest.TestCase):
+    def hedged(self, replicas: List[FakeSource], **options: Any) -> HedgedSource:
+        source = HedgedSource(replicas, **options)
+        self.addCleanup(source.close)
+        return source
+
+    def test_hedges_only_after_warmup(self) -> None:
+        fast, slow, spare = FakeSource({"n": 0}), FakeSource({"n": 1}), FakeSource({"n": 2})
+        source = self.hedged([fast, spare], hedge_min_ms=1)
+        for _ in range(HEDGE_WARMUP_SAMPLES - 1):
+            self.assertEqual(source.fetch("Name Search", "Ann Lee"), {"n": 0})
+        self.assertIsNone(source.hedge_delay(source.latency))
+
+        # Still warming up: a slow first replica is waited for.
+        source.replicas[0] = slow
+        slow.delay = 0.1
+        self.assertEqual(source.fetch("Name Search", "Ann Lee"), {"n": 1})
+        self.assertEqual((source.hedges, spare.calls), (0, 0))
+
+        delay = source.hedge_delay(source.latency)
+        self.assertIsNotNone(delay)
+        self.assertGreaterEqual(delay, 0.001)
+        # Warmed up: the same slow replica is hedged to the next one.
+        slow.delay = 5
+        start = time.monotonic()
+        self.assertEqual(source.fetch("Name Search", "Ann Lee"), {"n": 2})
+        self.assertLess(time.monotonic() - start, 1)
+        self.assertEqual((source.calls, source.hedges, source.hedge_wins), (HEDGE_WARMUP_SAMPLES + 1, 1, 1))
+        # Batches keep their own latency history: no hedging yet.
+        self.assertIsNone(source.hedge_delay(source.batch_latency))
+
+    def test_failed_replica_is_replaced_at_once(self) -> None:
+        broken = FakeSource(error=ConnectionError("refused"))
+        source = self.hedged([broken, FakeSource({"n": 1})])
+        self.assertEqual(source.fetch_many([("Name Search", "Ann Lee")] * 2), [{"n": 1}] * 2)
+        self.assertEqual((source.hedges, source.hedge_wins), (0, 1))
+
+        failing = self.hedged([broken, FakeSource(error=OSError("down"))])
+        with self.assertRaises(ConnectionError):
+            failing.fetch("Name Search", "Ann Lee")
+
+class FederatedSourceTests(unittest.TestCase):
+    def federated(self, members: List[Tuple[str, FakeSource]], **options: Any) -> FederatedSource:
+        source = FederatedSource(members, **options)
+        self.addCleanup(source.close)
+        return source
+
+    def test_late_members_are_left_out_after_the_grace_period(self) -> None:
+        partial = {"first_name": "Ann", "last_name": "Lee", "born": "1985", "lives_in": "1 Elm St Dallas TX"}
+        slow = FakeSource(partial, delay=5)
+        source = self.federated([("local", FakeSource(ANN)), ("provider", slow)], grace=0.05, timeout=5)
+        start = time.monotonic()
+        self.assertIs(source.fetch("Name Search", "Ann Lee"), ANN)
+        self.assertLess(time.monotonic() - start, 1)
+        self.assertEqual(source.stats["provider"]["late"], 1)
+        self.assertEqual(source.stats["local"]["answered"], 1)
+
+        # Within the grace period the other answer is merged.
+        slow.delay = 0.01
+        self.assertEqual(source.fetch("Name Search", "Ann Lee")["born"], "1985")
+
+    def test_slow_leader_times_out(self) -> None:
+        leader = FakeSource(ANN, delay=5)
+        source = self.federated([("local", leader), ("provider", FakeSource({"born": "1985"}))], timeout=0.1)
+        # The provider has no name: with the leader gone there is no person.
+        self.assertIsNone(source.fetch("Name Search", "Ann Lee"))
+        self.assertEqual((source.stats["local"]["timeouts"], source.stats["provider"]["answered"]), (1, 1))
+
+        everyone_slow = self.federated(
+            [("a", FakeSource(ANN, delay=5)), ("b", FakeSource(ANN, delay=5))], timeout=0.05
+        )
+        with self.assertRaises(TimeoutError):
+            everyone_slow.fetch("Name Search", "Ann Lee")
+
+    def test_failed_leader_hands_over_to_the_next(self) -> None:
+        source = self.federated(
+            [("local", FakeSource(error=ValueError("bad index"))), ("provider", FakeSource(ANN))], grace=0
+        )
+        self.assertIs(source.fetch("Name Search", "Ann Lee"), ANN)
+        self.assertEqual(source.stats["local"]["errors"], 1)
+
+        failing = self.federated(
+            [("a", FakeSource(error=ValueError("first"))), ("b", FakeSource(error=OSError()))]
+        )
+        with self.assertRaisesRegex(ValueError, "first"):
+            failing.fetch("Name Search", "Ann Lee")
+
+    def test_answers_in_before_the_first_wait_count(self) -> None:
+        other = {"first_name": "Ann", "last_name": "Lee", "born": "1985", "emails": ["ann@example.com"]}
+        source = self.federated([("local", FakeSource(ANN)), ("provider", FakeSource(other))], grace=0)
+        source._executor = ImmediateExecutor()
+        self.assertEqual(source.fetch("Name Search", "Ann Lee")["born"], "1985")
+        self.assertEqual(source.fetch_many([("Name Search", "Ann Lee")])[0]["born"], "1985")
+        self.assertEqual([counts["late"] for counts in source.stats.values()], [0, 0])
+
+    def test_batch_size_mismatch_is_an_error(self) -> None:
+        class Short(FakeSource):
+            def fetch_many(self, queries: Sequence[Tuple[str, str]]) -> List[Optional[Dict[str, Any]]]:
+                return []
+
+        source = self.federated([("short", Short(ANN)), ("local", FakeSource(ANN))])
+        self.assertEqual(source.fetch_many([("Name Search", "Ann Lee")]), [ANN])
+        self.assertEqual(source.stats["short"]["errors"], 1)
+
+class StoreSourceTests(unittest.TestCase):
+    def test_answers_like_the_local_index(self) -> None:
+        store = InMemoryRecordStore(list(generate_people(60, seed=6)))
+        rows = generate_queries(60, 200, seed=6, miss_ratio=0.2)
+        queries = [(row["search_option"], row["input_value"]) for row in rows]
+        source = StoreSource(store)
+        extractor = IdentityExtractor(store=store)
+        expected = [extractor.resolve(option, value) for option, value in queries]
+        self.assertEqual([source.fetch(option, value) for option, value in queries], expected)
+        self.assertEqual(source.fetch_many(queries), expected)
+        self.assertTrue(any(raw is None for raw in expected) and any(expected))
+
+    def test_source_from_settings(self) -> None:
+        store = InMemoryRecordStore([])
+        settings: Dict[str, Any] = {
+            "federation": {
+                "sources": [
+                    {"name": "local", "type": "store"},
+                    {"name": "provider", "urls": ["http://127.0.0.1:9", "http://127.0.0.1:10"]},
+                    {"url": "http://127.0.0.1:11"},
+                ],
+                "grace_ms": 5,
+            }
+        }
+        source = source_from_settings(settings, store)
+        self.addCleanup(source.close)
+        self.assertEqual([name for name, _ in source.members], ["local", "provider", "source3"])
+        self.assertIsInstance(source.members[0][1], StoreSource)
+        self.assertEqual(len(source.members[1][1].replicas), 2)
+        self.assertEqual(source.grace, 0.005)
+
+        for entries in ([{"type": "store"}], [{"name": "x", "type": "ftp"}], [{"name": "x"}]):
+            with self.subTest(entries=entries):
+                with self.assertRaises(ValueError):
+                    source_from_settings({"federation": {"sources": entries}})
+
+if __name__ == "__main__":
+    unittest.main()
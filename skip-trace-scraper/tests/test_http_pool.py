@@ -0,0 +1,147 @@
+import socket
+import threading
+import time
+import unittest
+from urllib.parse import urlencode
+
+from extractors.identity_extractor import IdentityExtractor
+from extractors.record_store import InMemoryRecordStore
+from extractors.remote_source import serve_stub_source
+from utils.http_pool import CircuitBreaker, CircuitOpenError, HTTPPool, PoolSaturatedError
+
+HIT = urlencode({"search_option": "Phone Search", "input_value": "(214) 534-2474"})
+MISS = urlencode({"search_option": "Phone Search", "input_value": "(000) 000-0000"})
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def _serve(port: int = 0):
+    store = InMemoryRecordStore(IdentityExtractor._build_static_dataset())
+    server = serve_stub_source(store, port=port)
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+class StubSourceTestCase(unittest.TestCase):
+    def setUp(self) -> None:
+        self.server, self.base_url = _serve()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+
+class PoolReuseTests(StubSourceTestCase):
+    def test_sequential_requests_share_one_connection(self) -> None:
+        with HTTPPool(timeout=5) as pool:
+            statuses = [pool.get(f"{self.base_url}/lookup?{HIT}")[0] for _ in range(20)]
+            self.assertEqual(statuses, [200] * 20)
+            self.assertEqual(pool.opened, 1)
+            self.assertEqual(pool.reused, 19)
+
+    def test_concurrent_requests_stay_within_max_per_host(self) -> None:
+        with HTTPPool(timeout=5, max_per_host=2) as pool:
+            results = []
+
+            def worker() -> None:
+                for _ in range(10):
+                    results.append(pool.get(f"{self.base_url}/lookup?{MISS}")[0])
+
+            threads = [threading.Thread(target=worker) for _ in range(6)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            self.assertEqual(results, [404] * 60)
+            self.assertLessEqual(pool.opened, 2)
+            self.assertEqual(pool.opened + pool.reused, 60)
+
+    def test_no_idle_connections_kept_when_max_idle_is_zero(self) -> None:
+        with HTTPPool(timeout=5, max_idle_per_host=0) as pool:
+            for _ in range(3):
+                pool.get(f"{self.base_url}/lookup?{HIT}")
+            self.assertEqual(pool.opened, 3)
+            self.assertEqual(pool.reused, 0)
+
+class OversizedBodyTests(StubSourceTestCase):
+    def test_oversized_body_raises_without_tripping_the_breaker(self) -> None:
+        with HTTPPool(timeout=5, max_response_bytes=64, failure_threshold=1) as pool:
+            with self.assertRaises(ValueError):
+                pool.get(f"{self.base_url}/lookup?{HIT}")
+            self.assertEqual(pool.retries, 0)
+            self.assertEqual(pool.stats()["open_circuits"], 0)
+            # The small 404 body still fits.
+            self.assertEqual(pool.get(f"{self.base_url}/lookup?{MISS}")[0], 404)
+
+class RetryTests(unittest.TestCase):
+    def test_connection_errors_are_retried_then_raised(self) -> None:
+        pool = HTTPPool(timeout=1, max_retries=3, backoff_base=0.001, failure_threshold=10)
+        with self.assertRaises(ConnectionRefusedError):
+            pool.get(f"http://127.0.0.1:{_free_port()}/lookup?{HIT}")
+        self.assertEqual(pool.retries, 3)
+        self.assertEqual(pool.opened, 4)
+
+    def test_backoff_is_capped_and_honours_retry_after(self) -> None:
+        pool = HTTPPool(backoff_base=0.1, backoff_max=0.5)
+        for attempt in range(8):
+            self.assertLessEqual(pool._backoff(attempt, None), min(0.5, 0.1 * 2 ** attempt))
+        # Only a whole number of seconds counts as a Retry-After delay.
+        self.assertLessEqual(pool._backoff(0, "Wed, 21 Oct 2026 07:28:00 GMT"), 0.1)
+        self.assertGreaterEqual(HTTPPool(backoff_max=5.0)._backoff(0, "2"), 2.0)
+        self.assertEqual(pool._backoff(0, "10"), 0.5)
+
+class CircuitBreakerTests(unittest.TestCase):
+    def test_opens_after_threshold_and_half_opens_after_reset(self) -> None:
+        now = [0.0]
+        breaker = CircuitBreaker(failure_threshold=2, reset_seconds=10, clock=lambda: now[0])
+        breaker.record_failure()
+        self.assertEqual(breaker.state, "closed")
+        breaker.record_failure()
+        self.assertEqual(breaker.state, "open")
+        self.assertFalse(breaker.allow())
+
+        now[0] = 10.0
+        self.assertEqual(breaker.state, "half_open")
+        self.assertTrue(breaker.allow())
+        # Only one trial call per reset period.
+        self.assertFalse(breaker.allow())
+        breaker.record_failure()
+        self.assertEqual(breaker.state, "open")
+
+        now[0] = 20.0
+        self.assertTrue(breaker.allow())
+        breaker.record_success()
+        self.assertEqual(breaker.state, "closed")
+        self.assertTrue(breaker.allow())
+
+    def test_pool_fails_fast_while_open_and_recovers_once_the_host_is_back(self) -> None:
+        port = _free_port()
+        url = f"http://127.0.0.1:{port}/lookup?{HIT}"
+        pool = HTTPPool(timeout=1, max_retries=0, failure_threshold=2, reset_seconds=0.2)
+        for _ in range(2):
+            with self.assertRaises(ConnectionRefusedError):
+                pool.get(url)
+        with self.assertRaises(CircuitOpenError):
+            pool.get(url)
+        self.assertEqual(pool.rejected, 1)
+        self.assertEqual(pool.stats()["open_circuits"], 1)
+
+        server, _ = _serve(port)
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        time.sleep(0.25)
+        self.assertEqual(pool.get(url)[0], 200)
+        self.assertEqual(pool.stats()["open_circuits"], 0)
+        pool.close()
+
+class SaturationTests(unittest.TestCase):
+    def test_saturated_pool_is_neither_retried_nor_counted_by_the_breaker(self) -> None:
+        pool = HTTPPool(timeout=0.05, max_per_host=1, max_retries=3, failure_threshold=1)
+        host = pool._host("http", "127.0.0.1", 9)
+        host.slots.acquire()
+        with self.assertRaises(PoolSaturatedError):
+            pool.get("http://127.0.0.1:9/lookup")
+        self.assertNotIsInstance(PoolSaturatedError(), OSError)
+        self.assertEqual(pool.retries, 0)
+        self.assertEqual(pool.saturated, 1)
+        self.assertEqual(host.breaker.state, "closed")
+
+if __name__ == "__main__":
+    unittest.main()
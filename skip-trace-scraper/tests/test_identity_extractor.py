@@ -0,0 +1,81 @@
+import unittest
+from typing import Any, List, Tuple
+
+from extractors.identity_extractor import IdentityExtractor, LookupMiss, PersonRecord
+from extractors.record_store import InMemoryRecordStore
+from extractors.remote_source import RemoteSource, serve_stub_source
+from utils.http_pool import HTTPPool
+from utils.lookup_cache import LookupCache
+from utils.synthetic import generate_people, generate_queries
+
+PEOPLE = 300
+QUERIES = 600
+
+def _queries() -> List[Tuple[str, str]]:
+    rows = generate_queries(PEOPLE, QUERIES, seed=7, miss_ratio=0.1)
+    queries = [(row["search_option"], row["input_value"]) for row in rows]
+    # Fuzzy candidates: misspelled and reordered names of real people.
+    people = list(generate_people(20, seed=7))
+    queries += [("Name Search", f"{p['first_name']} {p['last_name'][:-1]}x") for p in people]
+    queries += [("Name Search", f"{p['first_name'][:1]} {p['last_name']}") for p in people]
+    return queries
+
+def _single(extractor: IdentityExtractor, option: str, value: str) -> Any:
+    try:
+        return extractor.lookup(option, value).to_dict()
+    except LookupError as exc:
+        return ("miss", str(exc))
+
+def _batched(result: Any) -> Any:
+    if isinstance(result, LookupMiss):
+        return ("miss", str(result.to_exception()))
+    assert isinstance(result, PersonRecord)
+    return result.to_dict()
+
+class LookupParityTests(unittest.TestCase):
+    """``lookup_many`` gives exactly what one ``lookup`` per query gives."""
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.store = InMemoryRecordStore(list(generate_people(PEOPLE, seed=7)))
+        cls.queries = _queries()
+
+    def assert_parity(self, single: IdentityExtractor, batched: IdentityExtractor) -> None:
+        expected = [_single(single, option, value) for option, value in self.queries]
+        for size in (1, 7, len(self.queries)):
+            got = []
+            for start in range(0, len(self.queries), size):
+                got += [_batched(r) for r in batched.lookup_many(self.queries[start:start + size])]
+            self.assertEqual(got, expected, f"chunk size {size}")
+        self.assertTrue(any(isinstance(r, tuple) for r in expected))
+        self.assertTrue(any(isinstance(r, dict) for r in expected))
+
+    def test_store_lookups(self) -> None:
+        self.assert_parity(IdentityExtractor(store=self.store), IdentityExtractor(store=self.store))
+
+    def test_fuzzy_lookups(self) -> None:
+        single = IdentityExtractor(store=self.store, fuzzy_threshold=0.8)
+        batched = IdentityExtractor(store=self.store, fuzzy_threshold=0.8)
+        self.assert_parity(single, batched)
+        fuzzy = [r for r in batched.lookup_many(self.queries) if isinstance(r, PersonRecord) and r.match_score]
+        self.assertTrue(fuzzy)
+        self.assertTrue(all(r.to_dict()["Match Type"] == "fuzzy" for r in fuzzy))
+
+    def test_cached_lookups(self) -> None:
+        single = IdentityExtractor(store=self.store, cache=LookupCache())
+        batched = IdentityExtractor(store=self.store, cache=LookupCache())
+        self.assert_parity(single, batched)
+
+    def test_remote_source_lookups(self) -> None:
+        server = serve_stub_source(self.store)
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        url = f"http://127.0.0.1:{server.server_address[1]}"
+        for batch in (False, True):
+            with self.subTest(batch=batch):
+                source = RemoteSource(url, HTTPPool(timeout=5), batch=batch)
+                self.addCleanup(source.close)
+                self.assert_parity(IdentityExtractor(store=self.store), IdentityExtractor(source=source))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,195 @@
+import contextlib
+import io
+import json
+import logging
+import sys
+import unittest
+from pathlib import Path
+from typing import Any, Dict, List
+from unittest import mock
+
+from utils.log_pipeline import (
+    JsonFormatter,
+    RateLimitFilter,
+    SamplingFilter,
+    configure_logging,
+    shutdown_logging,
+)
+
+SETTINGS = Path(__file__).resolve().parents[1] / "src" / "config" / "settings.json"
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 1_000.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+def _record(name: str, msg: str, *args: Any, level: int = logging.INFO) -> logging.LogRecord:
+    return logging.makeLogRecord({"name": name, "msg": msg, "args": args, "levelno": level})
+
+class JsonFormatterTests(unittest.TestCase):
+    def test_extras_and_exception(self) -> None:
+        try:
+            raise ValueError("boom")
+        except ValueError:
+            record = logging.getLogger("tests.json").makeRecord(
+                "tests.json",
+                logging.ERROR,
+                __file__,
+                1,
+                "Failed %s",
+                ("Ann Lee",),
+                sys.exc_info(),
+                extra={"query_index": 7, "path": Path("/tmp/x")},
+            )
+        entry = json.loads(JsonFormatter().format(record))
+        self.assertEqual(
+            {key: entry[key] for key in ("level", "logger", "message", "query_index", "path")},
+            {
+                "level": "ERROR",
+                "logger": "tests.json",
+                "message": "Failed Ann Lee",
+                "query_index": 7,
+                "path": "/tmp/x",
+            },
+        )
+        self.assertRegex(entry["time"], r"^\d{4}-\d\d-\d\dT\d\d:\d\d:\d\d\.\d{3}\+00:00$")
+        self.assertIn("ValueError: boom", entry["exception"])
+        # Standard record attributes are not repeated as extras.
+        self.assertFalse({"args", "msg", "levelno", "exc_info", "created"} & set(entry))
+
+class SamplingFilterTests(unittest.TestCase):
+    def test_samples_each_event_at_its_prefix_rate(self) -> None:
+        sampler = SamplingFilter({"queries": 3, "queries.slow": 5, "off": 1})
+
+        def kept(name: str, msg: str, count: int) -> List[int]:
+            records = [_record(name, msg, n) for n in range(count)]
+            return [n for n, record in enumerate(records) if sampler.filter(record)]
+
+        self.assertEqual(kept("queries.fast", "Looking up %s", 10), [0, 3, 6, 9])
+        # Another template is another event with its own counter.
+        self.assertEqual(kept("queries.fast", "Enriching %s", 4), [0, 3])
+        # The longest prefix wins.
+        self.assertEqual(kept("queries.slow.deep", "Looking up %s", 11), [0, 5, 10])
+        for name in ("other", "queriesx", "off"):
+            self.assertEqual(kept(name, "Looking up %s", 5), list(range(5)))
+
+        record = _record("queries", "Looking up %s", 1)
+        self.assertTrue(sampler.filter(record))
+        self.assertEqual(record.sample_every, 3)
+
+class RateLimitFilterTests(unittest.TestCase):
+    def setUp(self) -> None:
+        self.clock = FakeClock()
+        patcher = mock.patch("utils.log_pipeline.time", self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_suppresses_and_reports_repeats(self) -> None:
+        limit = RateLimitFilter(burst=2, interval=10)
+        failed = [_record("main", "Failed %s", n, level=logging.ERROR) for n in range(5)]
+        self.assertEqual([limit.filter(record) for record in failed], [True, True, False, False, False])
+        # The same template at another level is another event.
+        self.assertTrue(limit.filter(_record("main", "Failed %s", 0, level=logging.WARNING)))
+        self.assertEqual(limit.pending(), [("main", logging.ERROR, "Failed %s", 3)])
+
+        self.clock.now += 9.9
+        self.assertFalse(limit.filter(_record("main", "Failed %s", 5, level=logging.ERROR)))
+        self.clock.now += 0.1
+        record = _record("main", "Failed %s", 6, level=logging.ERROR)
+        self.assertTrue(limit.filter(record))
+        self.assertEqual(record.getMessage(), "Failed 6 (4 similar message(s) suppressed)")
+        self.assertEqual(record.suppressed, 4)
+        self.assertEqual(limit.pending(), [])
+
+        # The report goes out once: the next record of the window is unchanged.
+        record = _record("main", "Failed %s", 7, level=logging.ERROR)
+        self.assertTrue(limit.filter(record))
+        self.assertFalse(hasattr(record, "suppressed"))
+
+class ConfigureLoggingTests(unittest.TestCase):
+    def setUp(self) -> None:
+        root = logging.getLogger()
+        queries = logging.getLogger("queries")
+        saved = (root.handlers[:], root.level, queries.level)
+
+        def restore() -> None:
+            shutdown_logging()
+            for handler in root.handlers[:]:
+                root.removeHandler(handler)
+            root.handlers[:] = saved[0]
+            root.setLevel(saved[1])
+            queries.setLevel(saved[2])
+
+        self.addCleanup(restore)
+
+    def run_logging(self, config: Dict[str, Any], emit: Any) -> List[str]:
+        """stderr lines written while ``emit`` runs, queue drained."""
+        stderr = io.StringIO()
+        with contextlib.redirect_stderr(stderr):
+            configure_logging("INFO", config)
+            emit()
+            shutdown_logging()
+        return stderr.getvalue().splitlines()
+
+    def test_rate_limit_reports_suppressed_at_shutdown(self) -> None:
+        def emit() -> None:
+            for n in range(4):
+                logging.getLogger("tests.flood").error("Failed %s", n)
+
+        config = {"format": "json", "rate_limit": {"burst": 1, "interval_seconds": 3600}}
+        lines = [json.loads(line) for line in self.run_logging(config, emit)]
+        self.assertEqual(
+            [(entry["logger"], entry["level"], entry["message"]) for entry in lines],
+            [
+                ("tests.flood", "ERROR", "Failed 0"),
+                ("tests.flood", "ERROR", "3 more message(s) like this were suppressed: Failed %s"),
+            ],
+        )
+
+    def test_rate_limit_is_off_by_default(self) -> None:
+        def emit() -> None:
+            for n in range(30):
+                logging.getLogger("tests.flood").error("Failed %s", n)
+
+        shipped = json.loads(SETTINGS.read_text(encoding="utf-8"))["logging"]
+        for name, config in (("empty", {}), ("settings.json", shipped)):
+            with self.subTest(config=name):
+                lines = self.run_logging(config, emit)
+                self.assertEqual(len(lines), 30)
+                self.assertTrue(lines[-1].endswith("tests.flood - Failed 29"))
+
+    def test_per_query_opt_in(self) -> None:
+        def emit() -> None:
+            logging.getLogger("queries.tests").info("Looking up %s", "Ann Lee")
+            logging.getLogger("tests").info("Batch done")
+
+        for queue in (True, False):
+            with self.subTest(queue=queue):
+                lines = self.run_logging({"queue": queue}, emit)
+                self.assertEqual(len(lines), 1)
+                self.assertTrue(lines[0].endswith("[INFO] tests - Batch done"))
+                self.assertFalse(logging.getLogger("queries.tests").isEnabledFor(logging.CRITICAL))
+
+                lines = self.run_logging({"queue": queue, "per_query": True}, emit)
+                self.assertEqual(len(lines), 2)
+                self.assertTrue(lines[0].endswith("[INFO] queries.tests - Looking up Ann Lee"))
+
+    def test_sample_every_applies_to_queries(self) -> None:
+        def emit() -> None:
+            for n in range(10):
+                logging.getLogger("queries.tests").info("Looking up %s", n)
+
+        lines = self.run_logging({"per_query": True, "format": "json", "sample_every": {"queries": 4}}, emit)
+        self.assertEqual(
+            [json.loads(line)["message"] for line in lines], ["Looking up 0", "Looking up 4", "Looking up 8"]
+        )
+        self.assertEqual(json.loads(lines[0])["sample_every"], 4)
+
+    def test_unknown_format(self) -> None:
+        with self.assertRaises(ValueError):
+            configure_logging("INFO", {"format": "xml"})
+
+if __name__ == "__main__":
+    unittest.main()
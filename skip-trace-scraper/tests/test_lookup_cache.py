@@ -0,0 +1,156 @@
+import sqlite3
+import tempfile
+import unittest
+from pathlib import Path
+from typing import Dict, Tuple
+from unittest import mock
+
+from utils.lookup_cache import LookupCache, cache_from_settings
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 1_000_000.0
+
+    def time(self) -> float:
+        return self.now
+
+def key(n: int) -> Tuple[str, str]:
+    return ("phone search", f"555000{n:04d}")
+
+def value(n: int) -> Dict[str, str]:
+    return {"first_name": f"Person{n}", "last_name": "Smith"}
+
+class LookupCacheTests(unittest.TestCase):
+    def setUp(self) -> None:
+        self.clock = FakeClock()
+        patcher = mock.patch("utils.lookup_cache.time", self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        work_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(work_dir.cleanup)
+        self.path = Path(work_dir.name) / "cache" / "lookups.sqlite3"
+
+    def open(self, **options: int) -> LookupCache:
+        cache = LookupCache(self.path, **options)
+        self.addCleanup(cache.close)
+        return cache
+
+    def accessed_at(self, n: int) -> float:
+        with sqlite3.connect(str(self.path)) as db:
+            (accessed,) = db.execute(
+                "SELECT accessed_at FROM lookup_cache WHERE option = ? AND input = ?", key(n)
+            ).fetchone()
+        return accessed
+
+    def test_entries_expire_after_their_ttl(self) -> None:
+        for path in (None, self.path):
+            with self.subTest(path=path):
+                cache = LookupCache(path, ttl_seconds=60)
+                self.addCleanup(cache.close)
+                cache.put(key(1), value(1))
+                cache.put(key(2), value(2), ttl_seconds=600)
+                self.clock.now += 59
+                self.assertEqual(cache.get(key(1)), value(1))
+                self.clock.now += 1
+                self.assertIsNone(cache.get(key(1)))
+                self.assertEqual(cache.get(key(2)), value(2))
+                self.assertEqual((cache.stats.hits, cache.stats.misses), (2, 1))
+                self.assertGreaterEqual(cache.stats.expired, 1)
+                cache.close()
+
+    def test_memory_tier_evicts_least_recently_used(self) -> None:
+        cache = LookupCache(memory_entries=3)
+        for n in range(3):
+            cache.put(key(n), value(n))
+        cache.get(key(0))
+        cache.put(key(3), value(3))
+        self.assertIsNone(cache.get(key(1)))
+        for n in (0, 2, 3):
+            self.assertEqual(cache.get(key(n)), value(n))
+        self.assertEqual(cache.stats.evictions, 1)
+
+    def test_disk_hits_refill_the_memory_tier(self) -> None:
+        cache = self.open(memory_entries=1)
+        cache.put(key(1), value(1))
+        cache.put(key(2), value(2))
+        self.assertEqual(cache.get(key(1)), value(1))
+        self.assertEqual((cache.stats.memory_hits, cache.stats.disk_hits), (0, 1))
+        self.assertEqual(cache.get(key(1)), value(1))
+        self.assertEqual(cache.stats.memory_hits, 1)
+
+    def test_persists_across_reopen(self) -> None:
+        cache = LookupCache(self.path, commit_every=1000)
+        cache.put(key(1), {"first_name": "José", "phones": [{"number": "(555) 000-0001"}]})
+        cache.close()
+
+        reopened = self.open()
+        self.assertEqual(
+            reopened.get(key(1)), {"first_name": "José", "phones": [{"number": "(555) 000-0001"}]}
+        )
+        self.assertEqual(reopened.stats.disk_hits, 1)
+        # The default TTL is a week.
+        self.clock.now += 8 * 24 * 3600
+        self.assertIsNone(reopened.get(key(1)))
+
+    def test_disk_tier_is_trimmed_every_evict_every_puts(self) -> None:
+        with mock.patch("utils.lookup_cache.EVICT_EVERY", 10):
+            cache = self.open(memory_entries=1, disk_entries=5)
+            for n in range(9):
+                self.clock.now += 1
+                cache.put(key(n), value(n))
+            self.assertEqual(cache.stats.evictions, 8)  # memory tier only
+            self.clock.now += 1
+            cache.put(key(9), value(9))
+        self.assertEqual(cache.stats.evictions, 9 + 5)
+        for n in range(5):
+            self.assertIsNone(cache.get(key(n)))
+        for n in range(5, 10):
+            self.assertEqual(cache.get(key(n)), value(n))
+
+    def test_disk_hits_touch_rows_in_batches(self) -> None:
+        with mock.patch("utils.lookup_cache.TOUCH_EVERY", 3):
+            cache = self.open(memory_entries=1, commit_every=1)
+            for n in range(4):
+                cache.put(key(n), value(n))
+            put_at = self.clock.now
+            self.clock.now += 100
+            cache.get(key(0))
+            cache.get(key(1))
+            self.assertEqual(self.accessed_at(0), put_at)
+            cache.get(key(2))
+        self.assertEqual([self.accessed_at(n) for n in range(4)], [put_at + 100] * 3 + [put_at])
+
+    def test_trimming_keeps_recently_read_rows(self) -> None:
+        with mock.patch("utils.lookup_cache.EVICT_EVERY", 4):
+            cache = self.open(memory_entries=1, disk_entries=2)
+            for n in range(3):
+                self.clock.now += 1
+                cache.put(key(n), value(n))
+            self.clock.now += 1
+            # Pending touches are flushed before the rows are ranked.
+            cache.get(key(0))
+            cache.put(key(3), value(3))
+        self.assertEqual(cache.get(key(0)), value(0))
+        self.assertIsNone(cache.get(key(1)))
+        self.assertIsNone(cache.get(key(2)))
+
+class CacheFromSettingsTests(unittest.TestCase):
+    def test_disabled_or_missing(self) -> None:
+        root = Path(tempfile.gettempdir())
+        self.assertIsNone(cache_from_settings({}, root))
+        self.assertIsNone(cache_from_settings({"cache": {"enabled": False}}, root))
+
+    def test_file_is_named_after_the_dataset(self) -> None:
+        with tempfile.TemporaryDirectory() as root_dir:
+            root = Path(root_dir)
+            names = set()
+            for source_url in (None, "http://a.example", "http://b.example", None):
+                settings = {"cache": {"path": "lookups.sqlite3"}, "source_url": source_url}
+                cache = cache_from_settings(settings, root)
+                names.add(cache.path.name)
+                cache.close()
+            self.assertEqual(len(names), 3)
+            self.assertTrue(all(name.startswith("lookups-") for name in names))
+
+if __name__ == "__main__":
+    unittest.main()
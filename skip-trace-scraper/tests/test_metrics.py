@@ -0,0 +1,166 @@
+import random
+import re
+import tempfile
+import unittest
+import urllib.error
+import urllib.request
+from pathlib import Path
+
+from utils.metrics import (
+    STAGES,
+    LatencyHistogram,
+    Metrics,
+    MetricsReporter,
+    _bucket,
+    _bucket_upper,
+    metrics_from_settings,
+)
+
+# name{labels} value, as in the Prometheus text exposition format.
+SAMPLE = re.compile(r'^([a-z_]+)(\{[a-z]+="[^"]*"(,[a-z]+="[^"]*")*\})? (-?[0-9.e+]+)$')
+
+class LatencyHistogramTests(unittest.TestCase):
+    def test_bucket_bounds(self) -> None:
+        rng = random.Random(1)
+        values = list(range(5000)) + [rng.randrange(1 << bits) for bits in range(13, 64) for _ in range(50)]
+        values.append((1 << 64) - 1)
+        for value in values:
+            index = _bucket(value)
+            upper = _bucket_upper(index)
+            lower = _bucket_upper(index - 1) + 1 if index else 0
+            self.assertLessEqual(lower, value)
+            self.assertLessEqual(value, upper)
+            # Buckets are at most 1/16 of their values wide.
+            self.assertLessEqual(upper - lower, max(0, lower) / 16)
+        self.assertEqual([_bucket(v) for v in (0, 1, 31, 32, 33, 34)], [0, 1, 31, 32, 32, 33])
+
+    def test_quantiles(self) -> None:
+        histogram = LatencyHistogram()
+        self.assertEqual(histogram.quantile(0.5), 0)
+        values = [n * 1000 for n in range(1, 1001)]
+        random.Random(2).shuffle(values)
+        for value in values:
+            histogram.record(value)
+        self.assertEqual((histogram.count, histogram.total, histogram.max), (1000, sum(values), 1_000_000))
+        for q, exact in ((0.5, 500_000), (0.95, 950_000), (0.99, 990_000)):
+            with self.subTest(q=q):
+                found = histogram.quantile(q)
+                self.assertGreaterEqual(found, exact)
+                self.assertLessEqual(found, exact * (1 + 1 / 16))
+        # The top bucket is capped at the largest value seen.
+        self.assertEqual(histogram.quantile(1.0), 1_000_000)
+        self.assertEqual(histogram.quantile(0.0), _bucket_upper(_bucket(1000)))
+
+    def test_drain_and_merge(self) -> None:
+        rng = random.Random(3)
+        values = [rng.randrange(10**9) for _ in range(500)]
+        whole, first, second = LatencyHistogram(), LatencyHistogram(), LatencyHistogram()
+        for n, value in enumerate(values):
+            whole.record(value)
+            (first if n % 3 else second).record(value)
+        first.merge(second.drain())
+        self.assertEqual((second.count, second.total, second.max, second.quantile(0.5)), (0, 0, 0, 0))
+        self.assertEqual((first.count, first.total, first.max), (whole.count, whole.total, whole.max))
+        for q in (0.1, 0.5, 0.95, 0.99, 1.0):
+            self.assertEqual(first.quantile(q), whole.quantile(q))
+
+class MetricsTests(unittest.TestCase):
+    def test_merge_stages(self) -> None:
+        worker, parent = Metrics(), Metrics()
+        worker.observe("lookup", 2_000_000)
+        worker.observe("lookup", 4_000_000)
+        worker.observe("write", 1_000)
+        parent.observe("lookup", 8_000_000)
+
+        snapshots = worker.drain_stages()
+        self.assertEqual(sorted(snapshots), ["lookup", "write"])
+        self.assertEqual(worker.drain_stages(), {})
+        parent.merge_stages(snapshots)
+        lookup = parent.stages["lookup"]
+        self.assertEqual((lookup.count, lookup.total, lookup.max), (3, 14_000_000, 8_000_000))
+        self.assertEqual(parent.stages["write"].count, 1)
+
+    def test_counts_and_gauges(self) -> None:
+        metrics = Metrics()
+        self.assertEqual(list(metrics.timed_iter("abcde")), list("abcde"))
+        metrics.skipped += 1
+        metrics.record_outcome(True)
+        metrics.record_outcome(False)
+        metrics.gauge("queue", lambda: 7)
+        metrics.gauge("broken", lambda: 1 / 0)
+        self.assertEqual((metrics.read, metrics.stages["parse"].count), (5, 5))
+        self.assertEqual(metrics.gauges(), {"in_flight": 2, "queue": 7})
+        self.assertIn("2 done (1 failed)", metrics.summary())
+
+    def test_prometheus_text_format(self) -> None:
+        metrics = Metrics()
+        metrics.observe("lookup", 1_500_000)
+        metrics.record_outcome(True)
+        metrics.gauge("reorder_buffer", lambda: 3)
+        text = metrics.prometheus()
+        self.assertTrue(text.endswith("\n"))
+
+        typed = set()
+        samples = {}
+        for line in text.splitlines():
+            if line.startswith("# TYPE "):
+                _, _, name, kind = line.split(" ")
+                self.assertIn(kind, ("summary", "counter", "gauge"))
+                typed.add(name)
+            elif not line.startswith("# HELP "):
+                match = SAMPLE.match(line)
+                self.assertIsNotNone(match, line)
+                name = match.group(1)
+                # Every sample follows the TYPE line of its metric family.
+                self.assertIn(re.sub(r"_(sum|count)$", "", name), typed)
+                samples[name + (match.group(2) or "")] = float(match.group(4))
+
+        self.assertEqual(samples['skiptrace_stage_seconds_count{stage="lookup"}'], 1)
+        self.assertEqual(samples['skiptrace_stage_seconds_sum{stage="lookup"}'], 0.0015)
+        self.assertEqual(
+            samples['skiptrace_stage_seconds{stage="lookup",quantile="0.5"}'], 1_500_000 / 1e9
+        )
+        for stage in STAGES:
+            self.assertIn(f'skiptrace_stage_seconds_count{{stage="{stage}"}}', samples)
+        self.assertEqual(samples['skiptrace_queries_total{outcome="success"}'], 1)
+        self.assertEqual(samples["skiptrace_reorder_buffer"], 3)
+        self.assertEqual(samples["skiptrace_in_flight"], 0)
+
+class MetricsReporterTests(unittest.TestCase):
+    def test_file_and_endpoint(self) -> None:
+        with tempfile.TemporaryDirectory() as work_dir:
+            path = Path(work_dir) / "metrics" / "skiptrace.prom"
+            reporter = MetricsReporter(Metrics(), summary_seconds=0, prometheus_file=path, prometheus_port=0)
+            reporter.start()
+            try:
+                reporter.metrics.record_outcome(True)
+                base = f"http://127.0.0.1:{reporter._server.server_address[1]}"
+                with urllib.request.urlopen(f"{base}/metrics", timeout=5) as response:
+                    self.assertEqual(response.status, 200)
+                    self.assertIn("text/plain", response.headers["Content-Type"])
+                    self.assertIn('skiptrace_queries_total{outcome="success"} 1', response.read().decode())
+                with self.assertRaises(urllib.error.HTTPError) as caught:
+                    urllib.request.urlopen(f"{base}/other", timeout=5)
+                caught.exception.close()
+                self.assertEqual(caught.exception.code, 404)
+                self.assertFalse(path.exists())
+            finally:
+                reporter.stop()
+            # stop() writes the final numbers.
+            self.assertIn('outcome="success"} 1', path.read_text(encoding="utf-8"))
+            self.assertEqual(list(path.parent.iterdir()), [path])
+
+    def test_metrics_from_settings(self) -> None:
+        root = Path(tempfile.gettempdir())
+        self.assertIsNone(metrics_from_settings({}, root))
+        self.assertIsNone(metrics_from_settings({"metrics": {"enabled": False}}, root))
+        reporter = metrics_from_settings(
+            {"metrics": {"summary_seconds": 5, "prometheus_file": "m.prom", "prometheus_port": None}}, root
+        )
+        self.assertEqual(
+            (reporter.summary_seconds, reporter.prometheus_file, reporter.prometheus_port),
+            (5.0, root / "m.prom", None),
+        )
+
+if __name__ == "__main__":
+    unittest.main()
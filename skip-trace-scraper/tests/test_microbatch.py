@@ -0,0 +1,101 @@
+import threading
+import time
+import unittest
+from concurrent.futures import Future
+from typing import Any, List
+
+from utils.microbatch import MicroBatcher
+
+class MicroBatcherTests(unittest.TestCase):
+    def batcher(self, handler: Any, **options: Any) -> MicroBatcher:
+        batcher: MicroBatcher = MicroBatcher(handler, **options)
+        self.addCleanup(batcher.close)
+        return batcher
+
+    def test_batches_hold_at_most_max_batch_items(self) -> None:
+        sizes: List[int] = []
+        busy = threading.Event()
+        release = threading.Event()
+
+        def handler(items: List[int]) -> List[int]:
+            busy.set()
+            release.wait(5)
+            sizes.append(len(items))
+            return [item * 2 for item in items]
+
+        batcher = self.batcher(handler, max_batch=4, max_wait=0.01)
+        first = batcher.submit(0)
+        busy.wait(5)
+        # The handler is busy with the first item while the rest queue up.
+        futures = [first] + [batcher.submit(item) for item in range(1, 11)]
+        release.set()
+        self.assertEqual([future.result(5) for future in futures], [item * 2 for item in range(11)])
+        self.assertEqual(sizes, [1, 4, 4, 2])
+        self.assertEqual((batcher.batches, batcher.items), (4, 11))
+
+    def test_waits_at_most_max_wait_for_company(self) -> None:
+        sizes: List[int] = []
+
+        def handler(items: List[str]) -> List[str]:
+            sizes.append(len(items))
+            return items
+
+        batcher = self.batcher(handler, max_batch=100, max_wait=0.2)
+        start = time.monotonic()
+        futures = [batcher.submit(item) for item in "abc"]
+        self.assertEqual([future.result(5) for future in futures], list("abc"))
+        elapsed = time.monotonic() - start
+        self.assertEqual(sizes, [3])
+        self.assertGreaterEqual(elapsed, 0.15)
+        self.assertLess(elapsed, 2)
+
+        # Without a wait every item goes out in a batch of its own.
+        alone = self.batcher(handler, max_batch=100, max_wait=0)
+        for item in "xyz":
+            self.assertEqual(alone.submit(item).result(5), item)
+        self.assertEqual(sizes[1:], [1, 1, 1])
+
+    def test_exception_entry_fails_only_its_item(self) -> None:
+        def handler(items: List[int]) -> List[Any]:
+            return [ValueError(f"bad {item}") if item % 2 else item for item in items]
+
+        batcher = self.batcher(handler, max_batch=8, max_wait=0.05)
+        futures = [batcher.submit(item) for item in range(4)]
+        self.assertEqual(futures[0].result(5), 0)
+        self.assertEqual(futures[2].result(5), 2)
+        with self.assertRaisesRegex(ValueError, "bad 1"):
+            futures[1].result(5)
+        self.assertIsInstance(futures[3].exception(5), ValueError)
+
+    def test_handler_failure_fails_the_whole_batch(self) -> None:
+        cases = {
+            "raises": lambda items: 1 / 0,
+            "too few results": lambda items: items[:-1],
+            "too many results": lambda items: items + [None],
+        }
+        for name, handler in cases.items():
+            with self.subTest(name=name):
+                batcher = self.batcher(handler, max_batch=8, max_wait=0.05)
+                with self.assertLogs("utils.microbatch", "ERROR"):
+                    futures = [batcher.submit(item) for item in range(3)]
+                    errors = [future.exception(5) for future in futures]
+                    batcher.close()
+                self.assertEqual(len({id(error) for error in errors}), 1)
+                self.assertIsInstance(errors[0], ZeroDivisionError if name == "raises" else RuntimeError)
+
+    def test_close_drains_submitted_items(self) -> None:
+        def handler(items: List[int]) -> List[int]:
+            time.sleep(0.01)
+            return items
+
+        batcher = self.batcher(handler, max_batch=3, max_wait=0.05)
+        futures: List["Future[int]"] = [batcher.submit(item) for item in range(20)]
+        batcher.close()
+        self.assertTrue(all(future.done() for future in futures))
+        self.assertEqual([future.result() for future in futures], list(range(20)))
+        with self.assertRaises(RuntimeError):
+            batcher.submit(20)
+        batcher.close()
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,112 @@
+import json
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+from typing import Any, Dict, List
+
+from extractors.identity_extractor import IdentityExtractor
+from extractors.record_store import (
+    KEY_KINDS,
+    InMemoryRecordStore,
+    RecordStore,
+    build_marshal_index,
+    build_snapshot_index,
+    build_sqlite_store,
+    open_record_store,
+    record_keys,
+)
+from utils.synthetic import generate_people
+
+def _records() -> List[Dict[str, Any]]:
+    records = IdentityExtractor._build_static_dataset() + list(generate_people(400, seed=3))
+    # Non-ASCII text, and a later record taking over an earlier one's phone.
+    unicode_person = dict(records[5], first_name="José", last_name="Núñez", name_key="José Núñez")
+    unicode_person["emails"] = ["josé.núñez@example.com"]
+    records.append(unicode_person)
+    return records
+
+def _canonical(raw: Any) -> str:
+    return json.dumps(raw, sort_keys=True, ensure_ascii=False)
+
+class StoreParityTests(unittest.TestCase):
+    """Every backend answers exactly like ``InMemoryRecordStore``."""
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.records = _records()
+        cls.work_dir = Path(tempfile.mkdtemp(prefix="store-parity-"))
+        sqlite_path = cls.work_dir / "people.sqlite3"
+        marshal_path = cls.work_dir / "people.stidx"
+        snapshot_path = cls.work_dir / "people.stsnap"
+        raw_path = cls.work_dir / "people-raw.stsnap"
+        build_sqlite_store(iter(cls.records), sqlite_path, batch_size=64)
+        build_marshal_index(iter(cls.records), marshal_path)
+        build_snapshot_index(iter(cls.records), snapshot_path, block_records=16)
+        build_snapshot_index(iter(cls.records), raw_path, compression="none")
+        cls.reference = InMemoryRecordStore(cls.records)
+        cls.stores: Dict[str, RecordStore] = {
+            path.name: open_record_store(path)
+            for path in (sqlite_path, marshal_path, snapshot_path, raw_path)
+        }
+        cls.keys = {kind: set() for kind in KEY_KINDS}
+        for raw in cls.records:
+            for kind, key in record_keys(raw):
+                cls.keys[kind].add(key)
+        for kind in KEY_KINDS:
+            cls.keys[kind].update({"", "no such key", "zz|nowhere|xx"})
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        for store in cls.stores.values():
+            store.close()
+        shutil.rmtree(cls.work_dir)
+
+    def test_get(self) -> None:
+        for name, store in self.stores.items():
+            for kind, keys in self.keys.items():
+                with self.subTest(store=name, kind=kind):
+                    for key in sorted(keys):
+                        self.assertEqual(
+                            _canonical(store.get(kind, key)),
+                            _canonical(self.reference.get(kind, key)),
+                            key,
+                        )
+
+    def test_get_many(self) -> None:
+        for name, store in self.stores.items():
+            for kind, keys in self.keys.items():
+                with self.subTest(store=name, kind=kind):
+                    probe = sorted(keys) + sorted(keys)[:10]
+                    got = store.get_many(kind, probe)
+                    expected = self.reference.get_many(kind, probe)
+                    self.assertEqual(sorted(got), sorted(expected))
+                    for key, raw in expected.items():
+                        self.assertEqual(_canonical(got[key]), _canonical(raw))
+
+    def test_records_and_length(self) -> None:
+        expected = sorted(_canonical(raw) for raw in self.reference.iter_records())
+        for name, store in self.stores.items():
+            with self.subTest(store=name):
+                self.assertEqual(len(store), len(self.reference))
+                self.assertEqual(sorted(_canonical(raw) for raw in store.iter_records()), expected)
+
+    def test_name_index(self) -> None:
+        reference = self.reference.name_index()
+        names = ["James Whitsit", "Jose Nunez", "José Núñez", "Mary Smyth", "Robert Jonson"]
+        names += [f"{raw['first_name']} {raw['last_name'][:-1]}" for raw in self.records[:20]]
+        for name, store in self.stores.items():
+            with self.subTest(store=name):
+                index = store.name_index()
+                self.assertIsNotNone(index)
+                self.assertEqual(len(index), len(reference))
+                for query in names:
+                    for strict in (False, True):
+                        self.assertEqual(
+                            index.search(query, limit=5, strict_first=strict),
+                            reference.search(query, limit=5, strict_first=strict),
+                            query,
+                        )
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,151 @@
+import tempfile
+import unittest
+from pathlib import Path
+from typing import List, Optional
+
+from extractors.identity_extractor import PersonRecord, Relation
+from extractors.relation_graph import ADDRESS_EDGES, PERSON_EDGES, RelationGraph
+
+def person(
+    name: str,
+    age: Optional[str] = None,
+    phone: Optional[str] = None,
+    street: Optional[str] = None,
+    relatives: Optional[List[Relation]] = None,
+    associates: Optional[List[Relation]] = None,
+    previous: Optional[List[str]] = None,
+) -> PersonRecord:
+    first, last = name.split(" ", 1)
+    return PersonRecord(
+        search_option="Name Search",
+        input_given=name,
+        first_name=first,
+        last_name=last,
+        age=age,
+        street_address=street,
+        address_locality="Dallas" if street else None,
+        address_region="TX" if street else None,
+        postal_code="75201" if street else None,
+        phones=[{"number": phone, "type": "Landline", "provider": None}] if phone else [],
+        previous_addresses=[
+            {"streetAddress": addr, "addressLocality": "Austin", "addressRegion": "TX", "postalCode": "73301"}
+            for addr in previous or []
+        ],
+        relatives=relatives or [],
+        associates=associates or [],
+    )
+
+def family() -> List[PersonRecord]:
+    return [
+        person(
+            "Ann Lee",
+            "40",
+            phone="555-010-0001",
+            street="1 Elm St",
+            relatives=[Relation("Bob Lee", "42"), Relation("John Smith", "30")],
+            associates=[Relation("Cy Ray", "41")],
+            previous=["9 Oak Ave"],
+        ),
+        person("Bob Lee", "43", phone="555-010-0002", street="1 Elm Street", relatives=[Relation("Dan Lee", "70")]),
+        person("Eve Cole", "39", street="1 Elm St"),
+        person("Cy Ray", "41", relatives=[Relation("John Smith", "60")]),
+        person("Fay Moss", "50", previous=["9 Oak Avenue"]),
+    ]
+
+class RelationGraphTests(unittest.TestCase):
+    def setUp(self) -> None:
+        self.graph = RelationGraph()
+        for record in family():
+            self.graph.add_record(record)
+
+    def test_within_hops_keeps_namesakes_apart(self) -> None:
+        self.assertEqual(
+            self.graph.within_hops("Ann Lee", 1),
+            [("Bob Lee", 43, 1), ("Cy Ray", 41, 1), ("John Smith", 30, 1)],
+        )
+        self.assertEqual(
+            self.graph.within_hops("Ann Lee", 2),
+            [
+                ("Bob Lee", 43, 1),
+                ("Cy Ray", 41, 1),
+                ("John Smith", 30, 1),
+                ("Dan Lee", 70, 2),
+                ("John Smith", 60, 2),
+            ],
+        )
+        self.assertEqual(self.graph.within_hops("John Smith", 1), [("Ann Lee", 40, 1), ("Cy Ray", 41, 1)])
+        self.assertEqual(self.graph.within_hops("Nobody Here", 3), [])
+
+    def test_within_hops_through_addresses(self) -> None:
+        edge_types = PERSON_EDGES + ADDRESS_EDGES
+        reachable = self.graph.within_hops("Eve Cole", 2, edge_types)
+        self.assertEqual(reachable, [("Ann Lee", 40, 2), ("Bob Lee", 43, 2)])
+        # A previous address ("9 Oak Ave" / "9 Oak Avenue") links people too.
+        self.assertIn(("Ann Lee", 40, 2), self.graph.within_hops("Fay Moss", 2, edge_types))
+        self.assertEqual(self.graph.within_hops("Eve Cole", 2), [])
+
+    def test_lookup_by_phone(self) -> None:
+        self.assertEqual(self.graph.within_hops("(555) 010-0002", 1), self.graph.within_hops("Bob Lee", 1))
+
+    def test_record_takes_over_its_reference(self) -> None:
+        # Bob was referenced as 42 and his own record says 43: one node.
+        self.assertEqual([name for name, _ in self.graph.neighbors("Bob Lee")], ["Ann Lee", "Dan Lee"])
+        self.assertEqual(len(self.graph), 7 + 3)
+
+    def test_reference_joins_the_closest_age(self) -> None:
+        graph = RelationGraph()
+        for age in ("31", "30", None):
+            graph.add_record(person("John Smith", age, phone=f"555-020-00{age or '00'}"))
+        graph.add_record(person("Kim Park", "35", relatives=[Relation("John Smith", "30")]))
+        graph.add_record(person("Lou Park", "35", relatives=[Relation("John Smith", "45")]))
+        self.assertEqual(
+            graph.within_hops("Kim Park", 1) + graph.within_hops("Lou Park", 1),
+            [("John Smith", 30, 1), ("John Smith", None, 1)],
+        )
+
+    def test_shared_phone_needs_the_same_name_and_age(self) -> None:
+        graph = RelationGraph()
+        graph.add_record(person("Mary Lee", "60", phone="555-030-0000"))
+        graph.add_record(person("Mary Lee", "61", phone="555-030-0000"))
+        graph.add_record(person("Mary Lee", "30", phone="555-030-0000"))
+        graph.add_record(person("Tom Lee", "62", phone="555-030-0000"))
+        self.assertEqual(len(graph), 3)
+
+    def test_likely_household(self) -> None:
+        self.assertEqual(self.graph.likely_household("Ann Lee"), [("Bob Lee", 1.75), ("Eve Cole", 1.0)])
+        self.assertEqual(self.graph.likely_household("Cy Ray"), [])
+
+    def test_save_and_load_round_trip(self) -> None:
+        with tempfile.TemporaryDirectory() as work_dir:
+            path = Path(work_dir) / "graph" / "relations.stgraph"
+            self.graph.save(path)
+            loaded = RelationGraph.load(path)
+
+            self.assertEqual((len(loaded), loaded.edge_count), (len(self.graph), self.graph.edge_count))
+            for name in ("Ann Lee", "Bob Lee", "John Smith", "Eve Cole", "555-010-0001"):
+                with self.subTest(name=name):
+                    self.assertEqual(loaded.neighbors(name), self.graph.neighbors(name))
+                    self.assertEqual(
+                        loaded.within_hops(name, 3, PERSON_EDGES + ADDRESS_EDGES),
+                        self.graph.within_hops(name, 3, PERSON_EDGES + ADDRESS_EDGES),
+                    )
+                    self.assertEqual(loaded.likely_household(name), self.graph.likely_household(name))
+
+            # The name and age index is rebuilt: later records still merge.
+            for graph in (self.graph, loaded):
+                graph.add_record(person("John Smith", "61", relatives=[Relation("Gil Smith", "5")]))
+                graph.add_record(person("Dan Lee", None, phone="555-010-0003"))
+            self.assertEqual(len(loaded), len(self.graph))
+            self.assertEqual(loaded.within_hops("Gil Smith", 2), self.graph.within_hops("Gil Smith", 2))
+
+    def test_load_rejects_other_files(self) -> None:
+        with tempfile.TemporaryDirectory() as work_dir:
+            path = Path(work_dir) / "relations.stgraph"
+            for data in (b"", b"not a graph", b"\xe9\x01\x02"):
+                with self.subTest(data=data):
+                    path.write_bytes(data)
+                    with self.assertRaises(ValueError):
+                        RelationGraph.load(path)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,61 @@
+import copy
+import random
+import unittest
+from typing import List, Optional, Tuple
+
+from extractors.identity_extractor import PersonRecord, Relation
+from extractors.relations_extractor import RELATION_FIELDS, RelationsExtractor
+
+# Includes names that only differ from another name plus age by where the
+# digits are ("E" aged 2 vs. "e2"), and ages that are blank or not numbers.
+NAMES = ["Ann Lee", "ann  lee", " ANN LEE ", "Bob Stone", "bob\tstone", "Ann Lee 2", "E", "e2", "É Ç"]
+AGES: List[Optional[str]] = [None, "", " ", "40", " 40", "40 ", "2", "04", "7", "abc", " 70 ", "-3"]
+
+def _random_records(rng: random.Random, count: int) -> List[PersonRecord]:
+    records = []
+    for position in range(count):
+        record = PersonRecord("Name Search", f"query {position}", "Jim", "Smith")
+        for field in RELATION_FIELDS:
+            relations = [Relation(rng.choice(NAMES), rng.choice(AGES)) for _ in range(rng.randrange(7))]
+            # Exact repeats of an earlier relation, as sources often send.
+            relations += [copy.copy(rng.choice(relations)) for _ in range(rng.randrange(3)) if relations]
+            rng.shuffle(relations)
+            setattr(record, field, relations)
+        records.append(record)
+    return records
+
+def _relations(records: List[PersonRecord]) -> List[Tuple[List[Tuple[str, Optional[str]]], ...]]:
+    return [
+        tuple([(rel.name, rel.age) for rel in getattr(record, field)] for field in RELATION_FIELDS)
+        for record in records
+    ]
+
+class EnrichManyTests(unittest.TestCase):
+    """``enrich_many`` gives exactly what ``enrich_relations`` per record gives."""
+
+    def test_matches_enrich_relations(self) -> None:
+        extractor = RelationsExtractor()
+        for seed in range(200):
+            with self.subTest(seed=seed):
+                records = _random_records(random.Random(seed), 1 + seed % 9)
+                single = [extractor.enrich_relations(r) for r in copy.deepcopy(records)]
+                batched = extractor.enrich_many(copy.deepcopy(records))
+                self.assertEqual(_relations(batched), _relations(single))
+
+    def test_dedupes_and_sorts(self) -> None:
+        record = PersonRecord("Name Search", "q", "Jim", "Smith")
+        record.relatives = [
+            Relation("bob  stone", None),
+            Relation("Ann Lee", " 40"),
+            Relation("ann lee", "40 "),
+            Relation("Ann Lee", None),
+            Relation(" Cy Ray", "70"),
+        ]
+        (enriched,) = RelationsExtractor().enrich_many([record])
+        self.assertEqual(
+            [(rel.name, rel.age) for rel in enriched.relatives],
+            [("Cy Ray", "70"), ("Ann Lee", "40"), ("Ann Lee", None), ("bob stone", None)],
+        )
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,180 @@
+import asyncio
+import threading
+import unittest
+from typing import Iterator, List
+from unittest import mock
+
+from utils.scheduler import BoundedScheduler, SearchRateLimiter, TokenBucket, run_async_bounded
+
+class FakeClock:
+    """Stands in for the ``time`` module: sleeping just moves the clock on."""
+
+    def __init__(self) -> None:
+        self.now = 100.0
+        self.slept: List[float] = []
+
+    def monotonic(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float) -> None:
+        self.slept.append(seconds)
+        self.now += seconds
+
+class TokenBucketTests(unittest.TestCase):
+    def setUp(self) -> None:
+        self.clock = FakeClock()
+        patcher = mock.patch("utils.scheduler.time", self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_burst_is_free_then_paced_at_rate(self) -> None:
+        bucket = TokenBucket(rate=4, burst=3)
+        for _ in range(3):
+            bucket.acquire()
+        self.assertEqual(self.clock.slept, [])
+        bucket.acquire()
+        self.assertEqual(self.clock.slept, [0.25])
+        bucket.acquire()
+        self.assertAlmostEqual(self.clock.now, 100.5)
+
+    def test_refill_is_capped_at_burst(self) -> None:
+        bucket = TokenBucket(rate=8, burst=2)
+        bucket.acquire()
+        self.clock.now += 60
+        for _ in range(2):
+            bucket.acquire()
+        self.assertEqual(self.clock.slept, [])
+        bucket.acquire()
+        self.assertEqual(self.clock.slept, [0.125])
+
+    def test_async_acquire_waits_too(self) -> None:
+        bucket = TokenBucket(rate=2, burst=1)
+        waits: List[float] = []
+
+        async def fake_sleep(seconds: float) -> None:
+            waits.append(seconds)
+            self.clock.now += seconds
+
+        async def take_two() -> None:
+            await bucket.aacquire()
+            await bucket.aacquire()
+
+        with mock.patch("utils.scheduler.asyncio.sleep", fake_sleep):
+            asyncio.run(take_two())
+        self.assertEqual(waits, [0.5])
+
+    def test_invalid_limits(self) -> None:
+        for rate, burst in ((0, None), (-1, None), (5, 0.5)):
+            with self.subTest(rate=rate, burst=burst):
+                with self.assertRaises(ValueError):
+                    TokenBucket(rate, burst)
+
+class SearchRateLimiterTests(unittest.TestCase):
+    def test_buckets_are_per_search_option(self) -> None:
+        limiter = SearchRateLimiter({"Phone Search": 1, "*": {"rate": 1, "burst": 2}})
+        self.assertTrue(limiter)
+        phone = limiter._buckets["phone search"]
+        self.assertIsNot(phone, limiter._default)
+        self.assertEqual(limiter._default.burst, 2)
+        with mock.patch.object(phone, "acquire") as phone_acquire, mock.patch.object(
+            limiter._default, "acquire"
+        ) as default_acquire:
+            limiter.acquire("  PHONE search ")
+            limiter.acquire("Name Search")
+            limiter.acquire("Email Search")
+        self.assertEqual(phone_acquire.call_count, 1)
+        self.assertEqual(default_acquire.call_count, 2)
+
+    def test_no_limits_never_throttle(self) -> None:
+        limiter = SearchRateLimiter({"Phone Search": 1})
+        limiter.acquire("Name Search")
+        self.assertFalse(SearchRateLimiter({}))
+        self.assertFalse(SearchRateLimiter(None))
+
+class BoundedSchedulerTests(unittest.TestCase):
+    def test_in_flight_work_is_bounded(self) -> None:
+        scheduler = BoundedScheduler(max_workers=3, max_in_flight_per_worker=2)
+        lock = threading.Lock()
+        pulled = 0
+        finished = 0
+        high_water = 0
+
+        def items() -> Iterator[int]:
+            nonlocal pulled, high_water
+            for item in range(200):
+                with lock:
+                    pulled += 1
+                    high_water = max(high_water, pulled - finished)
+                yield item
+
+        def work(item: int) -> int:
+            nonlocal finished
+            with lock:
+                finished += 1
+            return item * 2
+
+        results = {item: future.result() for item, future in scheduler.run(work, items())}
+        self.assertEqual(results, {item: item * 2 for item in range(200)})
+        self.assertLessEqual(high_water, scheduler.max_in_flight)
+        self.assertIsNone(scheduler.feed_error)
+
+    def test_reader_error_drains_in_flight_work(self) -> None:
+        scheduler = BoundedScheduler(max_workers=2, max_in_flight_per_worker=1)
+
+        def items() -> Iterator[int]:
+            yield from range(5)
+            raise ValueError("bad input line")
+
+        done = sorted(item for item, future in scheduler.run(lambda item: item, items()))
+        self.assertEqual(done, list(range(5)))
+        self.assertIsInstance(scheduler.feed_error, ValueError)
+
+    def test_work_errors_stay_on_their_future(self) -> None:
+        scheduler = BoundedScheduler(max_workers=2)
+
+        def work(item: int) -> int:
+            if item == 3:
+                raise LookupError("no match")
+            return item
+
+        outcomes = {item: future.exception() for item, future in scheduler.run(work, range(6))}
+        self.assertIsInstance(outcomes.pop(3), LookupError)
+        self.assertTrue(all(exc is None for exc in outcomes.values()))
+
+    def test_rate_limit_key_is_taken_from_each_item(self) -> None:
+        limiter = SearchRateLimiter({"*": 1000})
+        scheduler = BoundedScheduler(max_workers=2, rate_limiter=limiter)
+        with mock.patch.object(limiter, "acquire") as acquire:
+            list(scheduler.run(len, ["a", "bb"], limit_key=lambda item: f"option {item}"))
+        self.assertEqual(sorted(c.args[0] for c in acquire.call_args_list), ["option a", "option bb"])
+
+class AsyncBoundedTests(unittest.TestCase):
+    def test_bound_and_reader_error(self) -> None:
+        running = 0
+        high_water = 0
+
+        async def work(item: int) -> int:
+            nonlocal running, high_water
+            running += 1
+            high_water = max(high_water, running)
+            await asyncio.sleep(0)
+            running -= 1
+            return item
+
+        def items() -> Iterator[int]:
+            yield from range(20)
+            raise ValueError("bad input line")
+
+        done: List[int] = []
+
+        async def collect() -> None:
+            async for item, task in run_async_bounded(work, items(), max_in_flight=4):
+                done.append(task.result())
+
+        with self.assertRaises(ValueError):
+            asyncio.run(collect())
+        self.assertEqual(sorted(done), list(range(20)))
+        self.assertLessEqual(high_water, 4)
+
+if __name__ == "__main__":
+    unittest.main()
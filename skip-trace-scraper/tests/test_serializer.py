@@ -0,0 +1,77 @@
+import json
+import unittest
+from typing import List
+
+from extractors.entity_resolver import merge_person_records
+from extractors.identity_extractor import IdentityExtractor, PersonRecord, Relation
+from extractors.record_store import InMemoryRecordStore
+from utils.serializer import PRECOMPILED_INDEXES, RecordSerializer
+from utils.synthetic import generate_people
+
+INDENTS = (None, 0, 2, 4)
+
+def _records() -> List[PersonRecord]:
+    people = list(generate_people(60, seed=11))
+    extractor = IdentityExtractor(store=InMemoryRecordStore(people), fuzzy_threshold=0.8)
+    records = [extractor.lookup("Name Search", f"{p['first_name']} {p['last_name']}") for p in people]
+    # A fuzzy match, and a merged record carrying its matched queries.
+    person = people[0]
+    records.append(
+        extractor.lookup("Name Search", f"{person['first_name']} {person['last_name'][:-1]}x")
+    )
+    records.append(merge_person_records(records[:3]))
+
+    odd = PersonRecord(
+        search_option="Name Search",
+        input_given='  "Quoted"\tname\n',
+        first_name="Zoë",
+        last_name="O'Brien-Łukasz   \U0001F600",
+        age="41",
+        county_name="",
+        emails=[f"user{n}@example.com" for n in range(PRECOMPILED_INDEXES + 3)],
+        phones=[
+            {"number": "(555) 010-0000", "type": None, "provider": ""},
+            {"number": "", "type": "Landline", "provider": "Acme \\ Co"},
+        ],
+        previous_addresses=[{"streetAddress": "1 Main St", "addressLocality": None, "extra": [1, 2.5, True]}],
+        relatives=[Relation("Ann \"Nan\" Smith"), Relation("Bob", "70")],
+        associates=[Relation("Çelik")],
+        person_link="https://example.com/p?id=1&x=é",
+        match_score=0.875,
+    )
+    bare = PersonRecord(search_option="Phone Search", input_given="5550100", first_name="", last_name="")
+    return records + [odd, bare]
+
+class RecordSerializerTests(unittest.TestCase):
+    """``RecordSerializer`` writes byte for byte what ``json.dumps`` writes."""
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.records = _records()
+        assert any(record.match_score is not None for record in cls.records[:-2])
+        assert any(record.matched_queries for record in cls.records)
+
+    def test_matches_json_dumps(self) -> None:
+        for indent in INDENTS:
+            serializer = RecordSerializer(indent=indent)
+            for record in self.records:
+                with self.subTest(indent=indent, input=record.input_given):
+                    expected = json.dumps(record.to_dict(), indent=indent, ensure_ascii=False)
+                    self.assertEqual(serializer.dumps(record), expected)
+                    self.assertEqual(serializer.encode(record), expected.encode("utf-8"))
+                    self.assertEqual(serializer.encode_line(record), (expected + "\n").encode("utf-8"))
+
+    def test_nested_level_splices_into_an_array(self) -> None:
+        for indent in INDENTS:
+            with self.subTest(indent=indent):
+                serializer = RecordSerializer(indent=indent, level=1)
+                expected = json.dumps([r.to_dict() for r in self.records], indent=indent, ensure_ascii=False)
+                if indent is None:
+                    got = "[" + ", ".join(serializer.dumps(r) for r in self.records) + "]"
+                else:
+                    pad = "\n" + " " * indent
+                    got = "[" + pad + ("," + pad).join(serializer.dumps(r) for r in self.records) + "\n]"
+                self.assertEqual(got, expected)
+
+if __name__ == "__main__":
+    unittest.main()
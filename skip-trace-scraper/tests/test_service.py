@@ -0,0 +1,165 @@
+import http.client
+import json
+import tempfile
+import threading
+import unittest
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+from urllib.parse import quote
+
+from extractors.identity_extractor import IdentityExtractor
+from extractors.record_store import InMemoryRecordStore
+from extractors.relations_extractor import RelationsExtractor
+from service import MAX_BODY_BYTES, MAX_QUERIES_PER_REQUEST, LookupService, make_server
+from utils.metrics import Metrics
+from utils.serializer import RecordSerializer
+from utils.synthetic import generate_people
+
+PEOPLE = 50
+MISS = "Nobody Anywhere"
+
+class LookupServiceTests(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.people = list(generate_people(PEOPLE, seed=4))
+        cls.store = InMemoryRecordStore(cls.people)
+        cls.names = [person["name_key"] for person in cls.people]
+
+    def setUp(self) -> None:
+        self.service = LookupService(
+            IdentityExtractor(store=self.store),
+            RelationsExtractor(),
+            store=self.store,
+            metrics=Metrics(),
+            max_batch=8,
+            max_wait_ms=5,
+        )
+        self.addCleanup(self.service.close)
+
+    def expected(self, name: str) -> Any:
+        record = IdentityExtractor(store=self.store).lookup("Name Search", name)
+        return json.loads(RecordSerializer().encode(RelationsExtractor().enrich_relations(record)))
+
+    def serve(self, unix_socket: Optional[Path] = None) -> Any:
+        server = make_server(self.service, port=0, unix_socket=unix_socket)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        return server
+
+    def request(
+        self,
+        method: str,
+        path: str,
+        body: Optional[Any] = None,
+        headers: Optional[Dict[str, str]] = None,
+    ) -> Tuple[int, Any]:
+        connection = http.client.HTTPConnection("127.0.0.1", self.port, timeout=10)
+        self.addCleanup(connection.close)
+        if body is not None and not isinstance(body, bytes):
+            body = json.dumps(body).encode("utf-8")
+        connection.request(method, path, body=body, headers=headers or {})
+        response = connection.getresponse()
+        data = response.read()
+        return response.status, json.loads(data) if data else None
+
+    def start_http(self) -> None:
+        self.port = self.serve().server_address[1]
+
+    def test_lookup_in_process(self) -> None:
+        self.assertEqual(json.loads(self.service.lookup(None, self.names[0])), self.expected(self.names[0]))
+        with self.assertRaises(LookupError):
+            self.service.lookup("Name Search", MISS)
+        results = self.service.lookup_many([("Name Search", self.names[1]), (None, MISS)])
+        self.assertEqual(json.loads(results[0]), self.expected(self.names[1]))
+        self.assertIsInstance(results[1], LookupError)
+        self.assertEqual((self.service.served, self.service.misses), (2, 2))
+
+    def test_get_lookup(self) -> None:
+        self.start_http()
+        name = self.names[2]
+        self.assertEqual(self.request("GET", f"/lookup?value={quote(name)}"), (200, self.expected(name)))
+        self.assertEqual(
+            self.request("GET", f"/lookup?value={quote(name)}&option=Name%20Search")[1], self.expected(name)
+        )
+
+        status, body = self.request("GET", f"/lookup?value={quote(MISS)}&option=Name%20Search")
+        self.assertEqual((status, body["status"]), (404, 404))
+        self.assertEqual(self.request("GET", "/lookup")[0], 400)
+        self.assertEqual(self.request("GET", "/lookup?value=%20%20")[0], 400)
+        self.assertEqual(self.request("GET", "/elsewhere")[0], 404)
+
+        status, health = self.request("GET", "/health")
+        self.assertEqual((status, health["status"], health["records"]), (200, "ok", PEOPLE))
+        self.assertEqual((health["served"], health["misses"]), (2, 1))
+
+    def test_post_lookup(self) -> None:
+        self.start_http()
+        name = self.names[3]
+        self.assertEqual(
+            self.request("POST", "/lookup", {"search_option": "Name Search", "input_value": name}),
+            (200, self.expected(name)),
+        )
+        self.assertEqual(self.request("POST", "/lookup", {"input_value": MISS})[0], 404)
+
+        queries = [{"input_value": n} for n in self.names[:10]] + [{"Input Value": MISS}]
+        status, results = self.request("POST", "/lookup", queries)
+        self.assertEqual(status, 200)
+        self.assertEqual(results[:10], [self.expected(n) for n in self.names[:10]])
+        self.assertEqual(results[10]["status"], 404)
+        self.assertGreater(self.service.health()["mean_batch_size"], 1)
+
+    def test_post_rejects_bad_requests(self) -> None:
+        self.start_http()
+        invalid = {
+            "not json": b"{",
+            "not an object": [1],
+            "no value": {"search_option": "Name Search"},
+            "blank value": {"input_value": "  "},
+            "blank option": {"input_value": "Ann Lee", "search_option": ""},
+            "too many": [{"input_value": "Ann Lee"}] * (MAX_QUERIES_PER_REQUEST + 1),
+        }
+        for name, body in invalid.items():
+            with self.subTest(name=name):
+                status, error = self.request("POST", "/lookup", body)
+                self.assertEqual((status, error["status"]), (400, 400))
+                self.assertTrue(error["error"].startswith("invalid request"))
+
+        self.assertEqual(self.request("POST", "/elsewhere", {"input_value": "Ann Lee"})[0], 404)
+
+        # Over the limit: refused from the headers alone, the body is never read.
+        status, error = self.request("POST", "/lookup", headers={"Content-Length": str(MAX_BODY_BYTES + 1)})
+        self.assertEqual((status, error["status"]), (413, 413))
+
+        connection = http.client.HTTPConnection("127.0.0.1", self.port, timeout=10)
+        self.addCleanup(connection.close)
+        connection.putrequest("POST", "/lookup")
+        connection.endheaders()
+        self.assertEqual(connection.getresponse().status, 411)
+
+    def test_metrics_endpoint(self) -> None:
+        self.start_http()
+        self.request("GET", f"/lookup?value={quote(self.names[0])}")
+        connection = http.client.HTTPConnection("127.0.0.1", self.port, timeout=10)
+        self.addCleanup(connection.close)
+        connection.request("GET", "/metrics")
+        response = connection.getresponse()
+        self.assertEqual(response.status, 200)
+        self.assertIn('skiptrace_queries_total{outcome="success"} 1', response.read().decode("utf-8"))
+
+    def test_unix_socket(self) -> None:
+        with tempfile.TemporaryDirectory() as work_dir:
+            path = Path(work_dir) / "service.sock"
+            path.write_text("not a socket")
+            with self.assertRaises(FileExistsError):
+                make_server(self.service, unix_socket=path)
+            path.unlink()
+            server = self.serve(path)
+            self.assertTrue(path.exists())
+            server.shutdown()
+            server.server_close()
+            # A stale socket is replaced.
+            self.serve(path)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,113 @@
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+
+from extractors.identity_extractor import IdentityExtractor
+from extractors.record_store import InMemoryRecordStore, build_marshal_index
+from extractors.relations_extractor import RelationsExtractor
+from main import process_query, run_sharded
+from utils.checkpoint import CheckpointJournal
+from utils.data_parser import SearchQuery
+from utils.sharding import ReorderBuffer, shard_for
+from utils.synthetic import generate_people, generate_queries
+
+PEOPLE = 150
+QUERIES = 400
+FINGERPRINT = {"path": "/data/inputs.json", "size": 1, "mtime_ns": 1}
+
+class ReorderBufferTests(unittest.TestCase):
+    def test_releases_in_sequence_order(self) -> None:
+        buffer: ReorderBuffer[str] = ReorderBuffer()
+        buffer.put(2, "c")
+        buffer.skip(1)
+        self.assertEqual(list(buffer.pop_ready()), [])
+        buffer.put(0, "a")
+        self.assertEqual(list(buffer.pop_ready()), ["a", "c"])
+        buffer.put(4, "e")
+        buffer.skip(3)
+        self.assertEqual((list(buffer.pop_ready()), len(buffer), buffer.next_seq), (["e"], 0, 5))
+
+    def test_shard_for_is_stable(self) -> None:
+        keys = [f"name search\0person {n}" for n in range(200)]
+        shards = [shard_for(key, 4) for key in keys]
+        self.assertEqual(shards, [shard_for(key, 4) for key in keys])
+        self.assertEqual(set(shards), {0, 1, 2, 3})
+        self.assertEqual({shard_for(key, 1) for key in keys}, {0})
+
+class RunShardedTests(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.people = list(generate_people(PEOPLE, seed=9))
+        rows = generate_queries(PEOPLE, QUERIES, seed=9, miss_ratio=0.2)
+        cls.queries = [SearchQuery(row["search_option"], row["input_value"]) for row in rows]
+
+    def setUp(self) -> None:
+        work_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(work_dir.cleanup)
+        self.work_dir = Path(work_dir.name)
+        self.store_path = self.work_dir / "people.stmi"
+        build_marshal_index(self.people, self.store_path)
+
+    def settings(self, **overrides: Any) -> Dict[str, Any]:
+        settings = {
+            "record_store": {"type": "marshal", "path": str(self.store_path)},
+            "log_level": "CRITICAL",
+        }
+        settings.update(overrides)
+        return settings
+
+    def checkpoint(self) -> Path:
+        """A journal holding every third query, hits and misses alike."""
+        path = self.work_dir / "checkpoint.jsonl"
+        extractor = IdentityExtractor(store=InMemoryRecordStore(self.people))
+        journal = CheckpointJournal(path, FINGERPRINT).open()
+        for idx in range(0, QUERIES, 3):
+            try:
+                record = process_query(self.queries[idx], extractor, RelationsExtractor())
+            except LookupError as exc:
+                journal.record_miss(idx, str(exc))
+            else:
+                journal.record_success(idx, record.to_state())
+        journal.close()
+        return path
+
+    def run_with_checkpoint(
+        self, checkpoint: Path, output: str, processes: int, **settings: Any
+    ) -> Tuple[Tuple[int, int], bytes]:
+        path = self.work_dir / f"run-{output}"
+        shutil.copy(checkpoint, path)
+        journal = CheckpointJournal(path, FINGERPRINT).open()
+        self.addCleanup(journal.close)
+        output_path = self.work_dir / output
+        counts = run_sharded(
+            iter(self.queries), self.settings(**settings), output_path, processes, journal=journal
+        )
+        self.assertFalse(path.exists())
+        return counts, output_path.read_bytes()
+
+    def test_output_does_not_depend_on_the_process_count(self) -> None:
+        checkpoint = self.checkpoint()
+        for output in ("one.jsonl", "one.csv"):
+            with self.subTest(output=output):
+                one = self.run_with_checkpoint(checkpoint, output, 1)
+                two = self.run_with_checkpoint(checkpoint, f"two-{output}", 2, shard_batch_size=3)
+                self.assertEqual(two, one)
+                succeeded, failed = one[0]
+                self.assertEqual(succeeded + failed, QUERIES)
+                self.assertTrue(succeeded and failed)
+
+    def test_dead_worker_fails_the_run(self) -> None:
+        # Workers cannot open the store and exit; one key sends every batch
+        # to the same full inbox.
+        settings = self.settings(
+            record_store={"type": "marshal", "path": str(self.work_dir / "missing.stmi")},
+            shard_batch_size=1,
+        )
+        queries: List[SearchQuery] = [SearchQuery("Name Search", "Ann Lee")] * 12
+        with self.assertRaisesRegex(RuntimeError, "exited unexpectedly"):
+            run_sharded(iter(queries), settings, self.work_dir / "out.jsonl", 2)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,146 @@
+import asyncio
+import threading
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List
+
+from utils.singleflight import AsyncSingleFlight, SingleFlight
+
+WAITERS = 8
+
+class SingleFlightTests(unittest.TestCase):
+    def run_together(self, flight: SingleFlight, fn: Callable[[], str]) -> List[object]:
+        """Call ``flight.do`` from WAITERS threads while ``fn`` is held running."""
+        release = threading.Event()
+
+        def held() -> str:
+            release.wait(5)
+            return fn()
+
+        def call() -> object:
+            try:
+                return flight.do("key", held)
+            except Exception as exc:
+                return exc
+
+        with ThreadPoolExecutor(max_workers=WAITERS) as executor:
+            futures = [executor.submit(call) for _ in range(WAITERS)]
+            deadline = time.monotonic() + 5
+            while flight.coalesced < WAITERS - 1 and time.monotonic() < deadline:
+                time.sleep(0.001)
+            release.set()
+            return [future.result() for future in futures]
+
+    def test_concurrent_callers_share_one_call(self) -> None:
+        flight: SingleFlight[str] = SingleFlight()
+        calls = []
+        results = self.run_together(flight, lambda: calls.append(1) or "record")
+        self.assertEqual(results, ["record"] * WAITERS)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual((flight.executed, flight.coalesced), (1, WAITERS - 1))
+
+    def test_exception_reaches_every_caller(self) -> None:
+        flight: SingleFlight[str] = SingleFlight()
+        error = LookupError("no match")
+
+        def fail() -> str:
+            raise error
+
+        results = self.run_together(flight, fail)
+        self.assertTrue(all(result is error for result in results))
+        self.assertEqual(flight.executed, 1)
+
+    def test_key_is_forgotten_once_done(self) -> None:
+        flight: SingleFlight[int] = SingleFlight()
+        self.assertEqual(flight.do("key", lambda: 1), 1)
+        self.assertEqual(flight.do("key", lambda: 2), 2)
+        with self.assertRaises(ValueError):
+            flight.do("key", lambda: int("x"))
+        self.assertEqual(flight.do("key", lambda: 3), 3)
+        self.assertEqual((flight.executed, flight.coalesced), (4, 0))
+
+class AsyncSingleFlightTests(unittest.TestCase):
+    def test_concurrent_callers_share_one_call(self) -> None:
+        flight: AsyncSingleFlight[str] = AsyncSingleFlight()
+        calls = 0
+
+        async def fetch() -> str:
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0.01)
+            return "record"
+
+        async def run() -> List[str]:
+            first = await asyncio.gather(*(flight.do("a", fetch) for _ in range(WAITERS)))
+            other = await flight.do("b", fetch)
+            return first + [other]
+
+        self.assertEqual(asyncio.run(run()), ["record"] * (WAITERS + 1))
+        self.assertEqual(calls, 2)
+        self.assertEqual((flight.executed, flight.coalesced), (2, WAITERS - 1))
+
+    def test_exception_reaches_every_caller(self) -> None:
+        flight: AsyncSingleFlight[str] = AsyncSingleFlight()
+
+        async def fail() -> str:
+            await asyncio.sleep(0.01)
+            raise TimeoutError("slow source")
+
+        async def run() -> List[BaseException]:
+            return await asyncio.gather(
+                *(flight.do("a", fail) for _ in range(WAITERS)), return_exceptions=True
+            )
+
+        results = asyncio.run(run())
+        self.assertTrue(all(isinstance(result, TimeoutError) for result in results))
+        self.assertEqual(flight.executed, 1)
+
+    def test_cancelled_waiter_leaves_the_call_running(self) -> None:
+        flight: AsyncSingleFlight[str] = AsyncSingleFlight()
+        finished = []
+
+        async def fetch() -> str:
+            await asyncio.sleep(0.02)
+            finished.append(True)
+            return "record"
+
+        async def run() -> List[object]:
+            leader = asyncio.create_task(flight.do("a", fetch))
+            await asyncio.sleep(0)
+            waiters = [asyncio.create_task(flight.do("a", fetch)) for _ in range(2)]
+            await asyncio.sleep(0)
+            waiters[0].cancel()
+            return await asyncio.gather(leader, *waiters, return_exceptions=True)
+
+        leader, cancelled, waiter = asyncio.run(run())
+        self.assertEqual((leader, waiter), ("record", "record"))
+        self.assertIsInstance(cancelled, asyncio.CancelledError)
+        self.assertEqual(finished, [True])
+        self.assertEqual(flight.coalesced, 2)
+
+    def test_cancelled_leader_cancels_its_waiters(self) -> None:
+        flight: AsyncSingleFlight[str] = AsyncSingleFlight()
+
+        async def fetch() -> str:
+            await asyncio.sleep(1)
+            return "record"
+
+        async def run() -> List[object]:
+            leader = asyncio.create_task(flight.do("a", fetch))
+            await asyncio.sleep(0)
+            waiter = asyncio.create_task(flight.do("a", fetch))
+            await asyncio.sleep(0)
+            leader.cancel()
+            results = await asyncio.gather(leader, waiter, return_exceptions=True)
+            # The key is free again for the next caller.
+            results.append(await flight.do("a", lambda: asyncio.sleep(0, "again")))
+            return results
+
+        leader, waiter, again = asyncio.run(run())
+        self.assertIsInstance(leader, asyncio.CancelledError)
+        self.assertIsInstance(waiter, asyncio.CancelledError)
+        self.assertEqual(again, "again")
+
+if __name__ == "__main__":
+    unittest.main()